@@ -14,6 +14,9 @@ import logging
 from urllib.parse import urlparse, parse_qs
 import random
 
+from page_extractor import extract_fields, extract_with_patterns, parse_number
+from youtube_batch_client import YouTubeBatchClient
+
 # Konfiguracja logowania
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -47,6 +50,9 @@ class AdvancedSocialStatsChecker:
             self.api_keys = get_api_keys()
         except ImportError:
             self.api_keys = {}
+        
+        # Batchujący klient YouTube (cache kanałów + liczenie quota)
+        self.youtube = YouTubeBatchClient(self.api_keys.get('youtube'), self.session)
     
     def _rotate_user_agent(self):
         """Rotacja User-Agent"""
@@ -100,19 +106,15 @@ class AdvancedSocialStatsChecker:
             if not channel_id:
                 return None
             
-            api_key = self.api_keys['youtube']
-            url = "https://www.googleapis.com/youtube/v3/channels"
-            params = {
-                'part': 'statistics,snippet',
-                'id': channel_id,
-                'key': api_key
-            }
-            
-            response = self.session.get(url, params=params, timeout=10)
-            data = response.json()
+            # Handle (@nazwa) -> channel_id, wynik w cache klienta
+            if not (channel_id.startswith('UC') and len(channel_id) == 24):
+                channel_id = self.youtube.resolve_handles([channel_id]).get(channel_id.lstrip('@'))
+                if not channel_id:
+                    return None
             
-            if 'items' in data and data['items']:
-                stats = data['items'][0]['statistics']
+            channels = self.youtube.channels([channel_id], part='statistics,snippet')
+            if channel_id in channels:
+                stats = channels[channel_id]['statistics']
                 return {
                     'platform': 'YouTube',
                     'subscribers': int(stats.get('subscriberCount', 0)),
@@ -134,23 +136,11 @@ class AdvancedSocialStatsChecker:
             
             content = response.text
             
-            # Szukanie danych w różnych formatach
-            patterns = {
-                'subscribers': [
-                    r'"subscriberCountText":\{"simpleText":"([^"]+)"',
-                    r'"subscriberCountText":\{"runs":\[.*?"text":"([^"]+)"',
-                    r'subscriberCount["\']:\s*["\']([^"\']+)["\']',
-                    r'(\d+(?:\.\d+)?[KMB]?)\s*subscribers?'
-                ],
-                'views': [
-                    r'"viewCountText":\{"simpleText":"([^"]+)"',
-                    r'viewCount["\']:\s*["\']([^"\']+)["\']',
-                    r'(\d+(?:\.\d+)?[KMB]?)\s*views?'
-                ]
-            }
+            # Jeden przebieg po skompilowanych wzorcach platformy
+            fields = extract_fields('youtube', content)
             
-            subscribers = self._extract_with_patterns(content, patterns['subscribers'])
-            views = self._extract_with_patterns(content, patterns['views'])
+            subscribers = fields['subscribers']
+            views = fields['views']
             
             if subscribers or views:
                 return {
@@ -225,28 +215,12 @@ class AdvancedSocialStatsChecker:
             
             content = response.text
             
-            # Szukanie danych w różnych formatach
-            patterns = {
-                'followers': [
-                    r'"edge_followed_by":\{"count":(\d+)\}',
-                    r'"follower_count":(\d+)',
-                    r'(\d+(?:\.\d+)?[KMB]?)\s*followers?'
-                ],
-                'following': [
-                    r'"edge_follow":\{"count":(\d+)\}',
-                    r'"following_count":(\d+)',
-                    r'(\d+(?:\.\d+)?[KMB]?)\s*following'
-                ],
-                'posts': [
-                    r'"edge_owner_to_timeline_media":\{"count":(\d+)\}',
-                    r'"media_count":(\d+)',
-                    r'(\d+(?:\.\d+)?[KMB]?)\s*posts?'
-                ]
-            }
+            # Jeden przebieg po skompilowanych wzorcach platformy
+            fields = extract_fields('instagram', content)
             
-            followers = self._extract_with_patterns(content, patterns['followers'])
-            following = self._extract_with_patterns(content, patterns['following'])
-            posts = self._extract_with_patterns(content, patterns['posts'])
+            followers = fields['followers']
+            following = fields['following']
+            posts = fields['posts']
             
             if followers or following or posts:
                 return {
@@ -310,28 +284,12 @@ class AdvancedSocialStatsChecker:
             
             content = response.text
             
-            # Szukanie danych w różnych formatach
-            patterns = {
-                'followers': [
-                    r'"followerCount":(\d+)',
-                    r'"fans":(\d+)',
-                    r'(\d+(?:\.\d+)?[KMB]?)\s*followers?'
-                ],
-                'following': [
-                    r'"followingCount":(\d+)',
-                    r'"follow":(\d+)',
-                    r'(\d+(?:\.\d+)?[KMB]?)\s*following'
-                ],
-                'likes': [
-                    r'"heartCount":(\d+)',
-                    r'"likes":(\d+)',
-                    r'(\d+(?:\.\d+)?[KMB]?)\s*likes?'
-                ]
-            }
+            # Jeden przebieg po skompilowanych wzorcach platformy
+            fields = extract_fields('tiktok', content)
             
-            followers = self._extract_with_patterns(content, patterns['followers'])
-            following = self._extract_with_patterns(content, patterns['following'])
-            likes = self._extract_with_patterns(content, patterns['likes'])
+            followers = fields['followers']
+            following = fields['following']
+            likes = fields['likes']
             
             if followers or following or likes:
                 return {
@@ -415,20 +373,11 @@ class AdvancedSocialStatsChecker:
             
             content = response.text
             
-            # Szukanie danych w różnych formatach
-            patterns = {
-                'followers': [
-                    r'"followers_count":(\d+)',
-                    r'(\d+(?:\.\d+)?[KMB]?)\s*followers?'
-                ],
-                'friends': [
-                    r'"friends_count":(\d+)',
-                    r'(\d+(?:\.\d+)?[KMB]?)\s*friends?'
-                ]
-            }
+            # Jeden przebieg po skompilowanych wzorcach platformy
+            fields = extract_fields('vk', content)
             
-            followers = self._extract_with_patterns(content, patterns['followers'])
-            friends = self._extract_with_patterns(content, patterns['friends'])
+            followers = fields['followers']
+            friends = fields['friends']
             
             if followers or friends:
                 return {
@@ -469,22 +418,11 @@ class AdvancedSocialStatsChecker:
             
             content = response.text
             
-            # Szukanie danych w różnych formatach
-            patterns = {
-                'followers': [
-                    r'"fans":(\d+)',
-                    r'"followerCount":(\d+)',
-                    r'(\d+(?:\.\d+)?[KMB]?)\s*followers?'
-                ],
-                'following': [
-                    r'"follow":(\d+)',
-                    r'"followingCount":(\d+)',
-                    r'(\d+(?:\.\d+)?[KMB]?)\s*following'
-                ]
-            }
+            # Jeden przebieg po skompilowanych wzorcach platformy
+            fields = extract_fields('likee', content)
             
-            followers = self._extract_with_patterns(content, patterns['followers'])
-            following = self._extract_with_patterns(content, patterns['following'])
+            followers = fields['followers']
+            following = fields['following']
             
             if followers or following:
                 return {
@@ -498,40 +436,12 @@ class AdvancedSocialStatsChecker:
         return None
     
     def _extract_with_patterns(self, content: str, patterns: List[str]) -> int:
-        """Wyciąganie danych z różnych wzorców"""
-        for pattern in patterns:
-            try:
-                match = re.search(pattern, content, re.IGNORECASE)
-                if match:
-                    return self._parse_number(match.group(1))
-            except Exception:
-                continue
-        return 0
+        """Wyciąganie danych z różnych wzorców (jeden przebieg, wzorce kompilowane raz)"""
+        return extract_with_patterns(content, patterns)
     
     def _parse_number(self, text: str) -> int:
         """Parsowanie liczb z tekstu (np. '1.2M' -> 1200000)"""
-        if not text:
-            return 0
-        
-        text = text.replace(',', '').replace(' ', '').replace('"', '')
-        
-        multipliers = {
-            'K': 1000,
-            'M': 1000000,
-            'B': 1000000000
-        }
-        
-        for suffix, multiplier in multipliers.items():
-            if suffix in text.upper():
-                number = float(re.findall(r'[\d.]+', text)[0])
-                return int(number * multiplier)
-        
-        # Jeśli nie ma sufiksu, spróbuj wyciągnąć liczbę
-        numbers = re.findall(r'[\d.]+', text)
-        if numbers:
-            return int(float(numbers[0]))
-        
-        return 0
+        return parse_number(text)
     
     def check_all_stats(self, urls: Dict[str, str]) -> Dict[str, Any]:
         """Sprawdzanie statystyk na wszystkich platformach"""
@@ -12,7 +12,9 @@ from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from typing import List, Dict, Tuple
 import json
 from video_uniquizer import VideoUniquizer
-from vidgear.gears import WriteGear
+from fanout_renderer import FanoutRenderer, VariantSpec
+import tracing
+import complexity
 import cv2
 import numpy as np
 
@@ -53,8 +55,20 @@ class BatchVideoGenerator:
     def generate_single_version(self, input_video: str, run_dir: Path, 
                               version_id: int, effects: List[str]) -> Dict:
         """
-        Генерирует одну версию видео
+        Генерирует одну версию видео; трасса стадий пишется в папку версии
         """
+        if not tracing.TRACING_ENABLED:
+            return self._generate_single_version(input_video, run_dir, version_id, effects)
+        version_dir = run_dir / "versions" / f"version_{version_id:03d}"
+        tracer = tracing.Tracer('version', run_dir=version_dir, summary_name='metadata.json',
+                                version_id=version_id, effects='+'.join(effects))
+        with tracer.activate():
+            metadata = self._generate_single_version(input_video, run_dir, version_id, effects)
+        metadata["trace"] = tracer.summary
+        return metadata
+    
+    def _generate_single_version(self, input_video: str, run_dir: Path, 
+                                 version_id: int, effects: List[str]) -> Dict:
         try:
             # Создаем папку для версии
             version_dir = run_dir / "versions" / f"version_{version_id:03d}"
@@ -65,8 +79,9 @@ class BatchVideoGenerator:
             
             print(f"🎬 Генерируем версию {version_id}: {effects}")
             
-            # Создаем уникализатор
-            uniquizer = VideoUniquizer()
+            # Создаем уникализатор (CRF/maxrate по сложности исходника; анализ кэшируется на все версии)
+            encoding = complexity.choose_rate(input_video)
+            uniquizer = VideoUniquizer(rate_args=encoding['rate_args'])
             
             # Обрабатываем видео
             result_path = uniquizer.uniquize_video(
@@ -82,6 +97,7 @@ class BatchVideoGenerator:
                 "input_file": input_video,
                 "output_file": str(result_path),
                 "file_size_mb": os.path.getsize(result_path) / (1024*1024),
+                "encoding": encoding,
                 "generated_at": datetime.now().isoformat(),
                 "status": "success"
             }
@@ -155,6 +171,7 @@ class BatchVideoGenerator:
             "failed": len(failed),
             "run_dir": str(run_dir),
             "generated_at": datetime.now().isoformat(),
+            "trace": tracing.merge_summaries(r.get('trace') for r in results if isinstance(r, dict)),
             "results": results
         }
         
@@ -247,6 +264,7 @@ class BatchVideoGenerator:
             "failed": len(failed),
             "run_dir": str(run_dir),
             "generated_at": datetime.now().isoformat(),
+            "trace": tracing.merge_summaries(r.get('trace') for r in results if isinstance(r, dict)),
             "results": results
         }
         
@@ -262,6 +280,99 @@ class BatchVideoGenerator:
         
         return run_summary
     
+    def generate_batch_fanout(self, input_video: str, n_versions: int = 3, 
+                              run_name: str = None) -> Dict:
+        """
+        Генерация всех версий за одно декодирование исходника (FanoutRenderer)
+        """
+        print(f"🚀 Начинаем fan-out генерацию {n_versions} версий")
+        
+        # Создаем папку для запуска
+        run_dir = self.create_run_folder(run_name)
+        
+        # Список возможных эффектов
+        effect_combinations = [
+            ['temporal'],
+            ['social'], 
+            ['visual'],
+            ['temporal', 'social'],
+            ['temporal', 'visual'],
+            ['social', 'visual'],
+            ['temporal', 'social', 'visual']
+        ]
+        
+        # CRF/maxrate по сложности исходника - общие для всех версий
+        encoding = complexity.choose_rate(input_video)
+        encoder_args = (['-c:v', 'libx264', '-preset', 'fast'] + encoding['rate_args']
+                        + ['-threads', '2', '-pix_fmt', 'yuv420p', '-movflags', '+faststart'])
+        
+        variants = []
+        for i in range(n_versions):
+            effects = effect_combinations[i % len(effect_combinations)]
+            version_dir = run_dir / "versions" / f"version_{i+1:03d}"
+            version_dir.mkdir(exist_ok=True)
+            variants.append(VariantSpec(version_dir / f"uniquized_v{i+1:03d}.mp4", effects, encoder_args=encoder_args))
+        
+        print(f"⏳ Декодируем исходник один раз для {n_versions} версий...")
+        tracer = tracing.Tracer('fanout', run_dir=run_dir / "metadata", versions=n_versions)
+        with tracer.activate():
+            renderer = FanoutRenderer(input_video)
+            rendered = renderer.render(variants)
+        
+        results = []
+        for i, result in enumerate(rendered):
+            metadata = {
+                "version_id": i + 1,
+                "effects": result['effects'],
+                "input_file": input_video,
+                "params": result['params'],
+                "encoding": encoding,
+                "generated_at": datetime.now().isoformat(),
+                "status": result['status']
+            }
+            if result['status'] == 'success':
+                metadata["output_file"] = result['output_path']
+                metadata["file_size_mb"] = os.path.getsize(result['output_path']) / (1024*1024)
+            else:
+                metadata["error"] = result.get('error')
+            
+            # Сохраняем метаданные
+            metadata_file = Path(result['output_path']).parent / "metadata.json"
+            with open(metadata_file, 'w', encoding='utf-8') as f:
+                json.dump(metadata, f, indent=2, ensure_ascii=False)
+            results.append(metadata)
+        
+        # Собираем результаты
+        successful = [r for r in results if r.get('status') == 'success']
+        failed = [r for r in results if r.get('status') == 'error']
+        
+        # Создаем сводку запуска
+        run_summary = {
+            "run_name": run_name or f"run_{datetime.now().strftime('%Y%m%d_%H%M%S')}",
+            "input_video": input_video,
+            "total_versions": n_versions,
+            "successful": len(successful),
+            "failed": len(failed),
+            "run_dir": str(run_dir),
+            "generated_at": datetime.now().isoformat(),
+            "fanout_stats": renderer.stats,
+            "encoding": encoding,
+            "trace": tracer.summary,
+            "results": results
+        }
+        
+        # Сохраняем сводку
+        summary_file = run_dir / "metadata" / "run_summary.json"
+        with open(summary_file, 'w', encoding='utf-8') as f:
+            json.dump(run_summary, f, indent=2, ensure_ascii=False)
+        
+        print(f"\n🎉 FAN-OUT ГЕНЕРАЦИЯ ЗАВЕРШЕНА!")
+        print(f"📁 Папка запуска: {run_dir}")
+        print(f"✅ Успешно: {len(successful)}/{n_versions}")
+        print(f"❌ Ошибок: {len(failed)}")
+        
+        return run_summary
+    
     def generate_batch_sequential(self, input_video: str, n_versions: int = 3, 
                                 run_name: str = None) -> Dict:
         """
@@ -319,6 +430,7 @@ class BatchVideoGenerator:
             "failed": len(failed),
             "run_dir": str(run_dir),
             "generated_at": datetime.now().isoformat(),
+            "trace": tracing.merge_summaries(r.get('trace') for r in results if isinstance(r, dict)),
             "results": results
         }
         
@@ -388,8 +500,9 @@ def main():
     print("Выберите метод генерации:")
     print("1. Асинхронная (async/await)")
     print("2. Параллельная (multiprocessing)")
+    print("3. Fan-out (одно декодирование на все версии)")
     
-    choice = input("Введите номер (1-2): ").strip()
+    choice = input("Введите номер (1-3): ").strip()
     
     try:
         if choice == "1":
@@ -397,6 +510,11 @@ def main():
             result = asyncio.run(generator.generate_batch_async(
                 input_video, n_versions, run_name
             ))
+        elif choice == "3":
+            # Fan-out генерация
+            result = generator.generate_batch_fanout(
+                input_video, n_versions, run_name
+            )
         else:
             # Параллельная генерация
             result = generator.generate_batch_parallel(
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Benchmark ekstrakcji ze scrapowanych stron: stara pętla po wzorcach
+kontra skompilowany silnik z page_extractor.
+
+Użycie:
+    python benchmark_extraction.py                  # syntetyczne strony ~3 MB
+    python benchmark_extraction.py saved_pages/     # zapisane strony <platforma>_*.html
+"""
+
+import os
+import re
+import sys
+import time
+import random
+from typing import Dict, List, Tuple
+
+from page_extractor import PLATFORM_PATTERNS, extract_fields
+
+# Fragmenty, które zwykle pojawiają się w prawdziwym HTML platform:
+# dane w osadzonym JSON oraz same liczniki w tekście (nowe layouty)
+_SNIPPETS = {
+    'youtube': (
+        '"subscriberCountText":{"simpleText":"1.2M subscribers"},"viewCountText":{"simpleText":"45,678,901 views"}',
+        '<span>1.2M subscribers</span><span>45678901 views</span>'
+    ),
+    'instagram': (
+        '"edge_followed_by":{"count":15234},"edge_follow":{"count":321},"edge_owner_to_timeline_media":{"count":87}',
+        '<li>15.2K followers</li><li>321 following</li><li>87 posts</li>'
+    ),
+    'tiktok': (
+        '"followerCount":98765,"followingCount":12,"heartCount":1234567',
+        '<strong>98.7K Followers</strong><strong>12 Following</strong><strong>1.2M Likes</strong>'
+    ),
+    'vk': (
+        '"followers_count":4321,"friends_count":250',
+        '<div>4321 followers</div><div>250 friends</div>'
+    ),
+    'likee': (
+        '"fans":5555,"follow":44',
+        '<p>5555 followers</p><p>44 following</p>'
+    ),
+}
+
+
+def legacy_extract(content: str, patterns: List[str]) -> int:
+    """Stara implementacja: re.search dla każdego wzorca po kolei"""
+    for pattern in patterns:
+        try:
+            match = re.search(pattern, content, re.IGNORECASE)
+            if match:
+                text = match.group(1).replace(',', '').replace(' ', '').replace('"', '')
+                for suffix, multiplier in (('K', 1000), ('M', 1000000), ('B', 1000000000)):
+                    if suffix in text.upper():
+                        return int(float(re.findall(r'[\d.]+', text)[0]) * multiplier)
+                numbers = re.findall(r'[\d.]+', text)
+                return int(float(numbers[0])) if numbers else 0
+        except Exception:
+            continue
+    return 0
+
+
+def synthetic_page(platform: str, layout: int = 0, size_mb: float = 3.0, seed: int = 0) -> str:
+    """Strona o zadanym rozmiarze z danymi na końcu (najgorszy przypadek)"""
+    rng = random.Random(seed)
+    rows = []
+    size = 0
+    while size < size_mb * 1024 * 1024:
+        row = (f'<div class="c-{rng.randint(0, 999)}" data-id="{rng.randint(0, 10 ** 6)}" '
+               f'style="width:{rng.randint(1, 99)}px">item {rng.randint(0, 99)} of {rng.randint(0, 99)}</div>')
+        rows.append(row)
+        size += len(row)
+    return f'<html><body>{"".join(rows)}<script>{_SNIPPETS[platform][layout]}</script></body></html>'
+
+
+def load_fixtures(directory: str) -> List[Tuple[str, str]]:
+    """Wczytuje zapisane strony nazwane <platforma>_*.html"""
+    pages = []
+    for name in sorted(os.listdir(directory)):
+        platform = name.split('_', 1)[0].lower()
+        if name.endswith('.html') and platform in PLATFORM_PATTERNS:
+            with open(os.path.join(directory, name), 'r', encoding='utf-8', errors='ignore') as f:
+                pages.append((platform, f.read()))
+    return pages
+
+
+def run_benchmark(pages: List[Tuple[str, str]], repeats: int = 3) -> Dict[str, float]:
+    legacy_time = 0.0
+    engine_time = 0.0
+
+    for platform, content in pages:
+        fields = PLATFORM_PATTERNS[platform]
+        for _ in range(repeats):
+            start = time.perf_counter()
+            legacy = {field: legacy_extract(content, patterns) for field, patterns in fields.items()}
+            legacy_time += time.perf_counter() - start
+
+            start = time.perf_counter()
+            engine = extract_fields(platform, content)
+            engine_time += time.perf_counter() - start
+
+        if legacy != engine:
+            print(f"⚠️ {platform}: różne wyniki {legacy} != {engine}")
+
+    return {
+        'legacy_s': legacy_time,
+        'engine_s': engine_time,
+        'speedup': legacy_time / engine_time if engine_time else float('inf')
+    }
+
+
+def main():
+    if len(sys.argv) > 1:
+        pages = load_fixtures(sys.argv[1])
+        print(f"📁 Zapisane strony: {len(pages)}")
+    else:
+        pages = [(platform, synthetic_page(platform, layout, seed=i))
+                 for i, platform in enumerate(_SNIPPETS) for layout in (0, 1)]
+        print(f"🧪 Syntetyczne strony: {len(pages)}")
+
+    if not pages:
+        print("❌ Brak stron do testu")
+        return
+
+    total_mb = sum(len(content) for _, content in pages) / (1024 * 1024)
+    print(f"📊 Łącznie: {total_mb:.1f} MB")
+
+    result = run_benchmark(pages)
+    print(f"⏱️ Stara pętla:  {result['legacy_s']:.3f}s")
+    print(f"⚡ Silnik:       {result['engine_s']:.3f}s")
+    print(f"🚀 Przyspieszenie: x{result['speedup']:.1f}")
+
+
+if __name__ == "__main__":
+    main()
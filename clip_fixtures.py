@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+"""
+Общие тестовые ролики для тестов рендера: синтетическое видео lavfi (testsrc2 и
+др.) с тоном 440 Гц, и отметка requires_ffmpeg - без ffmpeg тест пропускается
+(pytest показывает его как skipped, а не как пройденный)
+"""
+
+import os
+import shutil
+from typing import Sequence
+
+import pytest
+
+from ffmpeg_utils import FFMPEG_BIN, run_ffmpeg
+
+requires_ffmpeg = pytest.mark.skipif(not shutil.which(FFMPEG_BIN), reason="ffmpeg не найден")
+
+
+def make_clip(path: str, seconds: float = 3, source: str = 'testsrc2=size=320x240:rate=25',
+              audio: bool = True, x264_args: Sequence[str] = ('-preset', 'ultrafast'),
+              display_rotation: int = 0):
+    """
+    Ролик libx264 (+ AAC, если audio) из источника lavfi; display_rotation - матрица
+    поворота в контейнере, как у вертикального видео с телефона
+    """
+    encoded = f"{path}.raw.mp4" if display_rotation else path
+    args = ['-f', 'lavfi', '-i', source]
+    if audio:
+        args += ['-f', 'lavfi', '-i', 'sine=frequency=440', '-c:a', 'aac', '-b:a', '96k', '-shortest']
+    result = run_ffmpeg(args + ['-t', str(seconds), '-c:v', 'libx264', *x264_args, encoded])
+    assert result.returncode == 0, result.stderr
+    if display_rotation:
+        result = run_ffmpeg(['-display_rotation', str(display_rotation), '-i', encoded, '-c', 'copy', path])
+        os.remove(encoded)
+        assert result.returncode == 0, result.stderr
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Выбор CRF/maxrate по сложности ролика вместо одного CRF на все.
+
+Быстрый анализ: ffmpeg декодирует исходник и отдает в NumPy несколько десятков
+пар соседних кадров, уменьшенных до COMPLEXITY_WIDTH пикселей по ширине, в
+оттенках серого. Пространственная сложность - средний модуль градиента яркости,
+временная - средняя разность соседних кадров (обе в единицах яркости 0-255).
+По таблице RATE_TABLE выбирается ступень: статичная "говорящая голова" получает
+CRF выше и потолок битрейта ниже (на ней это незаметно), динамичный ролик - CRF
+ниже и потолок выше, чтобы не рассыпаться. Средняя ступень - прежние параметры
+(RATE_ARGS), так что качество держится около той же цели, а файлы в среднем
+меньше и быстрее уходят на Yandex Disk и в Telegram.
+
+Результат анализа кэшируется по пути, размеру и mtime файла: варианты одного
+исходника анализируют его один раз. Кэш - LRU на COMPLEXITY_CACHE_SIZE записей;
+замок держится только на поиск и вставку, анализ разных роликов идет параллельно.
+"""
+
+import os
+import time
+import logging
+import threading
+import subprocess
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+import tracing
+from ffmpeg_utils import FFMPEG_BIN, probe_video
+from encoder_profiles import RATE_ARGS
+
+logger = logging.getLogger(__name__)
+
+COMPLEXITY_ADAPTIVE = os.getenv('COMPLEXITY_ADAPTIVE', 'true').lower() == 'true'
+COMPLEXITY_SAMPLES = int(os.getenv('COMPLEXITY_SAMPLES', '32'))
+COMPLEXITY_WIDTH = 160
+# Анализируется не больше этого начала ролика (рендер все равно режет до 60 секунд)
+COMPLEXITY_MAX_DURATION = 60
+# Сколько последних роликов помнит кэш анализа
+COMPLEXITY_CACHE_SIZE = 256
+
+# (макс. пространственная, макс. временная сложность, ступень, crf, maxrate, bufsize);
+# выбирается первая строка, в которую ролик попадает по обеим осям. Пороги подобраны
+# по битрейту x264 при CRF 23 на эталонных роликах lavfi 720p: smptebars и статичная
+# сцена с шумом сенсора (до 0.3 Мбит/с) - static; testsrc2 и mandelbrot (2.5-6 Мбит/с) -
+# medium; life и testsrc2 с сильным шумом (больше 50 Мбит/с) - high
+RATE_TABLE: Tuple[Tuple[float, float, str, int, str, str], ...] = (
+    (6.0, 0.5, 'static', 26, '1M', '2M'),
+    (10.0, 1.5, 'low', 25, '1500k', '3M'),
+    (20.0, 4.0, 'medium', 23, '2M', '4M'),
+    (float('inf'), float('inf'), 'high', 21, '3M', '6M'),
+)
+
+_cache: 'OrderedDict[Tuple[str, int, float], Dict[str, Any]]' = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def _read_frames(path: str, info: Dict[str, Any], samples: int, width: int) -> Optional[np.ndarray]:
+    """Пары соседних кадров через каждые step кадров, серые, width x height"""
+    duration = min(info['duration'], COMPLEXITY_MAX_DURATION)
+    total_frames = max(2, int(duration * (info.get('fps') or 30)))
+    step = max(2, total_frames // samples)
+    height = max(2, int(round(width * info['height'] / info['width'] / 2)) * 2)
+    # Без deblocking декодирование быстрее, а на уменьшенных кадрах разницы нет
+    cmd = [FFMPEG_BIN, '-hide_banner', '-nostdin', '-v', 'error', '-skip_loop_filter', 'all',
+           '-i', path, '-t', f"{duration:.3f}", '-map', '0:v:0', '-vf', f"select='lt(mod(n\\,{step})\\,2)',scale={width}:{height},format=gray",
+           '-fps_mode', 'passthrough', '-f', 'rawvideo', 'pipe:1']
+    result = subprocess.run(cmd, capture_output=True)
+    frame_size = width * height
+    count = len(result.stdout) // frame_size
+    if result.returncode != 0 or count < 2:
+        logger.warning(f"⚠️ Анализ сложности: кадры не получены ({result.stderr[-200:]!r})")
+        return None
+    return np.frombuffer(result.stdout[:count * frame_size], np.uint8).reshape(count, height, width)
+
+
+def measure(frames: np.ndarray) -> Dict[str, float]:
+    """Пространственная и временная сложность по кадрам (N, H, W); кадры идут парами"""
+    frames = frames.astype(np.float32)
+    gx = np.diff(frames, axis=2)[:, :-1, :]
+    gy = np.diff(frames, axis=1)[:, :, :-1]
+    spatial = float(np.sqrt(gx * gx + gy * gy).mean())
+    pairs = frames[:len(frames) // 2 * 2].reshape(-1, 2, *frames.shape[1:])
+    temporal = float(np.abs(pairs[:, 1] - pairs[:, 0]).mean())
+    return {'spatial': round(spatial, 2), 'temporal': round(temporal, 2)}
+
+
+def rate_for(spatial: float, temporal: float) -> Dict[str, Any]:
+    """Ступень таблицы RATE_TABLE и аргументы кодера для нее"""
+    for max_spatial, max_temporal, tier, crf, maxrate, bufsize in RATE_TABLE:
+        if spatial <= max_spatial and temporal <= max_temporal:
+            return {
+                'tier': tier,
+                'crf': crf,
+                'maxrate': maxrate,
+                'rate_args': ['-crf', str(crf), '-maxrate', maxrate, '-bufsize', bufsize],
+            }
+    raise AssertionError("последняя строка RATE_TABLE должна быть без ограничений")
+
+
+def analyze(path: str, samples: int = COMPLEXITY_SAMPLES, width: int = COMPLEXITY_WIDTH) -> Optional[Dict[str, Any]]:
+    """Сложность ролика (с кэшем); None, если ролик не удалось прочитать"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    key = (os.path.abspath(path), stat.st_size, stat.st_mtime)
+    with _cache_lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+    # Проба и декодирование - без замка: одновременные анализы разных роликов не ждут друг друга
+    info = probe_video(path)
+    if not info or not info.get('duration') or not info.get('width'):
+        return None
+    start = time.time()
+    frames = _read_frames(path, info, samples, width)
+    if frames is None:
+        return None
+    result = measure(frames)
+    result.update(frames=len(frames), analysis_time=round(time.time() - start, 3))
+    with _cache_lock:
+        _cache[key] = result
+        _cache.move_to_end(key)
+        while len(_cache) > COMPLEXITY_CACHE_SIZE:
+            _cache.popitem(last=False)
+    logger.info(f"🔍 Сложность {os.path.basename(path)}: пространственная {result['spatial']}, "
+                f"временная {result['temporal']} ({result['frames']} кадров, {result['analysis_time']}s)")
+    return result
+
+
+def choose_rate(path: str) -> Dict[str, Any]:
+    """
+    CRF/maxrate для ролика. Возвращает словарь для метаданных задачи: tier, crf,
+    maxrate, rate_args (аргументы ffmpeg) и измеренную сложность
+    """
+    if not COMPLEXITY_ADAPTIVE:
+        return {'tier': 'fixed', 'rate_args': list(RATE_ARGS)}
+    with tracing.span('complexity') as span:
+        result = analyze(path)
+        if result is None:
+            return {'tier': 'fixed', 'rate_args': list(RATE_ARGS)}
+        choice = rate_for(result['spatial'], result['temporal'])
+        choice.update(result)
+        span.set(tier=choice['tier'], crf=choice['crf'], spatial=result['spatial'], temporal=result['temporal'])
+    logger.info(f"🎚️ Ступень '{choice['tier']}': CRF {choice['crf']}, maxrate {choice['maxrate']}")
+    return choice
@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+Уборщик диска: результаты в telegram_results/batch_* (и трассы одиночных задач
+single_*), части *_chunks и *_processed.mp4 в temp_videos, запуски generated_videos/runs.
+
+Правила: одобренное видео (уже лежит в approved на Yandex Disk) удаляется
+локально сразу (on_approved); единицы старше JANITOR_MAX_AGE_HOURS удаляются;
+сверх JANITOR_MAX_MB и при свободном месте меньше двух JANITOR_MIN_FREE_MB
+удаляются самые старые. Не трогаются ни по возрасту, ни при нехватке места:
+папки, которые задача заняла через hold() (до release()), папки выполняющихся
+задач (tracing.active_run_dirs) и единицы с видео, ожидающими аппрува
+(protected_paths).
+
+Учет занятого места инкрементальный: размер единицы (папки запуска или файла)
+считается один раз при track() и вычитается при удалении; полный обход дерева
+только при старте и раз в JANITOR_RESCAN_HOURS для сверки. Свободное место -
+statvfs, это дешево. admit() - допуск новой задачи: если после нее свободного
+места останется меньше JANITOR_MIN_FREE_MB, уборщик сначала освобождает место, а
+если не вышло - задача не принимается (до ENOSPC, а не после).
+"""
+
+import os
+import time
+import shutil
+import logging
+import threading
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+import metrics
+import tracing
+
+logger = logging.getLogger(__name__)
+
+JANITOR_MAX_MB = int(os.getenv('JANITOR_MAX_MB', '10240'))
+JANITOR_MAX_AGE_HOURS = float(os.getenv('JANITOR_MAX_AGE_HOURS', '48'))
+JANITOR_MIN_FREE_MB = int(os.getenv('JANITOR_MIN_FREE_MB', '2048'))
+JANITOR_INTERVAL = int(os.getenv('JANITOR_INTERVAL', '300'))
+JANITOR_RESCAN_HOURS = float(os.getenv('JANITOR_RESCAN_HOURS', '6'))
+
+# (корень, glob-шаблон единицы уборки)
+DEFAULT_TARGETS: Tuple[Tuple[str, str], ...] = (
+    ('telegram_results', 'batch_*'),
+    ('telegram_results', 'single_*'),
+    ('temp_videos', '*_chunks'),
+    ('temp_videos', '*_processed.mp4'),
+    ('temp_videos', '*_merged.mp4'),
+    ('generated_videos/runs', '*'),
+)
+
+VIDEO_SUFFIXES = ('.mp4', '.mov', '.mkv', '.avi')
+
+
+def _path_size(path: Path) -> int:
+    if path.is_file():
+        return path.stat().st_size
+    return metrics.directory_size_bytes(str(path))
+
+
+class Unit:
+    """Единица уборки: папка запуска или отдельный файл"""
+
+    def __init__(self, path: Path, size: int, mtime: float):
+        self.path = path
+        self.size = size
+        self.mtime = mtime
+
+
+class DiskJanitor:
+    def __init__(self, targets: Sequence[Tuple[str, str]] = DEFAULT_TARGETS,
+                 max_bytes: int = JANITOR_MAX_MB * 1024 * 1024,
+                 max_age: float = JANITOR_MAX_AGE_HOURS * 3600,
+                 min_free_bytes: int = JANITOR_MIN_FREE_MB * 1024 * 1024,
+                 interval: float = JANITOR_INTERVAL,
+                 rescan_interval: float = JANITOR_RESCAN_HOURS * 3600,
+                 protected_paths: Optional[Callable[[], Iterable]] = None):
+        """protected_paths - функция: пути, которые нельзя удалять (видео в очереди на аппрув)"""
+        self.targets = [(Path(root), pattern) for root, pattern in targets]
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.min_free_bytes = min_free_bytes
+        self.interval = interval
+        self.rescan_interval = rescan_interval
+        self.protected_paths = protected_paths
+        self.units: Dict[Path, Unit] = {}
+        self.total_bytes = 0
+        self.deleted_bytes = 0
+        self._last_scan = 0.0
+        self._held: Dict[Path, int] = {}
+        self._lock = threading.RLock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # ------------------------------------------------------------ учет
+
+    def _unit_for(self, path) -> Optional[Path]:
+        """Единица уборки, которой принадлежит путь (None - путь не управляется уборщиком)"""
+        path = Path(path).absolute()
+        for root, pattern in self.targets:
+            root = root.absolute()
+            try:
+                relative = path.relative_to(root)
+            except ValueError:
+                continue
+            if relative.parts and Path(relative.parts[0]).match(pattern):
+                return root / relative.parts[0]
+        return None
+
+    def scan(self):
+        """Полный обход: пересчитывает все единицы (при старте и для сверки)"""
+        units = {}
+        for root, pattern in self.targets:
+            if not root.is_dir():
+                continue
+            for path in root.glob(pattern):
+                try:
+                    units[path.absolute()] = Unit(path.absolute(), _path_size(path), path.stat().st_mtime)
+                except OSError:
+                    continue
+        with self._lock:
+            self.units = units
+            self.total_bytes = sum(unit.size for unit in units.values())
+            self._last_scan = time.time()
+        logger.info(f"🧹 Уборщик: {len(units)} единиц, {self.total_bytes / 1024 / 1024:.0f} MB")
+
+    def track(self, path):
+        """Учитывает новую или изменившуюся единицу (папку запуска после задачи)"""
+        unit_path = self._unit_for(path)
+        if unit_path is None or not unit_path.exists():
+            return
+        size = _path_size(unit_path)
+        with self._lock:
+            previous = self.units.get(unit_path)
+            if previous:
+                self.total_bytes -= previous.size
+            self.units[unit_path] = Unit(unit_path, size, unit_path.stat().st_mtime)
+            self.total_bytes += size
+
+    def hold(self, path):
+        """Задача пишет в path: его единица не удаляется до release() (вызовы считаются)"""
+        unit_path = self._unit_for(path) or Path(path).absolute()
+        with self._lock:
+            self._held[unit_path] = self._held.get(unit_path, 0) + 1
+
+    def release(self, path):
+        unit_path = self._unit_for(path) or Path(path).absolute()
+        with self._lock:
+            count = self._held.pop(unit_path, 0) - 1
+            if count > 0:
+                self._held[unit_path] = count
+
+    def on_approved(self, path) -> int:
+        """
+        Видео одобрено и лежит в approved на Yandex Disk: локальная копия удаляется,
+        единица без оставшихся видео - целиком. Возвращает освобожденные байты
+        """
+        if not path:
+            return 0
+        path = Path(path)
+        freed = 0
+        try:
+            if path.is_file():
+                freed = path.stat().st_size
+                path.unlink()
+                logger.info(f"🧹 Одобренное видео удалено локально: {path}")
+        except OSError as e:
+            logger.warning(f"⚠️ Не удалось удалить {path}: {e}")
+        unit_path = self._unit_for(path)
+        with self._lock:
+            unit = self.units.get(unit_path) if unit_path else None
+            if unit is not None:
+                unit.size -= freed
+                self.total_bytes -= freed
+        if unit_path is not None and unit_path.is_dir():
+            if not any(p.suffix.lower() in VIDEO_SUFFIXES for p in unit_path.rglob('*') if p.is_file()):
+                freed += self._delete(unit_path, 'одобрено')
+        return freed
+
+    # ------------------------------------------------------------ уборка
+
+    def free_bytes(self) -> int:
+        """Свободное место на диске с управляемыми папками (минимум по корням)"""
+        free = []
+        for root, _ in self.targets:
+            probe = root if root.exists() else Path('.')
+            try:
+                free.append(shutil.disk_usage(probe).free)
+            except OSError:
+                continue
+        return min(free) if free else 0
+
+    def _delete(self, unit_path: Path, reason: str) -> int:
+        with self._lock:
+            unit = self.units.pop(unit_path, None)
+            size = unit.size if unit else 0
+            self.total_bytes -= size
+        try:
+            if unit_path.is_dir():
+                shutil.rmtree(unit_path)
+            else:
+                unit_path.unlink(missing_ok=True)
+        except OSError as e:
+            logger.warning(f"⚠️ Уборщик не удалил {unit_path}: {e}")
+            return 0
+        self.deleted_bytes += size
+        logger.info(f"🧹 Удалено ({reason}): {unit_path} ({size / 1024 / 1024:.1f} MB)")
+        return size
+
+    def _protected_units(self) -> Set[Path]:
+        """Единицы с видео из очереди на аппрув"""
+        if self.protected_paths is None:
+            return set()
+        try:
+            paths = [path for path in self.protected_paths() if path]
+        except Exception as e:
+            logger.warning(f"⚠️ Уборщик: не удалось получить защищенные пути: {e}")
+            # Неизвестно, что защищено, - в этот проход ничего не удаляется
+            with self._lock:
+                return set(self.units)
+        return {unit for unit in map(self._unit_for, paths) if unit is not None}
+
+    def _candidates(self) -> List[Unit]:
+        """Единицы, которые можно удалить, от старых к новым"""
+        active = {path.absolute() for path in tracing.active_run_dirs()}
+        protected = self._protected_units()
+        with self._lock:
+            active |= set(self._held)
+            units = [unit for unit in self.units.values()
+                     if unit.path not in active and unit.path not in protected
+                     and not any(unit.path in p.parents for p in active)]
+        return sorted(units, key=lambda unit: unit.mtime)
+
+    def collect(self, need_free_bytes: int = 0) -> int:
+        """Один проход уборки; need_free_bytes - сколько свободного места нужно сверх минимума"""
+        if self.rescan_interval and time.time() - self._last_scan > self.rescan_interval:
+            self.scan()
+        freed = 0
+        now = time.time()
+        for unit in self._candidates():
+            if self.max_age and now - unit.mtime > self.max_age:
+                freed += self._delete(unit.path, 'возраст')
+            elif self.total_bytes > self.max_bytes:
+                freed += self._delete(unit.path, 'лимит размера')
+            elif self.free_bytes() < 2 * self.min_free_bytes + need_free_bytes:
+                freed += self._delete(unit.path, 'мало места')
+        return freed
+
+    def pressure(self) -> str:
+        """ok / high (уборка освобождает место) / critical (новые задачи не принимаются)"""
+        free = self.free_bytes()
+        if free < self.min_free_bytes:
+            return 'critical'
+        if free < 2 * self.min_free_bytes:
+            return 'high'
+        return 'ok'
+
+    def admit(self, expected_bytes: int = 0) -> bool:
+        """Допуск новой задачи, которой понадобится около expected_bytes на диске"""
+        if self.free_bytes() - expected_bytes >= self.min_free_bytes:
+            return True
+        self.collect(need_free_bytes=expected_bytes)
+        admitted = self.free_bytes() - expected_bytes >= self.min_free_bytes
+        if not admitted:
+            logger.warning(f"💾 Задача не принята: свободно {self.free_bytes() / 1024 / 1024:.0f} MB, "
+                           f"нужно {expected_bytes / 1024 / 1024:.0f} MB + запас "
+                           f"{self.min_free_bytes / 1024 / 1024:.0f} MB")
+        return admitted
+
+    # ------------------------------------------------------------ фоновый поток
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.collect()
+                pressure = self.pressure()
+                if pressure != 'ok':
+                    logger.warning(f"💾 Мало места на диске ({pressure}): свободно {self.free_bytes() / 1024 / 1024:.0f} MB")
+            except Exception as e:
+                logger.error(f"❌ Ошибка уборщика: {e}")
+
+    def start(self):
+        self.scan()
+        self.collect()
+        self._thread = threading.Thread(target=self._run, name='disk-janitor', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
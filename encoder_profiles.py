@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""
+Профили кодера x264 под конкретный хост.
+
+Бенчмарк (при старте, если результатов нет или они устарели, или по запросу:
+`python encoder_profiles.py --benchmark`) кодирует синтетический клип всеми
+сочетаниями preset/threads и сохраняет fps в JSON. Во время работы EncoderTuner
+выбирает preset, -threads и -x264-params по цели (качество / баланс / пропускная
+способность или целевое время рендера) и по числу одновременно идущих рендеров.
+"""
+
+import os
+import re
+import json
+import time
+import shutil
+import logging
+import tempfile
+import threading
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+
+from ffmpeg_utils import FFMPEG_BIN, run_ffmpeg
+from thread_governor import ThreadGovernor, available_cpus
+
+logger = logging.getLogger(__name__)
+
+PROFILE_FILE = os.getenv('ENCODER_PROFILE_FILE', 'encoder_profiles.json')
+BENCHMARK_MAX_AGE_DAYS = float(os.getenv('ENCODER_BENCHMARK_MAX_AGE_DAYS', '7'))
+
+# От быстрого к медленному (и от худшего сжатия к лучшему)
+PRESETS = ['ultrafast', 'superfast', 'veryfast', 'faster', 'fast', 'medium']
+BENCHMARK_PRESETS = ['ultrafast', 'veryfast', 'faster', 'fast', 'medium']
+
+# Требуемый запас скорости относительно реального времени; None - максимум fps на поток
+GOALS = {'quality': 1.0, 'balanced': 2.0, 'throughput': None}
+REALTIME_FPS = 30.0
+
+# Меньше lookahead - меньше работы на кадр и памяти при многих параллельных рендерах
+LOOKAHEAD = {'quality': None, 'balanced': 20, 'throughput': 10}
+
+# Общие для всех рендеров параметры качества/битрейта (как было зашито в VideoUniquizer)
+RATE_ARGS = ['-crf', '23', '-maxrate', '2M', '-bufsize', '4M']
+
+# Без результатов бенчмарка - прежние значения
+FALLBACK_PRESET = 'fast'
+FALLBACK_THREADS = 2
+
+_VIDEO_SIZE_RE = re.compile(r'video:\s*(\d+)\s*[kK]i?B')
+
+
+def host_cpus() -> int:
+    """Число доступных процессу ядер (с учетом квоты cgroup контейнера)"""
+    return available_cpus()
+
+
+def _thread_options(cpus: int) -> List[int]:
+    options = [1, 2, 4, 8, 16]
+    return sorted({t for t in options if t < cpus} | {cpus})
+
+
+def run_benchmark(presets: Optional[List[str]] = None, thread_options: Optional[List[int]] = None,
+                  width: int = 1280, height: int = 720, frames: int = 60) -> Dict[str, Any]:
+    """Кодирует синтетический клип каждым сочетанием preset/threads; возвращает профиль хоста"""
+    presets = presets or BENCHMARK_PRESETS
+    cpus = host_cpus()
+    thread_options = thread_options or _thread_options(cpus)
+    work_dir = tempfile.mkdtemp(prefix='x264bench_')
+    try:
+        # Несжатый клип: в замер не попадает ни декодирование, ни генератор.
+        # Шум - текстура, похожая на съемку с телефона (testsrc2 сам по себе слишком простой)
+        clip = os.path.join(work_dir, 'clip.y4m')
+        result = run_ffmpeg(['-f', 'lavfi', '-i', f'testsrc2=size={width}x{height}:rate=30',
+                             '-vf', 'noise=alls=8:allf=t', '-frames:v', str(frames),
+                             '-pix_fmt', 'yuv420p', clip])
+        if result.returncode != 0:
+            raise RuntimeError(f"Cannot create benchmark clip: {result.stderr[-300:]}")
+
+        results = []
+        for preset in presets:
+            for threads in thread_options:
+                start_time = time.time()
+                result = run_ffmpeg(['-i', clip, '-c:v', 'libx264', '-preset', preset, '-threads', str(threads),
+                                     '-crf', '23', '-f', 'matroska', os.devnull])
+                elapsed = time.time() - start_time
+                if result.returncode != 0:
+                    logger.warning(f"⚠️ Бенчмарк {preset}/{threads}: {result.stderr[-200:]}")
+                    continue
+                size = _VIDEO_SIZE_RE.search(result.stderr)
+                results.append({
+                    'preset': preset,
+                    'threads': threads,
+                    'fps': round(frames / elapsed, 2),
+                    'kbps': round(int(size.group(1)) * 8 * 1.024 * 30 / frames, 1) if size else None
+                })
+                logger.info(f"⏱️ x264 {preset}/{threads} потоков: {results[-1]['fps']} fps")
+
+        return {
+            'created_at': datetime.now().isoformat(),
+            'host': {'cpus': cpus},
+            'clip': {'width': width, 'height': height, 'frames': frames},
+            'results': results
+        }
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+class EncoderTuner:
+    """Выбор параметров x264 по результатам бенчмарка и текущей нагрузке"""
+
+    def __init__(self, profile_file: str = PROFILE_FILE, governor: Optional[ThreadGovernor] = None):
+        self.profile_file = profile_file
+        self.profile: Optional[Dict[str, Any]] = None
+        # Число активных рендеров и бюджет потоков ведет ThreadGovernor
+        self.governor = governor or ThreadGovernor(cpus=host_cpus())
+        self._lock = threading.Lock()
+        self._benchmark_thread: Optional[threading.Thread] = None
+        self.load()
+
+    # ------------------------------------------------------------ профиль
+
+    def load(self) -> bool:
+        try:
+            if os.path.exists(self.profile_file):
+                with open(self.profile_file, 'r', encoding='utf-8') as f:
+                    self.profile = json.load(f)
+                return True
+        except Exception as e:
+            logger.error(f"❌ Ошибка загрузки профилей кодера: {e}")
+        return False
+
+    def save(self):
+        with open(self.profile_file, 'w', encoding='utf-8') as f:
+            json.dump(self.profile, f, ensure_ascii=False, indent=2)
+
+    def is_stale(self) -> bool:
+        """Нет профиля, другое число ядер или профиль старше BENCHMARK_MAX_AGE_DAYS"""
+        if not self.profile or not self.profile.get('results'):
+            return True
+        if self.profile.get('host', {}).get('cpus') != host_cpus():
+            return True
+        age = datetime.now() - datetime.fromisoformat(self.profile['created_at'])
+        return age.total_seconds() > BENCHMARK_MAX_AGE_DAYS * 86400
+
+    def benchmark(self, **kwargs) -> Dict[str, Any]:
+        """Бенчмарк по запросу: результаты сразу используются и сохраняются"""
+        profile = run_benchmark(**kwargs)
+        with self._lock:
+            self.profile = profile
+        self.save()
+        logger.info(f"✅ Профили кодера обновлены: {len(profile['results'])} замеров")
+        return profile
+
+    def ensure_benchmark(self, background: bool = True):
+        """Запускает бенчмарк, если профиль устарел; до его окончания действуют прежние значения"""
+        if not self.is_stale() or not shutil.which(FFMPEG_BIN):
+            return
+        if self._benchmark_thread and self._benchmark_thread.is_alive():
+            return
+        if not background:
+            self.benchmark()
+            return
+        self._benchmark_thread = threading.Thread(target=self._benchmark_safe, name='x264-benchmark', daemon=True)
+        self._benchmark_thread.start()
+
+    def _benchmark_safe(self):
+        try:
+            self.benchmark()
+        except Exception as e:
+            logger.error(f"❌ Ошибка бенчмарка кодера: {e}")
+
+    # ------------------------------------------------------------ нагрузка
+
+    @property
+    def active_jobs(self) -> int:
+        return self.governor.active_jobs
+
+    def threads_per_job(self, active_jobs: Optional[int] = None) -> int:
+        return self.governor.threads_per_job(active_jobs)
+
+    # ------------------------------------------------------------ выбор
+
+    def _candidates(self, budget: int, pixels: int) -> Dict[str, Dict[str, Any]]:
+        """Для каждого preset - замер с наибольшим числом потоков в пределах бюджета"""
+        clip = self.profile['clip']
+        scale = clip['width'] * clip['height'] / pixels if pixels else 1.0
+        by_preset: Dict[str, List[Dict[str, Any]]] = {}
+        for row in self.profile['results']:
+            by_preset.setdefault(row['preset'], []).append(row)
+        candidates = {}
+        for preset, rows in by_preset.items():
+            fitting = [row for row in rows if row['threads'] <= budget]
+            row = max(fitting, key=lambda r: r['threads']) if fitting else min(rows, key=lambda r: r['threads'])
+            candidates[preset] = dict(row, est_fps=row['fps'] * scale)
+        return candidates
+
+    def choose(self, goal: str = 'balanced', active_jobs: Optional[int] = None,
+               width: int = 1280, height: int = 720, frames: Optional[int] = None,
+               target_seconds: Optional[float] = None, threads: Optional[int] = None) -> Dict[str, Any]:
+        """
+        preset/threads/x264_params для рендера.
+
+        goal: 'quality' | 'balanced' | 'throughput'; target_seconds + frames задают
+        требуемую скорость явно (целевое время рендера). threads - бюджет из
+        аренды ThreadGovernor (иначе считается по числу активных рендеров).
+        """
+        budget = threads or self.threads_per_job(active_jobs)
+        lookahead = LOOKAHEAD.get(goal)
+        choice = {'preset': FALLBACK_PRESET, 'threads': min(FALLBACK_THREADS, budget), 'est_fps': None,
+                  'x264_params': f"rc-lookahead={lookahead}" if lookahead else None, 'goal': goal}
+
+        with self._lock:
+            profile = self.profile
+        if not profile or not profile.get('results'):
+            return choice
+
+        candidates = self._candidates(budget, width * height)
+        ordered = [candidates[p] for p in PRESETS if p in candidates]
+        if not ordered:
+            return choice
+
+        if target_seconds and frames:
+            required_fps = frames / target_seconds
+        elif GOALS.get(goal):
+            required_fps = REALTIME_FPS * GOALS[goal]
+        else:
+            required_fps = None
+
+        if required_fps is None:
+            # Пропускная способность: больше кадров на поток, при равенстве - более медленный preset
+            best = max(ordered, key=lambda row: (round(row['est_fps'] / row['threads'], 1), PRESETS.index(row['preset'])))
+        else:
+            # Самый медленный (лучше сжимающий) preset, который укладывается в требуемую скорость
+            fitting = [row for row in ordered if row['est_fps'] >= required_fps]
+            best = fitting[-1] if fitting else ordered[0]
+
+        choice.update(preset=best['preset'], threads=best['threads'], est_fps=round(best['est_fps'], 1))
+        return choice
+
+    def x264_args(self, **kwargs) -> List[str]:
+        """-preset/-threads/-x264-params для выбранного профиля"""
+        choice = self.choose(**kwargs)
+        args = ['-preset', choice['preset'], '-threads', str(choice['threads'])]
+        if choice['x264_params']:
+            args += ['-x264-params', choice['x264_params']]
+        return args
+
+    def encoder_args(self, rate_args: Optional[List[str]] = None, **kwargs) -> List[str]:
+        """
+        Полные аргументы кодера видео для рендера (libx264 + битрейт + yuv420p + faststart).
+        rate_args - CRF/maxrate по сложности ролика (complexity.choose_rate), по умолчанию RATE_ARGS.
+        yuv420p задан явно: из bgr24 (fan-out) libx264 иначе выберет yuv444p, который не
+        играют мобильные клиенты Telegram и аппаратные декодеры
+        """
+        return (['-c:v', 'libx264'] + self.x264_args(**kwargs) + list(rate_args or RATE_ARGS)
+                + ['-pix_fmt', 'yuv420p', '-movflags', '+faststart'])
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description='Бенчмарк x264 и выбор профиля кодера')
+    parser.add_argument('--benchmark', action='store_true', help='Запустить бенчмарк и сохранить результаты')
+    parser.add_argument('--goal', default='balanced', choices=list(GOALS))
+    parser.add_argument('--jobs', type=int, default=1, help='Число одновременных рендеров')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    tuner = EncoderTuner()
+    if args.benchmark:
+        tuner.benchmark()
+    print(f"🖥️ Ядер: {host_cpus()}")
+    print(f"🎛️ {args.goal}, рендеров: {args.jobs}: {tuner.choose(goal=args.goal, active_jobs=args.jobs)}")
+
+
+if __name__ == "__main__":
+    main()
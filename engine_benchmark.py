@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк видеодвижка на синтетических клипах.
+
+Клипы генерируются детерминированно (ffmpeg testsrc2 + шум с фиксированным seed +
+тон) в 480p/720p/1080p/4K и кэшируются. Каждое сочетание бэкенд/эффект/клип
+выполняется в отдельном процессе, чтобы пиковый RSS (свой и дочерних ffmpeg)
+относился только к нему. Результат - JSON: fps, время по стадиям, пиковый RSS,
+битрейт результата. С --baseline метрики сравниваются с сохраненным прогоном,
+и при регрессии больше порога процесс завершается с кодом 1.
+
+Использование:
+    python engine_benchmark.py --sizes 480p,720p --output bench_results.json
+    python engine_benchmark.py --baseline bench_baseline.json --threshold 0.15
+    python engine_benchmark.py --save-baseline bench_baseline.json
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import logging
+import platform
+import resource
+import tempfile
+import subprocess
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+
+from ffmpeg_utils import run_ffmpeg, probe_video
+from thread_governor import available_cpus
+
+logger = logging.getLogger(__name__)
+
+SIZES = {
+    '480p': (854, 480),
+    '720p': (1280, 720),
+    '1080p': (1920, 1080),
+    '4k': (3840, 2160),
+}
+FIXTURE_FPS = 30
+FIXTURE_SECONDS = 3
+FIXTURE_DIR = os.getenv('BENCH_FIXTURE_DIR', os.path.join(tempfile.gettempdir(), 'engine_bench_fixtures'))
+
+# Эффекты, которые поддерживает каждый бэкенд
+BACKENDS = {
+    'moviepy': ['social', 'visual'],
+    'vidgear': ['social'],
+    'fused': ['social', 'visual', 'temporal'],
+    'filtergraph': ['social', 'visual', 'temporal'],
+    'ffmpeg': ['temporal'],
+}
+
+# Стиль social фиксирован, чтобы бэкенды делали одну и ту же работу
+BENCH_STYLE = 'vintage'
+
+# Отслеживаемые метрики: True - больше лучше
+TRACKED_METRICS = {'fps': True, 'peak_rss_mb': False, 'output_kbps': False}
+DEFAULT_THRESHOLD = 0.15
+
+RESULT_MARKER = 'BENCH_RESULT '
+
+
+def make_fixture(name: str, size: Tuple[int, int], seconds: int = FIXTURE_SECONDS,
+                 fixture_dir: str = FIXTURE_DIR) -> str:
+    """Синтетический клип H.264 + AAC; повторные вызовы берут его из кэша"""
+    width, height = size
+    os.makedirs(fixture_dir, exist_ok=True)
+    path = os.path.join(fixture_dir, f"testsrc2_{name}_{width}x{height}_{seconds}s.mp4")
+    if os.path.exists(path):
+        return path
+    partial = path + '.part.mp4'
+    result = run_ffmpeg(['-f', 'lavfi', '-i', f'testsrc2=size={width}x{height}:rate={FIXTURE_FPS}',
+                         '-f', 'lavfi', '-i', 'sine=frequency=440:sample_rate=44100',
+                         '-t', str(seconds), '-vf', 'noise=alls=8:allf=t:all_seed=42',
+                         '-c:v', 'libx264', '-preset', 'fast', '-crf', '18', '-g', str(FIXTURE_FPS * 2),
+                         '-pix_fmt', 'yuv420p', '-c:a', 'aac', '-b:a', '128k', '-shortest', partial])
+    if result.returncode != 0:
+        raise RuntimeError(f"Cannot create fixture {name}: {result.stderr[-300:]}")
+    os.replace(partial, path)
+    return path
+
+
+@contextmanager
+def _timed_calls(module, name: str, stages: Dict[str, float], stage: str):
+    """Время всех вызовов module.name суммируется в stages[stage]"""
+    original = getattr(module, name)
+
+    def timed(*args, **kwargs):
+        start_time = time.perf_counter()
+        try:
+            return original(*args, **kwargs)
+        finally:
+            stages[stage] = stages.get(stage, 0.0) + time.perf_counter() - start_time
+
+    setattr(module, name, timed)
+    try:
+        yield
+    finally:
+        setattr(module, name, original)
+
+
+def _quiet_uniquizer():
+    from video_uniquizer import VideoUniquizer
+    uniquizer = VideoUniquizer(progress_callback=lambda message, progress_pct=None: None)
+    uniquizer.social_effects = {BENCH_STYLE: uniquizer.social_effects[BENCH_STYLE]}
+    return uniquizer
+
+
+def _render(backend: str, effect: str, input_path: str, output_path: str, stages: Dict[str, float]):
+    import video_uniquizer
+    if backend in ('moviepy', 'vidgear'):
+        uniquizer = _quiet_uniquizer()
+        method = {
+            ('moviepy', 'social'): uniquizer._apply_social_effects_moviepy,
+            ('moviepy', 'visual'): uniquizer.apply_visual_effects,
+            ('vidgear', 'social'): uniquizer._apply_social_effects_vidgear,
+        }[(backend, effect)]
+        with _timed_calls(video_uniquizer, 'mux_audio', stages, 'mux'):
+            method(input_path, output_path)
+    elif backend == 'ffmpeg':
+        uniquizer = _quiet_uniquizer()
+        with _timed_calls(video_uniquizer, 'smart_cut', stages, 'smart_cut'), \
+                _timed_calls(video_uniquizer, 'retime_copy', stages, 'retime'):
+            uniquizer.apply_temporal_effects(input_path, output_path)
+    elif backend == 'fused':
+        from fanout_renderer import FanoutRenderer, VariantSpec
+        start_time = time.perf_counter()
+        renderer = FanoutRenderer(input_path, uniquizer=_quiet_uniquizer())
+        stages['setup'] = time.perf_counter() - start_time
+        result = renderer.render([VariantSpec(output_path, [effect], style=BENCH_STYLE)])[0]
+        if result['status'] != 'success':
+            raise RuntimeError(result.get('error'))
+        stages['decode'] = renderer.stats['decode_time']
+    elif backend == 'filtergraph':
+        from filtergraph_backend import render_filtergraph
+        result = render_filtergraph(input_path, output_path, [effect], style=BENCH_STYLE)
+        if 'error' in result:
+            raise RuntimeError(result['error'])
+        stages['ffmpeg'] = result['render_time']
+    else:
+        raise ValueError(f"Unknown backend: {backend}")
+
+
+def _peak_rss_mb() -> Tuple[float, float]:
+    """Пиковый RSS процесса и самого тяжелого из завершенных дочерних (ru_maxrss в КБ на Linux)"""
+    scale = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale
+    return round(own, 1), round(children, 1)
+
+
+def run_case(backend: str, effect: str, fixture_name: str, input_path: str) -> Dict[str, Any]:
+    """Один замер (вызывается в отдельном процессе)"""
+    random.seed(0)
+    info = probe_video(input_path)
+    frames = int(round(info['duration'] * info['fps']))
+    case = {'backend': backend, 'effect': effect, 'fixture': fixture_name,
+            'width': info['width'], 'height': info['height'], 'frames': frames}
+
+    work_dir = tempfile.mkdtemp(prefix='engine_bench_')
+    output_path = os.path.join(work_dir, 'output.mp4')
+    stages: Dict[str, float] = {}
+    try:
+        start_time = time.perf_counter()
+        _render(backend, effect, input_path, output_path, stages)
+        wall_time = time.perf_counter() - start_time
+
+        output = probe_video(output_path)
+        output_bytes = os.path.getsize(output_path)
+        # Время вне отдельно измеренных стадий - кадры, эффекты и кодирование
+        stages['render'] = max(0.0, wall_time - sum(v for k, v in stages.items() if k != 'decode'))
+        own_rss, child_rss = _peak_rss_mb()
+        case.update({
+            'status': 'success',
+            'wall_time': round(wall_time, 3),
+            'fps': round(frames / wall_time, 2),
+            'stages': {stage: round(seconds, 3) for stage, seconds in stages.items()},
+            'peak_rss_mb': max(own_rss, child_rss),
+            'python_rss_mb': own_rss,
+            'child_rss_mb': child_rss,
+            'output_bytes': output_bytes,
+            'output_kbps': round(output_bytes * 8 / 1000 / output['duration'], 1) if output and output['duration'] else None,
+        })
+    except Exception as e:
+        case.update({'status': 'error', 'error': str(e)[-500:]})
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return case
+
+
+def _run_case_subprocess(backend: str, effect: str, fixture_name: str, input_path: str) -> Dict[str, Any]:
+    result = subprocess.run([sys.executable, os.path.abspath(__file__), '--run-case',
+                             json.dumps([backend, effect, fixture_name, input_path])],
+                            capture_output=True, text=True)
+    for line in reversed(result.stdout.splitlines()):
+        if line.startswith(RESULT_MARKER):
+            return json.loads(line[len(RESULT_MARKER):])
+    return {'backend': backend, 'effect': effect, 'fixture': fixture_name, 'status': 'error',
+            'error': (result.stderr or result.stdout)[-500:]}
+
+
+def _backend_available(backend: str) -> bool:
+    if backend == 'vidgear':
+        from video_uniquizer import vidgear_gears
+        return vidgear_gears.available()
+    if backend == 'moviepy':
+        from video_uniquizer import moviepy_editor
+        return moviepy_editor.available()
+    return True
+
+
+def run_suite(sizes: Optional[Dict[str, Tuple[int, int]]] = None, backends: Optional[List[str]] = None,
+              effects: Optional[List[str]] = None, seconds: int = FIXTURE_SECONDS,
+              fixture_dir: str = FIXTURE_DIR) -> Dict[str, Any]:
+    """Все сочетания бэкенд/эффект/клип; возвращает отчет для JSON"""
+    sizes = sizes or SIZES
+    backends = backends or list(BACKENDS)
+    fixtures = {name: make_fixture(name, size, seconds, fixture_dir) for name, size in sizes.items()}
+
+    results = []
+    for fixture_name, input_path in fixtures.items():
+        for backend in backends:
+            if not _backend_available(backend):
+                logger.warning(f"⚠️ {backend} не установлен - пропущен")
+                continue
+            for effect in BACKENDS[backend]:
+                if effects and effect not in effects:
+                    continue
+                case = _run_case_subprocess(backend, effect, fixture_name, input_path)
+                results.append(case)
+                if case['status'] == 'success':
+                    logger.info(f"⏱️ {fixture_name} {backend}/{effect}: {case['fps']} fps, "
+                                f"RSS {case['peak_rss_mb']} MB, {case['output_kbps']} kbps, стадии {case['stages']}")
+                else:
+                    logger.error(f"❌ {fixture_name} {backend}/{effect}: {case['error']}")
+
+    return {
+        'created_at': datetime.now().isoformat(),
+        'host': {'cpus': available_cpus(), 'platform': platform.platform(), 'python': platform.python_version()},
+        'fixtures': {name: {'width': sizes[name][0], 'height': sizes[name][1], 'fps': FIXTURE_FPS,
+                            'seconds': seconds} for name in fixtures},
+        'results': results
+    }
+
+
+def _case_key(case: Dict[str, Any]) -> str:
+    return f"{case['fixture']}/{case['backend']}/{case['effect']}"
+
+
+def compare_to_baseline(report: Dict[str, Any], baseline: Dict[str, Any],
+                        threshold: float = DEFAULT_THRESHOLD) -> List[Dict[str, Any]]:
+    """Регрессии отслеживаемых метрик больше threshold (доля); сломанный рендер - тоже регрессия"""
+    baseline_cases = {_case_key(case): case for case in baseline.get('results', []) if case.get('status') == 'success'}
+    regressions = []
+    for case in report['results']:
+        reference = baseline_cases.get(_case_key(case))
+        if reference is None:
+            continue
+        if case.get('status') != 'success':
+            regressions.append({'case': _case_key(case), 'metric': 'status', 'baseline': 'success',
+                                'current': case.get('status'), 'change': None})
+            continue
+        for metric, higher_is_better in TRACKED_METRICS.items():
+            old, new = reference.get(metric), case.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            if (-change if higher_is_better else change) > threshold:
+                regressions.append({'case': _case_key(case), 'metric': metric, 'baseline': old,
+                                    'current': new, 'change': round(change, 3)})
+    return regressions
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description='Бенчмарк видеодвижка на синтетических клипах')
+    parser.add_argument('--sizes', default=','.join(SIZES), help=f"Клипы через запятую: {', '.join(SIZES)}")
+    parser.add_argument('--backends', default=','.join(BACKENDS), help=f"Бэкенды: {', '.join(BACKENDS)}")
+    parser.add_argument('--effects', default='', help='Только эти эффекты (social, visual, temporal)')
+    parser.add_argument('--seconds', type=int, default=FIXTURE_SECONDS, help='Длительность клипов')
+    parser.add_argument('--output', default='bench_results.json', help='Куда записать JSON с результатами')
+    parser.add_argument('--baseline', help='JSON прошлого прогона для проверки регрессий')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD, help='Допустимая регрессия (доля)')
+    parser.add_argument('--save-baseline', help='Сохранить результаты как новый baseline')
+    parser.add_argument('--run-case', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_case:
+        # Дочерний процесс одного замера: результат - последней строкой stdout
+        print(RESULT_MARKER + json.dumps(run_case(*json.loads(args.run_case)), ensure_ascii=False))
+        return 0
+
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    sizes = {name: SIZES[name] for name in args.sizes.split(',') if name}
+    report = run_suite(sizes=sizes, backends=[b for b in args.backends.split(',') if b],
+                       effects=[e for e in args.effects.split(',') if e] or None, seconds=args.seconds)
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"💾 Результаты: {args.output}")
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"💾 Baseline: {args.save_baseline}")
+
+    failed = [case for case in report['results'] if case['status'] != 'success']
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare_to_baseline(report, baseline, args.threshold)
+        for regression in regressions:
+            print(f"❌ Регрессия {regression['case']} {regression['metric']}: "
+                  f"{regression['baseline']} -> {regression['current']} ({regression['change']})")
+        if regressions:
+            return 1
+        print(f"✅ Регрессий больше {args.threshold:.0%} нет")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
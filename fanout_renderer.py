@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+"""
+Fan-out рендер: один декод исходника на N вариантов.
+
+Декодер (ffmpeg -> rawvideo) пишет кадры в общий кольцевой буфер, каждый
+кадр раздается N веткам эффектов, каждая ветка кодирует свой вариант
+собственным процессом ffmpeg (tee в N sink'ов). Память ограничена размером
+кольца: когда все слоты заняты, декодер ждет самую медленную ветку.
+Обрезка до max_duration, масштабирование и анализ видео выполняются один раз.
+"""
+
+import os
+import time
+import queue
+import random
+import logging
+import tempfile
+import threading
+import subprocess
+from typing import Dict, Any, List, Optional, Callable
+
+import numpy as np
+
+from ffmpeg_utils import FFMPEG_BIN, probe_video, audio_codec_args
+import tracing
+from thread_governor import ffmpeg_thread_args
+
+logger = logging.getLogger(__name__)
+
+# Те же настройки кодирования, что и в VideoUniquizer
+DEFAULT_ENCODER_ARGS = [
+    '-c:v', 'libx264',
+    '-preset', 'fast',
+    '-crf', '23',
+    '-maxrate', '2M',
+    '-bufsize', '4M',
+    '-threads', '2',
+    '-pix_fmt', 'yuv420p',
+    '-movflags', '+faststart'
+]
+
+class VariantSpec:
+    """Описание одного варианта: эффекты, параметры и кодировщик"""
+
+    def __init__(self, output_path: str, effects: List[str], style: Optional[str] = None,
+                 style_params: Optional[Dict[str, float]] = None, speed: Optional[float] = None,
+                 encoder_args: Optional[List[str]] = None):
+        self.output_path = str(output_path)
+        self.effects = list(effects)
+        self.style = style
+        self.style_params = style_params
+        self.speed = speed
+        self.encoder_args = encoder_args or DEFAULT_ENCODER_ARGS
+
+
+class FrameRing:
+    """Кольцевой буфер кадров со счетчиком читателей на слот"""
+
+    def __init__(self, slots: int, shape: tuple):
+        self.frames = np.empty((slots,) + shape, dtype=np.uint8)
+        self._free: queue.Queue = queue.Queue()
+        for index in range(slots):
+            self._free.put(index)
+        self._refs = [0] * slots
+        self._lock = threading.Lock()
+
+    def acquire(self) -> int:
+        """Свободный слот (блокирует, пока ветки не освободят кадр)"""
+        return self._free.get()
+
+    def share(self, index: int, readers: int):
+        self._refs[index] = readers
+
+    def release(self, index: int):
+        with self._lock:
+            self._refs[index] -= 1
+            if self._refs[index] <= 0:
+                self._free.put(index)
+
+    def give_back(self, index: int):
+        """Возврат слота, который так и не был заполнен"""
+        self._free.put(index)
+
+
+class _Branch:
+    """Ветка эффектов одного варианта со своим процессом ffmpeg"""
+
+    def __init__(self, spec: VariantSpec, params: Dict[str, Any], start_frame: int, end_frame: int):
+        self.spec = spec
+        self.params = params
+        self.start_frame = start_frame
+        self.end_frame = end_frame
+        self.queue: queue.Queue = queue.Queue()
+        self.process: Optional[subprocess.Popen] = None
+        self.stderr = None
+        self.frames_written = 0
+        self.error: Optional[str] = None
+
+
+def _read_exact(stream, view: memoryview) -> bool:
+    """Читает ровно len(view) байт; False при конце потока"""
+    filled = 0
+    while filled < len(view):
+        count = stream.readinto(view[filled:])
+        if not count:
+            return False
+        filled += count
+    return True
+
+
+class FanoutRenderer:
+    """Рендер нескольких вариантов за одно декодирование исходника"""
+
+    def __init__(self, input_path: str, max_duration: Optional[float] = None,
+                 max_height: Optional[int] = None, ring_slots: int = 16, uniquizer=None,
+                 frame_callback: Optional[Callable[[int, int], None]] = None):
+        self.input_path = str(input_path)
+        self.max_duration = max_duration
+        self.max_height = max_height
+        self.ring_slots = ring_slots
+        self.frame_callback = frame_callback
+        if uniquizer is None:
+            from video_uniquizer import VideoUniquizer
+            uniquizer = VideoUniquizer()
+        # Используется только как библиотека покадровых эффектов и диапазонов параметров
+        self.uniquizer = uniquizer
+
+        self.info = probe_video(self.input_path)
+        if not self.info or not self.info['width'] or not self.info['fps']:
+            raise ValueError(f"Cannot probe video: {self.input_path}")
+
+        width, height = self.info['width'], self.info['height']
+        if max_height and height > max_height:
+            width, height = int(width * max_height / height), max_height
+        # libx264 + yuv420p требуют четные размеры
+        self.width, self.height = width - width % 2, height - height % 2
+        self.fps = self.info['fps']
+        self.duration = min(self.info['duration'], max_duration) if max_duration else self.info['duration']
+        self.total_frames = max(1, int(round(self.duration * self.fps)))
+        self.stats: Dict[str, Any] = {}
+
+    # ------------------------------------------------------------ параметры
+
+    def _plan(self, spec: VariantSpec) -> _Branch:
+        """Случайные параметры варианта - те же диапазоны, что в VideoUniquizer"""
+        params: Dict[str, Any] = {}
+        start_frame, end_frame = 0, self.total_frames
+
+        if 'temporal' in spec.effects:
+            params['speed'] = spec.speed or random.uniform(*self.uniquizer.speed_range)
+            trim_start = random.uniform(0, self.duration * 0.05)
+            trim_end = random.uniform(0, self.duration * 0.05)
+            start_frame = int(trim_start * self.fps)
+            end_frame = max(start_frame + 1, self.total_frames - int(trim_end * self.fps))
+            params['trim_start'] = round(trim_start, 3)
+            params['trim_end'] = round(trim_end, 3)
+        if 'visual' in spec.effects:
+            params['brightness'] = random.randint(*self.uniquizer.brightness_range)
+            params['contrast'] = random.uniform(*self.uniquizer.contrast_range)
+            params['saturation'] = random.uniform(*self.uniquizer.saturation_range)
+        if 'social' in spec.effects:
+            style = spec.style or random.choice(list(self.uniquizer.social_effects.keys()))
+            params['style'] = style
+            params['style_params'] = spec.style_params or self.uniquizer.social_effects[style]
+
+        return _Branch(spec, params, start_frame, end_frame)
+
+    def _process_frame(self, branch: _Branch, frame: np.ndarray) -> np.ndarray:
+        params = branch.params
+        for effect in branch.spec.effects:
+            if effect == 'visual':
+                frame = self.uniquizer._apply_frame_effects(
+                    frame, params['brightness'], params['contrast'], params['saturation'])
+            elif effect == 'social':
+                frame = self.uniquizer._apply_social_frame_effects(frame, params['style'], params['style_params'])
+            elif effect == 'neural':
+                frame = self.uniquizer._apply_neural_frame_effects(frame)
+        return frame
+
+    # --------------------------------------------------------------- ffmpeg
+
+    def _decoder_cmd(self) -> List[str]:
+        cmd = [FFMPEG_BIN, '-hide_banner', '-nostdin'] + ffmpeg_thread_args() + ['-i', self.input_path]
+        if self.max_duration:
+            cmd += ['-t', f"{self.duration:.3f}"]
+        cmd += ['-map', '0:v:0', '-vf', f"scale={self.width}:{self.height}",
+                '-r', f"{self.fps:.6f}", '-f', 'rawvideo', '-pix_fmt', 'bgr24', '-']
+        return cmd
+
+    def _sink_cmd(self, branch: _Branch) -> List[str]:
+        cmd = [FFMPEG_BIN, '-hide_banner', '-nostdin', '-y'] + ffmpeg_thread_args()
+        cmd += ['-f', 'rawvideo', '-pix_fmt', 'bgr24', '-s', f"{self.width}x{self.height}",
+               '-r', f"{self.fps:.6f}", '-i', '-']
+        speed = branch.params.get('speed', 1.0)
+        if self.info.get('has_audio'):
+            audio_start = branch.start_frame / self.fps
+            audio_duration = (branch.end_frame - branch.start_frame) / self.fps
+            cmd += ['-ss', f"{audio_start:.3f}", '-t', f"{audio_duration:.3f}", '-i', self.input_path,
+                    '-map', '0:v:0', '-map', '1:a:0?']
+        else:
+            cmd += ['-map', '0:v:0']
+        if abs(speed - 1.0) > 1e-6:
+            # Как speedx в MoviePy: fps сохраняется, кадры дублируются/отбрасываются
+            cmd += ['-filter:v', f"setpts=PTS/{speed:.6f}", '-r', f"{self.fps:.6f}"]
+        cmd += list(branch.spec.encoder_args)
+        if self.info.get('has_audio'):
+            # Без изменения скорости аудио копируется, иначе atempo в том же кодировании
+            cmd += audio_codec_args(self.info, speed) + ['-shortest']
+        cmd.append(branch.spec.output_path)
+        return cmd
+
+    # ---------------------------------------------------------------- рендер
+
+    def _run_branch(self, branch: _Branch, ring: FrameRing):
+        stdin = branch.process.stdin
+        while True:
+            item = branch.queue.get()
+            if item is None:
+                break
+            frame_no, index = item
+            try:
+                if branch.error is None and branch.start_frame <= frame_no < branch.end_frame:
+                    frame = self._process_frame(branch, ring.frames[index])
+                    stdin.write(memoryview(np.ascontiguousarray(frame, dtype=np.uint8)).cast('B'))
+                    branch.frames_written += 1
+            except Exception as e:
+                # Ветка падает, но продолжает освобождать слоты, чтобы не блокировать остальных
+                branch.error = str(e)
+                logger.error(f"❌ Fan-out ветка {branch.spec.output_path}: {e}")
+            finally:
+                ring.release(index)
+        try:
+            stdin.close()
+        except Exception:
+            pass
+
+    @tracing.traced('render:fanout')
+    def render(self, variants: List[VariantSpec]) -> List[Dict[str, Any]]:
+        """Рендерит все варианты; возвращает метаданные по каждому"""
+        start_time = time.time()
+        branches = [self._plan(spec) for spec in variants]
+        ring = FrameRing(self.ring_slots, (self.height, self.width, 3))
+        frame_size = self.width * self.height * 3
+
+        logger.info(f"🔀 Fan-out: {len(branches)} вариантов, {self.width}x{self.height} @ {self.fps:.2f}fps, "
+                    f"буфер {self.ring_slots} кадров ({self.ring_slots * frame_size / 1024 / 1024:.0f} MB)")
+
+        for branch in branches:
+            branch.stderr = tempfile.TemporaryFile()
+            branch.process = subprocess.Popen(self._sink_cmd(branch), stdin=subprocess.PIPE,
+                                              stdout=subprocess.DEVNULL, stderr=branch.stderr)
+        workers = [threading.Thread(target=self._run_branch, args=(branch, ring), daemon=True)
+                   for branch in branches]
+        for worker in workers:
+            worker.start()
+
+        decoder_stderr = tempfile.TemporaryFile()
+        decoder = subprocess.Popen(self._decoder_cmd(), stdout=subprocess.PIPE,
+                                   stderr=decoder_stderr, bufsize=frame_size)
+        frame_no = 0
+        try:
+            while True:
+                index = ring.acquire()
+                if not _read_exact(decoder.stdout, memoryview(ring.frames[index]).cast('B')):
+                    ring.give_back(index)
+                    break
+                ring.share(index, len(branches))
+                for branch in branches:
+                    branch.queue.put((frame_no, index))
+                frame_no += 1
+                if self.frame_callback:
+                    self.frame_callback(frame_no, self.total_frames)
+        finally:
+            for branch in branches:
+                branch.queue.put(None)
+            decoder.stdout.close()
+            decoder.wait()
+        decode_time = time.time() - start_time
+
+        for worker in workers:
+            worker.join()
+
+        results = []
+        for branch in branches:
+            returncode = branch.process.wait()
+            if branch.error is None and returncode != 0:
+                branch.stderr.seek(0)
+                branch.error = branch.stderr.read().decode(errors='replace')[-500:]
+            branch.stderr.close()
+            ok = branch.error is None and os.path.exists(branch.spec.output_path) \
+                and os.path.getsize(branch.spec.output_path) > 0
+            results.append({
+                'output_path': branch.spec.output_path,
+                'effects': branch.spec.effects,
+                'params': branch.params,
+                'frames': branch.frames_written,
+                'status': 'success' if ok else 'error',
+                **({} if ok else {'error': branch.error or 'empty output'})
+            })
+
+        if decoder.returncode != 0 and frame_no == 0:
+            decoder_stderr.seek(0)
+            logger.error(f"❌ Fan-out декодер: {decoder_stderr.read().decode(errors='replace')[-500:]}")
+        decoder_stderr.close()
+
+        self.stats = {
+            'variants': len(branches),
+            'decoded_frames': frame_no,
+            'decode_passes': 1,
+            'decode_time': round(decode_time, 3),
+            'wall_time': round(time.time() - start_time, 3)
+        }
+        logger.info(f"✅ Fan-out завершен: {frame_no} кадров x {len(branches)} вариантов "
+                    f"за {self.stats['wall_time']:.1f}s")
+        return results
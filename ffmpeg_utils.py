@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+Общие помощники для запуска ffmpeg/ffprobe
+"""
+
+import os
+import re
+import json
+import shutil
+import logging
+import subprocess
+from typing import Dict, Any, List, Optional
+
+import metrics
+import tracing
+from thread_governor import ffmpeg_thread_args
+
+logger = logging.getLogger(__name__)
+
+# Те же переменные окружения, что использует MoviePy/imageio
+FFMPEG_BIN = os.getenv('FFMPEG_BINARY', 'ffmpeg')
+FFPROBE_BIN = os.getenv('FFPROBE_BINARY', 'ffprobe')
+
+_DURATION_RE = re.compile(r'Duration:\s*(\d+):(\d+):(\d+(?:\.\d+)?)')
+_VIDEO_RE = re.compile(r'Stream #\S+.*?Video:\s*(\w+).*?(\d{2,5})x(\d{2,5})')
+# "h264 (High) (avc1 / 0x31637661), yuv420p(tv, bt709, progressive)": профиль, pix_fmt, атрибуты
+_VIDEO_FORMAT_RE = re.compile(r'Video:\s*\w+(?:\s*\(([^)]*)\))?(?:\s*\([^)]*\))?,\s*(\w+)(?:\(([^)]*)\))?')
+_FPS_RE = re.compile(r'(\d+(?:\.\d+)?)\s*(?:fps|tbr)')
+_AUDIO_RE = re.compile(r'Stream #\S+.*?Audio:\s*(\w+)')
+_BITRATE_RE = re.compile(r'bitrate:\s*(\d+)\s*kb/s')
+# Поворот кадра (вертикальное видео с телефона): матрица отображения или старый тег rotate
+_ROTATION_RE = re.compile(r'(?:displaymatrix|Display Matrix): rotation of (-?\d+(?:\.\d+)?) degrees'
+                          r'|^\s*rotate\s*:\s*(-?\d+)', re.MULTILINE)
+
+_PTS_TIME_RE = re.compile(r'pts_time:\s*(-?\d+(?:\.\d+)?)')
+
+# Кодеки, которые можно скопировать в mp4 без перекодирования
+MP4_AUDIO_CODECS = {'aac', 'mp3', 'ac3', 'eac3', 'alac', 'opus'}
+MP4_VIDEO_CODECS = {'h264', 'hevc', 'av1'}
+
+
+def run_ffmpeg(args: List[str], timeout: Optional[float] = None) -> subprocess.CompletedProcess:
+    """Запускает ffmpeg с общими флагами (без баннера, перезапись)"""
+    cmd = [FFMPEG_BIN, '-hide_banner', '-nostdin', '-y'] + args
+    return subprocess.run(cmd, capture_output=True, text=True, timeout=timeout)
+
+
+def _parse_rate(rate: str) -> float:
+    if not rate or rate == '0/0':
+        return 0.0
+    if '/' in rate:
+        num, den = rate.split('/')
+        return float(num) / float(den) if float(den) else 0.0
+    return float(rate)
+
+
+def _rotation(degrees: Optional[str]) -> int:
+    """Поворот 0/90/180/270 из градусов матрицы отображения или тега rotate"""
+    try:
+        return int(round(float(degrees))) % 360 if degrees else 0
+    except ValueError:
+        return 0
+
+
+def _display_size(width: int, height: int, rotation: int) -> tuple:
+    """Размер кадра при показе: ffmpeg поворачивает кадры при декодировании, на ±90° стороны меняются"""
+    return (height, width) if rotation in (90, 270) else (width, height)
+
+
+def _probe_ffprobe(path: str) -> Optional[Dict[str, Any]]:
+    cmd = [FFPROBE_BIN, '-v', 'quiet', '-print_format', 'json', '-show_format', '-show_streams', path]
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        return None
+    data = json.loads(result.stdout or '{}')
+    video = next((s for s in data.get('streams', []) if s.get('codec_type') == 'video'), None)
+    audio = next((s for s in data.get('streams', []) if s.get('codec_type') == 'audio'), None)
+    if video is None:
+        return None
+    fmt = data.get('format', {})
+    duration = float(fmt.get('duration') or video.get('duration') or 0)
+    fps = _parse_rate(video.get('avg_frame_rate')) or _parse_rate(video.get('r_frame_rate'))
+    matrix = next((item for item in video.get('side_data_list', []) if 'rotation' in item), {})
+    rotation = _rotation(str(matrix['rotation']) if matrix else video.get('tags', {}).get('rotate'))
+    width, height = _display_size(int(video.get('width', 0)), int(video.get('height', 0)), rotation)
+    return {
+        'width': width,
+        'height': height,
+        'rotation': rotation,
+        'fps': fps,
+        'duration': duration,
+        'frames': int(video.get('nb_frames') or round(duration * fps)),
+        'video_codec': video.get('codec_name'),
+        'profile': video.get('profile'),
+        'level': int(video['level']) if int(video.get('level', -99)) > 0 else None,
+        'pix_fmt': video.get('pix_fmt'),
+        'field_order': video.get('field_order'),
+        'frame_rate': video.get('r_frame_rate'),
+        'has_audio': audio is not None,
+        'audio_codec': audio.get('codec_name') if audio else None,
+        'audio_bitrate': int(audio.get('bit_rate', 0) or 0) if audio else 0,
+        'bitrate': int(fmt.get('bit_rate', 0) or 0),
+        'size': int(fmt.get('size', 0) or 0)
+    }
+
+
+def _probe_ffmpeg(path: str) -> Optional[Dict[str, Any]]:
+    """Запасной вариант без ffprobe: разбираем вывод `ffmpeg -i`"""
+    result = subprocess.run([FFMPEG_BIN, '-hide_banner', '-i', path], capture_output=True, text=True)
+    output = result.stderr
+    video = _VIDEO_RE.search(output)
+    if not video:
+        return None
+    duration_match = _DURATION_RE.search(output)
+    duration = 0.0
+    if duration_match:
+        hours, minutes, seconds = duration_match.groups()
+        duration = int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+    video_line = output[video.start():output.find('\n', video.start())]
+    fps_match = _FPS_RE.search(video_line)
+    fps = float(fps_match.group(1)) if fps_match else 0.0
+    video_format = _VIDEO_FORMAT_RE.search(video_line)
+    profile, pix_fmt, attributes = video_format.groups() if video_format else (None, None, None)
+    field_order = None
+    if attributes:
+        # Последний атрибут - развертка: progressive, top first, bottom first, ...
+        scan = attributes.split(',')[-1].strip()
+        field_order = 'progressive' if scan == 'progressive' else ('interlaced' if 'first' in scan else None)
+    # Поворот - в метаданных и side data этого потока, до следующего Stream #
+    next_stream = output.find('Stream #', video.end())
+    rotation_match = _ROTATION_RE.search(output, video.end(), next_stream if next_stream != -1 else len(output))
+    rotation = _rotation(rotation_match and (rotation_match.group(1) or rotation_match.group(2)))
+    width, height = _display_size(int(video.group(2)), int(video.group(3)), rotation)
+    audio = _AUDIO_RE.search(output)
+    bitrate = _BITRATE_RE.search(output)
+    return {
+        'width': width,
+        'height': height,
+        'rotation': rotation,
+        'fps': fps,
+        'duration': duration,
+        'frames': int(round(duration * fps)),
+        'video_codec': video.group(1),
+        'profile': profile,
+        'level': None,  # ffmpeg -i не показывает уровень
+        'pix_fmt': pix_fmt,
+        'field_order': field_order,
+        'frame_rate': None,
+        'has_audio': audio is not None,
+        'audio_codec': audio.group(1) if audio else None,
+        'audio_bitrate': 0,
+        'bitrate': int(bitrate.group(1)) * 1000 if bitrate else 0,
+        'size': os.path.getsize(path) if os.path.exists(path) else 0
+    }
+
+
+def probe_video(path: str) -> Optional[Dict[str, Any]]:
+    """Параметры видео: размер (при показе, с учетом поворота), fps, длительность, кодеки, наличие аудио"""
+    try:
+        with metrics.timed(metrics.PROBE_SECONDS), tracing.span('probe'):
+            if shutil.which(FFPROBE_BIN):
+                info = _probe_ffprobe(path)
+                if info:
+                    return info
+            return _probe_ffmpeg(path)
+    except Exception as e:
+        logger.error(f"❌ Ошибка анализа видео {path}: {e}")
+        return None
+
+
+def keyframe_times(path: str) -> List[float]:
+    """Время ключевых кадров видео (секунды, по возрастанию)"""
+    try:
+        if shutil.which(FFPROBE_BIN):
+            # Флаги пакетов - без декодирования
+            cmd = [FFPROBE_BIN, '-v', 'error', '-select_streams', 'v:0',
+                   '-show_entries', 'packet=pts_time,flags', '-of', 'csv=p=0', path]
+            result = subprocess.run(cmd, capture_output=True, text=True)
+            if result.returncode == 0:
+                times = []
+                for line in result.stdout.splitlines():
+                    pts_time, _, flags = line.partition(',')
+                    if 'K' in flags and pts_time not in ('', 'N/A'):
+                        times.append(float(pts_time))
+                return sorted(times)
+        # Без ffprobe: декодируются только ключевые кадры
+        result = subprocess.run([FFMPEG_BIN, '-hide_banner', '-nostdin', '-skip_frame', 'nokey', '-i', path,
+                                 '-map', '0:v:0', '-vf', 'showinfo', '-f', 'null', '-'],
+                                capture_output=True, text=True)
+        return sorted(float(t) for t in _PTS_TIME_RE.findall(result.stderr))
+    except Exception as e:
+        logger.error(f"❌ Не удалось получить ключевые кадры {path}: {e}")
+        return []
+
+
+@tracing.traced('retime')
+def retime_copy(input_path: str, output_path: str, speed: float, start: float = 0.0,
+                end: Optional[float] = None) -> bool:
+    """
+    Меняет скорость видео без перекодирования: -itsscale пересчитывает временные метки
+    контейнера, видео копируется. start должен быть ключевым кадром (обрезка копированием),
+    конец режется по пакетам. Через atempo проходит только аудио.
+    """
+    info = probe_video(input_path)
+    if not info or info['video_codec'] not in MP4_VIDEO_CODECS:
+        return False
+    end = min(end or info['duration'], info['duration'])
+    duration = end - start
+    if duration <= 0:
+        return False
+
+    args = ['-ss', f"{start:.3f}", '-itsscale', f"{1 / speed:.6f}", '-i', input_path]
+    maps = ['-map', '0:v:0']
+    if info['has_audio']:
+        args += ['-ss', f"{start:.3f}", '-t', f"{duration:.3f}", '-i', input_path]
+        maps += ['-map', '1:a:0']
+    args += maps + ['-t', f"{duration / speed:.3f}", '-c:v', 'copy']
+    if info['has_audio']:
+        args += audio_codec_args(info, speed)
+    args += ['-movflags', '+faststart', output_path]
+
+    result = run_ffmpeg(ffmpeg_thread_args() + args)
+    if result.returncode != 0 or not os.path.exists(output_path) or os.path.getsize(output_path) == 0:
+        logger.warning(f"⚠️ Ретайминг без перекодирования не удался: {result.stderr[-300:]}")
+        return False
+    return True
+
+
+def atempo_filter(speed: float) -> str:
+    """atempo для любой скорости: старые ffmpeg принимают только 0.5-2.0 на фильтр"""
+    factors = []
+    while speed > 2.0:
+        factors.append(2.0)
+        speed /= 2.0
+    while speed < 0.5:
+        factors.append(0.5)
+        speed /= 0.5
+    factors.append(speed)
+    return ','.join(f"atempo={factor:.6f}" for factor in factors)
+
+
+def audio_codec_args(info: Optional[Dict[str, Any]], speed: float = 1.0) -> List[str]:
+    """Копирование аудио, если тайминг не меняется; иначе atempo + AAC в том же проходе"""
+    if info and abs(speed - 1.0) < 1e-6 and info.get('audio_codec') in MP4_AUDIO_CODECS:
+        return ['-c:a', 'copy']
+    args = ['-filter:a', atempo_filter(speed)] if abs(speed - 1.0) >= 1e-6 else []
+    return args + ['-c:a', 'aac', '-b:a', '128k']
+
+
+@tracing.traced('mux')
+def mux_audio(video_path: str, audio_source: str, output_path: str, start: float = 0.0,
+              duration: Optional[float] = None, speed: float = 1.0) -> str:
+    """
+    Добавляет аудио из audio_source к видео без повторного кодирования видео (-c:v copy).
+    Аудио копируется как есть, если скорость не меняется. video_path удаляется.
+    """
+    info = probe_video(audio_source)
+    if not info or not info['has_audio']:
+        os.replace(video_path, output_path)
+        return output_path
+
+    args = ['-i', video_path]
+    if start > 0:
+        args += ['-ss', f"{start:.3f}"]
+    if duration:
+        args += ['-t', f"{duration:.3f}"]
+    args += ['-i', audio_source, '-map', '0:v:0', '-map', '1:a:0', '-c:v', 'copy']
+    args += audio_codec_args(info, speed) + ['-shortest', '-movflags', '+faststart', output_path]
+
+    result = run_ffmpeg(ffmpeg_thread_args() + args)
+    if result.returncode != 0 or not os.path.exists(output_path):
+        # Видео без звука лучше, чем потерянный рендер
+        logger.warning(f"⚠️ Не удалось добавить аудио: {result.stderr[-300:]}")
+        os.replace(video_path, output_path)
+        return output_path
+    os.remove(video_path)
+    return output_path
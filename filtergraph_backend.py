@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+Бэкенд на ffmpeg filtergraph: цепочка эффектов компилируется в один
+-filter_complex и выполняется целиком внутри ffmpeg (slice threading),
+кадры не проходят через Python.
+
+Соответствие эффектам VideoUniquizer (кадры BGR):
+- vintage:  colorchannelmixer (теплота) + маска виньетки (blend) + noise (зерно)
+- dramatic: lutrgb (контраст, тени, блики - точная таблица)
+- soft:     gblur + lutrgb (яркость) + lut3d (насыщенность)
+- vibrant:  lut3d (насыщенность) + lutrgb (вибрация) + лапласиан (четкость)
+- visual:   lutrgb (яркость/контраст) + lut3d (насыщенность) + слабый noise
+- temporal: trim/atrim + setpts/atempo
+
+Насыщенность в NumPy меняет S в HSV, а hue=s ffmpeg масштабирует цветность в YUV -
+результат другой, поэтому она идет через таблицу lut3d, посчитанную по формуле HSV.
+"""
+
+import os
+import time
+import random
+import logging
+import tempfile
+import threading
+from typing import Dict, Any, List, Optional, Tuple
+
+import numpy as np
+
+from ffmpeg_utils import run_ffmpeg, probe_video, atempo_filter
+import tracing
+from thread_governor import ffmpeg_thread_args
+
+logger = logging.getLogger(__name__)
+
+# Диапазоны случайных параметров - как в VideoUniquizer
+SPEED_RANGE = (0.95, 1.05)
+BRIGHTNESS_RANGE = (-15, 15)
+CONTRAST_RANGE = (0.9, 1.1)
+SATURATION_RANGE = (0.9, 1.1)
+
+SOCIAL_STYLES = {
+    'vintage': {'warmth': 0.9, 'vignette': 0.2, 'grain': 0.1},
+    'dramatic': {'contrast': 1.15, 'shadows': 0.8, 'highlights': 1.2},
+    'soft': {'blur': 0.5, 'brightness': 5, 'saturation': 0.9},
+    'vibrant': {'saturation': 1.2, 'vibrance': 1.15, 'clarity': 1.1}
+}
+
+DEFAULT_ENCODER_ARGS = [
+    '-c:v', 'libx264',
+    '-preset', 'fast',
+    '-crf', '23',
+    '-maxrate', '2M',
+    '-bufsize', '4M',
+    '-threads', '2',
+    '-movflags', '+faststart'
+]
+
+
+# Таблицы насыщенности (.cube) общие для всех рендеров
+LUT_DIR = os.path.join(tempfile.gettempdir(), 'filtergraph_luts')
+LUT_SIZE = 17
+
+
+def _lut(expr: str) -> str:
+    """
+    Одинаковая таблица для всех трех каналов. lutrgb отбрасывает дробную часть, а
+    cv2.convertScaleAbs округляет - там, где в NumPy он, в выражении стоит round()
+    """
+    return f"lutrgb=r='{expr}':g='{expr}':b='{expr}'"
+
+
+def saturation_lut(saturation: float) -> str:
+    """
+    Файл .cube для lut3d: S в HSV * saturation при той же V, как в VideoUniquizer.
+    В RGB это c' = max - k * (max - c), k = min(saturation, max / (max - min)):
+    оттенок и V не меняются, S упирается в 1. Внутри области с одним порядком
+    каналов отображение линейно, поэтому tetrahedral-интерполяция почти точна.
+    """
+    path = os.path.join(LUT_DIR, f"hsv_saturation_{saturation:.4f}.cube")
+    if os.path.exists(path):
+        return path
+    os.makedirs(LUT_DIR, exist_ok=True)
+    grid = np.linspace(0.0, 1.0, LUT_SIZE)
+    # В .cube быстрее всех меняется R
+    blue, green, red = np.meshgrid(grid, grid, grid, indexing='ij')
+    rgb = np.stack([red, green, blue], axis=-1).reshape(-1, 3)
+    high = rgb.max(axis=1, keepdims=True)
+    spread = high - rgb.min(axis=1, keepdims=True)
+    k = np.minimum(saturation, high / np.maximum(spread, 1e-9))
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'w') as f:
+        f.write(f"LUT_3D_SIZE {LUT_SIZE}\n")
+        np.savetxt(f, high - k * (high - rgb), fmt='%.6f')
+    os.replace(tmp_path, path)
+    return path
+
+
+def _saturation(saturation: float) -> str:
+    return f"lut3d=file='{saturation_lut(saturation)}':interp=tetrahedral"
+
+
+def _vignette(strength: float) -> str:
+    """
+    Виньетка как в NumPy: линейный спад 1 - strength * d / dmax от центра. Маска
+    считается geq один раз (по первому кадру), повторяется loop и умножается на кадр
+    """
+    expr = f"255*(1-{strength}*hypot(X-trunc(W/2),Y-trunc(H/2))/hypot(trunc(W/2),trunc(H/2)))"
+    return (f"format=gbrp,split[vig_in][vig_src];"
+            f"[vig_src]trim=end_frame=1,geq=r='{expr}':g='{expr}':b='{expr}',loop=loop=-1:size=1[vig_mask];"
+            f"[vig_in][vig_mask]blend=all_mode=multiply:shortest=1")
+
+
+def _clarity(weight: float) -> str:
+    """
+    Четкость как в NumPy: кадр + weight * clip(лапласиан серого, 0, 255).
+    Серый - по весам BT.601 (cv2.COLOR_BGR2GRAY) во всех трех плоскостях
+    """
+    kernel = '0 1 0 1 -4 1 0 1 0'
+    return (f"format=gbrp,split[cl_in][cl_src];"
+            f"[cl_src]colorchannelmixer=.299:.587:.114:0:.299:.587:.114:0:.299:.587:.114,"
+            f"convolution=0m='{kernel}':1m='{kernel}':2m='{kernel}',{_lut(f'round(val*{weight:.4f})')}[cl_edges];"
+            f"[cl_in][cl_edges]blend=all_mode=addition")
+
+
+def style_filters(style: str, params: Dict[str, float]) -> List[str]:
+    """Фильтры ffmpeg для стиля social_effects"""
+    if style == 'vintage':
+        warmth = params['warmth']
+        # NumPy: канал 0 (B) * warmth, канал 2 (R) * (2 - warmth)
+        filters = [f"colorchannelmixer=rr={2 - warmth:.4f}:bb={warmth:.4f}"]
+        if params.get('vignette'):
+            filters.append(_vignette(params['vignette']))
+        if params.get('grain'):
+            # noise=alls=N дает std ~0.45*N, в NumPy std = grain * 25
+            filters.append(f"noise=alls={max(1, round(params['grain'] * 25 / 0.45))}:allf=t")
+        return filters
+    if style == 'dramatic':
+        contrast, shadows, highlights = params['contrast'], params['shadows'], params['highlights']
+        return [_lut(f"clip(clip(clip(round(val*{contrast}),0,255)*{highlights},0,255)*{shadows},0,255)")]
+    if style == 'soft':
+        filters = []
+        if params.get('blur', 0) > 0:
+            # steps=6 - ближе к точному ядру cv2.GaussianBlur, чем 1 проход по умолчанию
+            filters.append(f"gblur=sigma={params['blur']}:steps=6")
+        filters.append(_lut(f"clip(val+{params['brightness']},0,255)"))
+        filters.append(_saturation(params['saturation']))
+        return filters
+    if style == 'vibrant':
+        filters = [_saturation(params['saturation']), _lut(f"clip(round(val*{params['vibrance']}),0,255)")]
+        if params.get('clarity', 1.0) > 1.0:
+            filters.append(_clarity((params['clarity'] - 1.0) * 0.3))
+        return filters
+    raise ValueError(f"Unknown style: {style}")
+
+
+def visual_filters(brightness: int, contrast: float, saturation: float) -> List[str]:
+    """Эффект 'visual': яркость, контраст, насыщенность, очень слабый шум"""
+    return [
+        _lut(f"clip(round(clip(val+{brightness},0,255)*{contrast:.4f}),0,255)"),
+        _saturation(saturation),
+        "noise=alls=1:allf=t"
+    ]
+
+
+def plan_params(effects: List[str], duration: float, style: Optional[str] = None,
+                style_params: Optional[Dict[str, float]] = None,
+                speed: Optional[float] = None) -> Dict[str, Any]:
+    """Параметры варианта; недостающие выбираются случайно, как в VideoUniquizer"""
+    params: Dict[str, Any] = {}
+    if 'temporal' in effects:
+        params['speed'] = speed or random.uniform(*SPEED_RANGE)
+        params['trim_start'] = random.uniform(0, duration * 0.05)
+        params['trim_end'] = random.uniform(0, duration * 0.05)
+    if 'visual' in effects:
+        params['brightness'] = random.randint(*BRIGHTNESS_RANGE)
+        params['contrast'] = random.uniform(*CONTRAST_RANGE)
+        params['saturation'] = random.uniform(*SATURATION_RANGE)
+    if 'social' in effects:
+        style = style or random.choice(list(SOCIAL_STYLES))
+        params['style'] = style
+        params['style_params'] = dict(SOCIAL_STYLES[style], **(style_params or {}))
+    return params
+
+
+def compile_filtergraph(effects: List[str], params: Dict[str, Any], duration: float,
+                        has_audio: bool, max_height: Optional[int] = None) -> Tuple[str, List[str]]:
+    """Цепочка эффектов -> (filter_complex, аргументы -map/-c:a)"""
+    video_chain: List[str] = []
+    audio_chain: List[str] = []
+    if max_height:
+        video_chain.append(f"scale=-2:'min({max_height},trunc(ih/2)*2)'")
+
+    for effect in effects:
+        if effect == 'temporal':
+            start = params['trim_start']
+            end = max(start + 0.1, duration - params['trim_end'])
+            speed = params['speed']
+            video_chain += [f"trim=start={start:.3f}:end={end:.3f}", f"setpts=(PTS-STARTPTS)/{speed:.6f}"]
+            audio_chain += [f"atrim=start={start:.3f}:end={end:.3f}", "asetpts=PTS-STARTPTS",
+                            atempo_filter(speed)]
+        elif effect == 'visual':
+            video_chain += visual_filters(params['brightness'], params['contrast'], params['saturation'])
+        elif effect == 'social':
+            video_chain += style_filters(params['style'], params['style_params'])
+        else:
+            raise ValueError(f"Effect '{effect}' is not supported by the filtergraph backend")
+
+    video_chain.append('format=yuv420p')
+    graph = f"[0:v:0]{','.join(video_chain)}[vout]"
+    maps = ['-map', '[vout]']
+    if has_audio and audio_chain:
+        graph += f";[0:a:0]{','.join(audio_chain)}[aout]"
+        maps += ['-map', '[aout]', '-c:a', 'aac', '-b:a', '128k']
+    elif has_audio:
+        # Тайминг не менялся - аудио копируется без перекодирования
+        maps += ['-map', '0:a:0?', '-c:a', 'copy']
+    return graph, maps
+
+
+def render_filtergraph(input_path: str, output_path: str, effects: List[str],
+                       style: Optional[str] = None, style_params: Optional[Dict[str, float]] = None,
+                       speed: Optional[float] = None, encoder_args: Optional[List[str]] = None,
+                       max_duration: Optional[float] = None,
+                       max_height: Optional[int] = None) -> Dict[str, Any]:
+    """Рендерит вариант одним процессом ffmpeg; возвращает метаданные или {'error': ...}"""
+    info = probe_video(input_path)
+    if not info:
+        return {'error': f"Cannot probe video: {input_path}"}
+
+    duration = min(info['duration'], max_duration) if max_duration else info['duration']
+    params = plan_params(effects, duration, style, style_params, speed)
+    graph, maps = compile_filtergraph(effects, params, duration, info['has_audio'], max_height)
+
+    # Потоки декодера и графа - из аренды рендера (ThreadGovernor.lease)
+    args = ffmpeg_thread_args()
+    if max_duration and info['duration'] > max_duration:
+        args += ['-t', f"{max_duration:.3f}"]
+    args += ['-i', input_path, '-filter_complex', graph] + maps + list(encoder_args or DEFAULT_ENCODER_ARGS) + [output_path]
+
+    start_time = time.time()
+    with tracing.span('render:filtergraph', effects='+'.join(effects)):
+        result = run_ffmpeg(args)
+    if result.returncode != 0 or not os.path.exists(output_path) or os.path.getsize(output_path) == 0:
+        logger.error(f"❌ Filtergraph render failed: {result.stderr[-500:]}")
+        return {'error': result.stderr[-500:] or 'empty output', 'params': params}
+
+    elapsed = time.time() - start_time
+    logger.info(f"✅ Filtergraph render: {output_path} за {elapsed:.1f}s ({graph})")
+    return {
+        'output_path': output_path,
+        'effects': effects,
+        'params': params,
+        'filtergraph': graph,
+        'frames': int(round(duration * info['fps'])) if info['fps'] else None,
+        'render_time': round(elapsed, 3)
+    }
@@ -7,6 +7,7 @@ import os
 import json
 import time
 import logging
+import threading
 from datetime import datetime, timedelta
 from typing import Dict, Any, List
 import requests
@@ -27,10 +28,13 @@ logger = logging.getLogger(__name__)
 class GoogleSheetsIntegration:
     """Integracja z Google Sheets"""
     
-    def __init__(self):
+    def __init__(self, history=None):
         self.sheet_id = "1p6bQ3Ck7qMv8M6vobXQcnEjXXdECAoBOlmy2_n9sUPI"
         self.credentials_file = "google_credentials.json"
         self.sheet = None
+        # Opcjonalna prawdziwa historia wyświetleń (StatsHistoryStore)
+        self.history = history
+        self._headers_checked = False
         
         # Inicjalizacja Google Sheets
         self.init_google_sheets()
@@ -85,8 +89,20 @@ class GoogleSheetsIntegration:
         ]
         return headers
     
-    def calculate_historical_views(self, current_views: int, platform: str) -> Dict[str, int]:
-        """Oblicza wyświetlenia z wczoraj i tygodnia temu (symulacja)"""
+    def calculate_historical_views(self, current_views: int, platform: str,
+                                   item_id: Any = None) -> Dict[str, int]:
+        """Oblicza wyświetlenia z wczoraj i tygodnia temu"""
+        # Prawdziwe próbki z historii, jeśli są
+        if self.history is not None and item_id is not None:
+            now = time.time()
+            yesterday = self.history.views_at(platform, str(item_id), now - 24 * 3600)
+            week_ago = self.history.views_at(platform, str(item_id), now - 7 * 24 * 3600)
+            if yesterday is not None or week_ago is not None:
+                return {
+                    'yesterday': yesterday if yesterday is not None else current_views,
+                    'week_ago': week_ago if week_ago is not None else (yesterday if yesterday is not None else current_views)
+                }
+        
         # Symulujemy realistyczne dane historyczne
         import random
         
@@ -133,7 +149,7 @@ class GoogleSheetsIntegration:
                 for clip in platform_data['clips']:
                     # Obliczamy historyczne wyświetlenia dla tego konkretnego clipa
                     current_views = clip.get('views', 0)
-                    historical = self.calculate_historical_views(current_views, platform)
+                    historical = self.calculate_historical_views(current_views, platform, clip.get('video_id'))
                     
                     # Obliczamy zmiany procentowe
                     daily_change = self.calculate_percentage_change(
@@ -167,7 +183,7 @@ class GoogleSheetsIntegration:
                 for video in platform_data['videos']:
                     # Obliczamy historyczne wyświetlenia dla tego konkretnego wideo
                     current_views = video.get('views', 0)
-                    historical = self.calculate_historical_views(current_views, platform)
+                    historical = self.calculate_historical_views(current_views, platform, video.get('video_id'))
                     
                     # Obliczamy zmiany procentowe
                     daily_change = self.calculate_percentage_change(
@@ -199,6 +215,25 @@ class GoogleSheetsIntegration:
         
         return rows
     
+    def append_rows(self, rows: List[List[str]]) -> bool:
+        """Dopisuje wiersze jednym wywołaniem API (append_rows zamiast append_row w pętli)"""
+        if not self.sheet:
+            logger.error("Google Sheets nie jest zainicjalizowane")
+            return False
+        if not rows:
+            return True
+        
+        # Nagłówki tylko raz na proces; row_values(1) zamiast czytania całego arkusza
+        if not self._headers_checked:
+            if not self.sheet.row_values(1):
+                self.sheet.append_row(self.prepare_headers())
+                logger.info("Добавлены заголовки в таблицу")
+            self._headers_checked = True
+        
+        self.sheet.append_rows(rows, value_input_option='USER_ENTERED')
+        logger.info(f"Успешно сохранено {len(rows)} строк в Google Sheets")
+        return True
+    
     def save_to_sheets(self, data: Dict[str, Any]) -> bool:
         """Zapisuje dane do Google Sheets"""
         try:
@@ -213,19 +248,7 @@ class GoogleSheetsIntegration:
                 logger.warning("Brak danych do zapisania")
                 return False
             
-            # Zawsze dodajemy nagłówki na początku (jeśli arkusz jest pusty)
-            if not self.sheet.get_all_values():
-                headers = self.prepare_headers()
-                self.sheet.append_row(headers)
-                logger.info("Добавлены заголовки в таблицу")
-            
-            # Dodajemy dane
-            for row in rows:
-                self.sheet.append_row(row)
-                logger.info(f"Добавлена строка: {row[1]} - {row[3][:50]}...")
-            
-            logger.info(f"Успешно сохранено {len(rows)} строк в Google Sheets")
-            return True
+            return self.append_rows(rows)
             
         except Exception as e:
             logger.error(f"Błąd zapisywania do Google Sheets: {e}")
@@ -243,6 +266,52 @@ class GoogleSheetsIntegration:
             logger.error(f"Błąd pobierania danych z arkusza: {e}")
             return []
 
+class BatchedSheetWriter:
+    """Bufor wierszy dla Google Sheets: zapis co max_rows wierszy lub co max_delay sekund"""
+    
+    def __init__(self, integration: GoogleSheetsIntegration, max_rows: int = 200, max_delay: float = 60.0):
+        self.integration = integration
+        self.max_rows = max_rows
+        self.max_delay = max_delay
+        self._rows: List[List[str]] = []
+        self._first_buffered_at = None
+        self._lock = threading.Lock()
+    
+    def add_results(self, data: Dict[str, Any]):
+        """Formatuje wyniki ekstraktora i dodaje do bufora"""
+        self.add_rows(self.integration.format_data_for_sheets(data))
+    
+    def add_rows(self, rows: List[List[str]]):
+        with self._lock:
+            if rows and not self._rows:
+                self._first_buffered_at = time.time()
+            self._rows.extend(rows)
+            should_flush = len(self._rows) >= self.max_rows
+        if should_flush:
+            self.flush()
+    
+    def flush_if_due(self):
+        """Zapis, jeśli najstarszy wiersz czeka dłużej niż max_delay"""
+        with self._lock:
+            due = self._rows and time.time() - self._first_buffered_at >= self.max_delay
+        if due:
+            self.flush()
+    
+    def flush(self) -> bool:
+        with self._lock:
+            rows, self._rows = self._rows, []
+        if not rows:
+            return True
+        try:
+            return self.integration.append_rows(rows)
+        except Exception as e:
+            logger.error(f"Błąd zapisywania do Google Sheets: {e}")
+            # Wiersze wracają do bufora na kolejną próbę
+            with self._lock:
+                self._rows = rows + self._rows
+                self._first_buffered_at = time.time()
+            return False
+
 def create_google_credentials_template():
     """Tworzy szablon pliku credentials dla Google"""
     template = {
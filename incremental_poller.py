@@ -0,0 +1,452 @@
+#!/usr/bin/env python3
+"""
+Inkrementalne sprawdzanie najnowszych postów z kursorami.
+
+Dla każdego konta zapamiętujemy najnowszy widziany post (id / data publikacji)
+i przy kolejnym uruchomieniu pobieramy tylko nowsze posty oraz okno
+„świeżych” postów, których wyświetlenia jeszcze rosną. Starsze posty
+zostają w stanie z ostatnią znaną liczbą wyświetleń.
+
+VK: zapytania wall.get dla wielu kont łączone są w jedno wywołanie
+`execute` (do 25 kont na jedno wywołanie).
+YouTube: zamiast search.list (100 jednostek quota) listujemy playlistę
+uploads (1 jednostka) i kończymy na pierwszym znanym wideo; wywołania idą
+przez YouTubeBatchClient (batchowanie + liczenie quota).
+"""
+
+import os
+import copy
+import json
+import time
+import logging
+import threading
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+
+import requests
+
+from youtube_batch_client import YouTubeBatchClient
+
+logger = logging.getLogger(__name__)
+
+# Limit wywołań API w jednym `execute`
+VK_EXECUTE_BATCH = 25
+# Maksymalny count dla wall.get
+VK_WALL_MAX_COUNT = 100
+
+
+def vk_post_clips(post: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Wyciąga clipy (załączniki video) z postu VK"""
+    clips = []
+    for attachment in post.get('attachments') or []:
+        if attachment.get('type') != 'video':
+            continue
+        video = attachment['video']
+        clips.append({
+            'post_id': post['id'],
+            'video_id': video.get('id'),
+            'title': video.get('title', ''),
+            'description': video.get('description', ''),
+            'views': video.get('views', 0),
+            'duration': video.get('duration', 0),
+            'date': datetime.fromtimestamp(post['date']).strftime('%Y-%m-%d %H:%M:%S'),
+            'date_ts': post['date'],
+            'likes': post.get('likes', {}).get('count', 0),
+            'comments': post.get('comments', {}).get('count', 0),
+            'reposts': post.get('reposts', {}).get('count', 0)
+        })
+    return clips
+
+
+def _youtube_published_ts(published_at: str) -> float:
+    """'2024-01-31T12:00:00Z' -> timestamp"""
+    try:
+        return datetime.strptime(published_at[:19], '%Y-%m-%dT%H:%M:%S').timestamp()
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _recency(post: Dict[str, Any]):
+    """Klucz sortowania: data publikacji, potem id postu"""
+    return post.get('date_ts', 0), post.get('post_id', 0)
+
+
+class PollCursorStore:
+    """Kursory kont zapisywane w pliku JSON.
+
+    Jeden magazyn obsługuje równoległe batche VK i YouTube (StatsScheduler):
+    każdy odczyt i zmiana stanu idzie pod `lock`, a save() zapisuje głęboką
+    kopię zrobioną pod tym samym zamkiem.
+    """
+
+    def __init__(self, path: str = "poll_cursors.json"):
+        self.path = path
+        self.lock = threading.RLock()
+        # Zapisy jeden po drugim: kopia i plik w tej samej kolejności
+        self._write_lock = threading.Lock()
+        self.data: Dict[str, Dict[str, Any]] = {}
+        self.load()
+
+    def load(self):
+        """Wczytuje kursory z pliku"""
+        with self.lock:
+            try:
+                if os.path.exists(self.path):
+                    with open(self.path, 'r', encoding='utf-8') as f:
+                        self.data = json.load(f)
+            except Exception as e:
+                logger.warning(f"Nie udało się wczytać kursorów {self.path}: {e}")
+                self.data = {}
+
+    def save(self):
+        """Zapisuje kursory atomowo (tmp + rename)"""
+        with self._write_lock:
+            with self.lock:
+                data = copy.deepcopy(self.data)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.path)
+
+    def get(self, key: str) -> Dict[str, Any]:
+        """Zwraca (i tworzy) stan konta; zmiany stanu - pod `lock`"""
+        with self.lock:
+            return self.data.setdefault(key, {})
+
+
+class IncrementalPoller:
+    """Inkrementalny poller dla VK i YouTube"""
+
+    def __init__(self, vk_session=None, youtube_api_key: Optional[str] = None,
+                 session: Optional[requests.Session] = None,
+                 store: Optional[PollCursorStore] = None,
+                 new_page: int = 10, refresh_age: float = 3 * 24 * 3600,
+                 refresh_limit: int = 20, max_tracked: int = 50):
+        self.vk_session = vk_session
+        self.session = session or requests.Session()
+        self.youtube = YouTubeBatchClient(youtube_api_key, self.session) if youtube_api_key else None
+        self.store = store or PollCursorStore()
+        # Ile nowych postów pobieramy na stronę
+        self.new_page = new_page
+        # Posty młodsze niż refresh_age sekund są odświeżane przy każdym sprawdzeniu
+        self.refresh_age = refresh_age
+        self.refresh_limit = refresh_limit
+        # Ile postów na konto trzymamy w stanie
+        self.max_tracked = max_tracked
+
+    # ---------------------------------------------------------------- wspólne
+
+    def _refresh_ids(self, posts: Dict[str, Dict[str, Any]], now: float) -> List[str]:
+        """Id postów, których wyświetlenia jeszcze się zmieniają"""
+        fresh = [(post_id, post.get('date_ts', 0)) for post_id, post in posts.items()
+                 if now - post.get('date_ts', 0) <= self.refresh_age]
+        fresh.sort(key=lambda item: item[1], reverse=True)
+        return [post_id for post_id, _ in fresh[:self.refresh_limit]]
+
+    def _trim_tracked(self, posts: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        """Zostawia max_tracked najnowszych postów"""
+        newest = sorted(posts.items(), key=lambda item: _recency(item[1]), reverse=True)
+        return dict(newest[:self.max_tracked])
+
+    # -------------------------------------------------------------------- VK
+
+    def _vk_resolve(self, usernames: List[str]) -> Dict[str, Dict[str, Any]]:
+        """username -> {'id', 'user_name'}; jedno users.get dla wszystkich nieznanych"""
+        resolved = {}
+        unknown = []
+        for username in usernames:
+            state = self.store.get(f"vk:{username}")
+            if state.get('user_id'):
+                resolved[username] = {'id': state['user_id'], 'user_name': state.get('user_name', '')}
+            elif username.lstrip('-').isdigit():
+                resolved[username] = {'id': int(username), 'user_name': ''}
+            else:
+                unknown.append(username)
+
+        for start in range(0, len(unknown), 1000):
+            chunk = unknown[start:start + 1000]
+            try:
+                users = self._vk_users_get(chunk)
+            except Exception as e:
+                if len(chunk) == 1:
+                    raise
+                # Jedna usunięta/błędna nazwa psuje całe wywołanie - ponawiamy po jednej nazwie
+                logger.warning(f"Błąd VK users.get dla {len(chunk)} kont ({e}), ponawiam pojedynczo")
+                users = []
+                for username in chunk:
+                    try:
+                        users.extend(self._vk_users_get([username]))
+                    except Exception as single_error:
+                        logger.warning(f"Błąd VK users.get dla {username}: {single_error}")
+            # Nieznane nazwy są pomijane w odpowiedzi, więc dopasowujemy po screen_name
+            by_name = {(user.get('screen_name') or '').lower(): user for user in users}
+            for username in chunk:
+                user = by_name.get(username.lower())
+                if not user:
+                    continue
+                user_name = f"{user.get('first_name', '')} {user.get('last_name', '')}".strip()
+                resolved[username] = {'id': user['id'], 'user_name': user_name}
+                with self.store.lock:
+                    state = self.store.get(f"vk:{username}")
+                    state['user_id'] = user['id']
+                    state['user_name'] = user_name
+
+        return resolved
+
+    def _vk_users_get(self, usernames: List[str]) -> List[Dict[str, Any]]:
+        users = self.vk_session.method('users.get', {'user_ids': ','.join(usernames), 'fields': 'screen_name'})
+        return users or []
+
+    def _vk_execute_wall(self, requests_batch: List[Dict[str, Any]]) -> List[Optional[Dict[str, Any]]]:
+        """Jedno `execute` z wieloma wall.get (max 25)"""
+        calls = [
+            'API.wall.get({"owner_id": %d, "count": %d, "offset": %d, "filter": "owner"})'
+            % (item['owner_id'], item['count'], item['offset'])
+            for item in requests_batch
+        ]
+        code = 'return [' + ','.join(calls) + '];'
+        response = self.vk_session.method('execute', {'code': code})
+        # Nieudane wywołania w execute zwracają false
+        return [item if isinstance(item, dict) else None for item in (response or [])]
+
+    def poll_vk(self, usernames: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Inkrementalne sprawdzenie clipów VK dla wielu kont.
+
+        Zwraca dla każdego konta: user_id, user_name, clips (śledzone clipy,
+        najnowsze pierwsze), latest_post (najnowszy post na ścianie),
+        new_posts (liczba nowych postów), api_calls.
+        """
+        if not self.vk_session:
+            return {username: {'error': 'VK API nie jest dostępny'} for username in usernames}
+
+        now = time.time()
+        results: Dict[str, Dict[str, Any]] = {}
+        try:
+            resolved = self._vk_resolve(usernames)
+        except Exception as e:
+            logger.error(f"Błąd VK users.get: {e}")
+            return {username: {'error': f'Błąd VK API: {e}'} for username in usernames}
+
+        # Kolejka zapytań: pierwsza strona dla każdego konta
+        pending = []
+        for username in usernames:
+            if username not in resolved:
+                results[username] = {'error': 'Nie znaleziono użytkownika VK'}
+                continue
+            with self.store.lock:
+                state = self.store.get(f"vk:{username}")
+                posts = state.setdefault('posts', {})
+                refresh = self._refresh_ids(posts, now) if state.get('newest_id') else []
+            count = self.new_page + len(refresh)
+            pending.append({
+                'username': username,
+                'owner_id': resolved[username]['id'],
+                'count': min(VK_WALL_MAX_COUNT, count),
+                'offset': 0,
+                'new': 0
+            })
+
+        api_calls = 0
+        while pending:
+            batch, pending = pending[:VK_EXECUTE_BATCH], pending[VK_EXECUTE_BATCH:]
+            try:
+                responses = self._vk_execute_wall(batch)
+                api_calls += 1
+            except Exception as e:
+                logger.error(f"Błąd VK execute: {e}")
+                for item in batch:
+                    results[item['username']] = {'error': f'Błąd VK API: {e}'}
+                continue
+
+            for item, response in zip(batch, responses + [None] * (len(batch) - len(responses))):
+                username = item['username']
+                if response is None:
+                    results[username] = {'error': 'Błąd VK wall.get'}
+                    continue
+
+                # Zmiany stanu pod zamkiem magazynu (save() innego batcha czyta te same dane)
+                with self.store.lock:
+                    state = self.store.get(f"vk:{username}")
+                    posts = state.setdefault('posts', {})
+                    newest_id = state.get('newest_id', 0)
+                    wall = response.get('items', [])
+
+                    for post in wall:
+                        if post['id'] > newest_id:
+                            item['new'] += 1
+                        for clip in vk_post_clips(post):
+                            posts[f"{post['id']}_{clip['video_id']}"] = clip
+
+                    # Najnowszy post (bez przypiętego) - zawsze na pierwszej stronie
+                    regular = [post['id'] for post in wall if not post.get('is_pinned')]
+                    if item['offset'] == 0 and regular:
+                        latest = max((post for post in wall if not post.get('is_pinned')), key=lambda post: post['id'])
+                        state['latest_post'] = {
+                            'id': latest['id'],
+                            'date': latest['date'],
+                            'text': latest.get('text', ''),
+                            'likes': latest.get('likes', {}).get('count', 0),
+                            'comments': latest.get('comments', {}).get('count', 0),
+                            'reposts': latest.get('reposts', {}).get('count', 0),
+                            'views': latest.get('views', {}).get('count', 0)
+                        }
+
+                    # Wszystkie pobrane posty są nowe -> może być ich więcej (doczytujemy)
+                    if newest_id and regular and min(regular) > newest_id \
+                            and item['offset'] + len(wall) < response.get('count', 0):
+                        item['offset'] += len(wall)
+                        item['count'] = VK_WALL_MAX_COUNT
+                        pending.append(item)
+                        continue
+
+                    if wall:
+                        state['newest_id'] = max([newest_id] + [post['id'] for post in wall])
+                    state['posts'] = self._trim_tracked(posts)
+                    state['checked_at'] = now
+                results[username] = {'new_posts': item['new']}
+
+        for username, result in results.items():
+            if 'error' in result:
+                continue
+            with self.store.lock:
+                state = self.store.get(f"vk:{username}")
+                clips = sorted(state['posts'].values(), key=_recency, reverse=True)
+                result.update({
+                    'user_id': state.get('user_id', resolved.get(username, {}).get('id')),
+                    'user_name': state.get('user_name', ''),
+                    'clips': clips,
+                    'latest_post': state.get('latest_post'),
+                    'api_calls': api_calls
+                })
+
+        self.store.save()
+        return results
+
+    # --------------------------------------------------------------- YouTube
+
+    def poll_youtube_batch(self, usernames: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Inkrementalne sprawdzenie wielu kanałów YouTube.
+
+        Kanały i playlisty uploads rozwiązywane są hurtem (z cache), a statystyki
+        nowych i świeżych wideo wszystkich kanałów idą wspólnymi videos.list po 50 id.
+        """
+        if not self.youtube:
+            return {username: {'error': 'Brak YouTube API key'} for username in usernames}
+
+        now = time.time()
+        results: Dict[str, Dict[str, Any]] = {}
+        try:
+            # username -> channel_id (id kanału 'UC...' bez zapytania)
+            channel_ids = {}
+            handles = []
+            for username in usernames:
+                channel_id = self.store.get(f"youtube:{username}").get('channel_id')
+                if channel_id:
+                    channel_ids[username] = channel_id
+                elif username.startswith('UC') and len(username) == 24:
+                    channel_ids[username] = username
+                else:
+                    handles.append(username)
+            resolved = self.youtube.resolve_handles(handles) if handles else {}
+            for username in handles:
+                if username.lstrip('@') in resolved:
+                    channel_ids[username] = resolved[username.lstrip('@')]
+                else:
+                    results[username] = {'error': 'Nie znaleziono kanału YouTube'}
+
+            playlists = self.youtube.uploads_playlists(list(dict.fromkeys(channel_ids.values())))
+        except Exception as e:
+            logger.error(f"Błąd YouTube: {e}")
+            return {username: {'error': f'Błąd YouTube: {str(e)}'} for username in usernames}
+
+        new_by_user: Dict[str, List[str]] = {}
+        to_fetch: List[str] = []
+        for username, channel_id in channel_ids.items():
+            with self.store.lock:
+                state = self.store.get(f"youtube:{username}")
+                state['channel_id'] = channel_id
+                videos = state.setdefault('videos', {})
+                newest_video_id = state.get('newest_video_id')
+            playlist_id = playlists.get(channel_id)
+            if not playlist_id:
+                results[username] = {'error': 'Nie znaleziono kanału YouTube'}
+                continue
+
+            try:
+                # Nowe wideo: strony playlisty aż do pierwszego znanego
+                new_ids = []
+                page_token = None
+                while True:
+                    page = self.youtube.playlist_items(playlist_id, self.new_page, page_token)
+                    reached_known = False
+                    for item in page.get('items', []):
+                        video_id = item['contentDetails']['videoId']
+                        if video_id in videos or video_id == newest_video_id:
+                            reached_known = True
+                            break
+                        new_ids.append(video_id)
+                    page_token = page.get('nextPageToken')
+                    # Pierwsze uruchomienie: tylko jedna strona
+                    if reached_known or not page_token or not newest_video_id:
+                        break
+            except Exception as e:
+                logger.error(f"Błąd YouTube playlistItems ({username}): {e}")
+                results[username] = {'error': f'Błąd YouTube: {str(e)}'}
+                continue
+
+            new_by_user[username] = new_ids
+            to_fetch.extend(new_ids)
+            to_fetch.extend(video_id for video_id in self._refresh_ids(videos, now) if video_id not in new_ids)
+
+        # Statystyki wszystkich kanałów naraz (videos.list, do 50 id na wywołanie)
+        try:
+            stats = self.youtube.videos(to_fetch) if to_fetch else {}
+        except Exception as e:
+            logger.error(f"Błąd YouTube videos.list: {e}")
+            stats = {}
+            for username in new_by_user:
+                results[username] = {'error': f'Błąd YouTube: {str(e)}'}
+
+        for username, new_ids in new_by_user.items():
+            if username in results:
+                continue
+            with self.store.lock:
+                state = self.store.get(f"youtube:{username}")
+                videos = state['videos']
+                for video_id in new_ids + list(videos):
+                    video = stats.get(video_id)
+                    if not video:
+                        continue
+                    statistics = video.get('statistics', {})
+                    snippet = video.get('snippet', {})
+                    description = snippet.get('description', '')
+                    state['channel_title'] = snippet.get('channelTitle', state.get('channel_title', ''))
+                    videos[video_id] = {
+                        'video_id': video_id,
+                        'title': snippet.get('title', ''),
+                        'description': description[:200] + '...' if len(description) > 200 else description,
+                        'views': int(statistics.get('viewCount', 0)),
+                        'likes': int(statistics.get('likeCount', 0)),
+                        'comments': int(statistics.get('commentCount', 0)),
+                        'date': snippet.get('publishedAt', ''),
+                        'date_ts': _youtube_published_ts(snippet.get('publishedAt', '')),
+                        'url': f"https://www.youtube.com/watch?v={video_id}"
+                    }
+
+                if new_ids:
+                    state['newest_video_id'] = new_ids[0]
+                state['videos'] = self._trim_tracked(videos)
+                state['checked_at'] = now
+                results[username] = {
+                    'channel_id': state['channel_id'],
+                    'channel_title': state.get('channel_title', ''),
+                    'new_videos': len(new_ids),
+                    'videos': sorted(state['videos'].values(), key=_recency, reverse=True)
+                }
+
+        self.store.save()
+        return results
+
+    def poll_youtube(self, username: str) -> Dict[str, Any]:
+        """Inkrementalne sprawdzenie wideo kanału YouTube"""
+        return self.poll_youtube_batch([username])[username]
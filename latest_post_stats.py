@@ -8,7 +8,7 @@ import json
 import time
 import logging
 from datetime import datetime
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
 import requests
 from urllib.parse import urlparse
 import instaloader
@@ -16,6 +16,8 @@ from TikTokApi import TikTokApi
 import vk_api
 from vk_api.exceptions import VkApiError
 
+from incremental_poller import IncrementalPoller
+
 # Konfiguracja logowania
 logging.basicConfig(
     level=logging.INFO,
@@ -55,6 +57,9 @@ class LatestPostStatsChecker:
                 logger.info("VK API zainicjalizowany")
             except Exception as e:
                 logger.warning(f"Nie udało się zainicjalizować VK API: {e}")
+        
+        # Inkrementalny poller (kursory ostatnio widzianych postów)
+        self.poller = IncrementalPoller(self.vk_session, os.getenv('YOUTUBE_API_KEY'), self.session)
     
     def extract_username(self, url: str, platform: str) -> Optional[str]:
         """Wyciąga username z URL"""
@@ -169,8 +174,7 @@ class LatestPostStatsChecker:
     def check_youtube_latest_video(self, url: str) -> Dict[str, Any]:
         """Sprawdza wyświetlenia ostatniego wideo na YouTube"""
         try:
-            api_key = os.getenv('YOUTUBE_API_KEY')
-            if not api_key:
+            if not os.getenv('YOUTUBE_API_KEY'):
                 return {'error': 'Brak YouTube API key'}
             
             # Wyciągamy channel ID lub username
@@ -180,79 +184,26 @@ class LatestPostStatsChecker:
             
             logger.info(f"Sprawdzanie ostatniego wideo YouTube: {channel_id}")
             
-            # Jeśli to username (zaczyna się od @), szukamy channel ID
-            if channel_id.startswith('@'):
-                search_url = f"https://www.googleapis.com/youtube/v3/search"
-                params = {
-                    'part': 'snippet',
-                    'q': channel_id,
-                    'type': 'channel',
-                    'key': api_key
-                }
-                response = self.session.get(search_url, params=params)
-                if response.status_code == 200:
-                    data = response.json()
-                    if data.get('items'):
-                        channel_id = data['items'][0]['snippet']['channelId']
-                    else:
-                        return {'error': 'Nie znaleziono kanału YouTube'}
-                else:
-                    return {'error': f'Błąd YouTube API: {response.status_code}'}
+            # Playlista uploads od kursora zamiast search.list przy każdym uruchomieniu
+            data = self.poller.poll_youtube(channel_id)
+            if 'error' in data:
+                return data
+            if not data['videos']:
+                return {'error': 'Brak wideo na kanale'}
             
-            # Pobieramy ostatnie wideo z kanału
-            search_url = f"https://www.googleapis.com/youtube/v3/search"
-            params = {
-                'part': 'snippet',
-                'channelId': channel_id,
-                'type': 'video',
-                'order': 'date',
-                'maxResults': 1,
-                'key': api_key
+            video = data['videos'][0]
+            return {
+                'platform': 'YouTube',
+                'channel_id': data['channel_id'],
+                'video_id': video['video_id'],
+                'video_url': video['url'],
+                'title': video['title'],
+                'views': video['views'],
+                'likes': video['likes'],
+                'comments': video['comments'],
+                'date': video['date'],
+                'method': 'YouTube Data API'
             }
-            
-            response = self.session.get(search_url, params=params)
-            if response.status_code == 200:
-                data = response.json()
-                if data.get('items'):
-                    video = data['items'][0]
-                    video_id = video['id']['videoId']
-                    
-                    # Pobieramy statystyki wideo
-                    stats_url = f"https://www.googleapis.com/youtube/v3/videos"
-                    stats_params = {
-                        'part': 'statistics,snippet',
-                        'id': video_id,
-                        'key': api_key
-                    }
-                    
-                    stats_response = self.session.get(stats_url, params=stats_params)
-                    if stats_response.status_code == 200:
-                        stats_data = stats_response.json()
-                        if stats_data.get('items'):
-                            video_stats = stats_data['items'][0]
-                            statistics = video_stats.get('statistics', {})
-                            snippet = video_stats.get('snippet', {})
-                            
-                            return {
-                                'platform': 'YouTube',
-                                'channel_id': channel_id,
-                                'video_id': video_id,
-                                'video_url': f"https://www.youtube.com/watch?v={video_id}",
-                                'title': snippet.get('title', ''),
-                                'views': int(statistics.get('viewCount', 0)),
-                                'likes': int(statistics.get('likeCount', 0)),
-                                'comments': int(statistics.get('commentCount', 0)),
-                                'date': snippet.get('publishedAt', ''),
-                                'method': 'YouTube Data API'
-                            }
-                        else:
-                            return {'error': 'Nie znaleziono statystyk wideo'}
-                    else:
-                        return {'error': f'Błąd pobierania statystyk: {stats_response.status_code}'}
-                else:
-                    return {'error': 'Brak wideo na kanale'}
-            else:
-                return {'error': f'Błąd YouTube API: {response.status_code}'}
                 
         except Exception as e:
             logger.error(f"Błąd YouTube: {e}")
@@ -356,11 +307,65 @@ class LatestPostStatsChecker:
             logger.error(f"Błąd Likee: {e}")
             return {'error': f'Błąd Likee: {str(e)}'}
     
+    def check_vk_latest_posts_batch(self, urls: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Ostatnie posty VK dla wielu kont jednym wywołaniem execute (do 25 kont)"""
+        usernames = {url: self.extract_username(url, 'vk') for url in urls}
+        polled = self.poller.poll_vk([username for username in usernames.values() if username])
+        
+        results = {}
+        for url, username in usernames.items():
+            if not username:
+                results[url] = {'error': 'Nie można wyciągnąć username z URL'}
+                continue
+            data = polled.get(username, {'error': 'Brak odpowiedzi VK'})
+            if 'error' in data:
+                results[url] = data
+                continue
+            post = data.get('latest_post')
+            if not post:
+                results[url] = {'error': 'Brak postów na profilu'}
+                continue
+            
+            user_id = data['user_id']
+            text = post.get('text', '')
+            results[url] = {
+                'platform': 'VK',
+                'username': username,
+                'user_id': user_id,
+                'post_id': post['id'],
+                'post_url': f"https://vk.com/wall{user_id}_{post['id']}",
+                'likes': post['likes'],
+                'comments': post['comments'],
+                'reposts': post['reposts'],
+                'views': post['views'],
+                'text': text[:100] + '...' if len(text) > 100 else text,
+                'date': datetime.fromtimestamp(post['date']).strftime('%Y-%m-%d %H:%M:%S'),
+                'method': 'VK API'
+            }
+        return results
+    
     def check_all_latest_posts(self, urls: Dict[str, str]) -> Dict[str, Any]:
         """Sprawdza wyświetlenia ostatnich postów na wszystkich platformach"""
         results = {}
         
+        # VK przez API: wszystkie konta jednym batchem
+        vk_platforms = {}
+        if self.vk_session:
+            vk_platforms = {platform: url for platform, url in urls.items() if platform.lower() == 'vk'}
+        if vk_platforms:
+            try:
+                vk_results = self.check_vk_latest_posts_batch(list(vk_platforms.values()))
+                for platform, url in vk_platforms.items():
+                    results[platform] = vk_results[url]
+            except Exception as e:
+                logger.error(f"Błąd sprawdzania VK: {e}")
+                for platform in vk_platforms:
+                    results[platform] = {'error': str(e)}
+        
         for platform, url in urls.items():
+            if platform in vk_platforms:
+                continue
+            
             logger.info(f"Sprawdzanie ostatniego postu {platform}: {url}")
             
             try:
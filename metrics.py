@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+Метрики бота в текстовом формате Prometheus (GET /metrics на порту health-сервера).
+
+Гистограммы: скачивание, анализ (probe), fps рендера по эффектам, время
+кодирования, скорость выгрузки на Yandex Disk и в Telegram. Gauge: очередь
+рендеров, активные рендеры и процессы ffmpeg, файлы и свободное место на диске, RSS.
+Значения gauge с функцией считаются в момент запроса.
+Без зависимостей: клиентская библиотека Prometheus не нужна.
+"""
+
+import os
+import time
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+SECONDS_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+FPS_BUCKETS = (1, 2, 5, 10, 15, 20, 30, 45, 60, 90, 120, 200, 400)
+THROUGHPUT_BUCKETS = (64e3, 256e3, 512e3, 1e6, 2e6, 5e6, 10e6, 20e6, 50e6, 100e6)
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(labels: Sequence[Tuple[str, str]]) -> str:
+    if not labels:
+        return ''
+    escaped = [(name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+               for name, value in labels]
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+
+class _Metric:
+    kind = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name}: labels {sorted(labels)} != {list(self.labelnames)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = SECONDS_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        # labels -> [счетчики по корзинам, сумма, количество]
+        self._series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.setdefault(key, [[0] * len(self.buckets), 0.0, 0])
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def collect(self) -> List[str]:
+        lines = self._header()
+        with self._lock:
+            series = {key: (list(counts), total, count) for key, (counts, total, count) in self._series.items()}
+        for key, (counts, total, count) in sorted(series.items()):
+            labels = list(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{_format_labels(labels + [('le', _format_value(bound))])} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {count}")
+        return lines
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._function: Optional[Callable[[], float]] = None
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def set_function(self, function: Callable[[], float]):
+        """Значение вычисляется при каждом запросе /metrics (только без меток)"""
+        self._function = function
+
+    def collect(self) -> List[str]:
+        lines = self._header()
+        if self._function is not None:
+            try:
+                lines.append(f"{self.name} {_format_value(self._function())}")
+            except Exception:
+                pass  # Метрика, которую не удалось посчитать, просто пропускается
+            return lines
+        with self._lock:
+            values = dict(self._values)
+        for key, value in sorted(values.items()):
+            lines.append(f"{self.name}{_format_labels(list(zip(self.labelnames, key)))} {_format_value(value)}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Duplicate metric: {metric.name}")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = SECONDS_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return '\n'.join(line for metric in metrics for line in metric.collect()) + '\n'
+
+
+@contextmanager
+def timed(histogram: Histogram, **labels):
+    """Наблюдает длительность блока в секундах (в том числе при исключении)"""
+    start_time = time.perf_counter()
+    try:
+        yield
+    finally:
+        histogram.observe(time.perf_counter() - start_time, **labels)
+
+
+@contextmanager
+def throughput(histogram: Histogram, size_bytes: int, **labels):
+    """Наблюдает скорость передачи size_bytes за время блока, байт/с (только при успехе)"""
+    start_time = time.perf_counter()
+    yield
+    elapsed = time.perf_counter() - start_time
+    if size_bytes and elapsed > 0:
+        histogram.observe(size_bytes / elapsed, **labels)
+
+
+# ------------------------------------------------------------ состояние процесса
+
+def process_rss_bytes() -> float:
+    with open('/proc/self/statm', 'r') as f:
+        return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+
+def ffmpeg_process_count(parent_pid: Optional[int] = None) -> int:
+    """Процессы ffmpeg/ffprobe, запущенные этим процессом (по /proc/<pid>/stat)"""
+    parent_pid = parent_pid or os.getpid()
+    count = 0
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat', 'r') as f:
+                stat = f.read()
+        except OSError:
+            continue
+        # Формат: pid (comm) state ppid ...; comm может содержать пробелы
+        comm = stat[stat.find('(') + 1:stat.rfind(')')]
+        ppid = int(stat[stat.rfind(')') + 2:].split()[1])
+        if ppid == parent_pid and comm.startswith(('ffmpeg', 'ffprobe')):
+            count += 1
+    return count
+
+
+def directory_size_bytes(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass  # Файл удален во время обхода
+    return total
+
+
+REGISTRY = Registry()
+
+DOWNLOAD_SECONDS = REGISTRY.histogram(
+    'bot_download_seconds', 'Скачивание исходного видео из Telegram')
+PROBE_SECONDS = REGISTRY.histogram(
+    'bot_probe_seconds', 'Анализ видео (ffprobe/ffmpeg)')
+RENDER_FPS = REGISTRY.histogram(
+    'bot_render_fps', 'Скорость рендера эффекта, кадров/с', ('backend', 'effect'), FPS_BUCKETS)
+ENCODE_SECONDS = REGISTRY.histogram(
+    'bot_encode_seconds', 'Время кодирования: рендер варианта, сжатие, обрезка, разделение', ('kind',))
+UPLOAD_THROUGHPUT = REGISTRY.histogram(
+    'bot_upload_bytes_per_second', 'Скорость выгрузки результата', ('target',), THROUGHPUT_BUCKETS)
+
+RENDER_QUEUE_DEPTH = REGISTRY.gauge(
+    'bot_render_queue_depth', 'Варианты, ожидающие свободного потока рендера')
+ACTIVE_RENDERS = REGISTRY.gauge(
+    'bot_active_renders', 'Рендеры, выполняющиеся сейчас')
+FFMPEG_PROCESSES = REGISTRY.gauge(
+    'bot_ffmpeg_processes', 'Запущенные процессы ffmpeg/ffprobe')
+TEMP_DISK_BYTES = REGISTRY.gauge(
+    'bot_temp_disk_bytes', 'Размер результатов и временных файлов под учетом уборщика диска')
+DISK_FREE_BYTES = REGISTRY.gauge(
+    'bot_disk_free_bytes', 'Свободное место на диске с результатами')
+PROCESS_RSS_BYTES = REGISTRY.gauge(
+    'bot_process_rss_bytes', 'Resident set size процесса бота')
+
+FFMPEG_PROCESSES.set_function(ffmpeg_process_count)
+PROCESS_RSS_BYTES.set_function(process_rss_bytes)
@@ -8,13 +8,13 @@ import json
 import time
 import logging
 from datetime import datetime
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
 import requests
 from urllib.parse import urlparse
 import vk_api
-from vk_api.exceptions import VkApiError
 from dotenv import load_dotenv
 from google_sheets_integration import GoogleSheetsIntegration
+from incremental_poller import IncrementalPoller
 
 # Ładujemy zmienne środowiskowe z .env
 load_dotenv()
@@ -52,204 +52,160 @@ class OfficialAPIExtractor:
         else:
             logger.warning("Brak YouTube API key")
         
+        # Inkrementalny poller (kursory ostatnio widzianych postów)
+        self.poller = IncrementalPoller(self.vk_session, self.youtube_api_key, self.session)
+        
         # Inicjalizacja Google Sheets
         self.google_sheets = GoogleSheetsIntegration()
     
+    def _vk_clips_username(self, clips_url: str) -> Optional[str]:
+        """Wyciąga username z URL VK Clips"""
+        if '/clips/' in clips_url:
+            return clips_url.split('/clips/')[-1].split('/')[0]
+        return None
+    
+    def extract_vk_clips_views_batch(self, clips_urls: List[str], limit: int = 10) -> Dict[str, Dict[str, Any]]:
+        """Ekstraktuje wyświetlenia VK Clips dla wielu kont naraz (jedno execute na 25 kont)"""
+        results = {}
+        usernames = {}
+        for clips_url in clips_urls:
+            username = self._vk_clips_username(clips_url)
+            if username:
+                usernames[clips_url] = username
+            else:
+                results[clips_url] = {'error': 'Nieprawidłowy URL VK Clips'}
+        
+        if not usernames:
+            return results
+        
+        logger.info(f"Ekstraktowanie wyświetleń VK Clips: {len(usernames)} kont")
+        polled = self.poller.poll_vk(list(dict.fromkeys(usernames.values())))
+        
+        for clips_url, username in usernames.items():
+            data = polled.get(username, {'error': 'Brak odpowiedzi VK'})
+            if 'error' in data:
+                results[clips_url] = data
+                continue
+            
+            clips = data['clips'][:limit]
+            results[clips_url] = {
+                'platform': 'VK Clips',
+                'username': username,
+                'user_id': data['user_id'],
+                'user_name': data['user_name'],
+                'method': 'VK API',
+                'clips': clips,
+                'new_posts': data['new_posts'],
+                'total_views': sum(clip['views'] for clip in clips),
+                'clips_count': len(clips)
+            }
+        
+        return results
+    
     def extract_vk_clips_views(self, clips_url: str) -> Dict[str, Any]:
         """Ekstraktuje wyświetlenia z VK Clips używając VK API"""
         try:
             if not self.vk_session:
                 return {'error': 'VK API nie jest dostępny'}
             
-            logger.info(f"Ekstraktowanie wyświetleń VK Clips: {clips_url}")
-            
-            # Wyciągamy username z URL
-            if '/clips/' in clips_url:
-                username = clips_url.split('/clips/')[-1].split('/')[0]
-            else:
-                return {'error': 'Nieprawidłowy URL VK Clips'}
-            
-            vk = self.vk_session.get_api()
-            
-            # Szukamy użytkownika po username
-            try:
-                user_info = vk.users.get(user_ids=username, fields='counters')
-                if not user_info:
-                    return {'error': 'Nie znaleziono użytkownika VK'}
-                
-                user = user_info[0]
-                user_id = user['id']
-                
-                # Pobieramy posty użytkownika (ostatnie 10)
-                posts = vk.wall.get(owner_id=user_id, count=10, filter='owner')
-                
-                clips_data = {
-                    'platform': 'VK Clips',
-                    'username': username,
-                    'user_id': user_id,
-                    'user_name': f"{user.get('first_name', '')} {user.get('last_name', '')}".strip(),
-                    'method': 'VK API',
-                    'clips': []
-                }
-                
-                if posts.get('items'):
-                    for post in posts['items']:
-                        # Sprawdzamy czy to clip (ma video)
-                        if post.get('attachments'):
-                            for attachment in post['attachments']:
-                                if attachment['type'] == 'video':
-                                    video = attachment['video']
-                                    clip_info = {
-                                        'post_id': post['id'],
-                                        'video_id': video.get('id'),
-                                        'title': video.get('title', ''),
-                                        'description': video.get('description', ''),
-                                        'views': video.get('views', 0),
-                                        'duration': video.get('duration', 0),
-                                        'date': datetime.fromtimestamp(post['date']).strftime('%Y-%m-%d %H:%M:%S'),
-                                        'likes': post.get('likes', {}).get('count', 0),
-                                        'comments': post.get('comments', {}).get('count', 0),
-                                        'reposts': post.get('reposts', {}).get('count', 0)
-                                    }
-                                    clips_data['clips'].append(clip_info)
-                
-                # Sortujemy po dacie (najnowsze pierwsze)
-                clips_data['clips'].sort(key=lambda x: x['date'], reverse=True)
-                
-                # Dodajemy statystyki
-                total_views = sum(clip['views'] for clip in clips_data['clips'])
-                clips_data['total_views'] = total_views
-                clips_data['clips_count'] = len(clips_data['clips'])
-                
-                return clips_data
-                
-            except VkApiError as e:
-                return {'error': f'Błąd VK API: {e}'}
+            return self.extract_vk_clips_views_batch([clips_url])[clips_url]
                 
         except Exception as e:
             logger.error(f"Błąd VK Clips: {e}")
             return {'error': f'Błąd VK Clips: {str(e)}'}
     
-    def extract_youtube_views(self, channel_url: str) -> Dict[str, Any]:
-        """Ekstraktuje wyświetlenia z YouTube używając YouTube Data API"""
-        try:
-            if not self.youtube_api_key:
-                return {'error': 'Brak YouTube API key'}
-            
-            logger.info(f"Ekstraktowanie wyświetleń YouTube: {channel_url}")
-            
+    def extract_youtube_views_batch(self, channel_urls: List[str], limit: int = 10) -> Dict[str, Dict[str, Any]]:
+        """Ekstraktuje wyświetlenia YouTube dla wielu kanałów (wspólne videos.list po 50 id)"""
+        results = {}
+        usernames = {}
+        for channel_url in channel_urls:
             # Wyciągamy username z URL
             if '@' in channel_url:
-                username = channel_url.split('@')[-1].split('/')[0]
+                usernames[channel_url] = channel_url.split('@')[-1].split('/')[0]
             else:
-                return {'error': 'Nieprawidłowy URL YouTube'}
-            
-            # Szukamy kanału po username
-            search_url = "https://www.googleapis.com/youtube/v3/search"
-            params = {
-                'part': 'snippet',
-                'q': username,
-                'type': 'channel',
-                'key': self.youtube_api_key
-            }
-            
-            response = self.session.get(search_url, params=params)
-            if response.status_code != 200:
-                return {'error': f'Błąd YouTube API: {response.status_code}'}
-            
-            data = response.json()
-            if not data.get('items'):
-                return {'error': 'Nie znaleziono kanału YouTube'}
-            
-            channel_id = data['items'][0]['snippet']['channelId']
-            channel_title = data['items'][0]['snippet']['title']
-            
-            # Pobieramy ostatnie wideo z kanału
-            search_url = "https://www.googleapis.com/youtube/v3/search"
-            params = {
-                'part': 'snippet',
-                'channelId': channel_id,
-                'type': 'video',
-                'order': 'date',
-                'maxResults': 10,
-                'key': self.youtube_api_key
-            }
-            
-            response = self.session.get(search_url, params=params)
-            if response.status_code != 200:
-                return {'error': f'Błąd pobierania wideo: {response.status_code}'}
-            
-            videos_data = response.json()
-            if not videos_data.get('items'):
-                return {'error': 'Brak wideo na kanale'}
-            
-            # Pobieramy statystyki dla każdego wideo
-            video_ids = [video['id']['videoId'] for video in videos_data['items']]
-            
-            stats_url = "https://www.googleapis.com/youtube/v3/videos"
-            params = {
-                'part': 'statistics,snippet',
-                'id': ','.join(video_ids),
-                'key': self.youtube_api_key
-            }
-            
-            stats_response = self.session.get(stats_url, params=params)
-            if stats_response.status_code != 200:
-                return {'error': f'Błąd pobierania statystyk: {stats_response.status_code}'}
+                results[channel_url] = {'error': 'Nieprawidłowy URL YouTube'}
+        
+        if not usernames:
+            return results
+        
+        logger.info(f"Ekstraktowanie wyświetleń YouTube: {len(usernames)} kanałów")
+        
+        # Tylko nowe wideo + okno świeżych (kursor w poll_cursors.json)
+        polled = self.poller.poll_youtube_batch(list(dict.fromkeys(usernames.values())))
+        
+        for channel_url, username in usernames.items():
+            data = polled.get(username, {'error': 'Brak odpowiedzi YouTube'})
+            if 'error' in data:
+                results[channel_url] = data
+                continue
             
-            stats_data = stats_response.json()
+            if not data['videos']:
+                results[channel_url] = {'error': 'Brak wideo na kanale'}
+                continue
             
-            videos_info = {
+            videos = data['videos'][:limit]
+            results[channel_url] = {
                 'platform': 'YouTube',
-                'channel_id': channel_id,
-                'channel_title': channel_title,
+                'channel_id': data['channel_id'],
+                'channel_title': data['channel_title'],
                 'username': username,
                 'method': 'YouTube Data API',
-                'videos': []
+                'videos': videos,
+                'new_videos': data['new_videos'],
+                'total_views': sum(video['views'] for video in videos),
+                'videos_count': len(videos)
             }
+        
+        return results
+    
+    def extract_youtube_views(self, channel_url: str) -> Dict[str, Any]:
+        """Ekstraktuje wyświetlenia z YouTube używając YouTube Data API"""
+        try:
+            if not self.youtube_api_key:
+                return {'error': 'Brak YouTube API key'}
             
-            for video in stats_data.get('items', []):
-                statistics = video.get('statistics', {})
-                snippet = video.get('snippet', {})
-                
-                video_info = {
-                    'video_id': video['id'],
-                    'title': snippet.get('title', ''),
-                    'description': snippet.get('description', '')[:200] + '...' if snippet.get('description') and len(snippet.get('description', '')) > 200 else snippet.get('description', ''),
-                    'views': int(statistics.get('viewCount', 0)),
-                    'likes': int(statistics.get('likeCount', 0)),
-                    'comments': int(statistics.get('commentCount', 0)),
-                    'date': snippet.get('publishedAt', ''),
-                    'duration': snippet.get('duration', ''),
-                    'url': f"https://www.youtube.com/watch?v={video['id']}"
-                }
-                videos_info['videos'].append(video_info)
-            
-            # Sortujemy po dacie (najnowsze pierwsze)
-            videos_info['videos'].sort(key=lambda x: x['date'], reverse=True)
-            
-            # Dodajemy statystyki
-            total_views = sum(video['views'] for video in videos_info['videos'])
-            videos_info['total_views'] = total_views
-            videos_info['videos_count'] = len(videos_info['videos'])
-            
-            return videos_info
+            return self.extract_youtube_views_batch([channel_url])[channel_url]
             
         except Exception as e:
             logger.error(f"Błąd YouTube: {e}")
             return {'error': f'Błąd YouTube: {str(e)}'}
     
+    def youtube_quota_metrics(self) -> Dict[str, Any]:
+        """Zużycie quota YouTube Data API w bieżącym dniu"""
+        if not self.poller.youtube:
+            return {}
+        return self.poller.youtube.metrics()
+    
     def extract_all_views(self, urls: Dict[str, str]) -> Dict[str, Any]:
         """Ekstraktuje wyświetlenia ze wszystkich platform"""
         results = {}
         
+        # VK Clips i YouTube: wszystkie konta danej platformy jednym batchem
+        batch_extractors = {
+            'vk_clips': self.extract_vk_clips_views_batch,
+            'youtube': self.extract_youtube_views_batch if self.youtube_api_key else None
+        }
+        for platform_key, extract_batch in batch_extractors.items():
+            grouped = {platform: url for platform, url in urls.items() if platform.lower() == platform_key}
+            if not grouped or not extract_batch:
+                continue
+            try:
+                batch_results = extract_batch(list(grouped.values()))
+                for platform, url in grouped.items():
+                    results[platform] = batch_results[url]
+            except Exception as e:
+                logger.error(f"Błąd ekstraktowania {platform_key}: {e}")
+                for platform in grouped:
+                    results[platform] = {'error': str(e)}
+        
         for platform, url in urls.items():
+            if platform in results:
+                continue
+            
             logger.info(f"Ekstraktowanie wyświetleń {platform}: {url}")
             
             try:
-                if platform.lower() == 'vk_clips':
-                    results[platform] = self.extract_vk_clips_views(url)
-                elif platform.lower() == 'youtube':
+                if platform.lower() == 'youtube':
                     results[platform] = self.extract_youtube_views(url)
                 else:
                     results[platform] = {'error': f'Nieznana platforma: {platform}'}
@@ -321,6 +277,13 @@ def main():
     
     print(f"\n💾 Wyniki zapisane do: {filename}")
     
+    # Zużycie quota YouTube
+    quota = extractor.youtube_quota_metrics()
+    if quota:
+        print(f"\n📉 YouTube quota: {quota['units_used']} jednostek ({quota['units_remaining']} pozostało)")
+        for call_type, units in quota['units_by_call'].items():
+            print(f"   {call_type}: {units} jedn. / {quota['calls_by_call'][call_type]} wywołań")
+    
     # Zapisujemy do Google Sheets
     print("\n📊 Zapisujemy do Google Sheets...")
     try:
@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+Silnik ekstrakcji danych ze scrapowanych stron.
+
+Wszystkie wzorce są kompilowane raz przy imporcie modułu (per platforma).
+Strona jest raz obniżana do małych liter; wzorce z literałem pomijane są,
+gdy literału brak, a drogie ogólne wzorce `<liczba> followers` szukają
+słowa zamiast próbować dopasowania na każdej cyfrze.
+"""
+
+import re
+import logging
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Wzorce dla każdej platformy; kolejność w liście = priorytet
+PLATFORM_PATTERNS: Dict[str, Dict[str, List[str]]] = {
+    'youtube': {
+        'subscribers': [
+            r'"subscriberCountText":\{"simpleText":"([^"]+)"',
+            r'"subscriberCountText":\{"runs":\[.*?"text":"([^"]+)"',
+            r'subscriberCount["\']:\s*["\']([^"\']+)["\']',
+            r'(\d+(?:\.\d+)?[KMB]?)\s*subscribers?'
+        ],
+        'views': [
+            r'"viewCountText":\{"simpleText":"([^"]+)"',
+            r'viewCount["\']:\s*["\']([^"\']+)["\']',
+            r'(\d+(?:\.\d+)?[KMB]?)\s*views?'
+        ]
+    },
+    'instagram': {
+        'followers': [
+            r'"edge_followed_by":\{"count":(\d+)\}',
+            r'"follower_count":(\d+)',
+            r'(\d+(?:\.\d+)?[KMB]?)\s*followers?'
+        ],
+        'following': [
+            r'"edge_follow":\{"count":(\d+)\}',
+            r'"following_count":(\d+)',
+            r'(\d+(?:\.\d+)?[KMB]?)\s*following'
+        ],
+        'posts': [
+            r'"edge_owner_to_timeline_media":\{"count":(\d+)\}',
+            r'"media_count":(\d+)',
+            r'(\d+(?:\.\d+)?[KMB]?)\s*posts?'
+        ]
+    },
+    'tiktok': {
+        'followers': [
+            r'"followerCount":(\d+)',
+            r'"fans":(\d+)',
+            r'(\d+(?:\.\d+)?[KMB]?)\s*followers?'
+        ],
+        'following': [
+            r'"followingCount":(\d+)',
+            r'"follow":(\d+)',
+            r'(\d+(?:\.\d+)?[KMB]?)\s*following'
+        ],
+        'likes': [
+            r'"heartCount":(\d+)',
+            r'"likes":(\d+)',
+            r'(\d+(?:\.\d+)?[KMB]?)\s*likes?'
+        ]
+    },
+    'vk': {
+        'followers': [
+            r'"followers_count":(\d+)',
+            r'(\d+(?:\.\d+)?[KMB]?)\s*followers?'
+        ],
+        'friends': [
+            r'"friends_count":(\d+)',
+            r'(\d+(?:\.\d+)?[KMB]?)\s*friends?'
+        ]
+    },
+    'likee': {
+        'followers': [
+            r'"fans":(\d+)',
+            r'"followerCount":(\d+)',
+            r'(\d+(?:\.\d+)?[KMB]?)\s*followers?'
+        ],
+        'following': [
+            r'"follow":(\d+)',
+            r'"followingCount":(\d+)',
+            r'(\d+(?:\.\d+)?[KMB]?)\s*following'
+        ]
+    }
+}
+
+_NUMBER_RE = re.compile(r'[\d.]+')
+_MULTIPLIERS = (('K', 1000), ('M', 1000000), ('B', 1000000000))
+
+
+def parse_number(text: str) -> int:
+    """Parsowanie liczb z tekstu (np. '1.2M' -> 1200000)"""
+    if not text:
+        return 0
+
+    text = text.replace(',', '').replace(' ', '').replace('"', '')
+    numbers = _NUMBER_RE.findall(text)
+    if not numbers:
+        return 0
+
+    try:
+        upper = text.upper()
+        for suffix, multiplier in _MULTIPLIERS:
+            if suffix in upper:
+                return int(float(numbers[0]) * multiplier)
+        return int(float(numbers[0]))
+    except ValueError:
+        return 0
+
+
+# Ogólny wzorzec "<liczba> <słowo>" - najdroższy, bo pasuje w każdym miejscu z cyfrą
+GENERIC_PREFIX = r'(\d+(?:\.\d+)?[KMB]?)\s*'
+_GENERIC_SUFFIX_RE = re.compile(r'^[A-Za-z]+\??$')
+_NUMBER_BEFORE_RE = re.compile(r'(\d+(?:\.\d+)?[kmb]?)\s*\Z')
+_LOOKBEHIND = 256
+
+
+def _literal_anchor(pattern: str) -> str:
+    """Najdłuższy fragment literalny, który musi wystąpić w dopasowaniu"""
+    if '|' in pattern:
+        return ''
+
+    best = ''
+    run = ''
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        if char == '\\':
+            escaped = pattern[i + 1:i + 2]
+            if escaped and not escaped.isalnum():
+                run += escaped
+            else:
+                best, run = max(best, run, key=len), ''
+            i += 2
+            continue
+        if char in '?*{':
+            # Poprzedni znak jest opcjonalny
+            run = run[:-1]
+            best, run = max(best, run, key=len), ''
+            if char == '{':
+                i = pattern.index('}', i)
+        elif char in '[(':
+            best, run = max(best, run, key=len), ''
+            # Pomijamy całą klasę znaków / grupę
+            closing = ']' if char == '[' else ')'
+            depth = 0
+            while i < len(pattern):
+                if pattern[i] == '\\':
+                    i += 2
+                    continue
+                if pattern[i] == char:
+                    depth += 1
+                elif pattern[i] == closing:
+                    depth -= 1
+                    if depth == 0:
+                        break
+                i += 1
+        elif char in '.^$+)':
+            best, run = max(best, run, key=len), ''
+        else:
+            run += char
+        i += 1
+
+    return max(best, run, key=len).lower()
+
+
+class FieldExtractor:
+    """Skompilowany zestaw wzorców dla pól jednej platformy.
+
+    Wzorce są kompilowane raz. Wzorce z literałem (np. `"followerCount":`)
+    uruchamiane są tylko, gdy literał występuje na stronie (sprawdzenie
+    na raz obniżonej kopii tekstu). Ogólne wzorce `<liczba> <słowo>` nie
+    próbują dopasowania na każdej cyfrze strony - szukamy słowa i sprawdzamy
+    liczbę tuż przed nim. Dla każdego pola wygrywa pierwszy pasujący wzorzec
+    z listy, tak samo jak przy kolejnych `re.search`.
+    """
+
+    def __init__(self, fields: Dict[str, Sequence[str]], flags: int = re.IGNORECASE):
+        self.fields = list(fields)
+        # pole -> lista kroków: ('regex', skompilowany, literał) lub ('generic', None, '')
+        self._steps: Dict[str, List[Tuple[str, Optional[re.Pattern], str]]] = {}
+        generic_suffixes: List[Tuple[str, str]] = []
+
+        for field, patterns in fields.items():
+            steps = []
+            for pattern in patterns:
+                suffix = pattern[len(GENERIC_PREFIX):] if pattern.startswith(GENERIC_PREFIX) else None
+                if suffix is not None and _GENERIC_SUFFIX_RE.match(suffix) \
+                        and field not in dict(generic_suffixes):
+                    generic_suffixes.append((field, suffix))
+                    steps.append(('generic', None, ''))
+                    continue
+                # Błędny wzorzec odpada sam, pozostałe działają dalej (jak w pętli z try/except)
+                try:
+                    compiled = re.compile(pattern, flags)
+                except re.error as e:
+                    logger.warning(f"Pomijam błędny wzorzec {pattern!r}: {e}")
+                    continue
+                if not compiled.groups:
+                    logger.warning(f"Pomijam wzorzec bez grupy: {pattern!r}")
+                    continue
+                steps.append(('regex', compiled, _literal_anchor(pattern)))
+            self._steps[field] = steps
+
+        # pole -> obowiązkowy literał słowa (np. 'follower' dla 'followers?')
+        self._generic = {field: _literal_anchor(suffix) for field, suffix in generic_suffixes}
+
+    def _search_generic(self, lowered: str, field: str) -> Optional[str]:
+        """Ogólny wzorzec: szybkie wyszukiwanie słowa jako literału, a liczbę
+        sprawdzamy tylko w krótkim oknie przed nim (bez regexa na każdej cyfrze)"""
+        word = self._generic[field]
+        start = 0
+        while True:
+            pos = lowered.find(word, start)
+            if pos < 0:
+                return None
+            match = _NUMBER_BEFORE_RE.search(lowered, max(0, pos - _LOOKBEHIND), pos)
+            if match:
+                return match.group(1)
+            start = pos + 1
+
+    def search(self, content: str) -> Dict[str, Optional[str]]:
+        """Zwraca surowy tekst najlepszego dopasowania dla każdego pola"""
+        result: Dict[str, Optional[str]] = {field: None for field in self.fields}
+        if not content:
+            return result
+
+        # Jedna obniżona kopia strony na wszystkie pola
+        lowered = content.lower()
+        for field, steps in self._steps.items():
+            for kind, compiled, anchor in steps:
+                if kind == 'generic':
+                    raw = self._search_generic(lowered, field)
+                    if raw:
+                        result[field] = raw
+                        break
+                    continue
+
+                if anchor and anchor not in lowered:
+                    continue
+                match = compiled.search(content)
+                # Pusta pierwsza grupa (opcjonalna) - jak wcześniej, próbujemy następny wzorzec
+                if match and match.group(1) is not None:
+                    result[field] = match.group(1)
+                    break
+
+        return result
+
+    def extract(self, content: str) -> Dict[str, int]:
+        """Zwraca sparsowane liczby dla każdego pola (0 gdy brak)"""
+        return {field: parse_number(raw) if raw else 0
+                for field, raw in self.search(content).items()}
+
+
+# Kompilacja przy imporcie
+PLATFORM_EXTRACTORS: Dict[str, FieldExtractor] = {
+    platform: FieldExtractor(fields) for platform, fields in PLATFORM_PATTERNS.items()
+}
+
+
+def extract_fields(platform: str, content: str) -> Dict[str, int]:
+    """Wyciąganie wszystkich pól platformy skompilowanymi wzorcami"""
+    return PLATFORM_EXTRACTORS[platform.lower()].extract(content)
+
+
+@lru_cache(maxsize=128)
+def _compiled_for(patterns: Tuple[str, ...]) -> FieldExtractor:
+    return FieldExtractor({'value': patterns})
+
+
+def extract_with_patterns(content: str, patterns: Sequence[str]) -> int:
+    """Zamiennik dla pętli po liście wzorców (kompilacja raz na listę, błędne wzorce pomijane)"""
+    return _compiled_for(tuple(patterns)).extract(content)['value']
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Профилировщик по запросу: сэмплирование стеков всех потоков процесса
+(бот, потоки рендера, fan-out) на заданное число секунд.
+
+Запуск: команда менеджера `/profile <секунды>` или GET /profile?seconds=N на
+health-сервере. Пока захват не запущен, потока сэмплера нет - накладных
+расходов тоже. Результат - collapsed stacks (`поток;файл:функция;... N`) для
+flamegraph.pl, speedscope, inferno; файл пишется в PROFILE_DIR и в папки
+запусков задач, выполнявшихся во время захвата (рядом с run_summary.json).
+"""
+
+import os
+import sys
+import time
+import logging
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import tracing
+
+logger = logging.getLogger(__name__)
+
+PROFILE_DIR = os.getenv('PROFILE_DIR', 'profiles')
+PROFILE_INTERVAL_MS = float(os.getenv('PROFILE_INTERVAL_MS', '10'))
+MAX_PROFILE_SECONDS = 300
+
+# Верхние кадры простаивающих потоков (ожидание задач, event loop) - не интересны в сводке
+IDLE_FRAMES = ('threading.py:wait', 'selectors.py:select', 'socketserver.py:serve_forever')
+
+_capture_lock = threading.Lock()
+
+
+def _fold(frame, thread_name: str) -> str:
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+        frame = frame.f_back
+    names.append(thread_name)
+    # Точка с запятой - разделитель кадров в формате collapsed
+    return ';'.join(name.replace(';', ':') for name in reversed(names))
+
+
+class StackSampler:
+    """Поток, который раз в interval секунд снимает стеки всех остальных потоков"""
+
+    def __init__(self, interval: float = PROFILE_INTERVAL_MS / 1000):
+        self.interval = interval
+        self.counts: Dict[str, int] = {}
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _run(self):
+        own_ident = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own_ident:
+                    continue
+                stack = _fold(frame, names.get(ident, f"thread-{ident}"))
+                self.counts[stack] = self.counts.get(stack, 0) + 1
+            self.samples += 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def collapsed(self) -> str:
+        return ''.join(f"{stack} {count}\n" for stack, count in sorted(self.counts.items()))
+
+    def top_frames(self, limit: int = 10) -> List[Tuple[str, int]]:
+        """Самые частые верхние кадры (где потоки проводят время), без ожидающих потоков"""
+        leaves: Dict[str, int] = {}
+        for stack, count in self.counts.items():
+            leaf = stack.rsplit(';', 1)[-1]
+            if leaf in IDLE_FRAMES:
+                continue
+            leaves[leaf] = leaves.get(leaf, 0) + count
+        return sorted(leaves.items(), key=lambda item: -item[1])[:limit]
+
+
+def capture(seconds: float, output_dir: Optional[str] = None,
+            interval: float = PROFILE_INTERVAL_MS / 1000) -> Dict[str, Any]:
+    """
+    Снимает профиль за seconds секунд (блокирует вызывающий поток).
+    Одновременно идет только один захват; иначе возвращается {'error': ...}
+    """
+    seconds = min(max(float(seconds), 0.1), MAX_PROFILE_SECONDS)
+    if not _capture_lock.acquire(blocking=False):
+        return {'error': 'Профилирование уже запущено'}
+    try:
+        run_dirs = set(tracing.active_run_dirs())
+        logger.info(f"🔬 Профилирование {seconds:.1f}s (шаг {interval * 1000:.0f} мс)")
+        sampler = StackSampler(interval)
+        start_time = time.time()
+        sampler.start()
+        try:
+            time.sleep(seconds)
+        finally:
+            sampler.stop()
+        run_dirs.update(tracing.active_run_dirs())
+
+        collapsed = sampler.collapsed()
+        filename = f"profile_{datetime.now().strftime('%Y%m%d_%H%M%S')}.folded"
+        paths = []
+        for directory in [Path(output_dir or PROFILE_DIR)] + sorted(run_dirs):
+            try:
+                directory.mkdir(parents=True, exist_ok=True)
+                (directory / filename).write_text(collapsed, encoding='utf-8')
+                paths.append(str(directory / filename))
+            except OSError as e:
+                logger.warning(f"⚠️ Профиль не записан в {directory}: {e}")
+
+        result = {
+            'path': paths[0] if paths else None,
+            'paths': paths,
+            'seconds': round(time.time() - start_time, 2),
+            'samples': sampler.samples,
+            'stacks': len(sampler.counts),
+            'top': sampler.top_frames(),
+            'collapsed': collapsed,
+        }
+        logger.info(f"✅ Профиль: {result['samples']} сэмплов, {result['stacks']} стеков -> {paths}")
+        return result
+    finally:
+        _capture_lock.release()
+
+
+def is_running() -> bool:
+    return _capture_lock.locked()
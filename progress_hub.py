@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Progress hub for WebSocket clients.
+
+Producers (render threads, upload coroutines) call publish() from any thread.
+Updates are coalesced per job on the producer side, flushed on the bot event
+loop at most max_rate times per second and delivered through bounded
+per-client queues, so a slow client only ever loses stale frames.
+"""
+
+import json
+import time
+import asyncio
+import logging
+import threading
+from typing import Any, Dict, Optional, Set
+
+import websockets
+
+logger = logging.getLogger(__name__)
+
+
+def user_topic(user_id) -> str:
+    """Topic used by clients subscribed by user_id (websocket_client.html)"""
+    return f"user:{user_id}"
+
+
+class ProgressClient:
+    """One WebSocket connection with a bounded send queue"""
+
+    def __init__(self, websocket, queue_size: int = 8):
+        self.websocket = websocket
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.topics: Set[str] = set()
+        self.dropped = 0
+        self.sender: Optional[asyncio.Task] = None
+
+    def offer(self, frame: str):
+        """Queue a frame; when full, the oldest (stale) frame is dropped"""
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(frame)
+
+    async def run_sender(self, on_closed):
+        try:
+            while True:
+                frame = await self.queue.get()
+                await self.websocket.send(frame)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.info(f"📡 WebSocket client dropped: {e}")
+            on_closed(self)
+
+
+class ProgressHub:
+    """Coalescing progress broadcaster bound to the bot event loop"""
+
+    def __init__(self, max_rate: float = 4.0, queue_size: int = 8):
+        self.min_interval = 1.0 / max_rate if max_rate > 0 else 0.0
+        self.queue_size = queue_size
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+
+        # job_id -> latest payload not yet flushed (written from any thread)
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._scheduled: Set[str] = set()
+        self._lock = threading.Lock()
+
+        # Loop-only state
+        self._last_sent: Dict[str, float] = {}
+        self._latest: Dict[str, tuple] = {}  # job_id -> (topics, frame)
+        self._clients: Set[ProgressClient] = set()
+        self._by_websocket: Dict[Any, ProgressClient] = {}
+
+    def attach(self, loop: Optional[asyncio.AbstractEventLoop] = None):
+        """Bind to the running bot loop (call from post_init)"""
+        self.loop = loop or asyncio.get_running_loop()
+
+    # ------------------------------------------------------------ producers
+
+    def publish(self, job_id, payload: Dict[str, Any]):
+        """Thread-safe: keep only the newest payload per job until it is flushed"""
+        job_id = str(job_id)
+        with self._lock:
+            self._pending[job_id] = payload
+            if job_id in self._scheduled or self.loop is None:
+                return
+            self._scheduled.add(job_id)
+        try:
+            self.loop.call_soon_threadsafe(self._flush_job, job_id)
+        except RuntimeError:
+            # Loop closed (shutdown) - nothing to deliver to
+            with self._lock:
+                self._scheduled.discard(job_id)
+
+    def finish(self, job_id):
+        """Forget per-job state once the job is done"""
+        job_id = str(job_id)
+        if self.loop is None:
+            with self._lock:
+                self._pending.pop(job_id, None)
+            return
+        self.loop.call_soon_threadsafe(self._forget, job_id)
+
+    # ------------------------------------------------------------ loop side
+
+    def _flush_job(self, job_id: str):
+        wait = self._last_sent.get(job_id, 0.0) + self.min_interval - time.monotonic()
+        if wait > 0:
+            self.loop.call_later(wait, self._flush_job, job_id)
+            return
+
+        with self._lock:
+            payload = self._pending.pop(job_id, None)
+            self._scheduled.discard(job_id)
+        if payload is None:
+            return
+
+        self._last_sent[job_id] = time.monotonic()
+        frame = json.dumps(dict(payload, job_id=job_id), ensure_ascii=False)
+        topics = {job_id}
+        if payload.get('user_id') is not None:
+            topics.add(user_topic(payload['user_id']))
+        self._latest[job_id] = (topics, frame)
+        for client in list(self._clients):
+            if client.topics & topics:
+                client.offer(frame)
+
+    def _forget(self, job_id: str):
+        # A final update may still be pending - deliver it first
+        with self._lock:
+            pending = job_id in self._pending
+        if pending:
+            self.loop.call_later(self.min_interval, self._forget, job_id)
+            return
+        self._last_sent.pop(job_id, None)
+        self._latest.pop(job_id, None)
+
+    def subscribe(self, websocket, topic: str):
+        client = self._by_websocket.get(websocket)
+        if client is None:
+            client = self.add_client(websocket)
+        client.topics.add(topic)
+        # Send the current state straight away instead of waiting for the next update
+        for topics, frame in self._latest.values():
+            if topic in topics:
+                client.offer(frame)
+
+    def add_client(self, websocket) -> ProgressClient:
+        client = ProgressClient(websocket, self.queue_size)
+        self._clients.add(client)
+        self._by_websocket[websocket] = client
+        client.sender = asyncio.get_running_loop().create_task(client.run_sender(self._drop_client))
+        return client
+
+    def _drop_client(self, client: ProgressClient):
+        self._clients.discard(client)
+        self._by_websocket.pop(client.websocket, None)
+
+    def remove_client(self, websocket):
+        client = self._by_websocket.get(websocket)
+        if client:
+            self._drop_client(client)
+            if client.sender and client.sender is not asyncio.current_task():
+                client.sender.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'clients': len(self._clients),
+            'jobs': len(self._latest),
+            'dropped_frames': sum(client.dropped for client in self._clients)
+        }
+
+    async def handle_connection(self, websocket, path=None):
+        """websockets.serve handler: subscribe by user_id or job_id"""
+        self.add_client(websocket)
+        try:
+            async for message in websocket:
+                try:
+                    data = json.loads(message)
+                except ValueError:
+                    continue
+                if data.get("type") == "subscribe_progress" and data.get("user_id") is not None:
+                    self.subscribe(websocket, user_topic(data["user_id"]))
+                    logger.info(f"📡 WebSocket client subscribed to user {data['user_id']}")
+                elif data.get("type") == "subscribe_job" and data.get("job_id"):
+                    self.subscribe(websocket, str(data["job_id"]))
+                    logger.info(f"📡 WebSocket client subscribed to job {data['job_id']}")
+        except websockets.exceptions.ConnectionClosed:
+            pass
+        except Exception as e:
+            logger.error(f"❌ WebSocket error: {e}")
+        finally:
+            self.remove_client(websocket)
@@ -18,6 +18,8 @@ import urllib3
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 
+from page_extractor import extract_with_patterns, parse_number
+
 # Wyłączanie ostrzeżeń SSL
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
@@ -730,40 +732,12 @@ class RobustSocialStatsChecker:
         return None
     
     def _extract_with_patterns(self, content: str, patterns: List[str]) -> int:
-        """Wyciąganie danych z różnych wzorców"""
-        for pattern in patterns:
-            try:
-                match = re.search(pattern, content, re.IGNORECASE)
-                if match:
-                    return self._parse_number(match.group(1))
-            except Exception:
-                continue
-        return 0
+        """Wyciąganie danych z różnych wzorców (jeden przebieg, wzorce kompilowane raz)"""
+        return extract_with_patterns(content, patterns)
     
     def _parse_number(self, text: str) -> int:
         """Parsowanie liczb z tekstu (np. '1.2M' -> 1200000)"""
-        if not text:
-            return 0
-        
-        text = text.replace(',', '').replace(' ', '').replace('"', '')
-        
-        multipliers = {
-            'K': 1000,
-            'M': 1000000,
-            'B': 1000000000
-        }
-        
-        for suffix, multiplier in multipliers.items():
-            if suffix in text.upper():
-                number = float(re.findall(r'[\d.]+', text)[0])
-                return int(number * multiplier)
-        
-        # Jeśli nie ma sufiksu, spróbuj wyciągnąć liczbę
-        numbers = re.findall(r'[\d.]+', text)
-        if numbers:
-            return int(float(numbers[0]))
-        
-        return 0
+        return parse_number(text)
     
     def check_all_stats(self, urls: Dict[str, str]) -> Dict[str, Any]:
         """Sprawdzanie statystyk na wszystkich platformach"""
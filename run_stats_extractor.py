@@ -1,6 +1,9 @@
 #!/usr/bin/env python3
 """
 Automatyczne uruchamianie ekstraktora statystyk
+
+    python run_stats_extractor.py            # jednorazowy przebieg
+    python run_stats_extractor.py --daemon   # harmonogram (stats_scheduler.py)
 """
 
 import os
@@ -74,6 +77,15 @@ def run_extractor():
         print(f"❌ Błąd uruchamiania: {e}")
         return False
 
+def run_scheduler():
+    """Uruchamia demon harmonogramu zamiast jednorazowego przebiegu"""
+    print("\n⏰ URUCHAMIANIE HARMONOGRAMU")
+    print("=" * 30)
+    
+    from stats_scheduler import main as scheduler_main
+    scheduler_main()
+    return True
+
 def main():
     """Główna funkcja"""
     print("🎬 AUTOMATYCZNY EKSTRAKTOR STATYSTYK")
@@ -93,6 +105,11 @@ def main():
         print("📋 Wykonaj kroki z GOOGLE_CLOUD_SETUP_GUIDE.md")
         return
     
+    # Tryb demona: harmonogram z adaptacyjnymi interwałami
+    if "--daemon" in sys.argv:
+        run_scheduler()
+        return
+    
     # Uruchamiamy ekstraktor
     if run_extractor():
         print("\n🎉 WSZYSTKO ZAKOŃCZONE POMYŚLNIE!")
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+Smart cut: покадрово точная обрезка почти со скоростью копирования.
+
+`-ss/-t` с `-c copy` режет по ключевым кадрам (замерзшие/черные кадры в начале),
+а полное перекодирование медленное. Здесь перекодируются только неполные GOP
+на границах, середина копируется:
+
+    start      k_in                    k_out      end
+      |--encode--|-------- copy ---------|--encode--|
+
+Все сегменты проходят через h264_mp4toannexb: SPS/PPS остаются в потоке у каждого
+ключевого кадра, поэтому части склеиваются concat без перекодирования. Края
+кодируются в формат исходника (профиль, уровень, pix_fmt, частота кадров и
+timebase кодера), иначе декодер посреди потока получает SPS другого профиля.
+Если формат не повторить (не H.264, чересстрочная развертка, профиль или pix_fmt,
+которых нет у libx264), весь отрезок перекодируется целиком.
+Целые GOP режет segment muxer - ровно по границе пакетов перед ключевым кадром
+(у `-t` с копированием в хвост попадают лишние B-кадры).
+Аудио копируется из исходника одним куском.
+"""
+
+import os
+import re
+import shutil
+import logging
+import tempfile
+import subprocess
+from fractions import Fraction
+from functools import lru_cache
+from typing import List, Optional, Tuple
+
+from ffmpeg_utils import FFMPEG_BIN, run_ffmpeg, probe_video, keyframe_times, audio_codec_args
+import tracing
+from thread_governor import ffmpeg_thread_args
+
+logger = logging.getLogger(__name__)
+
+# Перекодированные края должны быть визуально неотличимы от скопированной середины
+EDGE_ENCODER_ARGS = ['-c:v', 'libx264', '-preset', 'fast', '-crf', '18']
+
+# Профиль H.264 (как его называет ffprobe) -> -profile:v libx264
+X264_PROFILES = {
+    'Constrained Baseline': 'baseline',
+    'Baseline': 'baseline',
+    'Main': 'main',
+    'High': 'high',
+    'High 10': 'high10',
+    'High 4:2:2': 'high422',
+    'High 4:4:4 Predictive': 'high444',
+}
+
+# Допуск при сравнении времени реза с ключевым кадром
+EPSILON = 0.001
+
+
+def plan_segments(keyframes: List[float], start: float, end: float) -> List[Tuple[str, float, float]]:
+    """[(mode, start, end)]: mode - 'encode' для неполных GOP, 'copy' для целых"""
+    k_in = next((k for k in keyframes if k >= start - EPSILON), None)
+    k_out = next((k for k in reversed(keyframes) if k <= end + EPSILON), None)
+    if k_in is None or k_out is None or k_out - k_in < EPSILON:
+        # Между точками реза нет целого GOP
+        return [('encode', start, end)]
+
+    segments = []
+    if k_in - start > EPSILON:
+        segments.append(('encode', start, k_in))
+    segments.append(('copy', k_in, k_out))
+    if end - k_out > EPSILON:
+        segments.append(('encode', k_out, end))
+    return segments
+
+
+@lru_cache(maxsize=1)
+def _x264_pix_fmts() -> Tuple[str, ...]:
+    """pix_fmt, которые принимает libx264 в этой сборке ffmpeg"""
+    result = subprocess.run([FFMPEG_BIN, '-hide_banner', '-h', 'encoder=libx264'], capture_output=True, text=True)
+    match = re.search(r'Supported pixel formats:\s*(.*)', result.stdout)
+    return tuple(match.group(1).split()) if match else ()
+
+
+def _sps_level(input_path: str) -> Optional[int]:
+    """level_idc из SPS первого кадра (без ffprobe уровень больше неоткуда взять)"""
+    result = subprocess.run([FFMPEG_BIN, '-v', 'error', '-i', input_path, '-map', '0:v:0', '-c:v', 'copy',
+                             '-bsf:v', 'h264_mp4toannexb', '-frames:v', '1', '-f', 'h264', '-'],
+                            capture_output=True)
+    data = result.stdout
+    pos = data.find(b'\x00\x00\x01')
+    while pos != -1 and pos + 6 < len(data):
+        if data[pos + 3] & 0x1f == 7:
+            # NAL SPS: profile_idc, constraint flags, level_idc
+            return data[pos + 6] or None
+        pos = data.find(b'\x00\x00\x01', pos + 3)
+    return None
+
+
+def _frame_rate(info: dict) -> Optional[Fraction]:
+    """Частота кадров исходника как дробь (29.97 -> 30000/1001)"""
+    if info.get('frame_rate') and info['frame_rate'] != '0/0':
+        return Fraction(info['frame_rate'])
+    if not info['fps']:
+        return None
+    ntsc = info['fps'] * 1.001
+    if abs(ntsc - round(ntsc)) < 0.01 and abs(info['fps'] - round(info['fps'])) >= 0.01:
+        return Fraction(round(ntsc) * 1000, 1001)
+    return Fraction(info['fps']).limit_denominator(1001)
+
+
+def edge_encoder_args(input_path: str, info: dict) -> Optional[List[str]]:
+    """
+    Аргументы libx264 для краев в формате исходника; None - формат не повторить,
+    и отрезок нужно перекодировать целиком
+    """
+    profile = X264_PROFILES.get(info.get('profile'))
+    if info['video_codec'] != 'h264' or profile is None:
+        return None
+    if info.get('pix_fmt') not in _x264_pix_fmts() or info.get('field_order') not in ('progressive', None):
+        return None
+    level = info.get('level') or _sps_level(input_path)
+    rate = _frame_rate(info)
+    if not level or rate is None:
+        return None
+    return EDGE_ENCODER_ARGS + ['-profile:v', profile, '-level:v', '1b' if level == 9 else f"{level / 10:.1f}",
+                                '-pix_fmt', info['pix_fmt'], '-r', str(rate),
+                                # VUI timing в SPS берется из timebase кодера
+                                '-enc_time_base', f"{rate.denominator}/{rate.numerator}"]
+
+
+def _cut_segment(input_path: str, segment_path: str, mode: str, start: float, end: float,
+                 edge_args: List[str]) -> bool:
+    if mode == 'copy':
+        # Читаем чуть дальше end: segment muxer сам отрежет первый сегмент на ключевом кадре end
+        base, ext = os.path.splitext(segment_path)
+        args = ['-ss', f"{start:.6f}", '-t', f"{end - start + 1:.6f}", '-i', input_path,
+                '-map', '0:v:0', '-an', '-c:v', 'copy', '-bsf:v', 'h264_mp4toannexb',
+                '-f', 'segment', '-segment_times', f"{end - start:.6f}", '-reset_timestamps', '1',
+                '-segment_format', 'matroska', f"{base}_%02d{ext}"]
+    else:
+        args = ['-ss', f"{start:.6f}", '-i', input_path, '-t', f"{end - start:.6f}", '-map', '0:v:0', '-an']
+        args += edge_args + ['-bsf:v', 'h264_mp4toannexb', segment_path]
+    result = run_ffmpeg(ffmpeg_thread_args() + args)
+    if mode == 'copy' and result.returncode == 0:
+        os.replace(f"{base}_00{ext}", segment_path)
+    if result.returncode != 0 or not os.path.exists(segment_path):
+        logger.error(f"❌ Smart cut: сегмент {mode} {start:.2f}-{end:.2f} не удался: {result.stderr[-300:]}")
+        return False
+    return True
+
+
+def _full_encode(input_path: str, output_path: str, start: float, end: float, info: dict) -> bool:
+    """Отрезок целиком через libx264 - когда края не закодировать в формат исходника"""
+    args = ['-ss', f"{start:.6f}", '-i', input_path, '-t', f"{end - start:.6f}", '-map', '0:v:0']
+    if info['has_audio']:
+        args += ['-map', '0:a:0']
+    args += EDGE_ENCODER_ARGS + ['-pix_fmt', 'yuv420p']
+    if info['fps']:
+        args += ['-r', f"{info['fps']:.6f}"]
+    if info['has_audio']:
+        args += audio_codec_args(info)
+    args += ['-movflags', '+faststart', output_path]
+    result = run_ffmpeg(ffmpeg_thread_args() + args)
+    if result.returncode != 0 or not os.path.exists(output_path):
+        logger.error(f"❌ Smart cut: перекодирование отрезка не удалось: {result.stderr[-300:]}")
+        return False
+    logger.info(f"✂️ Smart cut {start:.2f}-{end:.2f}s: формат {info['video_codec']}/{info.get('profile')}/"
+                f"{info.get('pix_fmt')} не повторить на краях - отрезок перекодирован целиком")
+    return True
+
+
+@tracing.traced('smart_cut')
+def smart_cut(input_path: str, output_path: str, start: float = 0.0,
+              end: Optional[float] = None) -> bool:
+    """
+    Обрезает [start, end) покадрово точно; перекодируются только края (или весь отрезок,
+    если края не закодировать в формат исходника).
+    False - если обрезка не удалась (нет видео, ошибка ffmpeg); вызывающий решает, что делать.
+    """
+    info = probe_video(input_path)
+    if not info:
+        return False
+    end = min(end if end is not None else info['duration'], info['duration'])
+    if info['fps']:
+        # Точки реза - на сетке кадров, иначе длительности сегментов не сойдутся с кадрами
+        start = round(start * info['fps']) / info['fps']
+        end = round(end * info['fps']) / info['fps']
+    if end - start <= 0:
+        return False
+    edge_args = edge_encoder_args(input_path, info)
+    if edge_args is None:
+        return _full_encode(input_path, output_path, start, end, info)
+
+    segments = plan_segments(keyframe_times(input_path), start, end)
+    work_dir = tempfile.mkdtemp(prefix='smartcut_', dir=os.path.dirname(os.path.abspath(output_path)))
+    try:
+        segment_paths = []
+        for i, (mode, seg_start, seg_end) in enumerate(segments):
+            segment_path = os.path.join(work_dir, f"segment_{i:02d}.mkv")
+            if not _cut_segment(input_path, segment_path, mode, seg_start, seg_end, edge_args):
+                return False
+            segment_paths.append(segment_path)
+
+        concat_file = os.path.join(work_dir, 'segments.txt')
+        with open(concat_file, 'w') as f:
+            for segment_path, (_, seg_start, seg_end) in zip(segment_paths, segments):
+                # Явная длительность: у сегментов с B-кадрами первый pts не ноль
+                f.write(f"file '{segment_path}'\nduration {seg_end - seg_start:.6f}\n")
+
+        args = ['-f', 'concat', '-safe', '0', '-i', concat_file]
+        maps = ['-map', '0:v:0']
+        if info['has_audio']:
+            args += ['-ss', f"{start:.6f}", '-t', f"{end - start:.6f}", '-i', input_path]
+            maps += ['-map', '1:a:0']
+        args += maps + ['-c:v', 'copy']
+        if info['has_audio']:
+            args += audio_codec_args(info)
+        args += ['-movflags', '+faststart', output_path]
+
+        result = run_ffmpeg(ffmpeg_thread_args() + args)
+        if result.returncode != 0 or not os.path.exists(output_path):
+            logger.error(f"❌ Smart cut: склейка не удалась: {result.stderr[-300:]}")
+            return False
+
+        encoded = sum(seg_end - seg_start for mode, seg_start, seg_end in segments if mode == 'encode')
+        logger.info(f"✂️ Smart cut {start:.2f}-{end:.2f}s: перекодировано {encoded:.2f}s, "
+                    f"скопировано {end - start - encoded:.2f}s")
+        return True
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
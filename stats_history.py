@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Historia wyświetleń clipów/wideo.
+
+Próbki dopisywane są do pliku JSONL (append-only, bez przepisywania pliku),
+a w pamięci trzymamy indeks ostatnich próbek per element - wystarczający
+do wyliczenia wyświetleń „wczoraj” / „tydzień temu” i tempa przyrostu.
+"""
+
+import os
+import json
+import time
+import bisect
+import logging
+import threading
+from typing import Dict, Any, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DAY = 24 * 3600
+
+
+class StatsHistoryStore:
+    """Historia wyświetleń: plik JSONL + indeks w pamięci"""
+
+    def __init__(self, path: str = "stats_history.jsonl", keep_seconds: float = 8 * DAY):
+        self.path = path
+        self.keep_seconds = keep_seconds
+        self._lock = threading.Lock()
+        # (platforma, id elementu) -> posortowana lista (ts, views)
+        self._samples: Dict[Tuple[str, str], List[Tuple[float, int]]] = {}
+        self._load()
+
+    def _load(self):
+        """Odbudowuje indeks z pliku (tylko próbki z okna keep_seconds)"""
+        if not os.path.exists(self.path):
+            return
+        cutoff = time.time() - self.keep_seconds
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        sample = json.loads(line)
+                    except ValueError:
+                        continue
+                    if sample.get('ts', 0) >= cutoff:
+                        self._index(sample['platform'], str(sample['item_id']), sample['ts'], sample['views'])
+        except Exception as e:
+            logger.warning(f"Nie udało się wczytać historii {self.path}: {e}")
+
+    def _index(self, platform: str, item_id: str, ts: float, views: int):
+        samples = self._samples.setdefault((platform, item_id), [])
+        bisect.insort(samples, (ts, views))
+        cutoff = ts - self.keep_seconds
+        while samples and samples[0][0] < cutoff:
+            samples.pop(0)
+
+    def record_many(self, samples: List[Dict[str, Any]]):
+        """Dopisuje próbki: {'platform', 'account', 'item_id', 'views', 'ts'?, 'title'?}"""
+        if not samples:
+            return
+        now = time.time()
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                for sample in samples:
+                    sample = dict(sample, ts=sample.get('ts', now))
+                    f.write(json.dumps(sample, ensure_ascii=False) + '\n')
+                    self._index(sample['platform'], str(sample['item_id']), sample['ts'], int(sample['views']))
+
+    def record_result(self, platform: str, account: str, result: Dict[str, Any]) -> int:
+        """Zapisuje wynik ekstraktora (clips/videos); zwraca liczbę próbek"""
+        samples = []
+        for item in result.get('clips') or result.get('videos') or []:
+            item_id = item.get('video_id')
+            if item_id is None:
+                continue
+            samples.append({
+                'platform': platform,
+                'account': account,
+                'item_id': str(item_id),
+                'views': int(item.get('views') or 0),
+                'published_ts': item.get('date_ts'),
+                'title': item.get('title', '')[:100]
+            })
+        self.record_many(samples)
+        return len(samples)
+
+    def views_at(self, platform: str, item_id: str, ts: float) -> Optional[int]:
+        """Ostatnia znana liczba wyświetleń nie późniejsza niż ts"""
+        with self._lock:
+            samples = self._samples.get((platform, str(item_id)))
+            if not samples:
+                return None
+            index = bisect.bisect_right(samples, (ts, float('inf'))) - 1
+            return samples[index][1] if index >= 0 else None
+
+    def velocity(self, platform: str, item_id: str, window: float = DAY) -> Optional[float]:
+        """Przyrost wyświetleń na godzinę w oknie (None gdy za mało próbek)"""
+        with self._lock:
+            samples = self._samples.get((platform, str(item_id)))
+            if not samples or len(samples) < 2:
+                return None
+            last_ts, last_views = samples[-1]
+            index = max(0, bisect.bisect_left(samples, (last_ts - window, -1)))
+            first_ts, first_views = samples[min(index, len(samples) - 2)]
+            hours = (last_ts - first_ts) / 3600
+            if hours <= 0:
+                return None
+            return max(0.0, (last_views - first_views) / hours)
@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+"""
+Demon harmonogramu ekstrakcji statystyk.
+
+Zamiast jednorazowego pełnego przebiegu (official_api_extractor.main) każde
+konto ma własny interwał dopasowywany do tempa przyrostu wyświetleń:
+świeże, „gorące” clipy sprawdzamy często, stare - rzadko. Należne sprawdzenia
+czekają w kolejce priorytetowej, terminy mają losowy jitter, a globalny
+budżet współbieżności ogranicza liczbę równoległych wywołań API.
+Wyniki trafiają do historii (StatsHistoryStore) i do buforowanego zapisu
+w Google Sheets (BatchedSheetWriter).
+
+Użycie:
+    python stats_scheduler.py                 # demon
+    python stats_scheduler.py --once          # jeden przebieg wszystkich kont
+    python stats_scheduler.py accounts.json   # własna lista kont
+"""
+
+import os
+import sys
+import json
+import time
+import heapq
+import random
+import signal
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional
+
+from stats_history import StatsHistoryStore
+
+logger = logging.getLogger(__name__)
+
+# Ile kont jednej platformy łączymy w jedno zadanie (VK execute: 25, YouTube videos.list: 50)
+BATCH_LIMITS = {'vk_clips': 25, 'youtube': 50}
+
+DEFAULT_ACCOUNTS = [
+    {'platform': 'VK_Clips', 'url': 'https://vk.com/clips/raachel_fb'},
+    {'platform': 'YouTube', 'url': 'https://www.youtube.com/@raachel_fb'},
+]
+
+
+class AccountSchedule:
+    """Stan harmonogramu jednego konta"""
+
+    def __init__(self, platform: str, url: str, interval: float):
+        self.platform = platform
+        self.url = url
+        self.interval = interval
+        self.next_due = 0.0
+        self.failures = 0
+        self.running = False
+
+    @property
+    def key(self) -> str:
+        return f"{self.platform}:{self.url}"
+
+    @property
+    def kind(self) -> str:
+        return self.platform.lower()
+
+
+class StatsScheduler:
+    """Harmonogram adaptacyjnych sprawdzeń statystyk"""
+
+    def __init__(self, accounts: List[Dict[str, str]], extractor=None,
+                 history: Optional[StatsHistoryStore] = None, sheet_writer=None,
+                 max_concurrency: int = 2, min_interval: float = 15 * 60,
+                 max_interval: float = 24 * 3600, jitter: float = 0.1,
+                 target_delta: float = 50, hot_age: float = 6 * 3600):
+        self.extractor = extractor
+        self.history = history or StatsHistoryStore()
+        self.sheet_writer = sheet_writer
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        # Losowe rozrzucenie terminów: ±jitter * interwał
+        self.jitter = jitter
+        # Przy jakim spodziewanym przyroście wyświetleń warto sprawdzić ponownie
+        self.target_delta = target_delta
+        # Clipy młodsze niż hot_age sprawdzamy z minimalnym interwałem
+        self.hot_age = hot_age
+
+        # Globalny budżet współbieżności
+        self.max_concurrency = max_concurrency
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix='stats')
+
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        # Budżet wyczerpany w ostatnim dispatch() - czekamy na zwolnienie slotu, nie na termin
+        self._saturated = False
+        self._queue: List[tuple] = []
+        self._seq = 0
+        self.accounts: Dict[str, AccountSchedule] = {}
+
+        now = time.time()
+        for account in accounts:
+            schedule = AccountSchedule(account['platform'], account['url'], min_interval)
+            self.accounts[schedule.key] = schedule
+            # Start rozłożony w czasie, żeby nie uderzyć we wszystkie API naraz
+            self._push(schedule, now + random.uniform(0, min(60.0, min_interval) * self.jitter))
+
+    # --------------------------------------------------------------- kolejka
+
+    def _push(self, schedule: AccountSchedule, due: float):
+        schedule.next_due = due
+        self._seq += 1
+        heapq.heappush(self._queue, (due, self._seq, schedule.key))
+
+    def _pop_due(self, now: float) -> List[AccountSchedule]:
+        """Wszystkie należne konta (wpisy nieaktualne są pomijane)"""
+        due = []
+        while self._queue and self._queue[0][0] <= now:
+            due_at, _, key = heapq.heappop(self._queue)
+            schedule = self.accounts.get(key)
+            if schedule and not schedule.running and schedule.next_due == due_at:
+                due.append(schedule)
+        return due
+
+    def _with_jitter(self, interval: float) -> float:
+        return interval * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    # ------------------------------------------------------------ interwały
+
+    def next_interval(self, schedule: AccountSchedule, result: Dict[str, Any]) -> float:
+        """Interwał dopasowany do tempa przyrostu wyświetleń"""
+        if 'error' in result:
+            schedule.failures += 1
+            return min(self.max_interval, self.min_interval * (2 ** schedule.failures))
+        schedule.failures = 0
+
+        items = result.get('clips') or result.get('videos') or []
+        now = time.time()
+        velocity = 0.0
+        newest_age = None
+        for item in items:
+            rate = self.history.velocity(schedule.platform, str(item.get('video_id')))
+            velocity += rate or 0.0
+            if item.get('date_ts'):
+                age = now - item['date_ts']
+                newest_age = age if newest_age is None else min(newest_age, age)
+
+        if velocity > 0:
+            # Sprawdzamy mniej więcej wtedy, gdy przybędzie target_delta wyświetleń
+            interval = self.target_delta / velocity * 3600
+        else:
+            # Brak zmian (albo brak historii) - stopniowo rzadziej
+            interval = schedule.interval * 2
+
+        if newest_age is not None and newest_age < self.hot_age:
+            interval = min(interval, self.min_interval)
+
+        return max(self.min_interval, min(self.max_interval, interval))
+
+    # -------------------------------------------------------------- zadania
+
+    def _run_batch(self, kind: str, batch: List[AccountSchedule]):
+        """Jedno wywołanie batchowe ekstraktora dla kont tej samej platformy"""
+        urls = [schedule.url for schedule in batch]
+        try:
+            if kind == 'vk_clips':
+                results = self.extractor.extract_vk_clips_views_batch(urls)
+            elif kind == 'youtube':
+                results = self.extractor.extract_youtube_views_batch(urls)
+            else:
+                results = {url: {'error': f'Nieznana platforma: {kind}'} for url in urls}
+        except Exception as e:
+            logger.error(f"Błąd ekstraktowania {kind}: {e}")
+            results = {url: {'error': str(e)} for url in urls}
+
+        for schedule in batch:
+            result = results.get(schedule.url, {'error': 'Brak wyniku'})
+            if 'error' not in result:
+                samples = self.history.record_result(schedule.platform, schedule.url, result)
+                if self.sheet_writer:
+                    self.sheet_writer.add_results({schedule.platform: result})
+                logger.info(f"📊 {schedule.platform} {schedule.url}: {samples} próbek")
+            else:
+                logger.warning(f"⚠️ {schedule.platform} {schedule.url}: {result['error']}")
+
+            interval = self.next_interval(schedule, result)
+            with self._lock:
+                schedule.interval = interval
+                schedule.running = False
+                self._push(schedule, time.time() + self._with_jitter(interval))
+            logger.info(f"⏱️ {schedule.key}: następne sprawdzenie za {interval / 60:.0f} min")
+
+        self._wakeup.set()
+
+    def _release_after(self, future):
+        self._slots.release()
+        self._wakeup.set()
+        error = future.exception()
+        if error:
+            logger.error(f"Błąd zadania harmonogramu: {error}")
+
+    def dispatch(self, now: Optional[float] = None) -> int:
+        """Uruchamia należne sprawdzenia w ramach budżetu; zwraca liczbę zadań"""
+        now = now or time.time()
+        with self._lock:
+            due = self._pop_due(now)
+            for schedule in due:
+                schedule.running = True
+
+        # Grupujemy po platformie, żeby korzystać z batchowania API
+        groups: Dict[str, List[AccountSchedule]] = {}
+        for schedule in due:
+            groups.setdefault(schedule.kind, []).append(schedule)
+
+        started = 0
+        self._saturated = False
+        for kind, schedules in groups.items():
+            limit = BATCH_LIMITS.get(kind, 1)
+            for start in range(0, len(schedules), limit):
+                batch = schedules[start:start + limit]
+                if not self._slots.acquire(blocking=False):
+                    # Budżet wyczerpany - wracają do kolejki z tym samym terminem
+                    with self._lock:
+                        for pending in groups_left(groups, kind, start):
+                            pending.running = False
+                            self._push(pending, pending.next_due)
+                    self._saturated = True
+                    return started
+                future = self._executor.submit(self._run_batch, kind, batch)
+                future.add_done_callback(self._release_after)
+                started += 1
+        return started
+
+    def seconds_until_next(self) -> float:
+        """Czas do następnego należnego sprawdzenia; przy pełnym budżecie - do zwolnienia slotu"""
+        if self._saturated:
+            # Należne konta czekają z przeszłym terminem - _release_after ustawi _wakeup
+            return 60.0
+        with self._lock:
+            if not self._queue:
+                return self.max_interval
+            return max(0.0, self._queue[0][0] - time.time())
+
+    # ---------------------------------------------------------------- pętla
+
+    def run_forever(self):
+        """Główna pętla demona (do stop())"""
+        logger.info(f"🚀 Harmonogram: {len(self.accounts)} kont, budżet {self.max_concurrency}")
+        while not self._stop.is_set():
+            # clear() przed dispatch(): zwolnienie slotu w trakcie dispatch() nie zginie
+            self._wakeup.clear()
+            self.dispatch()
+            if self.sheet_writer:
+                self.sheet_writer.flush_if_due()
+            self._wakeup.wait(timeout=min(60.0, self.seconds_until_next()))
+        self.shutdown()
+
+    def run_once(self):
+        """Jeden przebieg wszystkich kont (jak stary skrypt, ale z batchowaniem)"""
+        with self._lock:
+            for schedule in self.accounts.values():
+                self._push(schedule, 0.0)
+        while any(schedule.next_due <= 0.0 or schedule.running for schedule in self.accounts.values()):
+            self._wakeup.clear()
+            self.dispatch()
+            self._wakeup.wait(timeout=1.0)
+        self.shutdown()
+
+    def stop(self):
+        self._stop.set()
+        self._wakeup.set()
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+        if self.sheet_writer:
+            self.sheet_writer.flush()
+
+
+def groups_left(groups: Dict[str, List[AccountSchedule]], kind: str, start: int) -> List[AccountSchedule]:
+    """Konta nieuruchomione: reszta bieżącej grupy i wszystkie kolejne grupy"""
+    kinds = list(groups)
+    left = groups[kind][start:]
+    for other in kinds[kinds.index(kind) + 1:]:
+        left.extend(groups[other])
+    return left
+
+
+def load_accounts(path: Optional[str]) -> List[Dict[str, str]]:
+    """Lista kont z pliku JSON [{"platform": "VK_Clips", "url": "..."}]"""
+    if path and os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    return DEFAULT_ACCOUNTS
+
+
+def main():
+    """Główna funkcja"""
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    from official_api_extractor import OfficialAPIExtractor
+    from google_sheets_integration import BatchedSheetWriter
+
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    accounts = load_accounts(args[0] if args else 'scheduler_accounts.json')
+
+    print("⏰ HARMONOGRAM EKSTRAKCJI STATYSTYK")
+    print("=" * 50)
+    print(f"📋 Konta: {len(accounts)}")
+
+    history = StatsHistoryStore()
+    extractor = OfficialAPIExtractor()
+    extractor.google_sheets.history = history
+    writer = BatchedSheetWriter(extractor.google_sheets) if extractor.google_sheets.sheet else None
+
+    scheduler = StatsScheduler(
+        accounts,
+        extractor=extractor,
+        history=history,
+        sheet_writer=writer,
+        max_concurrency=int(os.getenv('STATS_MAX_CONCURRENCY', '2')),
+        min_interval=float(os.getenv('STATS_MIN_INTERVAL', str(15 * 60))),
+        max_interval=float(os.getenv('STATS_MAX_INTERVAL', str(24 * 3600)))
+    )
+
+    if '--once' in sys.argv:
+        scheduler.run_once()
+        print("✅ Przebieg zakończony")
+        return
+
+    signal.signal(signal.SIGTERM, lambda *_: scheduler.stop())
+    try:
+        scheduler.run_forever()
+    except KeyboardInterrupt:
+        scheduler.stop()
+        scheduler.shutdown()
+    print("🛑 Harmonogram zatrzymany")
+
+
+if __name__ == "__main__":
+    main()
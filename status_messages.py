@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Статусные сообщения Telegram без упора во flood control.
+
+Обработчики и потоки рендера не редактируют сообщение сами, а задают желаемый
+текст: StatusMessage.set() только запоминает последний текст (из любого потока),
+а фоновая задача в цикле событий бота отправляет не больше одной правки на
+сообщение за STATUS_EDIT_INTERVAL секунд. Промежуточные тексты, которые успели
+устареть, не отправляются вовсе; правка тем же текстом пропускается.
+
+RetryAfter общий на весь бот: после него все сообщения ждут указанное время, а
+текст, который не ушел, остается в очереди (если его не сменил более новый).
+Финальные тексты (итог обработки) отправляются через flush() - сразу, без
+ожидания интервала, но с учетом RetryAfter.
+"""
+
+import os
+import time
+import asyncio
+import logging
+import threading
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from telegram.error import BadRequest, RetryAfter
+
+logger = logging.getLogger(__name__)
+
+STATUS_EDIT_INTERVAL = float(os.getenv('STATUS_EDIT_INTERVAL', '3'))
+
+MAX_FLUSH_ATTEMPTS = 3
+
+
+class StatusMessage:
+    """Одно статусное сообщение: последний желаемый текст и последний отправленный"""
+
+    def __init__(self, board: 'StatusBoard', edit: Callable[..., Awaitable[Any]]):
+        self.board = board
+        self.edit = edit
+        self.sent_text: Optional[str] = None
+        self.last_edit = float('-inf')
+        self._sending = asyncio.Lock()
+
+    def set(self, text: str, **kwargs):
+        """Новый текст сообщения; можно вызывать из любого потока, не блокирует"""
+        self.board._set(self, text, kwargs)
+
+    async def flush(self):
+        """Отправить ожидающий текст сейчас (итоговые сообщения)"""
+        await self.board._flush(self)
+
+    async def update(self, text: str, **kwargs):
+        """set() и flush(): текст уходит сразу"""
+        self.set(text, **kwargs)
+        await self.flush()
+
+
+class StatusBoard:
+    """Правки статусных сообщений: не чаще interval на сообщение, общий RetryAfter"""
+
+    def __init__(self, interval: float = STATUS_EDIT_INTERVAL):
+        self.interval = interval
+        self.edits = 0
+        self.skipped = 0
+        self._pending: Dict[StatusMessage, Tuple[str, Dict[str, Any]]] = {}
+        self._lock = threading.Lock()
+        self._retry_until = 0.0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._flusher: Optional[asyncio.Task] = None
+        self._wake_scheduled = False
+
+    def message(self, edit: Callable[..., Awaitable[Any]]) -> StatusMessage:
+        """Статусное сообщение; edit - например query.edit_message_text (вызывать в цикле событий)"""
+        self._loop = asyncio.get_running_loop()
+        return StatusMessage(self, edit)
+
+    def _set(self, message: StatusMessage, text: str, kwargs: Dict[str, Any]):
+        with self._lock:
+            pending = self._pending.get(message)
+            if pending is not None and pending[0] == text:
+                return
+            if pending is None and text == message.sent_text:
+                self.skipped += 1
+                return
+            self._pending[message] = (text, kwargs)
+            if self._wake_scheduled:
+                return
+            self._wake_scheduled = True
+        try:
+            in_loop = asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            in_loop = False
+        if in_loop:
+            self._wake()
+        else:
+            # Поток рендера: фоновая задача запускается в цикле событий бота
+            self._loop.call_soon_threadsafe(self._wake)
+
+    def _wake(self):
+        with self._lock:
+            self._wake_scheduled = False
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.get_running_loop().create_task(self._run())
+
+    def _due_at(self, message: StatusMessage) -> float:
+        return max(message.last_edit + self.interval, self._retry_until)
+
+    async def _run(self):
+        while True:
+            with self._lock:
+                if not self._pending:
+                    return
+                now = time.monotonic()
+                due = [message for message in self._pending if self._due_at(message) <= now]
+                next_at = min(self._due_at(message) for message in self._pending)
+            for message in due:
+                await self._send(message)
+            if not due:
+                await asyncio.sleep(max(0.05, next_at - time.monotonic()))
+
+    async def _send(self, message: StatusMessage):
+        """Одна правка сообщения; False - Telegram попросил подождать"""
+        async with message._sending:
+            wait = self._retry_until - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            with self._lock:
+                item = self._pending.pop(message, None)
+            if item is None:
+                return True
+            text, kwargs = item
+            if text == message.sent_text:
+                self.skipped += 1
+                return True
+            try:
+                await message.edit(text, **kwargs)
+                message.sent_text = text
+                self.edits += 1
+            except RetryAfter as e:
+                self._retry_until = time.monotonic() + e.retry_after
+                logger.warning(f"⏳ Flood control (статус): правки сообщений приостановлены на {e.retry_after}s")
+                with self._lock:
+                    # Текст не ушел - остается в очереди, если его не сменил более новый
+                    self._pending.setdefault(message, item)
+                return False
+            except BadRequest as e:
+                if 'not modified' in str(e).lower():
+                    message.sent_text = text
+                else:
+                    logger.warning(f"⚠️ Статус не обновлен: {e}")
+            except Exception as e:
+                logger.warning(f"⚠️ Статус не обновлен: {e}")
+            finally:
+                message.last_edit = time.monotonic()
+            return True
+
+    async def _flush(self, message: StatusMessage):
+        for _ in range(MAX_FLUSH_ATTEMPTS):
+            if await self._send(message):
+                return
+        logger.warning("⚠️ Итоговый статус не отправлен: flood control не снят")
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Кодирование под лимит размера (20 MB для Bot API, лимит тома Railway и т.п.).
+
+Битрейт видео считается из длительности, битрейта аудио и накладных расходов
+контейнера, а не угадывается: (max_bytes * (1 - накладные) * 8 - биты аудио) /
+(длительность + окно VBV). Кодирование одним проходом в capped VBR
+(-b:v = -maxrate, -bufsize на TARGET_SIZE_VBV_SECONDS секунд): буфер VBV не дает
+кодеру превысить битрейт больше чем на размер буфера, который уже вычтен из
+бюджета, поэтому результат укладывается в лимит с первого раза. Если бит на
+пиксель слишком мало, разрешение понижается, чтобы картинка не рассыпалась;
+ограничивается короткая сторона (720p вертикального ролика - 720x1280, а не 405x720).
+Редкий перелет (очень короткие ролики) - один повтор с битрейтом, уменьшенным
+пропорционально.
+"""
+
+import os
+import logging
+import subprocess
+from typing import Any, Dict, List, Optional
+
+from ffmpeg_utils import run_ffmpeg, probe_video
+from thread_governor import ffmpeg_thread_args
+
+logger = logging.getLogger(__name__)
+
+TARGET_SIZE_MARGIN = float(os.getenv('TARGET_SIZE_MARGIN', '0.03'))
+TARGET_SIZE_VBV_SECONDS = float(os.getenv('TARGET_SIZE_VBV_SECONDS', '1'))
+
+# Служебные данные mp4 (moov, заголовки сэмплов) - около 1-2% от размера
+CONTAINER_OVERHEAD = 0.02
+MIN_VIDEO_BITRATE = 100_000
+# Ниже этого числа бит на пиксель x264 заметно мылит - лучше меньше разрешение
+MIN_BITS_PER_PIXEL = 0.05
+# Короткая сторона кадра: 1080p, 720p, ...
+SHORT_SIDES = (1080, 720, 540, 480, 360, 240)
+
+DEFAULT_X264_ARGS = ['-preset', 'fast']
+
+
+def video_bitrate(max_bytes: int, duration: float, audio_bitrate: int = 0,
+                  margin: float = TARGET_SIZE_MARGIN,
+                  vbv_seconds: float = TARGET_SIZE_VBV_SECONDS) -> int:
+    """Битрейт видео (бит/с), при котором файл длительностью duration уложится в max_bytes"""
+    payload_bits = max_bytes * 8 * (1 - CONTAINER_OVERHEAD - margin)
+    return int((payload_bits - audio_bitrate * duration) / (duration + vbv_seconds))
+
+
+def choose_short_side(bitrate: int, width: int, height: int, fps: float,
+                      max_side: Optional[int] = None) -> int:
+    """
+    Наибольшая короткая сторона из SHORT_SIDES (не больше исходной и max_side), где
+    хватает бит на пиксель; 0 - размер исходника неизвестен, разрешение не меняется
+    """
+    short, long = min(width, height), max(width, height)
+    if short <= 0:
+        return 0
+    limit = min(short, max_side) if max_side else short
+    fps = fps or 30.0
+    aspect = long / short
+    candidates = [side for side in SHORT_SIDES if side < limit]
+    for side in [limit] + candidates:
+        if bitrate / (side * side * aspect * fps) >= MIN_BITS_PER_PIXEL:
+            return side
+    return candidates[-1] if candidates else limit
+
+
+def _encode(input_path: str, output_path: str, bitrate: int, audio_bitrate: int, short_side: int,
+            info: Dict[str, Any], has_audio: bool, x264_args: List[str],
+            timeout: Optional[float]) -> Optional[str]:
+    args = ['-i', input_path, '-map', '0:v:0']
+    width, height = info.get('width', 0), info.get('height', 0)
+    if 0 < short_side < min(width, height):
+        args += ['-vf', f'scale=-2:{short_side}' if width >= height else f'scale={short_side}:-2']
+    args += ['-c:v', 'libx264'] + x264_args + [
+        '-b:v', str(bitrate), '-maxrate', str(bitrate),
+        '-bufsize', str(int(bitrate * TARGET_SIZE_VBV_SECONDS)), '-pix_fmt', 'yuv420p',
+    ]
+    if has_audio:
+        args += ['-map', '0:a:0', '-c:a', 'aac', '-b:a', str(audio_bitrate)]
+    args += ['-movflags', '+faststart', output_path]
+    try:
+        result = run_ffmpeg(ffmpeg_thread_args() + args, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        if os.path.exists(output_path):
+            os.remove(output_path)
+        return f'ffmpeg не уложился в {timeout:.0f}s'
+    if result.returncode != 0 or not os.path.exists(output_path):
+        return result.stderr[-500:]
+    return None
+
+
+def encode_to_size(input_path: str, output_path: str, max_bytes: int, audio_bitrate: int = 96_000,
+                   max_height: Optional[int] = 720, x264_args: Optional[List[str]] = None,
+                   timeout: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Кодирует input_path в output_path так, чтобы файл был не больше max_bytes.
+    max_height - предел короткой стороны (720 - 720p и для вертикальных роликов);
+    timeout - секунд на один проход ffmpeg.
+    Возвращает size (достигнутый размер), битрейты, короткую сторону и число попыток;
+    при ошибке - {'error': ...}
+    """
+    info = probe_video(input_path)
+    if not info or not info.get('duration'):
+        return {'error': f'Не удалось определить длительность {input_path}'}
+    duration = info['duration']
+    has_audio = bool(info.get('has_audio'))
+    audio_bitrate = audio_bitrate if has_audio else 0
+    x264_args = x264_args if x264_args is not None else DEFAULT_X264_ARGS
+
+    bitrate = video_bitrate(max_bytes, duration, audio_bitrate)
+    if bitrate < MIN_VIDEO_BITRATE:
+        return {'error': f'{max_bytes / 1024 / 1024:.1f} MB мало для {duration:.0f}s видео '
+                         f'(битрейт видео {bitrate / 1000:.0f}k)'}
+    short_side = choose_short_side(bitrate, info.get('width', 0), info.get('height', 0), info.get('fps', 0),
+                                   max_height)
+
+    size = 0
+    for attempt in (1, 2):
+        logger.info(f"🎯 Кодирование под {max_bytes / 1024 / 1024:.1f} MB: видео {bitrate / 1000:.0f}k, "
+                    f"аудио {audio_bitrate / 1000:.0f}k, {short_side or 'исходное '}p, {duration:.1f}s")
+        error = _encode(input_path, output_path, bitrate, audio_bitrate, short_side,
+                        info, has_audio, x264_args, timeout)
+        if error:
+            return {'error': f'Ошибка кодирования: {error}'}
+        size = os.path.getsize(output_path)
+        if size <= max_bytes:
+            logger.info(f"✅ Размер {size / 1024 / 1024:.2f} MB из {max_bytes / 1024 / 1024:.1f} MB (попытка {attempt})")
+            return {
+                'success': True,
+                'path': output_path,
+                'size': size,
+                'max_bytes': max_bytes,
+                'video_bitrate': bitrate,
+                'audio_bitrate': audio_bitrate,
+                'short_side': short_side,
+                'attempts': attempt,
+            }
+        logger.warning(f"⚠️ Перелет: {size / 1024 / 1024:.2f} MB > {max_bytes / 1024 / 1024:.1f} MB")
+        bitrate = int(bitrate * max_bytes / size * (1 - TARGET_SIZE_MARGIN))
+
+    os.remove(output_path)
+    return {'error': f'Не удалось уложиться в {max_bytes / 1024 / 1024:.1f} MB '
+                     f'(получилось {size / 1024 / 1024:.2f} MB)'}
@@ -9,13 +9,15 @@ import logging
 from datetime import datetime
 from pathlib import Path
 from typing import Dict, List, Optional, Callable
+import hmac
 import json
 import uuid
 import threading
-import concurrent.futures
+import contextvars
 from concurrent.futures import ThreadPoolExecutor
 import time
-from http.server import HTTPServer, BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
 import websockets
 import aiohttp
 
@@ -26,7 +28,25 @@ from telegram.ext import (
 )
 from dotenv import load_dotenv
 import yadisk
+import thread_governor
+# Пулы BLAS/OpenMP читают окружение при импорте numpy/torch - задаем до video_uniquizer
+thread_governor.init_thread_env()
 from video_uniquizer import VideoUniquizer
+from progress_hub import ProgressHub
+from fanout_renderer import FanoutRenderer, VariantSpec
+from filtergraph_backend import render_filtergraph
+from smart_cut import smart_cut
+from encoder_profiles import EncoderTuner
+from thread_governor import ThreadGovernor
+import metrics
+import tracing
+import profiler
+import workspace
+import complexity
+from disk_janitor import DiskJanitor
+from target_size import encode_to_size
+from telegram_delivery import VideoDelivery, FileWindow, LocalFiles, file_windows
+from status_messages import StatusBoard
 
 # Загружаем переменные окружения
 load_dotenv()
@@ -48,8 +68,20 @@ MAX_VIDEO_SIZE_MB = int(os.getenv('MAX_VIDEO_SIZE_MB', '300'))
 # Auto-enable self-hosted API for Railway deployment
 USE_SELF_HOSTED_API = os.getenv('USE_SELF_HOSTED_API', 'true').lower() == 'true'  # Default to true for Railway
 SELF_HOSTED_API_URL = os.getenv('SELF_HOSTED_API_URL', 'http://localhost:8081').rstrip('/')
+# Бэкенд фильтров по умолчанию: 'python' (VideoUniquizer, кадры через NumPy) или 'filtergraph' (целиком в ffmpeg)
+FILTER_BACKEND = os.getenv('FILTER_BACKEND', 'python').lower()
+# Цель подбора параметров x264: quality | balanced | throughput
+ENCODER_GOAL = os.getenv('ENCODER_GOAL', 'balanced')
 SELF_HOSTED_BOT_API_URL = f"{SELF_HOSTED_API_URL}/bot"
+# Чат, куда /send_to_chatbot пересылает одобренные видео (пусто - только лог)
+CHATBOT_CHAT_ID = os.getenv('CHATBOT_CHAT_ID')
+# Telegram ID менеджеров через запятую; /profile доступен только им
+MANAGER_IDS = {int(user_id) for user_id in os.getenv('MANAGER_IDS', '').split(',') if user_id.strip()}
+# Токен GET /profile health-сервера (заголовок Authorization: Bearer <токен>); пусто - эндпоинт выключен
+PROFILE_HTTP_TOKEN = os.getenv('PROFILE_HTTP_TOKEN', '')
 MAX_FILE_SIZE_MB = int(os.getenv('MAX_FILE_SIZE_MB', '2000'))  # 2GB for self-hosted
+# Лимит get_file/загрузки публичного Bot API - под него кодируются сжатые копии
+BOT_API_FILE_LIMIT = 20 * 1024 * 1024
 
 # Auto-detect self-hosted API availability
 def check_self_hosted_api():
@@ -256,76 +288,90 @@ manager_states = {}
 # Очередь видео на аппрув
 pending_approvals = {}
 
-# Доступные фильтры Instagram с разными скоростями
+# Доступные фильтры Instagram с разными скоростями.
+# 'style' - стиль цветокоррекции (SOCIAL_STYLES); 'backend' можно задать отдельному
+# фильтру ('python' | 'filtergraph'), без него действует FILTER_BACKEND
 INSTAGRAM_FILTERS = {
     'vintage_slow': {
         'name': '📸 Винтажный (медленно)',
+        'style': 'vintage',
         'description': 'Теплые тона, виньетка, зерно, 0.8x скорость',
         'effects': ['social', 'temporal'],
         'params': {'warmth': 0.9, 'vignette': 0.2, 'grain': 0.1, 'speed': 0.8}
     },
     'vintage_normal': {
         'name': '📸 Винтажный (нормально)',
+        'style': 'vintage',
         'description': 'Теплые тона, виньетка, зерно, 1.0x скорость',
         'effects': ['social'],
         'params': {'warmth': 0.9, 'vignette': 0.2, 'grain': 0.1, 'speed': 1.0}
     },
     'vintage_fast': {
         'name': '📸 Винтажный (быстро)',
+        'style': 'vintage',
         'description': 'Теплые тона, виньетка, зерно, 1.2x скорость',
         'effects': ['social', 'temporal'],
         'params': {'warmth': 0.9, 'vignette': 0.2, 'grain': 0.1, 'speed': 1.2}
     },
     'dramatic_slow': {
         'name': '🎭 Драматический (медленно)',
+        'style': 'dramatic',
         'description': 'Высокий контраст, тени, блики, 0.8x скорость',
         'effects': ['social', 'temporal'],
         'params': {'contrast': 1.15, 'shadows': 0.8, 'highlights': 1.2, 'speed': 0.8}
     },
     'dramatic_normal': {
         'name': '🎭 Драматический (нормально)',
+        'style': 'dramatic',
         'description': 'Высокий контраст, тени, блики, 1.0x скорость',
         'effects': ['social'],
         'params': {'contrast': 1.15, 'shadows': 0.8, 'highlights': 1.2, 'speed': 1.0}
     },
     'dramatic_fast': {
         'name': '🎭 Драматический (быстро)',
+        'style': 'dramatic',
         'description': 'Высокий контраст, тени, блики, 1.2x скорость',
         'effects': ['social', 'temporal'],
         'params': {'contrast': 1.15, 'shadows': 0.8, 'highlights': 1.2, 'speed': 1.2}
     },
     'soft_slow': {
         'name': '🌸 Мягкий (медленно)',
+        'style': 'soft',
         'description': 'Размытие, повышенная яркость, 0.8x скорость',
         'effects': ['social', 'temporal'],
         'params': {'blur': 0.5, 'brightness': 5, 'saturation': 0.9, 'speed': 0.8}
     },
     'soft_normal': {
         'name': '🌸 Мягкий (нормально)',
+        'style': 'soft',
         'description': 'Размытие, повышенная яркость, 1.0x скорость',
         'effects': ['social'],
         'params': {'blur': 0.5, 'brightness': 5, 'saturation': 0.9, 'speed': 1.0}
     },
     'soft_fast': {
         'name': '🌸 Мягкий (быстро)',
+        'style': 'soft',
         'description': 'Размытие, повышенная яркость, 1.2x скорость',
         'effects': ['social', 'temporal'],
         'params': {'blur': 0.5, 'brightness': 5, 'saturation': 0.9, 'speed': 1.2}
     },
     'vibrant_slow': {
         'name': '🌈 Яркий (медленно)',
+        'style': 'vibrant',
         'description': 'Усиленная насыщенность, четкость, 0.8x скорость',
         'effects': ['social', 'temporal'],
         'params': {'saturation': 1.2, 'vibrance': 1.15, 'clarity': 1.1, 'speed': 0.8}
     },
     'vibrant_normal': {
         'name': '🌈 Яркий (нормально)',
+        'style': 'vibrant',
         'description': 'Усиленная насыщенность, четкость, 1.0x скорость',
         'effects': ['social'],
         'params': {'saturation': 1.2, 'vibrance': 1.15, 'clarity': 1.1, 'speed': 1.0}
     },
     'vibrant_fast': {
         'name': '🌈 Яркий (быстро)',
+        'style': 'vibrant',
         'description': 'Усиленная насыщенность, четкость, 1.2x скорость',
         'effects': ['social', 'temporal'],
         'params': {'saturation': 1.2, 'vibrance': 1.15, 'clarity': 1.1, 'speed': 1.2}
@@ -333,10 +379,15 @@ INSTAGRAM_FILTERS = {
 }
 
 
+def filter_backend(filter_info: Dict) -> str:
+    """Бэкенд рендера фильтра: собственный 'backend' фильтра или FILTER_BACKEND"""
+    return filter_info.get('backend', FILTER_BACKEND).lower()
+
+
 class WebSocketUploadProgress:
     """WebSocket upload progress tracker"""
     
-    def __init__(self, user_id: int, filename: str):
+    def __init__(self, user_id: int, filename: str, hub: Optional[ProgressHub] = None):
         self.user_id = user_id
         self.filename = filename
         self.uploaded_bytes = 0
@@ -344,7 +395,8 @@ class WebSocketUploadProgress:
         self.progress_percent = 0
         self.status = "starting"
         self.start_time = time.time()
-        self.websocket_clients = set()
+        self.hub = hub or ProgressHub()
+        self.job_id = f"upload_{user_id}_{uuid.uuid4().hex[:8]}"
     
     def update_progress(self, uploaded: int, total: int):
         """Update upload progress"""
@@ -359,9 +411,11 @@ class WebSocketUploadProgress:
         """Set upload status"""
         self.status = status
         self.broadcast_progress()
+        if status == "completed" or status.startswith("error"):
+            self.hub.finish(self.job_id)
     
     def broadcast_progress(self):
-        """Broadcast progress to all connected WebSocket clients"""
+        """Publish progress to the hub (coalesced, safe from any thread)"""
         progress_data = {
             "type": "upload_progress",
             "user_id": self.user_id,
@@ -373,17 +427,7 @@ class WebSocketUploadProgress:
             "elapsed_time": time.time() - self.start_time,
             "speed_mbps": self.calculate_speed()
         }
-        
-        # Remove disconnected clients
-        disconnected = set()
-        for client in self.websocket_clients:
-            try:
-                asyncio.create_task(client.send(json.dumps(progress_data)))
-            except:
-                disconnected.add(client)
-        
-        for client in disconnected:
-            self.websocket_clients.discard(client)
+        self.hub.publish(self.job_id, progress_data)
     
     def calculate_speed(self) -> float:
         """Calculate upload speed in MB/s"""
@@ -391,14 +435,6 @@ class WebSocketUploadProgress:
         if elapsed > 0:
             return (self.uploaded_bytes / (1024 * 1024)) / elapsed
         return 0.0
-    
-    def add_client(self, websocket):
-        """Add WebSocket client for progress updates"""
-        self.websocket_clients.add(websocket)
-    
-    def remove_client(self, websocket):
-        """Remove WebSocket client"""
-        self.websocket_clients.discard(websocket)
 
 
 class TelegramVideoBot:
@@ -412,6 +448,23 @@ class TelegramVideoBot:
         # WebSocket upload tracking
         self.upload_progress = {}  # user_id -> WebSocketUploadProgress
         self.websocket_server = None
+        self.progress_hub = ProgressHub(max_rate=float(os.getenv('PROGRESS_MAX_RATE', '4')))
+        # Self-hosted Bot API с --local читает файлы с диска сам - отправка путем file://
+        self.local_files = LocalFiles.detect(SELF_HOSTED_API_URL if USE_SELF_HOSTED_API else None)
+        # Готовые видео уходят альбомами; повторные отправки - по file_id без загрузки
+        self.delivery = VideoDelivery(local=self.local_files)
+        # Статусные сообщения: последний текст, не чаще одной правки за интервал, общий RetryAfter
+        self.status_board = StatusBoard()
+        
+        # Бюджет потоков CPU по квоте контейнера: ffmpeg, OpenCV, torch, BLAS
+        self.thread_governor = ThreadGovernor()
+        self.thread_governor.configure_libraries()
+        
+        # Профили x264 под этот хост: бенчмарк в фоне, если результатов нет или они устарели
+        self.encoder_tuner = EncoderTuner(governor=self.thread_governor)
+        metrics.ACTIVE_RENDERS.set_function(lambda: self.thread_governor.active_jobs)
+        if os.getenv('ENCODER_AUTO_BENCHMARK', 'true').lower() == 'true':
+            self.encoder_tuner.ensure_benchmark()
         
         # Инициализируем папки на Yandex Disk
         self.init_yandex_folders()
@@ -419,10 +472,21 @@ class TelegramVideoBot:
         # Создаем папки для временных файлов
         self.temp_dir = Path("temp_videos")
         self.temp_dir.mkdir(exist_ok=True)
+        # Рабочие папки задач, оставшиеся после падения процесса
+        workspace.recover_stale()
         
         # Создаем папку для результатов
         self.results_dir = Path("telegram_results")
         self.results_dir.mkdir(exist_ok=True)
+        
+        # Уборщик диска: старые и одобренные результаты, допуск задач по свободному месту
+        # Видео в очереди на аппрув уборщик не трогает, пока менеджер не решит
+        self.janitor = DiskJanitor(protected_paths=lambda: [
+            video.get('video_path') for video in list(pending_approvals.values())
+            if video.get('status') not in ('approved', 'rejected')])
+        self.janitor.start()
+        metrics.TEMP_DISK_BYTES.set_function(lambda: self.janitor.total_bytes)
+        metrics.DISK_FREE_BYTES.set_function(self.janitor.free_bytes)
     
     def init_yandex_folders(self):
         """Инициализация папок на Yandex Disk"""
@@ -583,8 +647,8 @@ class TelegramVideoBot:
         """Команда /manager - панель менеджера"""
         user_id = update.effective_user.id
         
-        # Проверяем права менеджера (можно настроить список ID)
-        manager_ids = [user_id]  # Добавьте ID менеджеров
+        # Проверяем права менеджера (MANAGER_IDS; не задан - панель открыта, как раньше)
+        manager_ids = MANAGER_IDS or [user_id]
         
         if user_id not in manager_ids:
             await update.message.reply_text("❌ У вас нет прав менеджера.")
@@ -599,6 +663,7 @@ class TelegramVideoBot:
 /approve <ID> - Одобрить видео
 /reject <ID> - Отклонить видео
 /send_to_chatbot <ID> - Отправить в чатбот
+/profile <сек> - Профиль горячих функций (flamegraph)
 
 *Статистика:*
 📊 Ожидают аппрува: {pending_count}
@@ -615,6 +680,37 @@ class TelegramVideoBot:
             parse_mode='Markdown'
         )
     
+    async def profile_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Команда /profile <секунды> - снять профиль стеков всех потоков бота и рендера"""
+        if update.effective_user.id not in MANAGER_IDS:
+            await update.message.reply_text("❌ У вас нет прав менеджера.")
+            return
+        try:
+            seconds = float(context.args[0]) if context.args else 10.0
+        except ValueError:
+            await update.message.reply_text("❌ Укажите длительность в секундах.\nПример: /profile 15")
+            return
+        if profiler.is_running():
+            await update.message.reply_text("⏳ Профилирование уже запущено, дождитесь результата.")
+            return
+        
+        await update.message.reply_text(f"🔬 Снимаю профиль {min(seconds, profiler.MAX_PROFILE_SECONDS):.0f} сек...")
+        result = await asyncio.get_running_loop().run_in_executor(None, profiler.capture, seconds)
+        if 'error' in result:
+            await update.message.reply_text(f"❌ {result['error']}")
+            return
+        
+        top_text = "\n".join(f"{count:>6}  {frame}" for frame, count in result['top'][:8]) or "нет активных потоков"
+        paths_text = "\n".join(result['paths'])
+        await update.message.reply_text(
+            f"🔬 Профиль: {result['samples']} сэмплов за {result['seconds']:.1f} сек\n\n"
+            f"Горячие функции:\n{top_text}\n\n"
+            f"📂 Collapsed stacks:\n{paths_text}"
+        )
+        if result['path']:
+            with open(result['path'], 'rb') as f:
+                await update.message.reply_document(document=f, filename=os.path.basename(result['path']))
+    
     async def queue_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Команда /queue - показать очередь на аппрув"""
         user_id = update.effective_user.id
@@ -873,16 +969,25 @@ class TelegramVideoBot:
     async def send_to_chatbot(self, video_data, context):
         """Отправка видео в чатбот с метаданными"""
         try:
-            # Здесь должна быть логика отправки в чатбот
-            # Пока что просто логируем
             logger.info(f"Отправка в чатбот: {video_data}")
+            if not CHATBOT_CHAT_ID:
+                return
             
-            # В реальной реализации здесь будет API вызов к чатботу
-            # с передачей видео и метаданных
+            # Видео уже загружено в Telegram при доставке пользователю - отправляем по file_id
+            metadata = video_data.get('metadata', {})
+            file_id = await self.delivery.send_video(
+                context.bot, CHATBOT_CHAT_ID, video_data.get('video_path'),
+                caption=f"📅 {metadata.get('publish_date', '')}\n"
+                        f"🆔 {metadata.get('scenario_id', '')}\n"
+                        f"📝 {metadata.get('description', '')}",
+                file_id=video_data.get('telegram_file_id'))
+            video_data['telegram_file_id'] = file_id
             
         except Exception as e:
             logger.error(f"Ошибка отправки в чатбот: {e}")
     
+    @tracing.job('approval')
+    @workspace.job('approval')
     async def move_to_approved_folder(self, video_data, approval_id):
         """Перемещение файла в папку approved"""
         try:
@@ -947,7 +1052,8 @@ class TelegramVideoBot:
                 approved_path = f"{video_folder}/video.mp4"
                 try:
                     # Сначала копируем файл
-                    self.yandex_disk.copy(source_remote_path, approved_path)
+                    with tracing.span('approval_move'):
+                        self.yandex_disk.copy(source_remote_path, approved_path)
                     logger.info(f"Файл скопирован с {source_remote_path} в {approved_path}")
                     
                     # Затем удаляем исходный файл
@@ -959,7 +1065,8 @@ class TelegramVideoBot:
                     # Fallback - загружаем локальный файл
                     source_path = video_data.get('video_path')
                     if source_path and os.path.exists(source_path):
-                        self.yandex_disk.upload(source_path, approved_path)
+                        with tracing.span('upload:yandex', bytes=os.path.getsize(source_path)):
+                            self.yandex_disk.upload(source_path, approved_path)
                         logger.info(f"Файл загружен локально: {source_path}")
                     else:
                         logger.error("Локальный файл не найден для fallback")
@@ -970,7 +1077,8 @@ class TelegramVideoBot:
                 logger.info(f"Локальный путь из данных: {source_path}")
                 if source_path and os.path.exists(source_path):
                     approved_path = f"{video_folder}/video.mp4"
-                    self.yandex_disk.upload(source_path, approved_path)
+                    with tracing.span('upload:yandex', bytes=os.path.getsize(source_path)):
+                        self.yandex_disk.upload(source_path, approved_path)
                     logger.info(f"Файл загружен локально: {source_path}")
                 else:
                     logger.error(f"Локальный файл не найден: {source_path}")
@@ -999,21 +1107,18 @@ ID сценария: {video_data['metadata']['scenario_id']}
             
             # Сохраняем метаданные как текстовый файл
             metadata_path = f"{video_folder}/metadata.txt"
-            with open("temp_metadata.txt", "w", encoding="utf-8") as f:
+            scratch = workspace.current()
+            local_metadata_path = scratch.path("metadata.txt", size_hint=len(metadata_content.encode("utf-8")))
+            with open(local_metadata_path, "w", encoding="utf-8") as f:
                 f.write(metadata_content)
             
-            self.yandex_disk.upload("temp_metadata.txt", metadata_path)
+            self.yandex_disk.upload(str(local_metadata_path), metadata_path)
             
             # Удаляем временный файл
-            os.remove("temp_metadata.txt")
+            scratch.remove(local_metadata_path)
             
-            # Удаляем локальный файл после успешного перемещения (только если он существует)
-            try:
-                if source_path and os.path.exists(source_path):
-                    os.remove(source_path)
-                    logger.info(f"Локальный файл удален: {source_path}")
-            except Exception as delete_error:
-                logger.warning(f"Не удалось удалить локальный файл: {delete_error}")
+            # Одобренное видео уже в approved: удаляем локальную копию (и пустую папку запуска)
+            self.janitor.on_approved(video_data.get('video_path'))
             
             logger.info(f"Видео {approval_id} перемещено в approved папку")
             logger.info(f"Финальный путь: {approved_path}")
@@ -1250,16 +1355,36 @@ ID сценария: {video_data['metadata']['scenario_id']}
             "⏳ Это может занять несколько минут..."
         )
         
+        if not await self.admit_job(query, user_id, video_count):
+            return
+        
         # Запускаем обработку в фоне
         asyncio.create_task(
             self.process_multiple_videos_parallel(user_id, query, selected_filters, context)
         )
     
+    async def admit_job(self, query, user_id: int, video_count: int) -> bool:
+        """Допуск задачи по свободному месту на диске: отказ до ENOSPC, а не падение посреди рендера"""
+        # Исходник, промежуточные файлы и результаты - каждый примерно размером с исходник
+        expected_bytes = (user_states[user_id].get('file_size') or 0) * (video_count + 3)
+        admitted = await asyncio.get_running_loop().run_in_executor(None, self.janitor.admit, expected_bytes)
+        if not admitted:
+            user_states[user_id]['status'] = 'waiting_disk'
+            await query.edit_message_text(
+                "💾 Сейчас на сервере мало свободного места, задача не запущена.\n"
+                "⏳ Попробуйте снова через несколько минут."
+            )
+        return admitted
+    
+    @tracing.job('batch_parallel')
+    @workspace.job('batch_parallel')
     async def process_multiple_videos_parallel(self, user_id: int, query, selected_filters: list, context):
         """Параллельная обработка нескольких видео с разными фильтрами"""
+        status = self.status_board.message(query.edit_message_text)
+        results_folder = None
         try:
             # Отправляем уведомление о начале обработки
-            await query.edit_message_text(
+            status.set(
                 "🔄 **НАЧИНАЮ ОБРАБОТКУ ВИДЕО**\n\n"
                 "📁 Файл будет сохранен в папке:\n"
                 f"`{self.results_dir}/batch_[ID]`\n\n"
@@ -1275,7 +1400,7 @@ ID сценария: {video_data['metadata']['scenario_id']}
             logger.info(f"📊 Размер файла: {file_size_mb:.1f} MB, лимит Railway: {railway_limit_mb} MB")
             if file_size_mb > railway_limit_mb:  # Jeśli файл больше 2GB, автоматически сжимаем
                 logger.info(f"🚨 Файл превышает Railway лимит! Начинаю компрессию...")
-                await query.message.edit_text(
+                status.set(
                     f"📦 **АВТОМАТИЧЕСКАЯ КОМПРЕССИЯ**\n\n"
                     f"📁 Размер: {file_size_mb:.1f} MB\n"
                     f"📁 Имя: {user_states[user_id]['filename']}\n\n"
@@ -1284,7 +1409,7 @@ ID сценария: {video_data['metadata']['scenario_id']}
                 )
                 
                 # Показываем инструкции по компрессии (Telegram API не позволяет скачать файлы >20MB)
-                await query.message.edit_text(
+                await status.update(
                     f"📦 **КОМПРЕССИЯ ТРЕБУЕТСЯ**\n\n"
                     f"📁 Размер: {file_size_mb:.1f} MB\n"
                     f"📁 Имя: {user_states[user_id]['filename']}\n\n"
@@ -1323,7 +1448,7 @@ ID сценария: {video_data['metadata']['scenario_id']}
                     logger.info(f"   File size: {user_states[user_id]['file_size'] / (1024*1024):.1f}MB")
                 if "File is too big" in str(e):
                     file_size_mb = user_states[user_id]['file_size'] / (1024*1024)
-                    await query.message.edit_text(
+                    await status.update(
                         f"⚠️ **Файл слишком большой для стандартного Telegram API!**\n\n"
                         f"📁 Размер: {file_size_mb:.1f} MB\n"
                         f"📁 Имя: {user_states[user_id]['filename']}\n\n"
@@ -1345,15 +1470,16 @@ ID сценария: {video_data['metadata']['scenario_id']}
             # Создаем уникальное имя файла для входного файла
             unique_id = str(uuid.uuid4())[:8]
             input_filename = f"input_{unique_id}.mp4"
-            input_path = self.temp_dir / input_filename
+            input_path = workspace.current().path(input_filename)
             
             # Скачиваем файл
-            await file.download_to_drive(input_path)
+            with metrics.timed(metrics.DOWNLOAD_SECONDS), tracing.span('download', bytes=file.file_size):
+                await file.download_to_drive(input_path)
             
             # Проверяем czy plik potrzebuje podziału
             needs_splitting = user_states[user_id].get('needs_splitting', False)
             if needs_splitting:
-                await query.message.edit_text(
+                status.set(
                     f"📹 **РАЗДЕЛЕНИЕ БОЛЬШОГО ФАЙЛА**\n\n"
                     f"📁 Размер: {user_states[user_id].get('original_size', 0):.1f} MB\n"
                     f"🔄 Разделяю на части по 30 секунд...\n\n"
@@ -1364,7 +1490,7 @@ ID сценария: {video_data['metadata']['scenario_id']}
                 chunks = self.split_video_into_chunks_sync(str(input_path), chunk_duration=30)
                 
                 if len(chunks) > 1:
-                    await query.message.edit_text(
+                    status.set(
                         f"✅ **ФАЙЛ РАЗДЕЛЕН НА {len(chunks)} ЧАСТЕЙ**\n\n"
                         f"📁 Части: {len(chunks)} x 30 секунд\n"
                         f"🔄 Обрабатываю каждую часть...\n\n"
@@ -1374,7 +1500,7 @@ ID сценария: {video_data['metadata']['scenario_id']}
                     # Обрабатываем каждую часть отдельно
                     processed_chunks = []
                     for i, chunk in enumerate(chunks):
-                        await query.message.edit_text(
+                        status.set(
                             f"🎬 **ОБРАБОТКА ЧАСТИ {i+1}/{len(chunks)}**\n\n"
                             f"📁 Файл: {os.path.basename(chunk)}\n"
                             f"🔄 Применяю фильтры...\n\n"
@@ -1402,7 +1528,7 @@ ID сценария: {video_data['metadata']['scenario_id']}
                         input_path = Path(result_path)
                         logger.info(f"✅ Видео объединено: {result_path}")
                         
-                        await query.message.edit_text(
+                        status.set(
                             f"✅ **ВСЕ ЧАСТИ ОБРАБОТАНЫ И ОБЪЕДИНЕНЫ**\n\n"
                             f"📁 Финальный файл: {os.path.basename(result_path)}\n"
                             f"🔄 Продолжаю обработку с фильтрами...\n\n"
@@ -1417,13 +1543,16 @@ ID сценария: {video_data['metadata']['scenario_id']}
             
             # Создаем папку для результатов
             results_folder = self.results_dir / f"batch_{unique_id}"
+            # Папка занята задачей: уборщик не удалит ее, пока идет рендер и выгрузка
+            self.janitor.hold(results_folder)
             results_folder.mkdir(exist_ok=True)
+            tracing.set_run_dir(results_folder)
             
             # Уведомляем о создании папки
             blogger_name = user_states[user_id].get('blogger_name', 'Unknown')
             folder_name = user_states[user_id].get('folder_name', 'default')
             
-            await query.edit_message_text(
+            status.set(
                 f"📁 **ПАПКА СОЗДАНА**\n\n"
                 f"👤 Блогер: **{blogger_name}**\n"
                 f"📂 Папка: **{folder_name}**\n"
@@ -1432,6 +1561,30 @@ ID сценария: {video_data['metadata']['scenario_id']}
                 "⏳ Начинаю параллельную обработку..."
             )
             
+            # CRF/maxrate по сложности исходника - один анализ на все варианты
+            encoding = await asyncio.get_running_loop().run_in_executor(
+                None, contextvars.copy_context().run, complexity.choose_rate, str(input_path))
+            tracing.update_run_summary(results_folder / 'run_summary.json', encoding=encoding)
+            
+            # Проценты рендера вариантов (из потоков рендера) - одно статусное сообщение на всю задачу
+            render_progress = {i + 1: 0.0 for i in range(len(selected_filters))}
+            render_notes = {}
+            progress_lock = threading.Lock()
+            
+            def render_status() -> str:
+                done = sum(1 for progress_pct in render_progress.values() if progress_pct >= 100)
+                text = f"🎬 **ПРОГРЕСС ОБРАБОТКИ**\n\n✅ Обработано: {done}/{len(render_progress)} видео\n"
+                for index, progress_pct in sorted(render_progress.items()):
+                    text += f"{'✅' if progress_pct >= 100 else '⏳'} Видео {index}: {progress_pct:.0f}%"
+                    text += f" {render_notes[index]}\n" if index in render_notes else "\n"
+                return text + f"📁 Сохранено в: `{results_folder}`"
+            
+            def on_progress(index: int, progress_pct: float):
+                with progress_lock:
+                    render_progress[index] = max(render_progress[index], min(progress_pct, 99.0))
+                    text = render_status()
+                status.set(text)
+            
             # Создаем задачи для параллельной обработки
             tasks = []
             video_id = user_states[user_id].get('video_id', 'unknown')
@@ -1448,64 +1601,67 @@ ID сценария: {video_data['metadata']['scenario_id']}
                     'output_path': str(output_path),
                     'filter_info': INSTAGRAM_FILTERS[filter_id],
                     'video_id': video_id,
-                    'upload_date': upload_date
+                    'upload_date': upload_date,
+                    'user_id': user_id,
+                    'job_id': f"render_{unique_id}_{i + 1}",
+                    'rate_args': encoding['rate_args'],
+                    'on_progress': lambda progress_pct, index=i + 1: on_progress(index, progress_pct)
                 }
                 tasks.append(task)
             
-            # Обрабатываем видео параллельно
+            # Несколько вариантов одного небольшого файла: одно декодирование на все варианты
             processed_videos = []
-            with ThreadPoolExecutor(max_workers=min(len(tasks), 4)) as executor:
-                # Запускаем все задачи
+            fanout_tasks = [task for task in tasks if filter_backend(task['filter_info']) == 'python']
+            if len(fanout_tasks) > 1 and os.path.getsize(input_path) <= 50 * 1024 * 1024:
+                processed_videos = await asyncio.get_running_loop().run_in_executor(
+                    None, contextvars.copy_context().run, self.process_videos_fanout, fanout_tasks
+                )
+            done_indexes = {video['index'] for video in processed_videos}
+            if done_indexes:
+                with progress_lock:
+                    render_progress.update({index: 100.0 for index in done_indexes})
+                    status.set(render_status())
+            remaining_tasks = [task for task in tasks if task['index'] not in done_indexes]
+            
+            # Обрабатываем оставшиеся видео параллельно
+            with ThreadPoolExecutor(max_workers=max(1, min(len(remaining_tasks), self.thread_governor.max_jobs))) as executor:
+                # Запускаем все задачи (каждая уходит из очереди в начале process_single_video)
+                metrics.RENDER_QUEUE_DEPTH.inc(len(remaining_tasks))
                 future_to_task = {
-                    executor.submit(self.process_single_video, task): task 
-                    for task in tasks
+                    executor.submit(contextvars.copy_context().run, self.process_single_video, task): task 
+                    for task in remaining_tasks
                 }
                 
-                # Отслеживаем прогресс
-                completed = 0
-                total = len(tasks)
-                
-                for future in concurrent.futures.as_completed(future_to_task):
-                    task = future_to_task[future]
+                # Отслеживаем прогресс, не блокируя цикл событий (статус обновляется в это время)
+                async def finished(future):
                     try:
-                        result = future.result()
-                        if result:
+                        return future_to_task[future], await asyncio.wrap_future(future), None
+                    except Exception as e:
+                        return future_to_task[future], None, e
+                
+                for next_finished in asyncio.as_completed([finished(future) for future in future_to_task]):
+                    task, result, error = await next_finished
+                    with progress_lock:
+                        if error is not None:
+                            logger.error(f"Ошибка обработки видео {task['index']}: {error}")
+                            render_notes[task['index']] = f"❌ {error}"
+                        elif result:
                             processed_videos.append(result)
-                            completed += 1
+                            render_progress[task['index']] = 100.0
                             logger.info(f"✅ Video {task['index']} processed successfully")
-                        else:
-                            logger.warning(f"⚠️ Video {task['index']} processing returned None")
-                            
-                            # Обновляем прогресс в Telegram с информацией о компрессии
-                            progress = f"🎬 **ПРОГРЕСС ОБРАБОТКИ**\n\n"
-                            progress += f"✅ Обработано: {completed}/{total} видео\n"
-                            progress += f"🎨 Фильтр: {task['filter_info']['name']}\n"
-                            progress += f"📁 Сохранено в: `{results_folder}`\n"
                             
-                            # Добавляем информацию о компрессии если была применена
+                            # Информация о компрессии и разделении, если они были применены
                             if result.get('compressed', False):
-                                progress += f"📦 **Компрессия:** Применена\n"
-                            
-                            # Добавляем информацию о разделении если было применено
+                                render_notes[task['index']] = "📦 сжато"
                             if result.get('split', False):
-                                progress += f"📹 **Разделение:** {result.get('chunks_count', 0)} частей\n"
-                            
-                            progress += f"\n⏳ Осталось: {total - completed} видео..."
-                            
-                            await query.edit_message_text(progress)
-                            
-                    except Exception as e:
-                        logger.error(f"Ошибка обработки видео {task['index']}: {e}")
-                        completed += 1
-                        
-                        # Обновляем прогресс с ошибкой
-                        progress = f"🎬 Обработано {completed}/{total} видео...\n"
-                        progress += f"❌ Ошибка в видео {task['index']}: {str(e)}"
-                        
-                        await query.edit_message_text(progress)
+                                render_notes[task['index']] = f"📹 {result.get('chunks_count', 0)} частей"
+                        else:
+                            logger.warning(f"⚠️ Video {task['index']} processing returned None")
+                            render_notes[task['index']] = "❌ не создано"
+                        status.set(render_status())
             
             # Уведомляем о завершении обработки
-            await query.edit_message_text(
+            await status.update(
                 f"🎉 **ОБРАБОТКА ЗАВЕРШЕНА!**\n\n"
                 f"✅ Обработано: {len(processed_videos)}/{len(selected_filters)} видео\n"
                 f"📁 Все файлы сохранены в папке:\n"
@@ -1513,23 +1669,22 @@ ID сценария: {video_data['metadata']['scenario_id']}
                 f"📤 Отправляю готовые видео..."
             )
             
-            # Отправляем все видео
-            for video_data in processed_videos:
-                try:
-                    await query.message.reply_video(
-                        video=open(video_data['path'], 'rb'),
-                        caption=f"✅ Видео {video_data['index']}/{len(selected_filters)}\n"
-                               f"🎨 Фильтр: {video_data['filter_name']}\n"
-                               f"📁 Размер: {os.path.getsize(video_data['path']) / (1024*1024):.1f} MB\n"
-                               f"📂 Путь: `{video_data['path']}`"
-                               + (f"\n☁️ Yandex Disk: {video_data['yandex_url']}" if video_data.get('yandex_url') else ""),
-                        supports_streaming=True
-                    )
-                except Exception as e:
-                    logger.error(f"Ошибка отправки видео {video_data['index']}: {e}")
+            # Отправляем все видео альбомами; file_id сохраняется для повторных отправок
+            file_ids = await self.delivery.send_videos(context.bot, query.message.chat_id, [
+                (video_data['path'],
+                 f"✅ Видео {video_data['index']}/{len(selected_filters)}\n"
+                 f"🎨 Фильтр: {video_data['filter_name']}\n"
+                 f"📁 Размер: {os.path.getsize(video_data['path']) / (1024*1024):.1f} MB\n"
+                 f"📂 Путь: `{video_data['path']}`"
+                 + (f"\n☁️ Yandex Disk: {video_data['yandex_url']}" if video_data.get('yandex_url') else ""))
+                for video_data in processed_videos
+            ])
+            for video_data, file_id in zip(processed_videos, file_ids):
+                video_data['telegram_file_id'] = file_id
             
             # Очищаем только входной файл, выходные файлы оставляем для загрузки на Yandex Disk
             input_path.unlink(missing_ok=True)
+            self.janitor.track(results_folder)
             logger.info("Входной файл удален, выходные файлы сохранены для загрузки на Yandex Disk")
             
             # Обновляем состояние
@@ -1561,6 +1716,7 @@ ID сценария: {video_data['metadata']['scenario_id']}
                     'filename': user_states[user_id]['filename'],
                     'filter': video_data['filter_name'],
                     'video_path': video_data['path'],
+                    'telegram_file_id': video_data.get('telegram_file_id'),
                     'yandex_remote_path': video_data.get('yandex_remote_path'),
                     'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
                     'approval_id': approval_id,
@@ -1624,8 +1780,136 @@ ID сценария: {video_data['metadata']['scenario_id']}
                     text=f"❌ Ошибка обработки: {str(e)}"
                 )
             user_states[user_id]['status'] = 'error'
+        finally:
+            if results_folder is not None:
+                self.janitor.release(results_folder)
+    
+    def create_render_uniquizer(self, task) -> VideoUniquizer:
+        """VideoUniquizer, прогресс которого идет в консоль, в WebSocket hub и в статус задачи"""
+        job_id = task.get('job_id', f"render_{task['index']}")
+        on_progress = task.get('on_progress')
+        base_payload = {
+            "type": "render_progress",
+            "user_id": task.get('user_id'),
+            "index": task['index'],
+            "filter_id": task.get('filter_id')
+        }
+        
+        # Progress callback for user updates
+        def progress_callback(message, progress_pct=None):
+            if progress_pct is not None:
+                print(f"📊 [{progress_pct:.1f}%] {message}")
+            else:
+                print(f"📊 {message}")
+            self.progress_hub.publish(job_id, dict(base_payload, message=message, progress_percent=progress_pct))
+            if on_progress and progress_pct is not None:
+                on_progress(progress_pct)
+        
+        # Покадровый прогресс: hub и статусное сообщение сами ограничивают частоту отправки
+        def frame_callback(frames_done, total_frames):
+            progress_pct = frames_done / total_frames * 100 if total_frames else None
+            self.progress_hub.publish(job_id, dict(base_payload, frames_done=frames_done,
+                                                   total_frames=total_frames, progress_percent=progress_pct))
+            if on_progress and progress_pct is not None:
+                on_progress(progress_pct)
+        
+        return VideoUniquizer(progress_callback=progress_callback, frame_callback=frame_callback,
+                              x264_args=self.encoder_tuner.x264_args(goal=ENCODER_GOAL, threads=task.get('threads')),
+                              rate_args=task.get('rate_args'))
+    
+    def process_videos_fanout(self, tasks: list) -> list:
+        """Все варианты за одно декодирование исходника (обрезка и сжатие - один раз)"""
+        try:
+            input_path = self.compress_video_if_needed_sync(tasks[0]['input_path'])
+            
+            def frame_callback(frames_done, total_frames):
+                for task in tasks:
+                    if task.get('on_progress') and total_frames:
+                        task['on_progress'](frames_done / total_frames * 100)
+                    self.progress_hub.publish(task['job_id'], {
+                        "type": "render_progress",
+                        "user_id": task.get('user_id'),
+                        "index": task['index'],
+                        "filter_id": task['filter_id'],
+                        "frames_done": frames_done,
+                        "total_frames": total_frames,
+                        "progress_percent": frames_done / total_frames * 100 if total_frames else None
+                    })
+            
+            renderer = FanoutRenderer(input_path, max_duration=60, frame_callback=frame_callback)
+            # Все варианты кодируются одновременно - каждый кодер считается отдельным рендером
+            with self.thread_governor.lease(jobs=len(tasks)) as budget:
+                encoder_args = self.encoder_tuner.encoder_args(goal=ENCODER_GOAL, threads=budget.threads,
+                                                               rate_args=tasks[0].get('rate_args'))
+                variants = [VariantSpec(task['output_path'], task['filter_info']['effects'], encoder_args=encoder_args)
+                            for task in tasks]
+                results = renderer.render(variants)
+            logger.info(f"🔀 Fan-out: {renderer.stats}")
+            if renderer.stats.get('wall_time'):
+                for task in tasks:
+                    metrics.RENDER_FPS.observe(renderer.stats['decoded_frames'] / renderer.stats['wall_time'],
+                                               backend='fused', effect='+'.join(task['filter_info']['effects']))
+            
+            processed = []
+            for task, result in zip(tasks, results):
+                self.progress_hub.finish(task['job_id'])
+                if result['status'] != 'success':
+                    logger.warning(f"⚠️ Fan-out вариант {task['index']} не удался: {result.get('error')}")
+                    continue
+                processed.append({
+                    'index': task['index'],
+                    'path': result['output_path'],
+                    'filter_name': task['filter_info']['name'],
+                    'filter_id': task['filter_id'],
+                    'video_id': task.get('video_id', 'unknown'),
+                    'upload_date': datetime.now().strftime('%Y%m%d'),
+                    'compressed': input_path != tasks[0]['input_path'],
+                    'split': False,
+                    'chunks_count': 1
+                })
+            return processed
+            
+        except Exception as e:
+            # Варианты будут обработаны по одному (process_single_video)
+            logger.error(f"❌ Ошибка fan-out рендера: {e}")
+            return []
+    
+    def render_filtergraph_sync(self, task) -> Optional[str]:
+        """Рендер фильтра одним графом ffmpeg (backend='filtergraph')"""
+        filter_info = task['filter_info']
+        style_params = dict(filter_info.get('params', {}))
+        speed = style_params.pop('speed', None)
+        input_path = self.compress_video_if_needed_sync(task['input_path'])
+        
+        result = render_filtergraph(
+            input_path, task['output_path'], filter_info['effects'],
+            style=filter_info['style'],
+            style_params=style_params,
+            speed=speed,
+            encoder_args=self.encoder_tuner.encoder_args(goal=ENCODER_GOAL, threads=task.get('threads'),
+                                                         rate_args=task.get('rate_args')),
+            max_duration=60
+        )
+        if 'error' in result:
+            logger.error(f"❌ Filtergraph: вариант {task['index']} не удался: {result['error']}")
+            return None
+        if result['frames'] and result['render_time']:
+            metrics.RENDER_FPS.observe(result['frames'] / result['render_time'], backend='filtergraph',
+                                       effect='+'.join(filter_info['effects']))
+        return result['output_path']
     
     def process_single_video(self, task):
+        """Обработка одного видео в отдельном потоке (с арендой потоков у ThreadGovernor)"""
+        metrics.RENDER_QUEUE_DEPTH.dec()
+        try:
+            with self.thread_governor.lease() as budget, metrics.timed(metrics.ENCODE_SECONDS, kind='render'), \
+                    tracing.span('variant', index=task['index'], filter_id=task['filter_id'], threads=budget.threads):
+                return self._process_single_video(dict(task, threads=budget.threads))
+        finally:
+            # Состояние задачи в hub убирается и после ошибки рендера
+            self.progress_hub.finish(task.get('job_id', f"render_{task['index']}"))
+    
+    def _process_single_video(self, task):
         """Обработка одного видео в отдельном потоке"""
         try:
             logger.info(f"🎬 Начинаю обработку видео {task['index']} с фильтром {task['filter_info']['name']}")
@@ -1634,7 +1918,10 @@ ID сценария: {video_data['metadata']['scenario_id']}
             file_size_mb = os.path.getsize(task['input_path']) / (1024 * 1024)
             chunks = []  # Инициализируем переменную
             
-            if file_size_mb > 50:  # Если файл больше 50MB, разделяем на части
+            if filter_backend(task['filter_info']) == 'filtergraph':
+                # ffmpeg обрабатывает поток сам - без разделения на части и без кадров в Python
+                result_path = self.render_filtergraph_sync(task)
+            elif file_size_mb > 50:  # Если файл больше 50MB, разделяем на части
                 logger.info(f"📹 Большой файл ({file_size_mb:.1f} MB) - разделяю на части")
                 print(f"📹 БОЛЬШОЙ ФАЙЛ: {file_size_mb:.1f} MB - разделение на части")
                 
@@ -1652,7 +1939,7 @@ ID сценария: {video_data['metadata']['scenario_id']}
                         compressed_chunk = self.compress_video_if_needed_sync(chunk)
                         
                         # Обрабатываем часть
-                        uniquizer = VideoUniquizer()
+                        uniquizer = self.create_render_uniquizer(task)
                         processed_chunk = uniquizer.uniquize_video(
                             input_path=compressed_chunk,
                             output_path=chunk.replace('.mp4', '_processed.mp4'),
@@ -1678,14 +1965,7 @@ ID сценария: {video_data['metadata']['scenario_id']}
                     trimmed_input_path = self.trim_video_if_needed_sync(task['input_path'], max_duration_seconds=60)
                     compressed_input_path = self.compress_video_if_needed_sync(trimmed_input_path)
                     
-                    # Progress callback for user updates
-                    def progress_callback(message, progress_pct=None):
-                        if progress_pct is not None:
-                            print(f"📊 [{progress_pct:.1f}%] {message}")
-                        else:
-                            print(f"📊 {message}")
-                    
-                    uniquizer = VideoUniquizer(progress_callback=progress_callback)
+                    uniquizer = self.create_render_uniquizer(task)
                     result_path = uniquizer.uniquize_video(
                         input_path=compressed_input_path,
                         output_path=task['output_path'],
@@ -1696,14 +1976,7 @@ ID сценария: {video_data['metadata']['scenario_id']}
                 trimmed_input_path = self.trim_video_if_needed_sync(task['input_path'], max_duration_seconds=60)
                 compressed_input_path = self.compress_video_if_needed_sync(trimmed_input_path)
                 
-                # Progress callback for user updates
-                def progress_callback(message, progress_pct=None):
-                    if progress_pct is not None:
-                        print(f"📊 [{progress_pct:.1f}%] {message}")
-                    else:
-                        print(f"📊 {message}")
-                
-                uniquizer = VideoUniquizer(progress_callback=progress_callback)
+                uniquizer = self.create_render_uniquizer(task)
                 result_path = uniquizer.uniquize_video(
                     input_path=compressed_input_path,
                     output_path=task['output_path'],
@@ -1797,6 +2070,9 @@ ID сценария: {video_data['metadata']['scenario_id']}
             "⏳ Это может занять несколько минут..."
         )
         
+        if not await self.admit_job(query, user_id, video_count):
+            return
+        
         # Запускаем обработку в фоне
         asyncio.create_task(
             self.process_multiple_videos(user_id, query, filter_id, video_count, context)
@@ -1874,8 +2150,12 @@ ID сценария: {video_data['metadata']['scenario_id']}
             logger.error(f"Ошибка быстрого одобрения: {e}")
             await query.edit_message_text(f"❌ Ошибка обработки: {str(e)}")
     
+    @tracing.job('batch')
+    @workspace.job('batch')
     async def process_multiple_videos(self, user_id: int, query, filter_id: str, video_count: int, context):
         """Обработка нескольких видео"""
+        status = self.status_board.message(query.edit_message_text)
+        results_folder = None
         try:
             # Проверяем размер файла ПЕРЕД попыткой get_file()
             file_size_mb = user_states[user_id]['file_size'] / (1024 * 1024)
@@ -1886,7 +2166,7 @@ ID сценария: {video_data['metadata']['scenario_id']}
             logger.info(f"📊 Размер файла: {file_size_mb:.1f} MB, лимит Railway: {railway_limit_mb} MB")
             if file_size_mb > railway_limit_mb:  # Jeśli файл больше 2GB, автоматически сжимаем
                 logger.info(f"🚨 Файл превышает Railway лимит! Начинаю компрессию...")
-                await query.message.edit_text(
+                status.set(
                     f"📦 **АВТОМАТИЧЕСКАЯ КОМПРЕССИЯ**\n\n"
                     f"📁 Размер: {file_size_mb:.1f} MB\n"
                     f"📁 Имя: {user_states[user_id]['filename']}\n\n"
@@ -1895,7 +2175,7 @@ ID сценария: {video_data['metadata']['scenario_id']}
                 )
                 
                 # Показываем инструкции по компрессии (Telegram API не позволяет скачать файлы >20MB)
-                await query.message.edit_text(
+                await status.update(
                     f"📦 **КОМПРЕССИЯ ТРЕБУЕТСЯ**\n\n"
                     f"📁 Размер: {file_size_mb:.1f} MB\n"
                     f"📁 Имя: {user_states[user_id]['filename']}\n\n"
@@ -1934,7 +2214,7 @@ ID сценария: {video_data['metadata']['scenario_id']}
                     logger.info(f"   File size: {user_states[user_id]['file_size'] / (1024*1024):.1f}MB")
                 if "File is too big" in str(e):
                     file_size_mb = user_states[user_id]['file_size'] / (1024*1024)
-                    await query.message.edit_text(
+                    await status.update(
                         f"⚠️ **Файл слишком большой для стандартного Telegram API!**\n\n"
                         f"📁 Размер: {file_size_mb:.1f} MB\n"
                         f"📁 Имя: {user_states[user_id]['filename']}\n\n"
@@ -1956,14 +2236,23 @@ ID сценария: {video_data['metadata']['scenario_id']}
             # Создаем уникальное имя файла для входного файла
             unique_id = str(uuid.uuid4())[:8]
             input_filename = f"input_{unique_id}.mp4"
-            input_path = self.temp_dir / input_filename
+            input_path = workspace.current().path(input_filename)
             
             # Скачиваем файл
-            await file.download_to_drive(input_path)
+            with metrics.timed(metrics.DOWNLOAD_SECONDS), tracing.span('download', bytes=file.file_size):
+                await file.download_to_drive(input_path)
             
             # Создаем папку для результатов
             results_folder = self.results_dir / f"batch_{unique_id}"
+            # Папка занята задачей: уборщик не удалит ее, пока идет рендер и выгрузка
+            self.janitor.hold(results_folder)
             results_folder.mkdir(exist_ok=True)
+            tracing.set_run_dir(results_folder)
+            
+            # CRF/maxrate по сложности исходника (анализ в потоке - цикл событий не блокируется)
+            encoding = await asyncio.get_running_loop().run_in_executor(
+                None, contextvars.copy_context().run, complexity.choose_rate, str(input_path))
+            tracing.update_run_summary(results_folder / 'run_summary.json', encoding=encoding)
             
             # Обрабатываем каждое видео
             processed_videos = []
@@ -1973,14 +2262,18 @@ ID сценария: {video_data['metadata']['scenario_id']}
                     output_filename = f"output_{unique_id}_{i+1}.mp4"
                     output_path = results_folder / output_filename
                     
-                    # Обрабатываем видео
-                    uniquizer = VideoUniquizer()
+                    # Обрабатываем видео в потоке; проценты рендера идут в статусное сообщение
+                    def progress_callback(message, progress_pct=None, done=i):
+                        if progress_pct is not None:
+                            status.set(f"🎬 Создано {done}/{video_count} видео...\n"
+                                       f"⏳ Видео {done + 1}: {progress_pct:.0f}%")
+                    
+                    uniquizer = VideoUniquizer(progress_callback=progress_callback, rate_args=encoding['rate_args'])
                     filter_info = INSTAGRAM_FILTERS[filter_id]
                     
-                    result_path = uniquizer.uniquize_video(
-                        input_path=str(input_path),
-                        output_path=str(output_path),
-                        effects=filter_info['effects']
+                    result_path = await asyncio.get_running_loop().run_in_executor(
+                        None, contextvars.copy_context().run, uniquizer.uniquize_video,
+                        str(input_path), str(output_path), filter_info['effects']
                     )
                     
                     # Загружаем на Yandex Disk
@@ -2000,28 +2293,29 @@ ID сценария: {video_data['metadata']['scenario_id']}
                     
                     # Обновляем прогресс
                     progress = f"🎬 Создано {i+1}/{video_count} видео..."
-                    await query.edit_message_text(progress)
+                    status.set(progress)
                     
                 except Exception as e:
                     logger.error(f"Ошибка обработки видео {i+1}: {e}")
                     continue
             
-            # Отправляем все видео
-            for video_data in processed_videos:
-                try:
-                    await query.message.reply_video(
-                        video=open(video_data['path'], 'rb'),
-                        caption=f"✅ Видео {video_data['index']}/{video_count}\n"
-                               f"🎨 Фильтр: {filter_info['name']}\n"
-                               f"📁 Размер: {os.path.getsize(video_data['path']) / (1024*1024):.1f} MB"
-                               + (f"\n☁️ Yandex Disk: {video_data['yandex_url']}" if video_data['yandex_url'] else ""),
-                        supports_streaming=True
-                    )
-                except Exception as e:
-                    logger.error(f"Ошибка отправки видео {video_data['index']}: {e}")
+            await status.flush()
+            
+            # Отправляем все видео альбомами; file_id сохраняется для повторных отправок
+            file_ids = await self.delivery.send_videos(context.bot, query.message.chat_id, [
+                (video_data['path'],
+                 f"✅ Видео {video_data['index']}/{video_count}\n"
+                 f"🎨 Фильтр: {filter_info['name']}\n"
+                 f"📁 Размер: {os.path.getsize(video_data['path']) / (1024*1024):.1f} MB"
+                 + (f"\n☁️ Yandex Disk: {video_data['yandex_url']}" if video_data['yandex_url'] else ""))
+                for video_data in processed_videos
+            ])
+            for video_data, file_id in zip(processed_videos, file_ids):
+                video_data['telegram_file_id'] = file_id
             
             # Очищаем только входной файл, выходные файлы оставляем для загрузки на Yandex Disk
             input_path.unlink(missing_ok=True)
+            self.janitor.track(results_folder)
             logger.info("Входной файл удален, выходные файлы сохранены для загрузки на Yandex Disk")
             
             # Обновляем состояние
@@ -2037,6 +2331,7 @@ ID сценария: {video_data['metadata']['scenario_id']}
                     'filename': user_states[user_id]['filename'],
                     'filter': filter_info['name'],
                     'video_path': video_data['path'],
+                    'telegram_file_id': video_data.get('telegram_file_id'),
                     'yandex_remote_path': video_data['yandex_remote_path'],
                     'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
                     'approval_id': approval_id,
@@ -2055,13 +2350,19 @@ ID сценария: {video_data['metadata']['scenario_id']}
                 text=f"❌ Ошибка обработки: {str(e)}"
             )
             user_states[user_id]['status'] = 'error'
+        finally:
+            if results_folder is not None:
+                self.janitor.release(results_folder)
     
+    @tracing.job('single')
+    @workspace.job('single')
     async def process_video(self, user_id: int, query, filter_id: str, context):
         """Обработка видео в фоне"""
+        status = self.status_board.message(query.edit_message_text)
         try:
             # Уведомляем о начале обработки
             filter_info = INSTAGRAM_FILTERS[filter_id]
-            await query.edit_message_text(
+            status.set(
                 f"🔄 **НАЧИНАЮ ОБРАБОТКУ ВИДЕО**\n\n"
                 f"🎨 Фильтр: {filter_info['name']}\n"
                 f"📁 Файл будет сохранен в папке:\n"
@@ -2078,7 +2379,7 @@ ID сценария: {video_data['metadata']['scenario_id']}
             logger.info(f"📊 Размер файла: {file_size_mb:.1f} MB, лимит Railway: {railway_limit_mb} MB")
             if file_size_mb > railway_limit_mb:  # Jeśli файл больше 2GB, автоматически сжимаем
                 logger.info(f"🚨 Файл превышает Railway лимит! Начинаю компрессию...")
-                await query.message.edit_text(
+                status.set(
                     f"📦 **АВТОМАТИЧЕСКАЯ КОМПРЕССИЯ**\n\n"
                     f"📁 Размер: {file_size_mb:.1f} MB\n"
                     f"📁 Имя: {user_states[user_id]['filename']}\n\n"
@@ -2087,7 +2388,7 @@ ID сценария: {video_data['metadata']['scenario_id']}
                 )
                 
                 # Показываем инструкции по компрессии (Telegram API не позволяет скачать файлы >20MB)
-                await query.message.edit_text(
+                await status.update(
                     f"📦 **КОМПРЕССИЯ ТРЕБУЕТСЯ**\n\n"
                     f"📁 Размер: {file_size_mb:.1f} MB\n"
                     f"📁 Имя: {user_states[user_id]['filename']}\n\n"
@@ -2126,7 +2427,7 @@ ID сценария: {video_data['metadata']['scenario_id']}
                     logger.info(f"   File size: {user_states[user_id]['file_size'] / (1024*1024):.1f}MB")
                 if "File is too big" in str(e):
                     file_size_mb = user_states[user_id]['file_size'] / (1024*1024)
-                    await query.message.edit_text(
+                    await status.update(
                         f"⚠️ **Файл слишком большой для стандартного Telegram API!**\n\n"
                         f"📁 Размер: {file_size_mb:.1f} MB\n"
                         f"📁 Имя: {user_states[user_id]['filename']}\n\n"
@@ -2153,14 +2454,17 @@ ID сценария: {video_data['metadata']['scenario_id']}
             input_filename = f"input_{unique_id}.mp4"
             output_filename = f"{upload_date}_{video_id}.mp4"
             
-            input_path = self.temp_dir / input_filename
-            output_path = self.temp_dir / output_filename
+            input_path = workspace.current().path(input_filename)
+            output_path = workspace.current().path(output_filename)
+            # Папка запуска одиночной задачи: trace-файлы и run_summary.json, как у пакетов
+            tracing.set_run_dir(self.results_dir / f"single_{unique_id}")
             
             # Скачиваем файл
-            await file.download_to_drive(input_path)
+            with metrics.timed(metrics.DOWNLOAD_SECONDS), tracing.span('download', bytes=file.file_size):
+                await file.download_to_drive(input_path)
             
             # Уведомляем о начале обработки
-            await query.edit_message_text(
+            status.set(
                 f"🎬 **ОБРАБАТЫВАЮ ВИДЕО**\n\n"
                 f"🎨 Фильтр: {filter_info['name']}\n"
                 f"📂 Входной файл: `{input_path}`\n"
@@ -2168,17 +2472,27 @@ ID сценария: {video_data['metadata']['scenario_id']}
                 f"⏳ Обработка может занять несколько минут..."
             )
             
-            # Обрабатываем видео
-            uniquizer = VideoUniquizer()
+            # Обрабатываем видео в потоке (CRF/maxrate по сложности исходника); проценты - в статус
+            def progress_callback(message, progress_pct=None):
+                if progress_pct is not None:
+                    status.set(
+                        f"🎬 **ОБРАБАТЫВАЮ ВИДЕО**\n\n"
+                        f"🎨 Фильтр: {filter_info['name']}\n"
+                        f"📊 Прогресс: {progress_pct:.0f}%\n\n"
+                        f"⏳ Обработка может занять несколько минут..."
+                    )
+            
+            rate_args = (await asyncio.get_running_loop().run_in_executor(
+                None, contextvars.copy_context().run, complexity.choose_rate, str(input_path)))['rate_args']
+            uniquizer = VideoUniquizer(progress_callback=progress_callback, rate_args=rate_args)
             
-            result_path = uniquizer.uniquize_video(
-                input_path=str(input_path),
-                output_path=str(output_path),
-                effects=filter_info['effects']
+            result_path = await asyncio.get_running_loop().run_in_executor(
+                None, contextvars.copy_context().run, uniquizer.uniquize_video,
+                str(input_path), str(output_path), filter_info['effects']
             )
             
             # Уведомляем о завершении обработки
-            await query.edit_message_text(
+            await status.update(
                 f"✅ **ОБРАБОТКА ЗАВЕРШЕНА!**\n\n"
                 f"🎨 Фильтр: {filter_info['name']}\n"
                 f"📁 Файл сохранен в: `{result_path}`\n"
@@ -2273,18 +2587,22 @@ ID сценария: {video_data['metadata']['scenario_id']}
                 start_time = i * chunk_duration
                 chunk_path = os.path.join(chunks_dir, f"chunk_{i:02d}.mp4")
                 
-                cmd = [
-                    'ffmpeg', '-i', file_path,
-                    '-ss', str(start_time),
-                    '-t', str(chunk_duration),
-                    '-c', 'copy',  # Копируем без перекодирования
-                    '-y',
-                    chunk_path
-                ]
-                
-                result = subprocess.run(cmd, capture_output=True, text=True)
+                # Smart cut: точный рез без замерзших кадров в начале части, перекодируются только края
+                with metrics.timed(metrics.ENCODE_SECONDS, kind='split'), tracing.span('split', part=i + 1):
+                    cut_ok = smart_cut(file_path, chunk_path, start_time, min(start_time + chunk_duration, duration))
+                    if not cut_ok:
+                        cmd = [
+                            'ffmpeg', '-i', file_path,
+                            '-ss', str(start_time),
+                            '-t', str(chunk_duration),
+                            '-c', 'copy',  # Копируем без перекодирования
+                            '-y',
+                            chunk_path
+                        ]
+                        result = subprocess.run(cmd, capture_output=True, text=True)
+                        cut_ok = result.returncode == 0
                 
-                if result.returncode == 0 and os.path.exists(chunk_path):
+                if cut_ok and os.path.exists(chunk_path):
                     chunks.append(chunk_path)
                     logger.info(f"✅ Часть {i+1}/{chunk_count} создана: {chunk_path}")
                     print(f"✅ ЧАСТЬ {i+1}/{chunk_count}: {chunk_path}")
@@ -2355,7 +2673,6 @@ ID сценария: {video_data['metadata']['scenario_id']}
             import tempfile
             import os
             import requests
-            import subprocess
             
             logger.info(f"🔄 Начинаю автоматическую компрессию: {filename}")
             logger.info(f"📁 File ID: {file_id}")
@@ -2396,59 +2713,37 @@ ID сценария: {video_data['metadata']['scenario_id']}
                 input_size_mb = input_size / (1024 * 1024)
                 logger.info(f"📁 Размер входного файла: {input_size_mb:.1f} MB")
                 
-                # Сжимаем файл с агрессивными настройками
+                # Сжимаем файл до 480p
                 compressed_path = os.path.join(temp_dir, f"compressed_{file_id}.mp4")
                 
-                # Определяем целевую битрейт на основе размера
-                target_bitrate = "500k" if input_size_mb > 50 else "1000k"
-                
-                cmd = [
-                    'ffmpeg', '-i', temp_input,
-                    '-c:v', 'libx264',
-                    '-crf', '32',  # Очень высокая компрессия
-                    '-preset', 'ultrafast',  # Быстрая компрессия
-                    '-c:a', 'aac',
-                    '-b:a', '64k',  # Низкий битрейт аудио
-                    '-vf', 'scale=854:480',  # Масштабируем до 480p
-                    '-b:v', target_bitrate,
-                    '-maxrate', target_bitrate,
-                    '-bufsize', f"{int(target_bitrate.replace('k', '')) * 2}k",
-                    '-y',
-                    compressed_path
-                ]
+                # Битрейт считается из длительности под лимит Bot API - без повторных попыток
+                result = await asyncio.get_running_loop().run_in_executor(
+                    None, contextvars.copy_context().run, self.compress_to_size_sync,
+                    temp_input, compressed_path, BOT_API_FILE_LIMIT, 480, 64_000, 'ultrafast')
                 
-                logger.info(f"🔄 Компрессия с параметрами: {target_bitrate}, 480p")
-                result = subprocess.run(cmd, capture_output=True, text=True, timeout=300)
-                
-                if result.returncode == 0 and os.path.exists(compressed_path):
-                    compressed_size = os.path.getsize(compressed_path)
-                    compressed_size_mb = compressed_size / (1024 * 1024)
+                if result.get('success'):
+                    compressed_size_mb = result['size'] / (1024 * 1024)
                     
                     logger.info(f"✅ Компрессия завершена: {input_size_mb:.1f} MB -> {compressed_size_mb:.1f} MB")
                     
-                    # Проверяем размер сжатого файла
-                    if compressed_size < 20 * 1024 * 1024:  # < 20MB
-                        # Загружаем сжатый файл обратно в Telegram
-                        with open(compressed_path, 'rb') as f:
-                            message = await context.bot.send_document(
-                                chat_id=user_id,
-                                document=f,
-                                filename=f"compressed_{filename}",
-                                caption=f"📦 Автоматически сжатое видео\n📁 Размер: {compressed_size_mb:.1f} MB"
-                            )
-                        
-                        logger.info(f"✅ Сжатый файл загружен: {message.document.file_id}")
-                        
-                        return {
-                            'file_id': message.document.file_id,
-                            'file_size': message.document.file_size,
-                            'filename': message.document.file_name
-                        }
-                    else:
-                        logger.error(f"❌ Сжатый файл все еще слишком большой: {compressed_size_mb:.1f} MB")
-                        return None
+                    # Загружаем сжатый файл обратно в Telegram
+                    with open(compressed_path, 'rb') as f:
+                        message = await context.bot.send_document(
+                            chat_id=user_id,
+                            document=f,
+                            filename=f"compressed_{filename}",
+                            caption=f"📦 Автоматически сжатое видео\n📁 Размер: {compressed_size_mb:.1f} MB"
+                        )
+                    
+                    logger.info(f"✅ Сжатый файл загружен: {message.document.file_id}")
+                    
+                    return {
+                        'file_id': message.document.file_id,
+                        'file_size': message.document.file_size,
+                        'filename': message.document.file_name
+                    }
                 else:
-                    logger.error(f"❌ Ошибка компрессии: {result.stderr}")
+                    logger.error(f"❌ Ошибка компрессии: {result['error']}")
                     return None
                     
         except Exception as e:
@@ -2484,46 +2779,28 @@ ID сценария: {video_data['metadata']['scenario_id']}
                         # Сжимаем файл
                         compressed_path = os.path.join(temp_dir, f"compressed_{file_id}.mp4")
                         
-                        cmd = [
-                            'ffmpeg', '-i', temp_input,
-                            '-c:v', 'libx264',
-                            '-crf', '30',  # Высокая компрессия
-                            '-preset', 'fast',
-                            '-c:a', 'aac',
-                            '-b:a', '96k',
-                            '-vf', 'scale=1280:720',  # Масштабируем до 720p
-                            '-y',
-                            compressed_path
-                        ]
-                        
-                        import subprocess
-                        result = subprocess.run(cmd, capture_output=True, text=True)
+                        result = await asyncio.get_running_loop().run_in_executor(
+                            None, contextvars.copy_context().run, self.compress_to_size_sync,
+                            temp_input, compressed_path, BOT_API_FILE_LIMIT, 720, 96_000)
                         
-                        if result.returncode == 0 and os.path.exists(compressed_path):
-                            compressed_size = os.path.getsize(compressed_path)
+                        if result.get('success'):
+                            # Загружаем сжатый файл обратно в Telegram
+                            with open(compressed_path, 'rb') as f:
+                                # Отправляем как документ
+                                message = await context.bot.send_document(
+                                    chat_id=user_id,
+                                    document=f,
+                                    filename=f"compressed_{filename}",
+                                    caption="📦 Сжатое видео для обработки"
+                                )
                             
-                            # Проверяем размер сжатого файла
-                            if compressed_size < 20 * 1024 * 1024:  # < 20MB
-                                # Загружаем сжатый файл обратно в Telegram
-                                with open(compressed_path, 'rb') as f:
-                                    # Отправляем как документ
-                                    message = await context.bot.send_document(
-                                        chat_id=user_id,
-                                        document=f,
-                                        filename=f"compressed_{filename}",
-                                        caption="📦 Сжатое видео для обработки"
-                                    )
-                                
-                                return {
-                                    'file_id': message.document.file_id,
-                                    'file_size': message.document.file_size,
-                                    'filename': message.document.file_name
-                                }
-                            else:
-                                logger.error(f"❌ Сжатый файл все еще слишком большой: {compressed_size / (1024*1024):.1f} MB")
-                                return None
+                            return {
+                                'file_id': message.document.file_id,
+                                'file_size': message.document.file_size,
+                                'filename': message.document.file_name
+                            }
                         else:
-                            logger.error(f"❌ Ошибка сжатия: {result.stderr}")
+                            logger.error(f"❌ Ошибка сжатия: {result['error']}")
                             return None
                     else:
                         logger.error(f"❌ Ошибка скачивания: {response.status_code}")
@@ -2559,17 +2836,21 @@ ID сценария: {video_data['metadata']['scenario_id']}
             # Создаем обрезанный файл
             trimmed_path = file_path.replace('.mp4', '_trimmed.mp4')
             
-            cmd = [
-                'ffmpeg', '-i', file_path,
-                '-t', str(max_duration_seconds),  # Обрезаем до max_duration_seconds
-                '-c', 'copy',  # Копируем без перекодирования
-                '-y',  # Перезаписать файл
-                trimmed_path
-            ]
-            
-            result = subprocess.run(cmd, capture_output=True, text=True)
-            
-            if result.returncode == 0 and os.path.exists(trimmed_path):
+            # Smart cut: точно max_duration_seconds, перекодируется только последний неполный GOP
+            with metrics.timed(metrics.ENCODE_SECONDS, kind='trim'), tracing.span('trim'):
+                cut_ok = smart_cut(file_path, trimmed_path, 0, max_duration_seconds)
+                if not cut_ok:
+                    cmd = [
+                        'ffmpeg', '-i', file_path,
+                        '-t', str(max_duration_seconds),  # Обрезаем до max_duration_seconds
+                        '-c', 'copy',  # Копируем без перекодирования
+                        '-y',  # Перезаписать файл
+                        trimmed_path
+                    ]
+                    result = subprocess.run(cmd, capture_output=True, text=True)
+                    cut_ok = result.returncode == 0
+            
+            if cut_ok and os.path.exists(trimmed_path):
                 trimmed_size_mb = os.path.getsize(trimmed_path) / (1024 * 1024)
                 logger.info(f"✅ Видео обрезано: {duration:.1f}s -> {max_duration_seconds}s, размер: {trimmed_size_mb:.1f} MB")
                 
@@ -2584,10 +2865,23 @@ ID сценария: {video_data['metadata']['scenario_id']}
             logger.error(f"❌ Ошибка обрезки видео: {e}")
             return file_path
     
+    def compress_to_size_sync(self, input_path: str, output_path: str, max_bytes: int,
+                              max_height: int = 720, audio_bitrate: int = 96_000, preset: str = 'fast',
+                              timeout: Optional[float] = 300) -> dict:
+        """
+        Кодирует видео в лимит max_bytes одним проходом (target_size.encode_to_size);
+        timeout - секунд на проход ffmpeg, как у прежнего сжатия.
+        Сжатие - такая же работа для ThreadGovernor, как рендер; внутри рендера берется его аренда.
+        """
+        with self.thread_governor.lease(reuse=True) as budget, metrics.timed(metrics.ENCODE_SECONDS, kind='compress'), \
+                tracing.span('compress', bytes=os.path.getsize(input_path), max_bytes=max_bytes):
+            return encode_to_size(input_path, output_path, max_bytes, audio_bitrate=audio_bitrate,
+                                  max_height=max_height, timeout=timeout,
+                                  x264_args=['-preset', preset, '-threads', str(budget.threads)])
+    
     def compress_video_if_needed_sync(self, file_path: str, max_size_mb: int = 2000) -> str:
         """Сжимает видео если оно слишком большое (синхронная версия)"""
         try:
-            import subprocess
             import os
             
             # Проверяем размер файла
@@ -2601,30 +2895,18 @@ ID сценария: {video_data['metadata']['scenario_id']}
             # Создаем сжатый файл
             compressed_path = file_path.replace('.mp4', '_compressed.mp4')
             
-            # Используем ffmpeg для сжатия z lepszymi parametrami dla .MOV
-            cmd = [
-                'ffmpeg', '-i', file_path,
-                '-c:v', 'libx264',
-                '-crf', '30',  # Większa kompresja dla .MOV
-                '-preset', 'fast',
-                '-c:a', 'aac',
-                '-b:a', '96k',  # Niższy bitrate audio
-                '-vf', 'scale=1280:720',  # Skalowanie do 720p
-                '-y',  # Перезаписать файл
-                compressed_path
-            ]
-            
-            result = subprocess.run(cmd, capture_output=True, text=True)
+            # Битрейт из длительности видео - файл укладывается в лимит с первого раза
+            result = self.compress_to_size_sync(file_path, compressed_path, max_size_mb * 1024 * 1024)
             
-            if result.returncode == 0 and os.path.exists(compressed_path):
-                compressed_size_mb = os.path.getsize(compressed_path) / (1024 * 1024)
+            if result.get('success'):
+                compressed_size_mb = result['size'] / (1024 * 1024)
                 logger.info(f"✅ Видео сжато: {file_size_mb:.1f} MB -> {compressed_size_mb:.1f} MB")
                 
                 # Удаляем оригинальный файл
                 os.remove(file_path)
                 return compressed_path
             else:
-                logger.error(f"❌ Ошибка сжатия: {result.stderr}")
+                logger.error(f"❌ Ошибка сжатия: {result['error']}")
                 return file_path
                 
         except Exception as e:
@@ -2633,50 +2915,8 @@ ID сценария: {video_data['metadata']['scenario_id']}
     
     async def compress_video_if_needed(self, file_path: str, max_size_mb: int = 2000) -> str:
         """Сжимает видео если оно слишком большое"""
-        try:
-            import subprocess
-            import os
-            
-            # Проверяем размер файла
-            file_size_mb = os.path.getsize(file_path) / (1024 * 1024)
-            if file_size_mb <= max_size_mb:
-                return file_path
-            
-            logger.info(f"🔄 Сжимаю видео: {file_size_mb:.1f} MB -> {max_size_mb} MB")
-            print(f"📦 КОМПРЕССИЯ: {file_size_mb:.1f} MB -> {max_size_mb} MB")
-            
-            # Создаем сжатый файл
-            compressed_path = file_path.replace('.mp4', '_compressed.mp4')
-            
-            # Используем ffmpeg для сжатия z lepszymi parametrami dla .MOV
-            cmd = [
-                'ffmpeg', '-i', file_path,
-                '-c:v', 'libx264',
-                '-crf', '30',  # Większa kompresja dla .MOV
-                '-preset', 'fast',
-                '-c:a', 'aac',
-                '-b:a', '96k',  # Niższy bitrate audio
-                '-vf', 'scale=1280:720',  # Skalowanie do 720p
-                '-y',  # Перезаписать файл
-                compressed_path
-            ]
-            
-            result = subprocess.run(cmd, capture_output=True, text=True)
-            
-            if result.returncode == 0 and os.path.exists(compressed_path):
-                compressed_size_mb = os.path.getsize(compressed_path) / (1024 * 1024)
-                logger.info(f"✅ Видео сжато: {file_size_mb:.1f} MB -> {compressed_size_mb:.1f} MB")
-                
-                # Удаляем оригинальный файл
-                os.remove(file_path)
-                return compressed_path
-            else:
-                logger.error(f"❌ Ошибка сжатия: {result.stderr}")
-                return file_path
-                
-        except Exception as e:
-            logger.error(f"❌ Ошибка сжатия видео: {e}")
-            return file_path
+        return await asyncio.get_running_loop().run_in_executor(
+            None, contextvars.copy_context().run, self.compress_video_if_needed_sync, file_path, max_size_mb)
     
     async def upload_to_yandex_disk(self, file_path: str, user_id: int, filter_id: str) -> tuple:
         """Загрузка файла на Yandex Disk"""
@@ -2742,7 +2982,9 @@ ID сценария: {video_data['metadata']['scenario_id']}
             
             # Загружаем файл
             logger.info(f"⬆️ Загружаю файл на Yandex Disk: {remote_path}")
-            self.yandex_disk.upload(file_path, remote_path)
+            with metrics.throughput(metrics.UPLOAD_THROUGHPUT, os.path.getsize(file_path), target='yandex'), \
+                    tracing.span('upload:yandex', bytes=os.path.getsize(file_path)):
+                self.yandex_disk.upload(file_path, remote_path)
             
             # Создаем публичную ссылку
             public_url = self.yandex_disk.get_download_link(remote_path)
@@ -2760,33 +3002,15 @@ ID сценария: {video_data['metadata']['scenario_id']}
         try:
             # Use port 8082 for WebSocket (8081 is used by self-hosted API)
             websocket_port = 8082
+            self.progress_hub.attach(asyncio.get_running_loop())
             self.websocket_server = await websockets.serve(
-                self.handle_websocket_connection,
+                self.progress_hub.handle_connection,
                 "0.0.0.0", websocket_port
             )
             logger.info(f"🚀 WebSocket server started on port {websocket_port}")
         except Exception as e:
             logger.error(f"❌ Failed to start WebSocket server: {e}")
     
-    async def handle_websocket_connection(self, websocket, path):
-        """Handle WebSocket connections for progress updates"""
-        try:
-            async for message in websocket:
-                data = json.loads(message)
-                
-                if data.get("type") == "subscribe_progress":
-                    user_id = data.get("user_id")
-                    if user_id in self.upload_progress:
-                        self.upload_progress[user_id].add_client(websocket)
-                        logger.info(f"📡 WebSocket client subscribed to user {user_id}")
-                
-        except websockets.exceptions.ConnectionClosed:
-            # Remove client from all progress trackers
-            for progress in self.upload_progress.values():
-                progress.remove_client(websocket)
-        except Exception as e:
-            logger.error(f"❌ WebSocket error: {e}")
-    
     def compress_mov_file(self, file_path: str, output_path: str) -> str:
         """Compress .MOV files for faster upload"""
         try:
@@ -2802,20 +3026,22 @@ ID сценария: {video_data['metadata']['scenario_id']}
             
             logger.info(f"🗜️ Compressing .MOV file: {file_size / (1024*1024):.1f}MB")
             
-            # Use FFmpeg to compress .MOV files
-            cmd = [
-                'ffmpeg', '-i', file_path,
-                '-c:v', 'libx264',           # H.264 codec
-                '-crf', '28',                # Constant rate factor (lower = better quality)
-                '-preset', 'fast',           # Fast encoding
-                '-c:a', 'aac',               # AAC audio codec
-                '-b:a', '128k',              # Audio bitrate
-                '-movflags', '+faststart',   # Optimize for streaming
-                '-y',                        # Overwrite output file
-                output_path
-            ]
-            
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=300)
+            # Use FFmpeg to compress .MOV files (threads leased from ThreadGovernor like a render)
+            with self.thread_governor.lease(reuse=True) as budget:
+                cmd = [
+                    'ffmpeg', *budget.ffmpeg_args(), '-i', file_path,
+                    '-c:v', 'libx264',           # H.264 codec
+                    '-crf', '28',                # Constant rate factor (lower = better quality)
+                    '-preset', 'fast',           # Fast encoding
+                    '-threads', str(budget.threads),
+                    '-c:a', 'aac',               # AAC audio codec
+                    '-b:a', '128k',              # Audio bitrate
+                    '-movflags', '+faststart',   # Optimize for streaming
+                    '-y',                        # Overwrite output file
+                    output_path
+                ]
+                
+                result = subprocess.run(cmd, capture_output=True, text=True, timeout=300)
             
             if result.returncode == 0 and os.path.exists(output_path):
                 compressed_size = os.path.getsize(output_path)
@@ -2845,7 +3071,7 @@ ID сценария: {video_data['metadata']['scenario_id']}
             file_size = os.path.getsize(file_path)
             
             # Create progress tracker
-            progress = WebSocketUploadProgress(user_id, filename)
+            progress = WebSocketUploadProgress(user_id, filename, hub=self.progress_hub)
             self.upload_progress[user_id] = progress
             progress.set_status("preparing")
             
@@ -2856,28 +3082,47 @@ ID сценария: {video_data['metadata']['scenario_id']}
             progress.set_status("uploading")
             progress.update_progress(0, file_size)
             
+            # Local Bot API server reads the file by path - no multipart copy, no chunks
+            async def send_local(uri: str):
+                with metrics.throughput(metrics.UPLOAD_THROUGHPUT, file_size, target='telegram_local'), \
+                        tracing.span('upload:telegram', bytes=file_size, local=True):
+                    return await context.bot.send_document(
+                        chat_id=user_id,
+                        document=uri,
+                        caption=caption,
+                        read_timeout=300,
+                        write_timeout=300,
+                        connect_timeout=60,
+                        pool_timeout=60
+                    )
+            
+            message = await self.local_files.send(file_path, send_local)
+            
             # For files > 50MB, use chunked upload
-            if file_size > 50 * 1024 * 1024:
+            if message is None and file_size > 50 * 1024 * 1024:
                 return await self.chunked_upload(file_path, user_id, context, 
                                               filename, caption, progress)
             
             # For smaller files, use optimized direct upload
-            with open(file_path, 'rb') as f:
-                # Upload to Telegram with optimized settings
-                message = await context.bot.send_document(
-                    chat_id=user_id,
-                    document=f,
-                    filename=filename,
-                    caption=caption,
-                    # Optimize for speed
-                    read_timeout=300,  # 5 minutes timeout
-                    write_timeout=300,  # 5 minutes timeout
-                    connect_timeout=60,  # 1 minute connection timeout
-                    pool_timeout=60  # 1 minute pool timeout
-                )
-                
-                # Update progress to 100% after successful upload
-                progress.update_progress(file_size, file_size)
+            if message is None:
+                with open(file_path, 'rb') as f, \
+                        metrics.throughput(metrics.UPLOAD_THROUGHPUT, file_size, target='telegram'), \
+                        tracing.span('upload:telegram', bytes=file_size):
+                    # Upload to Telegram with optimized settings
+                    message = await context.bot.send_document(
+                        chat_id=user_id,
+                        document=f,
+                        filename=filename,
+                        caption=caption,
+                        # Optimize for speed
+                        read_timeout=300,  # 5 minutes timeout
+                        write_timeout=300,  # 5 minutes timeout
+                        connect_timeout=60,  # 1 minute connection timeout
+                        pool_timeout=60  # 1 minute pool timeout
+                    )
+            
+            # Update progress to 100% after successful upload
+            progress.update_progress(file_size, file_size)
             
             progress.set_status("completed")
             
@@ -2918,37 +3163,26 @@ ID сценария: {video_data['metadata']['scenario_id']}
                 chunk_size = 5 * 1024 * 1024  # 5MB chunks
                 max_concurrent = 5  # 5 parallel uploads
             
-            total_chunks = (file_size + chunk_size - 1) // chunk_size
+            # Chunks are windows over the original file (os.pread) - nothing is copied to disk
+            windows = file_windows(file_size, chunk_size)
             progress.set_status("chunked_upload")
-            
-            # Create temporary chunks
-            temp_chunks = []
-            with open(file_path, 'rb') as f:
-                chunk_num = 0
-                while True:
-                    chunk_data = f.read(chunk_size)
-                    if not chunk_data:
-                        break
-                    
-                    chunk_path = f"temp_chunk_{user_id}_{chunk_num}.tmp"
-                    with open(chunk_path, 'wb') as chunk_file:
-                        chunk_file.write(chunk_data)
-                    temp_chunks.append(chunk_path)
-                    chunk_num += 1
+            uploaded_bytes = 0
             
             # Upload chunks in parallel with semaphore for concurrency control
             semaphore = asyncio.Semaphore(max_concurrent)
             upload_tasks = []
             
-            async def upload_chunk(chunk_path: str, chunk_index: int):
+            async def upload_chunk(offset: int, length: int, chunk_index: int):
+                nonlocal uploaded_bytes
                 async with semaphore:
                     try:
-                        with open(chunk_path, 'rb') as f:
+                        # Opened only while uploading, so at most max_concurrent descriptors at a time
+                        with FileWindow(file_path, offset, length, name=f"{filename}_part{chunk_index + 1}") as f:
                             message = await context.bot.send_document(
                                 chat_id=user_id,
                                 document=f,
                                 filename=f"{filename}_part{chunk_index + 1}",
-                                caption=f"📦 Часть {chunk_index + 1}/{len(temp_chunks)}",
+                                caption=f"📦 Часть {chunk_index + 1}/{len(windows)}",
                                 # Optimize for speed
                                 read_timeout=300,
                                 write_timeout=300,
@@ -2956,30 +3190,24 @@ ID сценария: {video_data['metadata']['scenario_id']}
                                 pool_timeout=60
                             )
                         
-                        # Clean up chunk after upload
-                        os.unlink(chunk_path)
-                        
-                        # Update progress
-                        progress.update_progress(
-                            (chunk_index + 1) * chunk_size, 
-                            file_size
-                        )
+                        # Update progress with the bytes actually sent (the last chunk is shorter)
+                        uploaded_bytes += length
+                        progress.update_progress(uploaded_bytes, file_size)
                         
                         return message
                     except Exception as e:
                         logger.error(f"❌ Chunk {chunk_index + 1} upload error: {e}")
-                        # Clean up failed chunk
-                        if os.path.exists(chunk_path):
-                            os.unlink(chunk_path)
                         raise
             
             # Create upload tasks for all chunks
-            for i, chunk_path in enumerate(temp_chunks):
-                task = asyncio.create_task(upload_chunk(chunk_path, i))
+            for i, (offset, length) in enumerate(windows):
+                task = asyncio.create_task(upload_chunk(offset, length, i))
                 upload_tasks.append(task)
             
             # Wait for all uploads to complete
-            messages = await asyncio.gather(*upload_tasks, return_exceptions=True)
+            with metrics.throughput(metrics.UPLOAD_THROUGHPUT, file_size, target='telegram'), \
+                    tracing.span('upload:telegram', bytes=file_size, chunks=len(upload_tasks)):
+                messages = await asyncio.gather(*upload_tasks, return_exceptions=True)
             
             # Check for any failed uploads
             failed_uploads = [i for i, result in enumerate(messages) if isinstance(result, Exception)]
@@ -2993,7 +3221,7 @@ ID сценария: {video_data['metadata']['scenario_id']}
                 'file_id': first_message.document.file_id,
                 'file_size': first_message.document.file_size,
                 'filename': first_message.document.file_name,
-                'chunks': len(temp_chunks)
+                'chunks': len(windows)
             }
             
         except Exception as e:
@@ -3020,6 +3248,7 @@ def main():
         application = (Application.builder()
                       .token(TELEGRAM_BOT_TOKEN)
                       .base_url(ACTUAL_API_URL)
+                      .local_mode(bot.local_files.enabled)  # Accept file:// paths for uploads
                       .connection_pool_size(20)  # Increase connection pool
                       .read_timeout(300)        # 5 minutes read timeout
                       .write_timeout(300)       # 5 minutes write timeout
@@ -3071,6 +3300,7 @@ def main():
     application.add_handler(CommandHandler("approved", bot.approved_command))
     application.add_handler(CommandHandler("reject", bot.reject_command))
     application.add_handler(CommandHandler("send_to_chatbot", bot.send_to_chatbot_command))
+    application.add_handler(CommandHandler("profile", bot.profile_command))
     
     # Обработчики сообщений
     application.add_handler(MessageHandler(filters.VIDEO, bot.handle_video))
@@ -3100,7 +3330,41 @@ def main():
 # Health check server for Railway
 class HealthHandler(BaseHTTPRequestHandler):
     def do_GET(self):
-        if self.path == '/health':
+        url = urlsplit(self.path)
+        if url.path == '/profile' and PROFILE_HTTP_TOKEN:
+            authorization = self.headers.get('Authorization', '').encode()
+            if not hmac.compare_digest(authorization, f"Bearer {PROFILE_HTTP_TOKEN}".encode()):
+                self.send_response(401)
+                self.end_headers()
+                return
+            # Блокирует только поток этого запроса (ThreadingHTTPServer)
+            try:
+                seconds = float(parse_qs(url.query).get('seconds', ['10'])[0])
+            except ValueError:
+                self.send_response(400)
+                self.end_headers()
+                return
+            result = profiler.capture(seconds)
+            if 'error' in result:
+                self.send_response(409)
+                self.end_headers()
+                self.wfile.write(result['error'].encode())
+                return
+            body = result['collapsed'].encode()
+            self.send_response(200)
+            self.send_header('Content-type', 'text/plain; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.send_header('X-Profile-Path', result['path'] or '')
+            self.end_headers()
+            self.wfile.write(body)
+        elif url.path == '/metrics':
+            body = metrics.REGISTRY.render().encode()
+            self.send_response(200)
+            self.send_header('Content-type', metrics.CONTENT_TYPE)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        elif url.path == '/health':
             self.send_response(200)
             self.send_header('Content-type', 'application/json')
             self.end_headers()
@@ -3117,7 +3381,7 @@ class HealthHandler(BaseHTTPRequestHandler):
 def start_health_server():
     """Start health check server in background"""
     port = int(os.getenv('PORT', 8000))
-    server = HTTPServer(('0.0.0.0', port), HealthHandler)
+    server = ThreadingHTTPServer(('0.0.0.0', port), HealthHandler)
     server.serve_forever()
 
 if __name__ == "__main__":
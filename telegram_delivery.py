@@ -0,0 +1,376 @@
+#!/usr/bin/env python3
+"""
+Доставка готовых видео в Telegram: альбомами (send_media_group, до 10 видео),
+несколько альбомов параллельно (TELEGRAM_UPLOAD_CONCURRENCY), с ожиданием при
+RetryAfter (flood control).
+
+Telegram возвращает file_id загруженного видео; он сохраняется в FileIdCache
+по хэшу содержимого файла (blake2b), и повторная отправка того же результата
+(менеджеру, в чатбот, другому пользователю) идет по file_id - без новой
+загрузки сотен мегабайт. Кэш хранится в JSON (FILE_ID_CACHE), хэш файла
+вычисляется один раз на путь, размер и mtime.
+
+Если self-hosted Bot API запущен с --local и видит файлы бота (тот же контейнер
+или общий том, TELEGRAM_LOCAL_PATH_MAP), видео передаются путем file:// - сервер
+читает файл с диска сам, без multipart-копии сотен мегабайт через HTTP. Если
+сервер путь не принял, LocalFiles отключается и отправка идет обычной загрузкой.
+
+FileWindow - часть файла [offset, offset + length) как файловый объект только
+для чтения (os.pread): загрузка большого файла частями без копирования частей
+во временные файлы.
+"""
+
+import io
+import os
+import json
+import time
+import asyncio
+import hashlib
+import logging
+import threading
+from pathlib import PurePosixPath
+from urllib.parse import urlparse
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from telegram import InputMediaVideo
+from telegram.error import BadRequest, RetryAfter
+
+import metrics
+import tracing
+
+logger = logging.getLogger(__name__)
+
+FILE_ID_CACHE = os.getenv('FILE_ID_CACHE', 'telegram_file_ids.json')
+TELEGRAM_UPLOAD_CONCURRENCY = int(os.getenv('TELEGRAM_UPLOAD_CONCURRENCY', '3'))
+# auto - путь file://, если сервер Bot API на этой машине или задан общий том; true | false
+TELEGRAM_LOCAL_FILES = os.getenv('TELEGRAM_LOCAL_FILES', 'auto').lower()
+# Общий том с сервером Bot API: "путь_у_бота=путь_у_сервера" через запятую
+TELEGRAM_LOCAL_PATH_MAP = os.getenv('TELEGRAM_LOCAL_PATH_MAP', '')
+
+MEDIA_GROUP_LIMIT = 10
+MAX_RETRY_AFTER_ATTEMPTS = 3
+HASH_BLOCK_SIZE = 1024 * 1024
+
+UPLOAD_TIMEOUTS = dict(read_timeout=300, write_timeout=300, connect_timeout=60, pool_timeout=60)
+
+
+class LocalFiles:
+    """Пути file:// для self-hosted Bot API в режиме --local"""
+
+    LOCAL_HOSTS = ('localhost', '127.0.0.1', '::1')
+
+    def __init__(self, enabled: bool = False, path_map: Sequence[Tuple[str, str]] = ()):
+        self.enabled = enabled
+        self.path_map = [(os.path.realpath(bot_path), server_path) for bot_path, server_path in path_map]
+
+    @classmethod
+    def detect(cls, api_url: Optional[str], mode: str = TELEGRAM_LOCAL_FILES,
+               path_map: str = TELEGRAM_LOCAL_PATH_MAP) -> 'LocalFiles':
+        """
+        По адресу self-hosted Bot API (None - публичный API, локального режима нет):
+        сервер на localhost видит те же файлы, удаленный - только через общий том
+        """
+        pairs = [tuple(part.strip() for part in item.split('=', 1))
+                 for item in path_map.split(',') if '=' in item]
+        if not api_url or mode == 'false':
+            enabled = False
+        elif mode == 'true':
+            enabled = True
+        else:
+            enabled = urlparse(api_url).hostname in cls.LOCAL_HOSTS or bool(pairs)
+        if enabled:
+            logger.info(f"📂 Отправка файлов в Bot API путем file:// "
+                        f"({'общий том: ' + path_map if pairs else 'тот же хост'})")
+        return cls(enabled, pairs)
+
+    def uri(self, path: Optional[str]) -> Optional[str]:
+        """file:// для сервера Bot API; None - файл нужно загружать по HTTP"""
+        if not self.enabled or not path or not os.path.exists(path):
+            return None
+        real_path = os.path.realpath(path)
+        if self.path_map:
+            for bot_path, server_path in self.path_map:
+                if real_path == bot_path or real_path.startswith(bot_path + os.sep):
+                    real_path = server_path.rstrip('/') + real_path[len(bot_path):]
+                    break
+            else:
+                return None  # файл не на общем томе
+        return PurePosixPath(real_path).as_uri()
+
+    def disable(self, reason: str):
+        if self.enabled:
+            logger.warning(f"⚠️ Bot API не принял путь к файлу ({reason}) - дальше загрузка по HTTP")
+        self.enabled = False
+
+    async def send(self, path: Optional[str], send):
+        """
+        send(uri) для файла по пути. None - локальный режим недоступен или сервер
+        путь не принял: файл нужно загрузить по HTTP
+        """
+        uri = self.uri(path)
+        if uri is None:
+            return None
+        try:
+            return await send(uri)
+        except BadRequest as e:
+            self.disable(str(e))
+            return None
+
+
+class FileWindow(io.RawIOBase):
+    """Окно файла для чтения через os.pread: на диск ничего не пишется"""
+
+    def __init__(self, path: str, offset: int, length: int, name: Optional[str] = None):
+        super().__init__()
+        self._fd = os.open(path, os.O_RDONLY)
+        self.offset = offset
+        self.length = max(0, min(length, os.fstat(self._fd).st_size - offset))
+        self.name = name or os.path.basename(path)
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        size = min(len(buffer), self.length - self._position)
+        if size <= 0:
+            return 0
+        data = os.pread(self._fd, size, self.offset + self._position)
+        buffer[:len(data)] = data
+        self._position += len(data)
+        return len(data)
+
+    def seek(self, position: int, whence: int = io.SEEK_SET) -> int:
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._position, io.SEEK_END: self.length}[whence]
+        self._position = max(0, base + position)
+        return self._position
+
+    def tell(self) -> int:
+        return self._position
+
+    def close(self):
+        if not self.closed:
+            os.close(self._fd)
+        super().close()
+
+
+def file_windows(file_size: int, chunk_size: int) -> List[Tuple[int, int]]:
+    """(offset, length) частей файла; последняя часть - остаток"""
+    return [(offset, min(chunk_size, file_size - offset)) for offset in range(0, file_size, chunk_size)]
+
+
+class FileIdCache:
+    """file_id загруженных в Telegram файлов по хэшу содержимого"""
+
+    def __init__(self, path: Optional[str] = FILE_ID_CACHE):
+        self.path = path
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self._digests: Dict[Tuple[str, int, float], str] = {}
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    self.entries = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"⚠️ Кэш file_id не прочитан, начинаю пустой: {e}")
+
+    def digest(self, path: str) -> str:
+        """Хэш содержимого файла (считается один раз на путь, размер и mtime)"""
+        stat = os.stat(path)
+        key = (os.path.abspath(path), stat.st_size, stat.st_mtime)
+        with self._lock:
+            if key in self._digests:
+                return self._digests[key]
+        hasher = hashlib.blake2b(digest_size=20)
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+                hasher.update(block)
+        digest = hasher.hexdigest()
+        with self._lock:
+            self._digests[key] = digest
+        return digest
+
+    def get(self, digest: str) -> Optional[str]:
+        with self._lock:
+            entry = self.entries.get(digest)
+        return entry['file_id'] if entry else None
+
+    def put(self, digest: str, file_id: str, size: int = 0):
+        with self._lock:
+            self.entries[digest] = {'file_id': file_id, 'size': size, 'updated': time.time()}
+            entries = dict(self.entries)
+        if not self.path:
+            return
+        try:
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(entries, f, indent=2, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning(f"⚠️ Кэш file_id не сохранен: {e}")
+
+
+def _message_file_id(message) -> Optional[str]:
+    media = message.video or message.document
+    return media.file_id if media else None
+
+
+async def _retry_after(send, what: str):
+    """Вызывает send(), пока Telegram отвечает RetryAfter (не больше MAX_RETRY_AFTER_ATTEMPTS раз)"""
+    for attempt in range(MAX_RETRY_AFTER_ATTEMPTS + 1):
+        try:
+            return await send()
+        except RetryAfter as e:
+            if attempt == MAX_RETRY_AFTER_ATTEMPTS:
+                raise
+            logger.warning(f"⏳ Flood control ({what}): жду {e.retry_after}s")
+            await asyncio.sleep(e.retry_after)
+
+
+class VideoDelivery:
+    """Отправка видео альбомами с повторным использованием file_id"""
+
+    def __init__(self, cache: Optional[FileIdCache] = None,
+                 max_concurrent: int = TELEGRAM_UPLOAD_CONCURRENCY,
+                 local: Optional[LocalFiles] = None):
+        self.cache = cache if cache is not None else FileIdCache()
+        self.local = local if local is not None else LocalFiles()
+        self.max_concurrent = max_concurrent
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    def _slots(self) -> asyncio.Semaphore:
+        # Семафор создается в цикле событий бота, а не при создании объекта
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrent)
+        return self._semaphore
+
+    async def _lookup(self, path: Optional[str]) -> Tuple[Optional[str], Optional[str]]:
+        """(хэш, file_id из кэша) для локального файла"""
+        if not path or not os.path.exists(path):
+            return None, None
+        digest = await asyncio.get_running_loop().run_in_executor(None, self.cache.digest, path)
+        return digest, self.cache.get(digest)
+
+    async def send_video(self, bot, chat_id, path: Optional[str] = None, caption: str = '',
+                         file_id: Optional[str] = None) -> Optional[str]:
+        """
+        Одно видео: по file_id (переданному или из кэша), иначе загрузка файла.
+        Возвращает file_id отправленного видео
+        """
+        digest = None
+        if file_id is None:
+            digest, file_id = await self._lookup(path)
+        if file_id is not None:
+            try:
+                message = await _retry_after(
+                    lambda: bot.send_video(chat_id=chat_id, video=file_id, caption=caption, supports_streaming=True),
+                    'send_video')
+                return _message_file_id(message)
+            except BadRequest as e:
+                # file_id устарел (другой бот/сервер Bot API) - загружаем файл заново, если он есть
+                if not path or not os.path.exists(path):
+                    raise
+                logger.warning(f"⚠️ file_id не принят ({e}), загружаю файл заново")
+                digest = digest or await asyncio.get_running_loop().run_in_executor(None, self.cache.digest, path)
+        if not path or not os.path.exists(path):
+            raise FileNotFoundError(f"Нет ни file_id, ни файла: {path}")
+
+        size = os.path.getsize(path)
+
+        async def send_local(uri):
+            with metrics.throughput(metrics.UPLOAD_THROUGHPUT, size, target='telegram_local'), \
+                    tracing.span('upload:telegram', bytes=size, videos=1, local=True):
+                return await _retry_after(
+                    lambda: bot.send_video(chat_id=chat_id, video=uri, caption=caption,
+                                           supports_streaming=True, **UPLOAD_TIMEOUTS),
+                    'send_video')
+
+        async def upload():
+            with open(path, 'rb') as f:
+                return await bot.send_video(chat_id=chat_id, video=f, caption=caption,
+                                            supports_streaming=True, **UPLOAD_TIMEOUTS)
+
+        async with self._slots():
+            message = await self.local.send(path, send_local)
+            if message is None:
+                with metrics.throughput(metrics.UPLOAD_THROUGHPUT, size, target='telegram'), \
+                        tracing.span('upload:telegram', bytes=size, videos=1):
+                    message = await _retry_after(upload, 'send_video')
+        sent_id = _message_file_id(message)
+        if sent_id and digest:
+            self.cache.put(digest, sent_id, size)
+        return sent_id
+
+    async def _send_group(self, bot, chat_id, group: List[Dict[str, Any]]) -> List[Optional[str]]:
+        if len(group) == 1:
+            item = group[0]
+            return [await self.send_video(bot, chat_id, item['path'], item['caption'], item['file_id'])]
+
+        upload_bytes = sum(os.path.getsize(item['path']) for item in group if item['file_id'] is None)
+        # Если сервер не примет путь, альбом уйдет по одному видео (send_videos),
+        # и send_video отключит локальный режим и загрузит файлы по HTTP
+        local = any(item['file_id'] is None and self.local.uri(item['path']) for item in group)
+
+        async def send():
+            files = []
+            try:
+                media = []
+                for item in group:
+                    video = item['file_id'] or self.local.uri(item['path'])
+                    if video is None:
+                        video = open(item['path'], 'rb')
+                        files.append(video)
+                    media.append(InputMediaVideo(video, caption=item['caption'], supports_streaming=True))
+                return await bot.send_media_group(chat_id=chat_id, media=media, **UPLOAD_TIMEOUTS)
+            finally:
+                for f in files:
+                    f.close()
+
+        async with self._slots():
+            with metrics.throughput(metrics.UPLOAD_THROUGHPUT, upload_bytes,
+                                    target='telegram_local' if local else 'telegram'), \
+                    tracing.span('upload:telegram', bytes=upload_bytes, videos=len(group), local=local,
+                                 cached=sum(item['file_id'] is not None for item in group)):
+                messages = await _retry_after(send, 'send_media_group')
+
+        file_ids = [_message_file_id(message) for message in messages]
+        for item, sent_id in zip(group, file_ids):
+            if sent_id and item['file_id'] is None and item['digest']:
+                self.cache.put(item['digest'], sent_id, os.path.getsize(item['path']))
+        return file_ids
+
+    async def send_videos(self, bot, chat_id, videos: Sequence[Tuple[str, str]]) -> List[Optional[str]]:
+        """
+        Список (путь, подпись) альбомами до MEDIA_GROUP_LIMIT видео; альбомы уходят
+        параллельно. Возвращает file_id по порядку (None - видео не отправлено)
+        """
+        items = []
+        for path, caption in videos:
+            digest, file_id = await self._lookup(path)
+            items.append({'path': path, 'caption': caption, 'digest': digest, 'file_id': file_id})
+        groups = [items[i:i + MEDIA_GROUP_LIMIT] for i in range(0, len(items), MEDIA_GROUP_LIMIT)]
+
+        async def deliver(group):
+            try:
+                return await self._send_group(bot, chat_id, group)
+            except Exception as e:
+                if len(group) == 1:
+                    logger.error(f"❌ Ошибка отправки видео {group[0]['path']}: {e}")
+                    return [None]
+                # Альбом не ушел целиком (например, одно видео отклонено) - по одному
+                logger.warning(f"⚠️ Альбом из {len(group)} видео не отправлен ({e}), отправляю по одному")
+                file_ids = []
+                for item in group:
+                    try:
+                        file_ids.append(await self.send_video(bot, chat_id, item['path'], item['caption'],
+                                                              item['file_id']))
+                    except Exception as item_error:
+                        logger.error(f"❌ Ошибка отправки видео {item['path']}: {item_error}")
+                        file_ids.append(None)
+                return file_ids
+
+        results = await asyncio.gather(*(deliver(group) for group in groups))
+        return [file_id for group_ids in results for file_id in group_ids]
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Тест аудио: копирование без перекодирования, atempo при смене скорости, перенос на видео без звука
+"""
+
+import os
+import tempfile
+import importlib.util
+
+import cv2
+import pytest
+
+from ffmpeg_utils import probe_video, mux_audio, atempo_filter, audio_codec_args
+from clip_fixtures import make_clip, requires_ffmpeg
+
+
+def test_audio_args():
+    assert atempo_filter(1.2) == 'atempo=1.200000'
+    assert atempo_filter(3.0) == 'atempo=2.000000,atempo=1.500000'
+    assert audio_codec_args({'audio_codec': 'aac'}) == ['-c:a', 'copy']
+    assert audio_codec_args({'audio_codec': 'pcm_s16le'}) == ['-c:a', 'aac', '-b:a', '128k']
+    assert audio_codec_args({'audio_codec': 'aac'}, 0.8)[:2] == ['-filter:a', 'atempo=0.800000']
+    print("✅ Audio args")
+
+
+@requires_ffmpeg
+def test_mux_audio_copies_stream():
+    """Видео без звука + аудио исходника: видео и аудио не перекодируются"""
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, 'source.mp4')
+        video_only = os.path.join(tmp, 'video_only.mp4')
+        output = os.path.join(tmp, 'out.mp4')
+        make_clip(source)
+        make_clip(video_only, audio=False)
+        video_size = os.path.getsize(video_only)
+
+        assert mux_audio(video_only, source, output) == output
+        assert not os.path.exists(video_only)
+        info = probe_video(output)
+        assert info['has_audio'] and info['audio_codec'] == 'aac'
+        # Видео скопировано: файл больше исходного видео только на дорожку аудио
+        assert video_size < info['size'] < video_size + 60 * 1024
+
+        # Нет аудио в исходнике - файл просто переносится
+        silent = os.path.join(tmp, 'silent.mp4')
+        make_clip(silent, audio=False)
+        make_clip(video_only, audio=False)
+        result = mux_audio(video_only, silent, os.path.join(tmp, 'out2.mp4'))
+        assert not probe_video(result)['has_audio']
+        print("✅ mux_audio")
+
+
+@requires_ffmpeg
+def test_mux_audio_with_tempo():
+    """Смена скорости: atempo в том же проходе, длительность аудио следует за видео"""
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, 'source.mp4')
+        video_only = os.path.join(tmp, 'video_only.mp4')
+        output = os.path.join(tmp, 'out.mp4')
+        make_clip(source, seconds=4)
+        make_clip(video_only, seconds=2)
+        mux_audio(video_only, source, output, start=0.5, duration=2.4, speed=1.2)
+        info = probe_video(output)
+        assert info['has_audio'] and abs(info['duration'] - 2.0) < 0.15, info['duration']
+        print("✅ mux_audio + atempo")
+
+
+@requires_ffmpeg
+@pytest.mark.skipif(importlib.util.find_spec('vidgear') is None, reason="vidgear не установлен")
+def test_vidgear_keeps_frames_after_mux():
+    """WriteGear пишет с частотой исходника: 30 fps не становятся 25, mux_audio не обрезает кадры"""
+    from video_uniquizer import VideoUniquizer
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, 'source.mp4')
+        make_clip(source, seconds=4, source='testsrc2=size=320x240:rate=30')
+        uniquizer = VideoUniquizer(device='cpu')
+        outputs = [uniquizer._apply_social_effects_vidgear(source, os.path.join(tmp, 'social.mp4')),
+                   uniquizer._uniquize_video_vidgear(source, os.path.join(tmp, 'full.mp4'), ['social'])]
+        for output in outputs:
+            info = probe_video(output)
+            cap = cv2.VideoCapture(output)
+            frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+            cap.release()
+            assert frames == 120, frames
+            assert abs(info['fps'] - 30) < 0.01 and abs(info['duration'] - 4) < 0.1, info
+            assert info['has_audio'] and info['pix_fmt'] == 'yuv420p', info
+        print("✅ VidGear: все кадры и частота исходника после mux_audio")
+
+
+if __name__ == "__main__":
+    print("🧪 ТЕСТ АУДИО")
+    print("=" * 60)
+    test_audio_args()
+    test_mux_audio_copies_stream()
+    test_mux_audio_with_tempo()
+    test_vidgear_keeps_frames_after_mux()
+    print("🎉 Все тесты завершены")
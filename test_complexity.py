@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Тест выбора CRF/maxrate по сложности: метрики на синтетических кадрах, таблица
+ступеней, анализ роликов (статичный и шумный), кэш (LRU, без замка на время
+анализа) и запись в метаданные
+"""
+
+import os
+import json
+import tempfile
+import threading
+from unittest import mock
+
+import numpy as np
+
+import tracing
+import complexity
+from complexity import measure, rate_for, choose_rate, RATE_TABLE
+from encoder_profiles import RATE_ARGS
+from clip_fixtures import make_clip, requires_ffmpeg
+
+
+def test_measure():
+    flat = np.full((8, 90, 160), 128, np.uint8)
+    assert measure(flat) == {'spatial': 0.0, 'temporal': 0.0}
+
+    rng = np.random.default_rng(0)
+    still = np.repeat(rng.integers(0, 256, (1, 90, 160), dtype=np.uint8), 8, axis=0)
+    moving = rng.integers(0, 256, (8, 90, 160), dtype=np.uint8)
+    assert measure(still)['spatial'] > 50 and measure(still)['temporal'] == 0.0
+    assert measure(moving)['temporal'] > 50
+    print("✅ Пространственная и временная сложность")
+
+
+def test_rate_table():
+    tiers = [rate_for(spatial, temporal)['tier'] for spatial, temporal in [(1, 0), (8, 1), (15, 3), (40, 1), (5, 20)]]
+    assert tiers == ['static', 'low', 'medium', 'high', 'high']
+    crfs = [row[3] for row in RATE_TABLE]
+    assert crfs == sorted(crfs, reverse=True), "сложнее ролик - ниже CRF"
+    medium = rate_for(15, 3)
+    assert medium['rate_args'] == RATE_ARGS, "средняя ступень - прежние параметры"
+    print("✅ Таблица ступеней")
+
+
+@requires_ffmpeg
+def test_choose_rate_on_clips():
+    with tempfile.TemporaryDirectory() as tmp:
+        static = os.path.join(tmp, 'static.mkv')
+        busy = os.path.join(tmp, 'busy.mkv')
+        clip_args = dict(audio=False, x264_args=('-preset', 'ultrafast', '-crf', '18'))
+        make_clip(static, source='smptebars=size=640x360:rate=25', **clip_args)
+        make_clip(busy, source='testsrc2=size=640x360:rate=25,noise=alls=40:allf=t', **clip_args)
+
+        calls = []
+        original = complexity._read_frames
+        complexity._read_frames = lambda *args: calls.append(args[0]) or original(*args)
+        try:
+            with tracing.Tracer('complexity', run_dir=tmp, trace_dir=None).activate():
+                static_choice = choose_rate(static)
+                busy_choice = choose_rate(busy)
+                assert choose_rate(static) == static_choice
+            assert calls == [static, busy], "повторный анализ того же файла - из кэша"
+        finally:
+            complexity._read_frames = original
+
+        assert static_choice['tier'] == 'static' and busy_choice['tier'] == 'high'
+        assert static_choice['crf'] > busy_choice['crf']
+        assert static_choice['frames'] >= 2 * 16
+
+        with open(os.path.join(tmp, 'run_summary.json'), encoding='utf-8') as f:
+            summary = json.load(f)
+        assert summary['trace']['stages']['complexity']['count'] == 3
+        tracing.update_run_summary(os.path.join(tmp, 'run_summary.json'), encoding=static_choice)
+        with open(os.path.join(tmp, 'run_summary.json'), encoding='utf-8') as f:
+            summary = json.load(f)
+        assert summary['encoding']['tier'] == 'static' and 'trace' in summary
+
+        complexity.COMPLEXITY_ADAPTIVE = False
+        try:
+            assert choose_rate(busy) == {'tier': 'fixed', 'rate_args': RATE_ARGS}
+        finally:
+            complexity.COMPLEXITY_ADAPTIVE = True
+    print("✅ Статичный ролик - высокий CRF, шумный - низкий; кэш и метаданные")
+
+
+def test_cache_lru_without_lock_during_analysis():
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = {}
+        for name in ('slow', 'a', 'b', 'c'):
+            paths[name] = os.path.join(tmp, f"{name}.mp4")
+            with open(paths[name], 'wb') as f:
+                f.write(name.encode())
+        entered, release_slow = threading.Event(), threading.Event()
+        decoded = []
+
+        def read_frames(path, info, samples, width):
+            decoded.append(os.path.basename(path))
+            if path == paths['slow']:
+                entered.set()
+                assert release_slow.wait(5)
+            return np.zeros((4, 9, 16), np.uint8)
+
+        with mock.patch.object(complexity, 'probe_video', return_value={'duration': 1, 'width': 16}), \
+                mock.patch.object(complexity, '_read_frames', read_frames), \
+                mock.patch.object(complexity, 'COMPLEXITY_CACHE_SIZE', 2), \
+                mock.patch.object(complexity, '_cache', complexity.OrderedDict()):
+            slow = threading.Thread(target=complexity.analyze, args=(paths['slow'],))
+            slow.start()
+            assert entered.wait(5)
+            # Пока первый ролик декодируется, анализ другого не ждет замка
+            assert complexity.analyze(paths['a']) is not None
+            release_slow.set()
+            slow.join()
+
+            complexity.analyze(paths['a'])   # из кэша, становится самым свежим
+            complexity.analyze(paths['b'])   # вытесняет slow
+            complexity.analyze(paths['c'])   # вытесняет a
+            assert [os.path.basename(key[0]) for key in complexity._cache] == ['b.mp4', 'c.mp4']
+            assert decoded == ['slow.mp4', 'a.mp4', 'b.mp4', 'c.mp4']
+    print("✅ Кэш LRU, анализ без общего замка")
+
+
+if __name__ == "__main__":
+    print("🧪 ТЕСТ ВЫБОРА CRF ПО СЛОЖНОСТИ")
+    print("=" * 60)
+    test_measure()
+    test_rate_table()
+    test_choose_rate_on_clips()
+    test_cache_lru_without_lock_during_analysis()
+    print("🎉 Все тесты завершены")
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Тест уборщика диска: инкрементальный учет, правила возраста и размера, удаление
+одобренного, защита выполняющихся задач (hold/release, без трассировки) и видео
+в очереди на аппрув, допуск задач по свободному месту
+"""
+
+import os
+import time
+import tempfile
+from pathlib import Path
+
+import tracing
+from disk_janitor import DiskJanitor
+
+
+def make_unit(path: Path, size: int, age: float = 0, video: str = 'output_1.mp4') -> Path:
+    path.mkdir(parents=True)
+    (path / video).write_bytes(b'x' * size)
+    (path / 'metadata.json').write_text('{}', encoding='utf-8')
+    if age:
+        mtime = time.time() - age
+        os.utime(path, (mtime, mtime))
+    return path
+
+
+def make_janitor(tmp: str, **kwargs) -> DiskJanitor:
+    targets = [(os.path.join(tmp, 'telegram_results'), 'batch_*'),
+               (os.path.join(tmp, 'temp_videos'), '*_chunks'),
+               (os.path.join(tmp, 'temp_videos'), '*_processed.mp4')]
+    options = dict(max_bytes=10 ** 9, max_age=3600, min_free_bytes=0, rescan_interval=0)
+    options.update(kwargs)
+    return DiskJanitor(targets, **options)
+
+
+def test_incremental_accounting():
+    with tempfile.TemporaryDirectory() as tmp:
+        results = Path(tmp) / 'telegram_results'
+        make_unit(results / 'batch_a', 1000)
+        (Path(tmp) / 'temp_videos').mkdir()
+        (Path(tmp) / 'temp_videos' / 'input_x_processed.mp4').write_bytes(b'x' * 500)
+        (Path(tmp) / 'temp_videos' / 'input_keep.mp4').write_bytes(b'x' * 500)  # не управляется
+        janitor = make_janitor(tmp)
+        janitor.scan()
+        assert len(janitor.units) == 2 and janitor.total_bytes == 1000 + 2 + 500
+
+        # Новый запуск учитывается без полного обхода
+        janitor.scan = lambda: (_ for _ in ()).throw(AssertionError("полный обход не нужен"))
+        make_unit(results / 'batch_b', 300)
+        janitor.track(results / 'batch_b')
+        assert janitor.total_bytes == 1502 + 302
+        janitor.track(results / 'batch_b' / 'output_1.mp4')  # путь внутри единицы - та же единица
+        assert janitor.total_bytes == 1804 and len(janitor.units) == 3
+        janitor.track(Path(tmp) / 'elsewhere')  # не управляется - игнорируется
+        assert len(janitor.units) == 3
+    print("✅ Инкрементальный учет")
+
+
+def test_age_and_size_policies_skip_active_jobs():
+    with tempfile.TemporaryDirectory() as tmp:
+        results = Path(tmp) / 'telegram_results'
+        old = make_unit(results / 'batch_old', 100, age=7200)
+        active_old = make_unit(results / 'batch_active', 100, age=7200)
+        first = make_unit(results / 'batch_1', 1000, age=600)
+        second = make_unit(results / 'batch_2', 1000, age=300)
+        janitor = make_janitor(tmp, max_bytes=1500)
+        janitor.scan()
+
+        with tracing.Tracer('batch', run_dir=active_old, trace_dir=None).activate():
+            janitor.collect()
+            assert not old.exists(), "старше max_age"
+            assert active_old.exists(), "папка выполняющейся задачи не трогается"
+            assert not first.exists() and second.exists(), "сверх лимита удаляются самые старые"
+        assert janitor.total_bytes == sum(unit.size for unit in janitor.units.values())
+        assert janitor.deleted_bytes == 102 + 1002
+    print("✅ Возраст, лимит размера, активные задачи")
+
+
+def test_on_approved():
+    with tempfile.TemporaryDirectory() as tmp:
+        results = Path(tmp) / 'telegram_results'
+        batch = make_unit(results / 'batch_a', 100)
+        (batch / 'output_2.mp4').write_bytes(b'x' * 50)
+        janitor = make_janitor(tmp)
+        janitor.scan()
+
+        assert janitor.on_approved(batch / 'output_1.mp4') == 100
+        assert batch.exists() and janitor.total_bytes == 52
+        # Последнее видео одобрено - папка запуска удаляется целиком
+        assert janitor.on_approved(str(batch / 'output_2.mp4')) == 52
+        assert not batch.exists() and janitor.total_bytes == 0 and not janitor.units
+        assert janitor.on_approved(None) == 0
+    print("✅ Одобренное удаляется локально")
+
+
+def test_admission_under_pressure():
+    with tempfile.TemporaryDirectory() as tmp:
+        results = Path(tmp) / 'telegram_results'
+        make_unit(results / 'batch_1', 1000, age=600)
+        make_unit(results / 'batch_2', 1000, age=300)
+        janitor = make_janitor(tmp, min_free_bytes=1000)
+        janitor.scan()
+        disk = {'free': 2500}
+
+        def free_bytes():
+            return disk['free'] + janitor.deleted_bytes
+        janitor.free_bytes = free_bytes
+
+        assert janitor.pressure() == 'ok'
+        assert janitor.admit(500)                 # 2500 - 500 >= 1000
+        assert janitor.deleted_bytes == 0
+        disk['free'] = 1200
+        assert janitor.pressure() == 'high'
+        assert janitor.admit(1000)                # уборка освобождает место с запасом, от старых к новым
+        assert not (results / 'batch_1').exists() and not janitor.units
+        disk['free'] = -janitor.deleted_bytes
+        assert janitor.pressure() == 'critical'
+        assert not janitor.admit(5000)            # удалять больше нечего - задача не принимается
+    print("✅ Допуск задач по свободному месту")
+
+
+def test_held_and_pending_units_survive_both_policies():
+    with tempfile.TemporaryDirectory() as tmp:
+        results = Path(tmp) / 'telegram_results'
+        held = make_unit(results / 'batch_held', 1000, age=7200)
+        pending = make_unit(results / 'batch_pending', 1000, age=7200)
+        other = make_unit(results / 'batch_other', 1000, age=300)
+        pending_approvals = {'a1': {'status': 'pending', 'video_path': str(pending / 'output_1.mp4')}}
+        janitor = make_janitor(tmp, max_bytes=100, min_free_bytes=10 ** 15,
+                               protected_paths=lambda: [v['video_path'] for v in pending_approvals.values()])
+        janitor.scan()
+
+        # Трассировка выключена (нет active_run_dirs) - папку защищает hold()
+        janitor.hold(held)
+        janitor.hold(held / 'output_1.mp4')
+        assert not janitor.admit(10)
+        assert held.exists() and pending.exists(), "ни возраст, ни нехватка места их не удаляют"
+        assert not other.exists()
+
+        janitor.release(held)
+        janitor.collect()
+        assert held.exists(), "второй hold() еще действует"
+        janitor.release(held / 'output_1.mp4')
+        janitor.collect()
+        assert not held.exists() and pending.exists()
+
+        pending_approvals.clear()  # менеджер решил - видео больше не защищено
+        janitor.collect()
+        assert not pending.exists() and not janitor.units
+    print("✅ hold/release и видео на аппруве")
+
+
+if __name__ == "__main__":
+    print("🧪 ТЕСТ УБОРЩИКА ДИСКА")
+    print("=" * 60)
+    test_incremental_accounting()
+    test_age_and_size_policies_skip_active_jobs()
+    test_on_approved()
+    test_admission_under_pressure()
+    test_held_and_pending_units_survive_both_policies()
+    print("🎉 Все тесты завершены")
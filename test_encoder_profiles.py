@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Тест профилей кодера: выбор preset/threads по цели и нагрузке, бенчмарк
+"""
+
+import os
+import tempfile
+from datetime import datetime
+from unittest import mock
+
+import encoder_profiles
+from encoder_profiles import EncoderTuner, run_benchmark
+from clip_fixtures import requires_ffmpeg
+
+
+def make_tuner(tmp):
+    """Профиль 8-ядерного хоста: fps растет с потоками, медленные preset медленнее"""
+    speed = {'ultrafast': 400, 'veryfast': 160, 'faster': 110, 'fast': 70, 'medium': 45}
+    results = [{'preset': preset, 'threads': threads, 'fps': fps * min(threads, 6) / 2, 'kbps': None}
+               for preset, fps in speed.items() for threads in (1, 2, 4, 8)]
+    tuner = EncoderTuner(os.path.join(tmp, 'profiles.json'))
+    tuner.profile = {'created_at': datetime.now().isoformat(), 'host': {'cpus': 8},
+                     'clip': {'width': 1280, 'height': 720, 'frames': 60}, 'results': results}
+    return tuner
+
+
+def test_choose_by_goal_and_load():
+    with tempfile.TemporaryDirectory() as tmp, mock.patch.object(encoder_profiles, 'host_cpus', return_value=8):
+        tuner = make_tuner(tmp)
+
+        # Один рендер: все 8 потоков, quality берет самый медленный preset, укладывающийся в 30 fps
+        choice = tuner.choose(goal='quality', active_jobs=1)
+        assert choice['threads'] == 8 and choice['preset'] == 'medium'
+        # 4 рендера: по 2 потока, для balanced (60 fps) medium уже не успевает
+        choice = tuner.choose(goal='balanced', active_jobs=4)
+        assert choice['threads'] == 2 and choice['preset'] == 'fast', choice
+        # 1080p в 2.25 раза больше пикселей, чем в замере
+        choice = tuner.choose(goal='balanced', active_jobs=4, width=1920, height=1080)
+        assert choice['preset'] == 'veryfast', choice
+        # Целевое время: 1800 кадров за 10 с
+        choice = tuner.choose(active_jobs=1, frames=1800, target_seconds=10)
+        assert choice['preset'] == 'fast', choice
+        # Пропускная способность: максимум кадров на поток, короткий lookahead
+        args = tuner.x264_args(goal='throughput', active_jobs=8)
+        assert args == ['-preset', 'ultrafast', '-threads', '1', '-x264-params', 'rc-lookahead=10'], args
+
+        # Активные рендеры учитываются автоматически
+        with tuner.governor.lease(), tuner.governor.lease():
+            assert tuner.threads_per_job() == 4
+        assert tuner.active_jobs == 0
+        print("✅ choose")
+
+
+def test_fallback_and_staleness():
+    with tempfile.TemporaryDirectory() as tmp:
+        tuner = EncoderTuner(os.path.join(tmp, 'missing.json'))
+        assert tuner.is_stale()
+        assert tuner.choose(goal='quality', active_jobs=1)['preset'] == 'fast'
+        args = tuner.encoder_args(goal='quality', active_jobs=1)
+        assert args[:3] == ['-c:v', 'libx264', '-preset'] and '-maxrate' in args
+        print("✅ fallback")
+
+
+@requires_ffmpeg
+def test_benchmark_smoke():
+    with tempfile.TemporaryDirectory() as tmp:
+        profile = run_benchmark(presets=['ultrafast', 'fast'], thread_options=[1], width=320, height=240, frames=10)
+        assert [row['preset'] for row in profile['results']] == ['ultrafast', 'fast']
+        assert all(row['fps'] > 0 and row['kbps'] for row in profile['results'])
+
+        tuner = EncoderTuner(os.path.join(tmp, 'profiles.json'))
+        tuner.profile = profile
+        tuner.save()
+        assert EncoderTuner(tuner.profile_file).profile['results'] == profile['results']
+        print(f"✅ Benchmark: {profile['results']}")
+
+
+if __name__ == "__main__":
+    print("🧪 ТЕСТ ПРОФИЛЕЙ КОДЕРА")
+    print("=" * 60)
+    test_choose_by_goal_and_load()
+    test_fallback_and_staleness()
+    test_benchmark_smoke()
+    print("🎉 Все тесты завершены")
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Тест бенчмарка движка: проверка регрессий и короткий прогон на маленьком клипе
+"""
+
+import tempfile
+
+from engine_benchmark import run_suite, compare_to_baseline
+from clip_fixtures import requires_ffmpeg
+
+
+def make_report(fps, rss, kbps, status='success'):
+    return {'results': [{'fixture': '720p', 'backend': 'filtergraph', 'effect': 'social', 'status': status,
+                         'fps': fps, 'peak_rss_mb': rss, 'output_kbps': kbps}]}
+
+
+def test_compare_to_baseline():
+    baseline = make_report(100.0, 200.0, 1500.0)
+    # В пределах порога и улучшения - не регрессия
+    assert compare_to_baseline(make_report(90.0, 220.0, 1600.0), baseline, 0.15) == []
+    assert compare_to_baseline(make_report(300.0, 50.0, 500.0), baseline, 0.15) == []
+
+    regressions = compare_to_baseline(make_report(80.0, 260.0, 1500.0), baseline, 0.15)
+    assert {r['metric'] for r in regressions} == {'fps', 'peak_rss_mb'}, regressions
+    assert regressions[0]['case'] == '720p/filtergraph/social' and regressions[0]['change'] == -0.2
+
+    regressions = compare_to_baseline(make_report(None, None, None, status='error'), baseline)
+    assert regressions[0]['metric'] == 'status'
+    # Сочетаний без baseline не сравниваем
+    assert compare_to_baseline(make_report(1.0, 1.0, 1.0), {'results': []}) == []
+    print("✅ compare_to_baseline")
+
+
+@requires_ffmpeg
+def test_suite_smoke():
+    with tempfile.TemporaryDirectory() as tmp:
+        report = run_suite(sizes={'tiny': (320, 240)}, backends=['filtergraph', 'fused'],
+                           effects=['social'], seconds=1, fixture_dir=tmp)
+        assert [(c['backend'], c['effect']) for c in report['results']] == [('filtergraph', 'social'), ('fused', 'social')]
+        for case in report['results']:
+            assert case['status'] == 'success', case
+            assert case['frames'] == 30 and case['fps'] > 0
+            assert case['peak_rss_mb'] > 0 and case['output_kbps'] > 0
+            assert 'render' in case['stages']
+        assert report['fixtures']['tiny'] == {'width': 320, 'height': 240, 'fps': 30, 'seconds': 1}
+        assert compare_to_baseline(report, report) == []
+        print(f"✅ Прогон: {[(c['backend'], c['fps']) for c in report['results']]}")
+
+
+if __name__ == "__main__":
+    print("🧪 ТЕСТ БЕНЧМАРКА ДВИЖКА")
+    print("=" * 60)
+    test_compare_to_baseline()
+    test_suite_smoke()
+    print("🎉 Все тесты завершены")
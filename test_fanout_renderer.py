@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Тест fan-out рендера: один декод -> несколько вариантов (нужен ffmpeg)
+"""
+
+import os
+import tempfile
+
+import cv2
+
+from ffmpeg_utils import probe_video
+from encoder_profiles import EncoderTuner
+from fanout_renderer import FanoutRenderer, VariantSpec
+from clip_fixtures import make_clip, requires_ffmpeg
+
+
+class SimpleEffects:
+    """Диапазоны и покадровые эффекты как у VideoUniquizer, без torch"""
+
+    speed_range = (0.95, 1.05)
+    brightness_range = (-15, 15)
+    contrast_range = (0.9, 1.1)
+    saturation_range = (0.9, 1.1)
+    social_effects = {'soft': {'blur': 0.5}}
+
+    def _apply_frame_effects(self, frame, brightness, contrast, saturation):
+        return cv2.convertScaleAbs(frame, alpha=contrast, beta=brightness)
+
+    def _apply_social_frame_effects(self, frame, style, params):
+        return cv2.GaussianBlur(frame, (3, 3), params['blur'])
+
+
+@requires_ffmpeg
+def test_fanout_single_decode():
+    """5 вариантов, кольцо из 2 кадров: один проход декодера, все файлы валидны"""
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, 'source.mp4')
+        make_clip(source)
+        effects = [['temporal'], ['social'], ['visual'], ['temporal', 'social'], ['social', 'visual']]
+        variants = [VariantSpec(os.path.join(tmp, f'v{i}.mp4'), e) for i, e in enumerate(effects)]
+
+        frames = []
+        renderer = FanoutRenderer(source, ring_slots=2, uniquizer=SimpleEffects(),
+                                  frame_callback=lambda done, total: frames.append(done))
+        results = renderer.render(variants)
+
+        assert renderer.stats['decode_passes'] == 1
+        assert renderer.stats['decoded_frames'] == 75 == frames[-1]
+        for result in results:
+            assert result['status'] == 'success', result.get('error')
+            info = probe_video(result['output_path'])
+            assert info['width'] == 320 and info['has_audio']
+        # Без temporal вариант сохраняет все кадры
+        assert results[1]['frames'] == 75
+        print(f"✅ Fan-out: {renderer.stats}")
+
+
+@requires_ffmpeg
+def test_fanout_max_duration():
+    """Обрезка до max_duration выполняется в декодере один раз"""
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, 'source.mp4')
+        make_clip(source, seconds=4)
+        renderer = FanoutRenderer(source, max_duration=2, uniquizer=SimpleEffects())
+        results = renderer.render([VariantSpec(os.path.join(tmp, 'a.mp4'), ['social']),
+                                   VariantSpec(os.path.join(tmp, 'b.mp4'), ['visual'])])
+        assert all(result['frames'] == 50 for result in results)
+        assert abs(probe_video(results[0]['output_path'])['duration'] - 2) < 0.2
+        print("✅ max_duration")
+
+
+@requires_ffmpeg
+def test_fanout_tuner_args_yuv420p():
+    """Аргументы EncoderTuner: кадры bgr24 кодируются в yuv420p, а не в yuv444p"""
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, 'source.mp4')
+        make_clip(source, seconds=1)
+        encoder_args = EncoderTuner(os.path.join(tmp, 'missing.json')).encoder_args(goal='balanced', threads=2)
+        renderer = FanoutRenderer(source, uniquizer=SimpleEffects())
+        results = renderer.render([VariantSpec(os.path.join(tmp, 'a.mp4'), ['social'], encoder_args=encoder_args)])
+        assert results[0]['status'] == 'success', results[0].get('error')
+        info = probe_video(results[0]['output_path'])
+        assert info['pix_fmt'] == 'yuv420p', info['pix_fmt']
+        print("✅ yuv420p с аргументами EncoderTuner")
+
+
+if __name__ == "__main__":
+    print("🧪 ТЕСТ FAN-OUT РЕНДЕРА")
+    print("=" * 60)
+    test_fanout_single_decode()
+    test_fanout_max_duration()
+    test_fanout_tuner_args_yuv420p()
+    print("🎉 Все тесты завершены")
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Тест быстрого ретайминга: скорость через временные метки, обрезка по ключевым кадрам
+"""
+
+import os
+import time
+import tempfile
+
+from ffmpeg_utils import probe_video, keyframe_times, retime_copy
+from clip_fixtures import make_clip, requires_ffmpeg
+
+# 30 fps, ключевой кадр каждые 2 секунды
+CLIP_ARGS = dict(source='testsrc2=size=640x360:rate=30', x264_args=('-preset', 'ultrafast', '-g', '60'))
+
+
+@requires_ffmpeg
+def test_keyframe_times():
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, 'source.mp4')
+        make_clip(source, 10, **CLIP_ARGS)
+        times = keyframe_times(source)
+        assert times[:5] == [0.0, 2.0, 4.0, 6.0, 8.0], times
+        print(f"✅ Keyframes: {times}")
+
+
+@requires_ffmpeg
+def test_retime_copy_60s():
+    """60 с: скорость 1.05, обрезка с ключевого кадра - без перекодирования видео"""
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, 'source.mp4')
+        output = os.path.join(tmp, 'out.mp4')
+        make_clip(source, 60, **CLIP_ARGS)
+
+        start_time = time.time()
+        assert retime_copy(source, output, 1.05, start=2.0, end=58.5)
+        elapsed = time.time() - start_time
+
+        info = probe_video(output)
+        assert info['video_codec'] == 'h264' and info['has_audio']
+        assert abs(info['duration'] - 56.5 / 1.05) < 0.2, info['duration']
+        assert abs(info['fps'] - 30 * 1.05) < 0.5, info['fps']
+        # Время - это в основном atempo по аудио
+        assert elapsed < 3, elapsed
+        print(f"✅ Retime 60s за {elapsed:.2f}s: {info['duration']:.2f}s @ {info['fps']:.1f}fps")
+
+
+if __name__ == "__main__":
+    print("🧪 ТЕСТ БЫСТРОГО РЕТАЙМИНГА")
+    print("=" * 60)
+    test_keyframe_times()
+    test_retime_copy_60s()
+    print("🎉 Все тесты завершены")
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Тест ffmpeg filtergraph бэкенда: визуальное соответствие NumPy-эффектам и рендер
+"""
+
+import os
+import tempfile
+import subprocess
+from unittest import mock
+
+import cv2
+import numpy as np
+
+from ffmpeg_utils import FFMPEG_BIN, run_ffmpeg, probe_video
+import filtergraph_backend
+from filtergraph_backend import SOCIAL_STYLES, style_filters, visual_filters, render_filtergraph
+from thread_governor import ThreadGovernor
+from clip_fixtures import make_clip, requires_ffmpeg
+
+
+def grab_frame(width=320, height=240):
+    """Кадр testsrc2 с приглушенными цветами (ближе к реальному видео)"""
+    result = subprocess.run([FFMPEG_BIN, '-v', 'error', '-f', 'lavfi', '-i', f'testsrc2=size={width}x{height}',
+                             '-frames:v', '1', '-f', 'rawvideo', '-pix_fmt', 'bgr24', '-'], capture_output=True)
+    frame = np.frombuffer(result.stdout, np.uint8).reshape(height, width, 3)
+    return (frame * 0.5 + 64).astype(np.uint8)
+
+
+def apply_filters(frame, filters):
+    """Прогоняет BGR-кадр через цепочку фильтров ffmpeg"""
+    height, width = frame.shape[:2]
+    result = subprocess.run([FFMPEG_BIN, '-v', 'error', '-f', 'rawvideo', '-pix_fmt', 'bgr24',
+                             '-s', f'{width}x{height}', '-i', '-', '-vf', ','.join(filters),
+                             '-f', 'rawvideo', '-pix_fmt', 'bgr24', '-'], input=frame.tobytes(), capture_output=True)
+    assert result.returncode == 0, result.stderr
+    return np.frombuffer(result.stdout, np.uint8).reshape(height, width, 3)
+
+
+def mae(a, b):
+    return float(np.abs(a.astype(np.float32) - b.astype(np.float32)).mean())
+
+
+# Допустимое расхождение с NumPy-версией, уровней 0-255 (в среднем по кадру)
+MAX_STYLE_MAE = {'dramatic': 1.0, 'vintage': 1.0, 'soft': 1.0, 'vibrant': 1.0}
+MAX_STAGE_MAE = 1.0
+
+# Каждый шаг стиля отдельно: остальные параметры нейтральны
+STAGES = [
+    ('vintage', 'warmth', {'warmth': 0.9, 'vignette': 0, 'grain': 0}),
+    ('vintage', 'vignette', {'warmth': 1.0, 'vignette': 0.2, 'grain': 0}),
+    ('dramatic', 'contrast', {'contrast': 1.15, 'shadows': 1.0, 'highlights': 1.0}),
+    ('dramatic', 'shadows/highlights', {'contrast': 1.0, 'shadows': 0.8, 'highlights': 1.2}),
+    ('soft', 'blur', {'blur': 1.5, 'brightness': 0, 'saturation': 1.0}),
+    ('soft', 'brightness', {'blur': 0, 'brightness': 5, 'saturation': 1.0}),
+    ('soft', 'saturation', {'blur': 0, 'brightness': 0, 'saturation': 0.9}),
+    ('vibrant', 'saturation', {'saturation': 1.2, 'vibrance': 1.0, 'clarity': 1.0}),
+    ('vibrant', 'vibrance', {'saturation': 1.0, 'vibrance': 1.15, 'clarity': 1.0}),
+    # clarity 4 вместо 1.1 - чтобы шаг заметно менял кадр
+    ('vibrant', 'clarity', {'saturation': 1.0, 'vibrance': 1.0, 'clarity': 4.0}),
+]
+
+
+@requires_ffmpeg
+def test_visual_parity():
+    """Каждый стиль ffmpeg совпадает с NumPy-версией в пределах уровня яркости"""
+    from video_uniquizer import VideoUniquizer
+    uniquizer = VideoUniquizer(device='cpu')
+    frame = grab_frame()
+
+    for style, params in SOCIAL_STYLES.items():
+        params = dict(params, grain=0) if style == 'vintage' else params
+        expected = uniquizer._apply_social_frame_effects(frame, style, params)
+        error = mae(expected, apply_filters(frame, style_filters(style, params)))
+        assert error < MAX_STYLE_MAE[style], (style, error)
+        print(f"✅ {style}: MAE {error:.2f} (без эффекта {mae(expected, frame):.2f})")
+
+    # visual: яркость, контраст и насыщенность как в _apply_frame_effects (его шум не сравниваем)
+    expected = cv2.convertScaleAbs(cv2.convertScaleAbs(frame, alpha=1, beta=10), alpha=1.05, beta=0)
+    hsv = cv2.cvtColor(expected, cv2.COLOR_BGR2HSV)
+    hsv[:, :, 1] = cv2.convertScaleAbs(hsv[:, :, 1], alpha=1.1)
+    expected = cv2.cvtColor(hsv, cv2.COLOR_HSV2BGR)
+    error = mae(expected, apply_filters(frame, visual_filters(10, 1.05, 1.1)[:2]))
+    assert error < MAX_STAGE_MAE, error
+    print(f"✅ visual: MAE {error:.2f}")
+
+
+@requires_ffmpeg
+def test_stage_parity():
+    """Каждый шаг стиля отдельно: расхождение одного шага не прячется за остальными"""
+    from video_uniquizer import VideoUniquizer
+    uniquizer = VideoUniquizer(device='cpu')
+    frame = grab_frame()
+
+    for style, stage, params in STAGES:
+        expected = uniquizer._apply_social_frame_effects(frame, style, params)
+        baseline = mae(expected, frame)
+        error = mae(expected, apply_filters(frame, style_filters(style, params)))
+        assert baseline > 2 * MAX_STAGE_MAE, f"{style}/{stage} почти не меняет кадр ({baseline:.2f})"
+        assert error < MAX_STAGE_MAE, (style, stage, error, baseline)
+        print(f"✅ {style}/{stage}: MAE {error:.2f} (без эффекта {baseline:.2f})")
+
+
+@requires_ffmpeg
+def test_render_with_temporal():
+    """Один вызов ffmpeg: стиль + скорость + обрезка, аудио сохраняется"""
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, 'source.mp4')
+        result = run_ffmpeg(['-f', 'lavfi', '-i', 'testsrc2=size=320x240:rate=25',
+                             '-f', 'lavfi', '-i', 'sine=frequency=440', '-t', '4',
+                             '-c:v', 'libx264', '-preset', 'ultrafast', '-c:a', 'aac', '-shortest', source])
+        assert result.returncode == 0, result.stderr
+
+        output = os.path.join(tmp, 'out.mp4')
+        result = render_filtergraph(source, output, ['social', 'temporal'], style='vintage',
+                                    speed=1.2, max_duration=3)
+        assert 'error' not in result, result.get('error')
+        info = probe_video(output)
+        assert info['has_audio'] and info['width'] == 320
+        # 3 с минус обрезка (до 10%), ускорение 1.2x
+        assert 2.0 < info['duration'] < 2.7, info['duration']
+
+        output = os.path.join(tmp, 'social.mp4')
+        result = render_filtergraph(source, output, ['social'], style='dramatic', max_height=120)
+        assert 'error' not in result, result.get('error')
+        info = probe_video(output)
+        assert info['height'] == 120 and abs(info['duration'] - 4) < 0.2
+
+        # Ветки графа (маска виньетки, лапласиан) и lut3d в полном рендере
+        for style, effects in (('vintage', ['social']), ('vibrant', ['visual', 'social'])):
+            output = os.path.join(tmp, f'{style}.mp4')
+            result = render_filtergraph(source, output, effects, style=style)
+            assert 'error' not in result, result.get('error')
+            assert abs(probe_video(output)['duration'] - 4) < 0.2
+        print(f"✅ Render: {result['filtergraph']}")
+
+
+@requires_ffmpeg
+def test_threads_from_lease():
+    """Внутри аренды ThreadGovernor граф и декодер получают ее потоки"""
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, 'source.mp4')
+        make_clip(source, 1)
+        calls = []
+
+        def recording_run_ffmpeg(args, **kwargs):
+            calls.append(args)
+            return run_ffmpeg(args, **kwargs)
+
+        governor = ThreadGovernor(cpus=3, max_jobs=1, pin=False)
+        with mock.patch.object(filtergraph_backend, 'run_ffmpeg', recording_run_ffmpeg), governor.lease():
+            result = render_filtergraph(source, os.path.join(tmp, 'out.mp4'), ['social'], style='soft')
+        assert 'error' not in result, result.get('error')
+        args = calls[0]
+        assert args[args.index('-filter_complex_threads') + 1] == '3'
+        assert args.index('-threads') < args.index('-i'), "потоки декодера - перед -i"
+        print("✅ Потоки из аренды рендера")
+
+
+if __name__ == "__main__":
+    print("🧪 ТЕСТ FILTERGRAPH БЭКЕНДА")
+    print("=" * 60)
+    test_visual_parity()
+    test_stage_parity()
+    test_render_with_temporal()
+    test_threads_from_lease()
+    print("🎉 Все тесты завершены")
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Тест быстрого старта: бот и CLI импортируются без torch/MoviePy/VidGear и
+укладываются в бюджет времени импорта
+"""
+
+import os
+import sys
+import json
+import subprocess
+
+HEAVY_MODULES = ['torch', 'moviepy', 'vidgear']
+
+# Бюджет холодного импорта, секунды (на медленных машинах CI можно поднять через окружение)
+IMPORT_BUDGETS = {
+    'video_uniquizer': float(os.getenv('IMPORT_BUDGET_UNIQUIZER', '1.0')),
+    'telegram_bot': float(os.getenv('IMPORT_BUDGET_BOT', '2.0')),
+}
+
+PROBE = """
+import sys, time, json
+start = time.perf_counter()
+{statement}
+elapsed = time.perf_counter() - start
+print(json.dumps({{'elapsed': elapsed, 'loaded': [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def run_probe(statement):
+    """Импорт в новом интерпретаторе: кэш модулей текущего процесса не влияет на замер"""
+    env = dict(os.environ, USE_SELF_HOSTED_API='false')
+    result = subprocess.run([sys.executable, '-c', PROBE.format(statement=statement, heavy=HEAVY_MODULES)],
+                            capture_output=True, text=True, env=env,
+                            cwd=os.path.dirname(os.path.abspath(__file__)))
+    assert result.returncode == 0, result.stderr[-1000:]
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def test_import_budget():
+    for module, budget in IMPORT_BUDGETS.items():
+        probe = run_probe(f"import {module}")
+        assert not probe['loaded'], f"{module} тянет тяжелые модули при импорте: {probe['loaded']}"
+        assert probe['elapsed'] < budget, f"{module}: {probe['elapsed']:.2f}s > {budget}s"
+        print(f"✅ import {module}: {probe['elapsed']:.2f}s")
+
+
+def test_uniquizer_init_is_light():
+    """Создание VideoUniquizer (на каждый вариант и часть) не проверяет CUDA и не грузит torch"""
+    probe = run_probe("from video_uniquizer import VideoUniquizer\n"
+                      "for _ in range(10): VideoUniquizer()")
+    assert not probe['loaded'], probe
+    print(f"✅ 10 x VideoUniquizer(): {probe['elapsed']:.3f}s")
+
+
+def test_device_probe_cached():
+    probe = run_probe("import video_uniquizer\n"
+                      "from video_uniquizer import VideoUniquizer, probe_device\n"
+                      "assert VideoUniquizer().device == VideoUniquizer().device\n"
+                      "assert probe_device.cache_info().misses == 1, probe_device.cache_info()\n"
+                      "assert video_uniquizer.torch.loaded")
+    assert probe['loaded'] == ['torch'], probe
+    print("✅ Устройство определяется один раз, torch загружается по требованию")
+
+
+if __name__ == "__main__":
+    print("🧪 ТЕСТ БЫСТРОГО СТАРТА")
+    print("=" * 60)
+    test_import_budget()
+    test_uniquizer_init_is_light()
+    test_device_probe_cached()
+    print("🎉 Все тесты завершены")
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Test inkrementalnego pollera VK (bez sieci - sztuczna sesja VK)
+"""
+
+import os
+import re
+import json
+import tempfile
+import time
+from unittest import mock
+
+import incremental_poller
+from incremental_poller import IncrementalPoller, PollCursorStore
+
+
+class FakeVkSession:
+    """Udaje vk_api.VkApi: users.get + execute z wall.get"""
+
+    def __init__(self, walls, invalid=()):
+        self.walls = walls  # owner_id -> lista postów (najnowsze pierwsze)
+        self.invalid = set(invalid)  # nazwy, dla których users.get zwraca błąd
+        self.calls = []
+
+    def method(self, name, params):
+        self.calls.append((name, params))
+        if name == 'users.get':
+            names = params['user_ids'].split(',')
+            if self.invalid & set(names):
+                raise ValueError('[113] Invalid user id')
+            return [{'id': 100 + i, 'screen_name': n, 'first_name': n, 'last_name': ''} for i, n in enumerate(names)]
+        if name == 'execute':
+            result = []
+            for owner, count, offset in re.findall(r'"owner_id": (-?\d+), "count": (\d+), "offset": (\d+)', params['code']):
+                wall = self.walls.get(int(owner), [])
+                result.append({'count': len(wall), 'items': wall[int(offset):int(offset) + int(count)]})
+            return result
+        raise ValueError(name)
+
+
+def make_post(post_id, views, age=0):
+    return {
+        'id': post_id,
+        'date': int(time.time() - age),
+        'attachments': [{'type': 'video', 'video': {'id': post_id * 10, 'title': f'clip {post_id}', 'views': views}}],
+        'views': {'count': views}
+    }
+
+
+def make_poller(walls, path):
+    session = FakeVkSession(walls)
+    return IncrementalPoller(vk_session=session, store=PollCursorStore(path), new_page=5), session
+
+
+def test_vk_batches_accounts_into_one_execute():
+    """25 kont = jedno wywołanie execute"""
+    with tempfile.TemporaryDirectory() as tmp:
+        usernames = [f'user{i}' for i in range(25)]
+        walls = {100 + i: [make_post(3, 30), make_post(2, 20), make_post(1, 10)] for i in range(25)}
+        poller, session = make_poller(walls, os.path.join(tmp, 'cursors.json'))
+
+        results = poller.poll_vk(usernames)
+
+        executes = [call for call in session.calls if call[0] == 'execute']
+        assert len(executes) == 1
+        assert all(results[name]['new_posts'] == 3 for name in usernames)
+        print(f"✅ 25 kont -> {len(executes)} execute")
+
+
+def test_vk_cursor_only_counts_new_posts():
+    """Drugie sprawdzenie: nowe posty od kursora, stare posty zachowane"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'cursors.json')
+        walls = {100: [make_post(2, 20), make_post(1, 10)]}
+        poller, _ = make_poller(walls, path)
+        poller.poll_vk(['raachel_fb'])
+
+        walls[100] = [make_post(4, 5), make_post(3, 7), make_post(2, 25), make_post(1, 12)]
+        poller, session = make_poller(walls, path)
+        result = poller.poll_vk(['raachel_fb'])['raachel_fb']
+
+        assert result['new_posts'] == 2
+        assert [clip['post_id'] for clip in result['clips']] == [4, 3, 2, 1]
+        assert result['clips'][2]['views'] == 25
+        assert result['latest_post']['id'] == 4
+        # username zapamiętany w kursorze - bez ponownego users.get
+        assert not [call for call in session.calls if call[0] == 'users.get']
+        print("✅ Kursor: tylko nowe posty + odświeżenie świeżych")
+
+
+def test_vk_gap_fetches_next_page():
+    """Więcej nowych postów niż strona -> doczytanie z offsetem"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'cursors.json')
+        walls = {100: [make_post(1, 10, age=30 * 24 * 3600)]}
+        poller, _ = make_poller(walls, path)
+        poller.poll_vk(['raachel_fb'])
+
+        walls[100] = [make_post(i, i) for i in range(20, 1, -1)] + [make_post(1, 10, age=30 * 24 * 3600)]
+        poller, session = make_poller(walls, path)
+        result = poller.poll_vk(['raachel_fb'])['raachel_fb']
+
+        assert result['new_posts'] == 19
+        assert len([call for call in session.calls if call[0] == 'execute']) == 2
+        print("✅ Luka w kursorze doczytana")
+
+
+def test_vk_invalid_name_only_loses_its_account():
+    """Błędna nazwa w users.get -> ponowienie pojedynczo, pozostałe konta działają"""
+    with tempfile.TemporaryDirectory() as tmp:
+        session = FakeVkSession({100: [make_post(1, 10)]}, invalid={'deleted_user'})
+        poller = IncrementalPoller(vk_session=session, store=PollCursorStore(os.path.join(tmp, 'cursors.json')),
+                                   new_page=5)
+
+        results = poller.poll_vk(['alice', 'deleted_user', 'bob'])
+
+        assert 'error' in results['deleted_user']
+        assert results['alice']['new_posts'] == 1 and results['bob']['new_posts'] == 1
+        assert len([call for call in session.calls if call[0] == 'users.get']) == 4
+        print("✅ Błędna nazwa nie psuje pozostałych kont")
+
+
+def test_store_changed_during_save():
+    """Drugi batch (StatsScheduler) zmienia kursory w trakcie save(): zapis się udaje, kursory nie giną"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'cursors.json')
+        store = PollCursorStore(path)
+        for i in range(10):
+            store.get(f"vk:user{i}")['posts'] = {str(post_id): {'views': post_id} for post_id in range(10)}
+        real_dump = json.dump
+
+        class ConcurrentBatch:
+            """Plik, przy każdym zapisie którego inny batch dopisuje konto i post"""
+
+            def __init__(self, f):
+                self.f = f
+                self.writes = 0
+
+            def write(self, chunk):
+                self.writes += 1
+                with store.lock:
+                    store.get(f"youtube:channel{self.writes}")['checked_at'] = self.writes
+                    store.get("vk:user0")['posts'][f"new{self.writes}"] = {'views': 0}
+                return self.f.write(chunk)
+
+        with mock.patch.object(incremental_poller.json, 'dump',
+                               lambda obj, f, **kwargs: real_dump(obj, ConcurrentBatch(f), **kwargs)):
+            store.save()
+        store.save()
+
+        with open(path, encoding='utf-8') as f:
+            saved = json.load(f)
+        assert len(saved) > 10 and all(f"vk:user{i}" in saved for i in range(10))
+        assert saved == store.data
+        print("✅ Zmiana kursorów w trakcie zapisu")
+
+
+if __name__ == "__main__":
+    print("🧪 TEST INKREMENTALNEGO POLLERA")
+    print("=" * 60)
+    test_vk_batches_accounts_into_one_execute()
+    test_vk_cursor_only_counts_new_posts()
+    test_vk_gap_fetches_next_page()
+    test_vk_invalid_name_only_loses_its_account()
+    test_store_changed_during_save()
+    print("🎉 Wszystkie testy zakończone")
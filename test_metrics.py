@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Тест метрик: формат Prometheus, gauge с функциями, эндпоинт /metrics health-сервера
+"""
+
+import os
+import shutil
+import threading
+import subprocess
+import urllib.request
+from http.server import HTTPServer
+
+import metrics
+from metrics import Registry, timed, throughput
+from ffmpeg_utils import FFMPEG_BIN
+
+
+def test_histogram_and_gauge_format():
+    registry = Registry()
+    latency = registry.histogram('test_seconds', 'Тестовая гистограмма', ('kind',), buckets=(0.5, 1, 5))
+    latency.observe(0.2, kind='a')
+    latency.observe(0.7, kind='a')
+    latency.observe(10, kind='a')
+    queue = registry.gauge('test_queue', 'Очередь')
+    queue.inc(3)
+    queue.dec()
+    rss = registry.gauge('test_rss', 'RSS')
+    rss.set_function(lambda: 1024)
+
+    text = registry.render()
+    assert '# TYPE test_seconds histogram' in text
+    assert 'test_seconds_bucket{kind="a",le="0.5"} 1' in text
+    assert 'test_seconds_bucket{kind="a",le="1"} 2' in text
+    assert 'test_seconds_bucket{kind="a",le="5"} 2' in text
+    assert 'test_seconds_bucket{kind="a",le="+Inf"} 3' in text
+    assert 'test_seconds_sum{kind="a"} 10.9' in text
+    assert 'test_seconds_count{kind="a"} 3' in text
+    assert 'test_queue 2' in text and 'test_rss 1024' in text
+
+    try:
+        latency.observe(1.0)
+        assert False, "метки обязательны"
+    except ValueError:
+        pass
+    print("✅ Формат Prometheus")
+
+
+def test_timed_and_throughput():
+    registry = Registry()
+    seconds = registry.histogram('op_seconds', 'op')
+    speed = registry.histogram('op_bytes_per_second', 'speed', ('target',), buckets=(1e3, 1e9))
+    with timed(seconds):
+        pass
+    with throughput(speed, 10 * 1024 * 1024, target='yandex'):
+        pass
+    try:
+        with throughput(speed, 1024, target='telegram'):
+            raise RuntimeError('upload failed')
+    except RuntimeError:
+        pass
+    text = registry.render()
+    assert 'op_seconds_count 1' in text
+    assert 'op_bytes_per_second_count{target="yandex"} 1' in text
+    # Неудачная выгрузка скорость не портит
+    assert 'target="telegram"' not in text
+    print("✅ timed / throughput")
+
+
+def test_process_gauges():
+    assert metrics.process_rss_bytes() > 10 * 1024 * 1024
+    process = subprocess.Popen(['sleep', '5'])
+    try:
+        # sleep не ffmpeg - не считается
+        assert metrics.ffmpeg_process_count() == 0
+    finally:
+        process.kill()
+        process.wait()
+    if shutil.which(FFMPEG_BIN):
+        process = subprocess.Popen([FFMPEG_BIN, '-v', 'quiet', '-re', '-f', 'lavfi', '-i', 'testsrc2', '-t', '5',
+                                    '-f', 'null', '-'])
+        try:
+            assert metrics.ffmpeg_process_count() == 1
+        finally:
+            process.kill()
+            process.wait()
+    print("✅ RSS и процессы ffmpeg")
+
+
+def test_health_server_metrics_endpoint():
+    os.environ.setdefault('USE_SELF_HOSTED_API', 'false')
+    from telegram_bot import HealthHandler
+
+    metrics.PROBE_SECONDS.observe(0.3)
+    server = HTTPServer(('127.0.0.1', 0), HealthHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        url = f"http://127.0.0.1:{server.server_port}"
+        with urllib.request.urlopen(f"{url}/metrics") as response:
+            assert response.headers['Content-Type'].startswith('text/plain; version=0.0.4')
+            text = response.read().decode()
+        for name in ('bot_download_seconds', 'bot_probe_seconds_count', 'bot_render_fps', 'bot_encode_seconds',
+                     'bot_upload_bytes_per_second', 'bot_render_queue_depth', 'bot_ffmpeg_processes',
+                     'bot_process_rss_bytes'):
+            assert name in text, name
+        with urllib.request.urlopen(f"{url}/health") as response:
+            assert response.status == 200
+        # Маршрут - по пути, строка запроса не мешает
+        with urllib.request.urlopen(f"{url}/metrics?x=1") as response:
+            assert 'bot_probe_seconds_count' in response.read().decode()
+    finally:
+        server.shutdown()
+        server.server_close()
+    print("✅ /metrics")
+
+
+if __name__ == "__main__":
+    print("🧪 ТЕСТ МЕТРИК")
+    print("=" * 60)
+    test_histogram_and_gauge_format()
+    test_timed_and_throughput()
+    test_process_gauges()
+    test_health_server_metrics_endpoint()
+    print("🎉 Все тесты завершены")
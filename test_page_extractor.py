@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Test silnika ekstrakcji: wyniki muszą być takie same jak starej pętli po wzorcach
+"""
+
+from benchmark_extraction import legacy_extract, synthetic_page, _SNIPPETS
+from page_extractor import PLATFORM_PATTERNS, extract_fields, extract_with_patterns, parse_number
+
+
+def test_parse_number():
+    """Parsowanie liczb z sufiksami"""
+    assert parse_number('1.2M') == 1200000
+    assert parse_number('15,234') == 15234
+    assert parse_number('98.7K Followers') == 98700
+    assert parse_number('') == 0
+    assert parse_number('brak') == 0
+
+
+def test_same_results_as_legacy():
+    """Silnik daje te same liczby co stara implementacja"""
+    for platform in _SNIPPETS:
+        for layout in (0, 1):
+            content = synthetic_page(platform, layout, size_mb=0.2)
+            expected = {field: legacy_extract(content, patterns)
+                        for field, patterns in PLATFORM_PATTERNS[platform].items()}
+            assert extract_fields(platform, content) == expected, (platform, layout)
+            print(f"✅ {platform} (layout {layout}): {expected}")
+
+
+def test_priority_order():
+    """Wzorzec wyżej na liście wygrywa, nawet gdy ogólny pasuje wcześniej na stronie"""
+    content = '<span>5 followers</span> ... "edge_followed_by":{"count":777}'
+    assert extract_fields('instagram', content)['followers'] == 777
+
+
+def test_ad_hoc_patterns():
+    """Dowolne listy wzorców (np. z RobustSocialStatsChecker)"""
+    patterns = [r'(\d+(?:\.\d+)?[KMB]?)\s*subscribers?', r'subscriberCount["\']:\s*["\']([^"\']+)["\']']
+    assert extract_with_patterns('v2.1.5K Subscribers', patterns) == legacy_extract('v2.1.5K Subscribers', patterns)
+    assert extract_with_patterns("'subscriberCount': '42'", patterns) == 42
+    assert extract_with_patterns('nic tu nie ma', patterns) == 0
+
+
+def test_bad_patterns_skipped_like_legacy():
+    """Błędny wzorzec, wzorzec bez grupy lub z kilkoma grupami psuje tylko siebie"""
+    patterns = [r'"count":([unclosed', r'subscribers', r'(\d+)\s*(subs)', r'"simpleText":"([^"]+)"',
+                r'(\d+(?:\.\d+)?[KMB]?)\s*subscribers?']
+    pages = ['"simpleText":"1.5M"', '12 subs', '7 subscribers', 'x "count":5 subscribers', 'nic']
+    for page in pages:
+        assert extract_with_patterns(page, patterns) == legacy_extract(page, patterns), page
+    assert extract_with_patterns('"simpleText":"1.5M"', patterns) == 1500000
+    # Opcjonalna pierwsza grupa bez dopasowania - następny wzorzec, jak wcześniej
+    assert extract_with_patterns('x 9 views', [r'(a)?x', r'(\d+) views']) == 9
+
+
+if __name__ == "__main__":
+    print("🧪 TEST SILNIKA EKSTRAKCJI")
+    print("=" * 60)
+    test_parse_number()
+    test_same_results_as_legacy()
+    test_priority_order()
+    test_ad_hoc_patterns()
+    test_bad_patterns_skipped_like_legacy()
+    print("🎉 Wszystkie testy zakończone")
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Тест профилировщика по запросу: захват стеков рабочих потоков, папки запусков,
+эндпоинт /profile health-сервера (токен) и команда /profile (только менеджеры)
+"""
+
+import os
+import time
+import asyncio
+import tempfile
+import threading
+import urllib.error
+import urllib.request
+from unittest import mock
+from pathlib import Path
+from types import SimpleNamespace
+from http.server import ThreadingHTTPServer
+
+import profiler
+import tracing
+
+
+def busy_render_loop(stop):
+    total = 0
+    while not stop.is_set():
+        total += sum(i * i for i in range(1000))
+    return total
+
+
+def test_capture_hot_function():
+    assert not any(t.name == 'stack-sampler' for t in threading.enumerate()), "без захвата потока нет"
+    stop = threading.Event()
+    worker = threading.Thread(target=busy_render_loop, args=(stop,), name='render-1')
+    worker.start()
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            run_dir = Path(tmp) / 'batch_x'
+            with tracing.Tracer('batch', run_dir=run_dir, trace_dir=None).activate():
+                result = profiler.capture(0.5, output_dir=tmp, interval=0.005)
+            assert result['samples'] > 10, result['samples']
+            assert result['paths'] == [str(Path(tmp) / Path(result['path']).name),
+                                       str(run_dir / Path(result['path']).name)]
+            lines = Path(result['path']).read_text(encoding='utf-8').splitlines()
+            hot = [line for line in lines if line.startswith('render-1;') and 'busy_render_loop' in line]
+            assert hot, lines[:5]
+            stack, count = hot[0].rsplit(' ', 1)
+            assert int(count) > 0 and ';' in stack
+            assert any('busy_render_loop' in frame or '<genexpr>' in frame for frame, _ in result['top'])
+    finally:
+        stop.set()
+        worker.join()
+    assert not any(t.name == 'stack-sampler' for t in threading.enumerate())
+    print("✅ Горячая функция рабочего потока в collapsed stacks")
+
+
+def test_single_capture_at_a_time():
+    with tempfile.TemporaryDirectory() as tmp:
+        thread = threading.Thread(target=profiler.capture, args=(0.5, tmp))
+        thread.start()
+        time.sleep(0.1)
+        assert profiler.is_running()
+        assert 'error' in profiler.capture(0.1, tmp)
+        thread.join()
+        assert not profiler.is_running()
+    print("✅ Один захват одновременно")
+
+
+def test_health_profile_endpoint():
+    os.environ.setdefault('USE_SELF_HOSTED_API', 'false')
+    import telegram_bot
+    from telegram_bot import HealthHandler
+
+    def status(url, token=None):
+        request = urllib.request.Request(url, headers={'Authorization': f"Bearer {token}"} if token else {})
+        try:
+            with urllib.request.urlopen(request) as response:
+                return response.status
+        except urllib.error.HTTPError as e:
+            return e.code
+
+    with tempfile.TemporaryDirectory() as tmp:
+        profiler_dir = profiler.PROFILE_DIR
+        profiler.PROFILE_DIR = tmp
+        server = ThreadingHTTPServer(('127.0.0.1', 0), HealthHandler)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            url = f"http://127.0.0.1:{server.server_port}"
+            with mock.patch.object(telegram_bot, 'PROFILE_HTTP_TOKEN', ''):
+                assert status(f"{url}/profile?seconds=0.1", 'anything') == 404, "без токена эндпоинт выключен"
+            with mock.patch.object(telegram_bot, 'PROFILE_HTTP_TOKEN', 'secret'):
+                assert status(f"{url}/profile?seconds=0.1") == 401
+                assert status(f"{url}/profile?seconds=0.1", 'wrong') == 401
+                assert not list(Path(tmp).iterdir()), "без токена профиль не снимается"
+                request = urllib.request.Request(f"{url}/profile?seconds=0.3", headers={'Authorization': 'Bearer secret'})
+                with urllib.request.urlopen(request) as response:
+                    body = response.read().decode()
+                    path = response.headers['X-Profile-Path']
+            assert path.startswith(tmp) and Path(path).read_text(encoding='utf-8') == body
+            assert 'serve_forever' in body
+        finally:
+            profiler.PROFILE_DIR = profiler_dir
+            server.shutdown()
+            server.server_close()
+    print("✅ /profile")
+
+
+def test_profile_command_requires_manager():
+    os.environ.setdefault('USE_SELF_HOSTED_API', 'false')
+    import telegram_bot
+
+    replies = []
+
+    async def reply_text(text, **kwargs):
+        replies.append(text)
+
+    update = SimpleNamespace(effective_user=SimpleNamespace(id=42), message=SimpleNamespace(reply_text=reply_text))
+    context = SimpleNamespace(args=['0.1'])
+    with mock.patch.object(telegram_bot, 'MANAGER_IDS', {7}), mock.patch.object(profiler, 'capture') as capture:
+        asyncio.run(telegram_bot.TelegramVideoBot.profile_command(None, update, context))
+    assert not capture.called and replies == ["❌ У вас нет прав менеджера."]
+    print("✅ /profile только для менеджеров")
+
+
+if __name__ == "__main__":
+    print("🧪 ТЕСТ ПРОФИЛИРОВЩИКА")
+    print("=" * 60)
+    test_capture_hot_function()
+    test_single_capture_at_a_time()
+    test_health_profile_endpoint()
+    test_profile_command_requires_manager()
+    print("🎉 Все тесты завершены")
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Test ProgressHub: coalescing, bounded client queues, dead clients
+"""
+
+import json
+import asyncio
+import threading
+
+from progress_hub import ProgressHub, user_topic
+
+
+class FakeWebSocket:
+    """Records sent frames; optionally slow or broken"""
+
+    def __init__(self, delay=0.0, broken=False):
+        self.sent = []
+        self.delay = delay
+        self.broken = broken
+
+    async def send(self, frame):
+        if self.broken:
+            raise ConnectionError("closed")
+        await asyncio.sleep(self.delay)
+        self.sent.append(json.loads(frame))
+
+
+def test_updates_from_threads_are_coalesced():
+    """1000 updates from a worker thread -> a few frames, the last one is the newest"""
+    async def scenario():
+        hub = ProgressHub(max_rate=20)
+        hub.attach()
+        ws = FakeWebSocket()
+        hub.subscribe(ws, 'render_1')
+
+        def worker():
+            for i in range(1, 1001):
+                hub.publish('render_1', {'frames_done': i, 'user_id': 7})
+
+        thread = threading.Thread(target=worker)
+        thread.start()
+        await asyncio.to_thread(thread.join)
+        await asyncio.sleep(0.2)
+        return ws
+
+    ws = asyncio.run(scenario())
+    assert 1 <= len(ws.sent) <= 10
+    assert ws.sent[-1]['frames_done'] == 1000
+    print(f"✅ 1000 updates -> {len(ws.sent)} frames")
+
+
+def test_slow_client_drops_stale_frames():
+    """Slow client keeps a bounded queue; user subscription receives job frames"""
+    async def scenario():
+        hub = ProgressHub(max_rate=0, queue_size=2)
+        hub.attach()
+        slow = FakeWebSocket(delay=0.05)
+        hub.subscribe(slow, user_topic(7))
+        for i in range(20):
+            hub.publish(f'job_{i}', {'n': i, 'user_id': 7})
+            await asyncio.sleep(0)
+        await asyncio.sleep(0.3)
+        return hub, slow
+
+    hub, slow = asyncio.run(scenario())
+    assert len(slow.sent) < 20
+    assert slow.sent[-1]['n'] == 19
+    assert hub.stats()['dropped_frames'] > 0
+    print(f"✅ Slow client: {len(slow.sent)}/20 frames, newest delivered")
+
+
+def test_broken_client_is_removed():
+    async def scenario():
+        hub = ProgressHub(max_rate=0)
+        hub.attach()
+        hub.subscribe(FakeWebSocket(broken=True), 'job')
+        hub.publish('job', {'n': 1})
+        await asyncio.sleep(0.05)
+        return hub
+
+    hub = asyncio.run(scenario())
+    assert hub.stats()['clients'] == 0
+    print("✅ Broken client removed")
+
+
+if __name__ == "__main__":
+    print("🧪 TEST PROGRESS HUB")
+    print("=" * 60)
+    test_updates_from_threads_are_coalesced()
+    test_slow_client_drops_stale_frames()
+    test_broken_client_is_removed()
+    print("🎉 All tests passed")
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Тест smart cut: план сегментов, покадровая точность реза, края в формате исходника
+и перекодирование целиком, если формат не повторить
+"""
+
+import os
+import tempfile
+import subprocess
+
+import numpy as np
+import pytest
+
+from ffmpeg_utils import FFMPEG_BIN, probe_video
+from smart_cut import plan_segments, smart_cut
+from clip_fixtures import make_clip, requires_ffmpeg
+
+
+def read_frames(path):
+    result = subprocess.run([FFMPEG_BIN, '-v', 'error', '-i', path, '-fps_mode', 'passthrough',
+                             '-f', 'rawvideo', '-pix_fmt', 'gray', '-'], capture_output=True)
+    return np.frombuffer(result.stdout, np.uint8).reshape(-1, 240, 320)
+
+
+def sps_formats(path):
+    """{(profile_idc, level_idc)} всех SPS в потоке"""
+    result = subprocess.run([FFMPEG_BIN, '-v', 'error', '-i', path, '-map', '0:v:0', '-c:v', 'copy',
+                             '-bsf:v', 'h264_mp4toannexb', '-f', 'h264', '-'], capture_output=True)
+    data, formats = result.stdout, set()
+    pos = data.find(b'\x00\x00\x01')
+    while pos != -1 and pos + 6 < len(data):
+        if data[pos + 3] & 0x1f == 7:
+            formats.add((data[pos + 4], data[pos + 6]))
+        pos = data.find(b'\x00\x00\x01', pos + 3)
+    return formats
+
+
+def test_plan_segments():
+    keyframes = [0.0, 2.0, 4.0, 6.0]
+    assert plan_segments(keyframes, 0.5, 5.0) == [('encode', 0.5, 2.0), ('copy', 2.0, 4.0), ('encode', 4.0, 5.0)]
+    assert plan_segments(keyframes, 2.0, 6.0) == [('copy', 2.0, 6.0)]
+    assert plan_segments(keyframes, 2.5, 3.5) == [('encode', 2.5, 3.5)]
+    print("✅ plan_segments")
+
+
+@requires_ffmpeg
+def test_smart_cut_frame_accurate():
+    """Каждый кадр результата совпадает с кадром исходника; без дублей и пропусков"""
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, 'source.mp4')
+        output = os.path.join(tmp, 'cut.mp4')
+        make_clip(source, 20, x264_args=('-g', '50'))
+        source_frames = read_frames(source)
+
+        for start, end in [(3.52, 15.08), (0, 12.3), (5.1, 5.9)]:
+            assert smart_cut(source, output, start, end)
+            frames = read_frames(output)
+            first = round(start * 25)
+            assert len(frames) == round(end * 25) - first, (start, end, len(frames))
+            errors = [np.abs(frame.astype(np.float32) - source_frames[first + i]).mean()
+                      for i, frame in enumerate(frames)]
+            assert max(errors) < 2, (start, end, max(errors))
+            info = probe_video(output)
+            assert info['has_audio'] and abs(info['duration'] - (end - start)) < 0.1
+            print(f"✅ {start}-{end}s: {len(frames)} кадров, max MAE {max(errors):.2f}")
+
+
+@requires_ffmpeg
+def test_edges_match_source_format():
+    """Края кодируются тем же профилем и уровнем, что и скопированная середина"""
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, 'source.mp4')
+        output = os.path.join(tmp, 'cut.mp4')
+        make_clip(source, 10, x264_args=('-g', '50', '-profile:v', 'main', '-level:v', '3.1'))
+        assert sps_formats(source) == {(77, 31)}
+
+        assert smart_cut(source, output, 1.52, 8.08)
+        assert sps_formats(output) == {(77, 31)}, sps_formats(output)
+        info = probe_video(output)
+        assert info['profile'] == 'Main' and info['pix_fmt'] == 'yuv420p'
+        print("✅ Края в формате исходника: Main@3.1")
+
+
+@requires_ffmpeg
+def test_unmatched_format_is_fully_reencoded():
+    """HEVC краями libx264 не повторить - отрезок перекодируется целиком, рез остается точным"""
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, 'source.mkv')
+        output = os.path.join(tmp, 'cut.mp4')
+        result = subprocess.run([FFMPEG_BIN, '-v', 'error', '-f', 'lavfi', '-i', 'testsrc2=size=320x240:rate=25',
+                                 '-t', '6', '-c:v', 'libx265', '-x265-params', 'log-level=error', source],
+                                capture_output=True)
+        if result.returncode != 0:
+            pytest.skip("ffmpeg собран без libx265")
+        source_frames = read_frames(source)
+
+        assert smart_cut(source, output, 1.52, 4.08)
+        frames = read_frames(output)
+        assert len(frames) == round(4.08 * 25) - round(1.52 * 25)
+        errors = [np.abs(frame.astype(np.float32) - source_frames[38 + i]).mean() for i, frame in enumerate(frames)]
+        assert max(errors) < 3, max(errors)
+        assert probe_video(output)['video_codec'] == 'h264'
+        print(f"✅ HEVC: перекодирован целиком, {len(frames)} кадров")
+
+
+if __name__ == "__main__":
+    print("🧪 ТЕСТ SMART CUT")
+    print("=" * 60)
+    test_plan_segments()
+    test_smart_cut_frame_accurate()
+    test_edges_match_source_format()
+    test_unmatched_format_is_fully_reencoded()
+    print("🎉 Все тесты завершены")
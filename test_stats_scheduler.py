@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Test harmonogramu statystyk (sztuczny ekstraktor, bez sieci)
+"""
+
+import os
+import time
+import tempfile
+import threading
+
+from stats_history import StatsHistoryStore
+from stats_scheduler import StatsScheduler
+
+
+class FakeExtractor:
+    """Udaje OfficialAPIExtractor: batchowe metody VK/YouTube"""
+
+    def __init__(self, views=100, age=30 * 24 * 3600, delay=0.0):
+        self.views = views
+        self.age = age
+        self.delay = delay
+        self.calls = []
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+    def _result(self, url):
+        return {'clips': [{'video_id': url[-1], 'views': self.views,
+                           'date_ts': int(time.time() - self.age), 'title': 'clip'}]}
+
+    def _batch(self, name, urls):
+        with self._lock:
+            self.calls.append((name, list(urls)))
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        time.sleep(self.delay)
+        with self._lock:
+            self.active -= 1
+        return {url: self._result(url) for url in urls}
+
+    def extract_vk_clips_views_batch(self, urls, limit=10):
+        return self._batch('vk', urls)
+
+    def extract_youtube_views_batch(self, urls, limit=10):
+        return self._batch('youtube', urls)
+
+
+def make_scheduler(tmp, accounts, extractor, **kwargs):
+    history = StatsHistoryStore(os.path.join(tmp, 'history.jsonl'))
+    return StatsScheduler(accounts, extractor=extractor, history=history, **kwargs)
+
+
+def test_run_once_batches_and_respects_budget():
+    """30 kont VK + 3 YouTube -> 3 zadania, max 2 naraz"""
+    with tempfile.TemporaryDirectory() as tmp:
+        accounts = [{'platform': 'VK_Clips', 'url': f'https://vk.com/clips/user{i}'} for i in range(30)]
+        accounts += [{'platform': 'YouTube', 'url': f'https://www.youtube.com/@chan{i}'} for i in range(3)]
+        extractor = FakeExtractor(delay=0.05)
+        scheduler = make_scheduler(tmp, accounts, extractor, max_concurrency=2)
+
+        scheduler.run_once()
+
+        assert sorted(len(urls) for _, urls in extractor.calls) == [3, 5, 25]
+        assert extractor.max_active <= 2
+        assert all(schedule.next_due > time.time() for schedule in scheduler.accounts.values())
+        print(f"✅ {len(accounts)} kont -> {len(extractor.calls)} zadania, max {extractor.max_active} naraz")
+
+
+def test_interval_follows_velocity():
+    """Szybki przyrost -> krótki interwał, brak przyrostu -> coraz dłuższy"""
+    with tempfile.TemporaryDirectory() as tmp:
+        scheduler = make_scheduler(tmp, [{'platform': 'VK_Clips', 'url': 'https://vk.com/clips/a'}],
+                                   FakeExtractor(), min_interval=60, max_interval=24 * 3600, target_delta=50)
+        schedule = next(iter(scheduler.accounts.values()))
+        old = {'clips': [{'video_id': 'x', 'views': 0, 'date_ts': time.time() - 30 * 24 * 3600}]}
+
+        now = time.time()
+        scheduler.history.record_many([
+            {'platform': 'VK_Clips', 'item_id': 'x', 'views': 0, 'ts': now - 3600},
+            {'platform': 'VK_Clips', 'item_id': 'x', 'views': 100, 'ts': now},
+        ])
+        # 100 wyświetleń/h, 50 docelowo -> 30 min
+        assert abs(scheduler.next_interval(schedule, old) - 1800) < 1
+
+        schedule.interval = 3600
+        assert scheduler.next_interval(schedule, {'clips': [{'video_id': 'stale'}]}) == 7200
+
+        # Świeży clip -> minimalny interwał
+        fresh = {'clips': [{'video_id': 'stale', 'date_ts': time.time() - 600}]}
+        assert scheduler.next_interval(schedule, fresh) == 60
+
+        # Błędy -> wykładniczy backoff
+        assert scheduler.next_interval(schedule, {'error': 'x'}) == 120
+        assert scheduler.next_interval(schedule, {'error': 'x'}) == 240
+        print("✅ Interwał dopasowany do tempa przyrostu")
+
+
+def test_jitter_spreads_due_times():
+    """Terminy z jitterem mieszczą się w ±10% i nie są identyczne"""
+    with tempfile.TemporaryDirectory() as tmp:
+        scheduler = make_scheduler(tmp, [], FakeExtractor(), jitter=0.1)
+        values = [scheduler._with_jitter(1000) for _ in range(50)]
+        assert all(900 <= value <= 1100 for value in values)
+        assert len(set(values)) > 1
+        print("✅ Jitter terminów")
+
+
+def test_full_budget_does_not_spin():
+    """Wszystkie sloty zajęte -> pętla czeka na zwolnienie slotu zamiast kręcić się"""
+    with tempfile.TemporaryDirectory() as tmp:
+        accounts = [{'platform': 'YouTube', 'url': f'https://www.youtube.com/@chan{i}'} for i in range(4)]
+        accounts += [{'platform': 'VK_Clips', 'url': 'https://vk.com/clips/a'}]
+        extractor = FakeExtractor(delay=0.5)
+        scheduler = make_scheduler(tmp, accounts, extractor, max_concurrency=1)
+        for schedule in scheduler.accounts.values():
+            scheduler._push(schedule, 0.0)
+
+        dispatches = []
+        original = scheduler.dispatch
+        scheduler.dispatch = lambda now=None: dispatches.append(time.time()) or original(now)
+        thread = threading.Thread(target=scheduler.run_forever)
+        thread.start()
+        time.sleep(1.2)
+        scheduler.stop()
+        thread.join(timeout=5)
+
+        assert len(extractor.calls) >= 2, "kolejne zadanie po zwolnieniu slotu"
+        assert len(dispatches) < 20, f"pętla kręci się przy pełnym budżecie: {len(dispatches)} dispatch"
+        print(f"✅ Pełny budżet: {len(dispatches)} dispatch w 1.2 s")
+
+
+if __name__ == "__main__":
+    print("🧪 TEST HARMONOGRAMU STATYSTYK")
+    print("=" * 60)
+    test_run_once_batches_and_respects_budget()
+    test_interval_follows_velocity()
+    test_jitter_spreads_due_times()
+    test_full_budget_does_not_spin()
+    print("🎉 Wszystkie testy zakończone")
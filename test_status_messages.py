@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Тест статусных сообщений: частые обновления сливаются в редкие правки, текст без
+изменений не отправляется, RetryAfter приостанавливает все сообщения, прогресс
+приходит из потока рендера
+"""
+
+import time
+import asyncio
+import threading
+
+from telegram.error import RetryAfter
+
+from status_messages import StatusBoard
+
+
+class FakeMessage:
+    """Запоминает правки; может один раз ответить RetryAfter"""
+
+    def __init__(self, retry_after: float = 0):
+        self.edits = []
+        self.retry_after = retry_after
+
+    async def edit(self, text, **kwargs):
+        if self.retry_after:
+            retry_after, self.retry_after = self.retry_after, 0
+            raise RetryAfter(retry_after)
+        self.edits.append((time.monotonic(), text))
+
+
+def test_coalescing():
+    async def scenario():
+        board = StatusBoard(interval=0.2)
+        chat = FakeMessage()
+        status = board.message(chat.edit)
+        for pct in range(101):
+            status.set(f"📊 {pct}%")
+            await asyncio.sleep(0.005)
+        await asyncio.sleep(0.3)
+        status.set("📊 100%")  # тот же текст - правки нет
+        await status.update("✅ Готово")
+        return board, chat
+
+    board, chat = asyncio.run(scenario())
+    texts = [text for _, text in chat.edits]
+    assert texts[0] == "📊 0%" and texts[-2:] == ["📊 100%", "✅ Готово"]
+    assert len(texts) <= 6, f"100 обновлений - несколько правок, а не {len(texts)}"
+    gaps = [b - a for (a, _), (b, _) in zip(chat.edits, chat.edits[1:-1])]
+    assert all(gap >= 0.19 for gap in gaps), "не чаще одной правки за интервал"
+    assert board.skipped >= 1
+    print("✅ Слияние обновлений и пропуск правок без изменений")
+
+
+def test_retry_after_is_global():
+    async def scenario():
+        board = StatusBoard(interval=0.05)
+        first, second = FakeMessage(retry_after=0.3), FakeMessage()
+        status_first, status_second = board.message(first.edit), board.message(second.edit)
+        start = time.monotonic()
+        status_first.set("первое")
+        await asyncio.sleep(0.05)
+        status_second.set("второе")
+        await status_second.flush()
+        await status_first.flush()
+        return start, first, second
+
+    start, first, second = asyncio.run(scenario())
+    assert [text for _, text in first.edits] == ["первое"], "текст после RetryAfter отправлен повторно"
+    assert second.edits[0][0] - start >= 0.29, "RetryAfter приостанавливает и другие сообщения"
+    print("✅ RetryAfter общий для всех сообщений")
+
+
+def test_updates_from_render_thread():
+    async def scenario():
+        board = StatusBoard(interval=0.05)
+        chat = FakeMessage()
+        status = board.message(chat.edit)
+
+        def render():
+            for pct in range(0, 101, 5):
+                status.set(f"🎬 Рендер {pct}%")
+                time.sleep(0.01)
+
+        thread = threading.Thread(target=render)
+        thread.start()
+        await asyncio.get_running_loop().run_in_executor(None, thread.join)
+        await asyncio.sleep(0.1)
+        return chat
+
+    chat = asyncio.run(scenario())
+    texts = [text for _, text in chat.edits]
+    assert texts[-1] == "🎬 Рендер 100%" and len(texts) < 21
+    print("✅ Прогресс из потока рендера")
+
+
+if __name__ == "__main__":
+    print("🧪 ТЕСТ СТАТУСНЫХ СООБЩЕНИЙ")
+    print("=" * 60)
+    test_coalescing()
+    test_retry_after_is_global()
+    test_updates_from_render_thread()
+    print("🎉 Все тесты завершены")
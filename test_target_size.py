@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Тест кодирования под лимит размера: расчет битрейта, выбор разрешения и
+попадание в лимит с первой попытки
+"""
+
+import os
+import tempfile
+
+from ffmpeg_utils import probe_video
+from target_size import video_bitrate, choose_short_side, encode_to_size, CONTAINER_OVERHEAD
+from clip_fixtures import make_clip, requires_ffmpeg
+
+
+def test_bitrate_budget():
+    max_bytes = 20 * 1024 * 1024
+    bitrate = video_bitrate(max_bytes, 60, audio_bitrate=96_000, margin=0, vbv_seconds=0)
+    total_bits = (bitrate + 96_000) * 60
+    assert abs(total_bits - max_bytes * 8 * (1 - CONTAINER_OVERHEAD)) < 60 * 8
+    # Окно VBV и запас уменьшают битрейт
+    assert video_bitrate(max_bytes, 60, 96_000) < bitrate
+    print("✅ Битрейт из длительности, аудио и накладных расходов")
+
+
+def test_choose_short_side():
+    assert choose_short_side(5_000_000, 1920, 1080, 30, max_side=720) == 720
+    assert choose_short_side(5_000_000, 640, 360, 30, max_side=720) == 360  # не увеличиваем
+    assert choose_short_side(400_000, 1920, 1080, 30, max_side=720) == 360
+    assert choose_short_side(10_000, 1920, 1080, 30) == 240
+    # Вертикальный ролик: ограничивается ширина (короткая сторона), а не высота
+    assert choose_short_side(5_000_000, 1080, 1920, 30, max_side=720) == 720
+    assert choose_short_side(5_000_000, 0, 0, 30, max_side=720) == 0  # размер неизвестен
+    print("✅ Разрешение по битам на пиксель")
+
+
+@requires_ffmpeg
+def test_encode_under_budget_first_try():
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, 'source.mkv')
+        # Шум плохо сжимается - кодер вынужден держать битрейт у потолка
+        make_clip(source, 6, source='testsrc2=size=640x360:rate=25,noise=alls=40:allf=t',
+                  x264_args=('-crf', '10', '-preset', 'ultrafast'))
+        max_bytes = 400 * 1024
+        assert os.path.getsize(source) > max_bytes
+
+        output = os.path.join(tmp, 'out.mp4')
+        result = encode_to_size(source, output, max_bytes, audio_bitrate=64_000,
+                                x264_args=['-preset', 'ultrafast'])
+        assert result.get('success'), result
+        assert result['attempts'] == 1
+        assert result['size'] == os.path.getsize(output) <= max_bytes
+        assert result['size'] > max_bytes * 0.6, "бюджет использован, а не выброшен"
+        info = probe_video(output)
+        assert info['has_audio'] and info['height'] == result['short_side']
+
+        error = encode_to_size(source, output, 10 * 1024)
+        assert 'error' in error
+    print("✅ Файл в лимите с первой попытки")
+
+
+@requires_ffmpeg
+def test_portrait_and_timeout():
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, 'portrait.mkv')
+        make_clip(source, 2, source='testsrc2=size=360x640:rate=25')
+        output = os.path.join(tmp, 'out.mp4')
+        result = encode_to_size(source, output, 2 * 1024 * 1024, max_height=240, x264_args=['-preset', 'ultrafast'])
+        assert result.get('success'), result
+        info = probe_video(output)
+        assert (info['width'], info['height']) == (240, 426), (info['width'], info['height'])
+
+        result = encode_to_size(source, output, 2 * 1024 * 1024, timeout=0.001)
+        assert 'не уложился' in result['error'] and not os.path.exists(output)
+    print("✅ Вертикальный ролик и таймаут")
+
+
+@requires_ffmpeg
+def test_rotated_phone_clip():
+    """1920x1080 с поворотом 90° (вертикальное видео с телефона): 720x1280, а не 406x720"""
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, 'phone.mp4')
+        make_clip(source, 1, source='testsrc2=size=1920x1080:rate=25', display_rotation=90)
+        info = probe_video(source)
+        assert (info['width'], info['height'], info['rotation']) == (1080, 1920, 90), info
+
+        output = os.path.join(tmp, 'out.mp4')
+        result = encode_to_size(source, output, 4 * 1024 * 1024, x264_args=['-preset', 'ultrafast'])
+        assert result.get('success') and result['short_side'] == 720, result
+        info = probe_video(output)
+        assert (info['width'], info['height']) == (720, 1280), (info['width'], info['height'])
+    print("✅ Повернутый ролик с телефона")
+
+
+if __name__ == "__main__":
+    print("🧪 ТЕСТ КОДИРОВАНИЯ ПОД РАЗМЕР")
+    print("=" * 60)
+    test_bitrate_budget()
+    test_choose_short_side()
+    test_encode_under_budget_first_try()
+    test_portrait_and_timeout()
+    test_rotated_phone_clip()
+    print("🎉 Все тесты завершены")
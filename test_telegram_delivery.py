@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Тест доставки видео: альбомы до 10 видео, file_id из кэша вместо повторной
+загрузки, ожидание при RetryAfter, устаревший file_id, окна файла для загрузки
+частями без временных файлов, отправка путем file:// в локальный Bot API
+"""
+
+import os
+import asyncio
+import tempfile
+from types import SimpleNamespace
+
+from telegram.error import BadRequest, RetryAfter
+
+from telegram_delivery import (FileIdCache, VideoDelivery, FileWindow, LocalFiles, file_windows,
+                               MEDIA_GROUP_LIMIT)
+
+
+class FakeBot:
+    """Запоминает вызовы; загруженный файл получает file_id по имени"""
+
+    def __init__(self, retry_after_once: bool = False, stale_ids=(), reject_local: bool = False):
+        self.groups = []
+        self.single = []
+        self.uploaded = []
+        self.local = []
+        self.retry_after_once = retry_after_once
+        self.stale_ids = set(stale_ids)
+        self.reject_local = reject_local
+
+    def _file_id(self, video):
+        if isinstance(video, str) and video.startswith('file://'):
+            # Сервер без --local или без доступа к тому не принимает путь
+            if self.reject_local:
+                raise BadRequest("Wrong remote file identifier specified: wrong character in the string")
+            self.local.append(video)
+            return f"id_{os.path.basename(video)}"
+        if isinstance(video, str):
+            if video in self.stale_ids:
+                raise BadRequest("Wrong file identifier/http url specified")
+            return video
+        self.uploaded.append(os.path.basename(video.name))
+        return f"id_{os.path.basename(video.name)}"
+
+    async def send_media_group(self, chat_id, media, **kwargs):
+        if self.retry_after_once:
+            self.retry_after_once = False
+            raise RetryAfter(0)
+        self.groups.append(len(media))
+        return [SimpleNamespace(video=SimpleNamespace(file_id=self._file_id(item.media)), document=None)
+                for item in media]
+
+    async def send_video(self, chat_id, video, **kwargs):
+        self.single.append(video if isinstance(video, str) else 'upload')
+        return SimpleNamespace(video=SimpleNamespace(file_id=self._file_id(video)), document=None)
+
+
+def make_videos(tmp: str, count: int):
+    paths = []
+    for i in range(count):
+        path = os.path.join(tmp, f"v{i}.mp4")
+        with open(path, 'wb') as f:
+            f.write(os.urandom(1024) + bytes([i]))
+        paths.append((path, f"Видео {i + 1}"))
+    return paths
+
+
+def test_media_groups_and_cache_reuse():
+    with tempfile.TemporaryDirectory() as tmp:
+        videos = make_videos(tmp, MEDIA_GROUP_LIMIT + 2)
+        cache_path = os.path.join(tmp, 'file_ids.json')
+        bot = FakeBot(retry_after_once=True)
+        delivery = VideoDelivery(FileIdCache(cache_path), max_concurrent=2)
+
+        file_ids = asyncio.run(delivery.send_videos(bot, 1, videos))
+        assert sorted(bot.groups) == [2, MEDIA_GROUP_LIMIT], "альбомы по 10, RetryAfter - повтор"
+        assert file_ids == [f"id_v{i}.mp4" for i in range(len(videos))]
+        assert len(bot.uploaded) == len(videos)
+
+        # Повторная отправка (другой процесс - кэш из файла): ничего не загружается
+        bot = FakeBot()
+        delivery = VideoDelivery(FileIdCache(cache_path))
+        assert asyncio.run(delivery.send_videos(bot, 2, videos)) == file_ids
+        assert bot.uploaded == []
+        assert asyncio.run(delivery.send_video(bot, 3, videos[0][0], 'в чатбот')) == file_ids[0]
+        assert bot.single == [file_ids[0]] and bot.uploaded == []
+    print("✅ Альбомы и повторное использование file_id")
+
+
+def test_single_video_and_stale_file_id():
+    with tempfile.TemporaryDirectory() as tmp:
+        (path, caption), = make_videos(tmp, 1)
+        cache = FileIdCache(None)
+        cache.put(cache.digest(path), 'old_id')
+        bot = FakeBot(stale_ids={'old_id'})
+        file_ids = asyncio.run(VideoDelivery(cache).send_videos(bot, 1, [(path, caption)]))
+        assert file_ids == ['id_v0.mp4'] and bot.uploaded == ['v0.mp4']
+        assert cache.get(cache.digest(path)) == 'id_v0.mp4'
+
+        # Файла уже нет, но file_id сохранен в данных задачи
+        os.remove(path)
+        assert asyncio.run(VideoDelivery(cache).send_video(bot, 1, path, caption, file_id='id_v0.mp4')) == 'id_v0.mp4'
+        assert asyncio.run(VideoDelivery(cache).send_videos(bot, 1, [(path, caption)])) == [None]
+    print("✅ Устаревший file_id - загрузка заново")
+
+
+def test_file_windows():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'big.mp4')
+        data = os.urandom(10_000)
+        with open(path, 'wb') as f:
+            f.write(data)
+
+        windows = file_windows(len(data), 4096)
+        assert windows == [(0, 4096), (4096, 4096), (8192, 1808)]
+        parts = []
+        for offset, length in windows:
+            with FileWindow(path, offset, length) as window:
+                parts.append(window.read())
+        assert b''.join(parts) == data
+
+        with FileWindow(path, 4096, 4096, name='part2') as window:
+            assert window.read(10) == data[4096:4106] and window.tell() == 10
+            window.seek(0)
+            assert window.read() == data[4096:8192]
+            assert window.read() == b''
+            assert window.name == 'part2'
+        assert set(os.listdir(tmp)) == {'big.mp4'}, "части не пишутся на диск"
+    print("✅ Окна файла без временных частей")
+
+
+def test_local_files():
+    assert not LocalFiles.detect(None).enabled, "публичный API - только загрузка"
+    assert LocalFiles.detect('http://localhost:8081', 'auto', '').enabled
+    assert not LocalFiles.detect('http://telegram-bot-api:8081', 'auto', '').enabled
+    assert not LocalFiles.detect('http://localhost:8081', 'false', '').enabled
+
+    with tempfile.TemporaryDirectory() as tmp:
+        videos = make_videos(tmp, 3)
+        shared = LocalFiles.detect('http://telegram-bot-api:8081', 'auto', f"{tmp}=/srv/shared")
+        assert shared.uri(videos[0][0]) == 'file:///srv/shared/v0.mp4'
+        assert shared.uri(__file__) is None, "файл не на общем томе"
+
+        bot = FakeBot()
+        delivery = VideoDelivery(FileIdCache(None), local=LocalFiles(True))
+        file_ids = asyncio.run(delivery.send_videos(bot, 1, videos))
+        assert file_ids == [f"id_v{i}.mp4" for i in range(3)]
+        assert bot.uploaded == [] and bot.local == [LocalFiles(True).uri(path) for path, _ in videos]
+
+        # Сервер путь не принял: альбом по одному, локальный режим отключен, загрузка по HTTP
+        bot = FakeBot(reject_local=True)
+        local = LocalFiles(True)
+        file_ids = asyncio.run(VideoDelivery(FileIdCache(None), local=local).send_videos(bot, 1, videos))
+        assert file_ids == [f"id_v{i}.mp4" for i in range(3)]
+        assert not local.enabled and bot.uploaded == ['v0.mp4', 'v1.mp4', 'v2.mp4']
+    print("✅ Отправка путем file:// и откат на HTTP")
+
+
+if __name__ == "__main__":
+    print("🧪 ТЕСТ ДОСТАВКИ ВИДЕО В TELEGRAM")
+    print("=" * 60)
+    test_media_groups_and_cache_reuse()
+    test_single_video_and_stale_file_id()
+    test_file_windows()
+    test_local_files()
+    print("🎉 Все тесты завершены")
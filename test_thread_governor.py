@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Тест бюджета потоков: квота cgroup, аренда потоков/ядер, привязка к ядрам
+"""
+
+import os
+import tempfile
+import threading
+from unittest import mock
+
+import pytest
+
+import thread_governor
+from thread_governor import ThreadGovernor, cgroup_cpu_quota, available_cpus
+
+
+def patch_cgroup(tmp, v2=None, v1=None):
+    """Подменяет пути cgroup файлами во временной папке"""
+    paths = {name: os.path.join(tmp, name) for name in ('cpu.max', 'quota', 'period')}
+    if v2 is not None:
+        with open(paths['cpu.max'], 'w') as f:
+            f.write(v2 + '\n')
+    if v1 is not None:
+        for name, value in zip(('quota', 'period'), v1):
+            with open(paths[name], 'w') as f:
+                f.write(f"{value}\n")
+    return mock.patch.multiple(thread_governor, CGROUP_V2_CPU_MAX=paths['cpu.max'],
+                               CGROUP_V1_QUOTA=paths['quota'], CGROUP_V1_PERIOD=paths['period'])
+
+
+def test_cgroup_quota():
+    with tempfile.TemporaryDirectory() as tmp, patch_cgroup(tmp, v2='250000 100000'):
+        assert cgroup_cpu_quota() == 2.5
+        with mock.patch.object(thread_governor, 'allowed_cpu_ids', return_value=list(range(16))):
+            assert available_cpus() == 3
+    with tempfile.TemporaryDirectory() as tmp, patch_cgroup(tmp, v2='max 100000'):
+        assert cgroup_cpu_quota() is None
+    with tempfile.TemporaryDirectory() as tmp, patch_cgroup(tmp, v1=(200000, 100000)):
+        assert cgroup_cpu_quota() == 2.0
+    with tempfile.TemporaryDirectory() as tmp, patch_cgroup(tmp, v1=(-1, 100000)):
+        assert cgroup_cpu_quota() is None
+        # Без квоты - столько, сколько разрешает affinity
+        with mock.patch.object(thread_governor, 'allowed_cpu_ids', return_value=[0, 1]):
+            assert available_cpus() == 2
+    print("✅ Квота cgroup")
+
+
+def test_lease_budget():
+    with mock.patch.object(thread_governor, 'allowed_cpu_ids', return_value=list(range(8))):
+        governor = ThreadGovernor(cpus=8, max_jobs=4, pin=False)
+    with governor.lease() as first:
+        assert first.threads == 8 and first.cpu_ids == list(range(8))
+        with governor.lease() as second:
+            # Второй рендер получает половину ядер, наименее загруженные
+            assert second.threads == 4 and governor.active_jobs == 2
+            assert second.ffmpeg_args() == ['-threads', '4', '-filter_threads', '4', '-filter_complex_threads', '4']
+            assert thread_governor.ffmpeg_thread_args() == second.ffmpeg_args()
+            with governor.lease(reuse=True) as nested:
+                # Сжатие внутри рендера - та же аренда, без лишней работы
+                assert nested is second and governor.active_jobs == 2
+        assert thread_governor.current_budget() is first
+    assert thread_governor.ffmpeg_thread_args() == []
+    with governor.lease(jobs=4) as fanout:
+        assert fanout.threads == 2 and len(fanout.cpu_ids) == 8
+    assert governor.active_jobs == 0 and set(governor.stats()['core_load'].values()) == {0}
+
+    with governor.lease() as a, governor.lease() as b, governor.lease() as c:
+        # При 3 рендерах по 2 потока ядра не пересекаются у b и c
+        assert not set(b.cpu_ids) & set(c.cpu_ids), (a, b, c)
+    print("✅ Аренда потоков")
+
+
+@pytest.mark.skipif(not hasattr(os, 'sched_setaffinity'), reason="sched_setaffinity недоступен")
+def test_pinning():
+    governor = ThreadGovernor(pin=True)
+    before = os.sched_getaffinity(0)
+    seen = {}
+
+    def worker():
+        with governor.lease() as budget:
+            seen['inside'] = os.sched_getaffinity(0)
+            seen['budget'] = set(budget.cpu_ids)
+        seen['after'] = os.sched_getaffinity(0)
+
+    thread = threading.Thread(target=worker)
+    thread.start()
+    thread.join()
+    assert seen['inside'] == seen['budget']
+    assert seen['after'] == before and os.sched_getaffinity(0) == before
+    print(f"✅ Привязка к ядрам: {sorted(seen['budget'])}")
+
+
+if __name__ == "__main__":
+    print("🧪 ТЕСТ БЮДЖЕТА ПОТОКОВ")
+    print("=" * 60)
+    test_cgroup_quota()
+    test_lease_budget()
+    test_pinning()
+    print("🎉 Все тесты завершены")
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Тест трассировки задач: вложенность spans, передача контекста в потоки,
+экспорт JSONL / Chrome trace / run_summary.json, режим без активной задачи
+"""
+
+import json
+import asyncio
+import tempfile
+import contextvars
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+import tracing
+from tracing import Tracer, span, job, chrome_trace, slowest_by_class
+
+
+def test_span_without_tracer_is_noop():
+    with span('download', bytes=10) as stage:
+        stage.set(extra=1)
+    assert tracing.current_tracer() is None
+    print("✅ Без задачи span ничего не пишет")
+
+
+def test_nested_spans_and_threads():
+    with tempfile.TemporaryDirectory() as tmp:
+        run_dir = Path(tmp) / 'batch_1'
+        tracer = Tracer('batch', trace_dir=tmp)
+        with tracer.activate():
+            tracing.set_run_dir(run_dir)
+            with span('download', bytes=1024):
+                pass
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                def variant(index):
+                    with span('variant', index=index):
+                        with span('effect:social'):
+                            pass
+                futures = [executor.submit(contextvars.copy_context().run, variant, i) for i in range(2)]
+                for future in futures:
+                    future.result()
+            try:
+                with span('upload:yandex'):
+                    raise RuntimeError('network down')
+            except RuntimeError:
+                pass
+
+        records = tracer.records()
+        by_id = {r['span_id']: r for r in records}
+        root = next(r for r in records if r['name'] == 'job')
+        assert root['parent_id'] is None
+        variants = [r for r in records if r['name'] == 'variant']
+        assert len(variants) == 2 and all(v['parent_id'] == root['span_id'] for v in variants)
+        effects = [r for r in records if r['name'] == 'effect:social']
+        assert {by_id[e['parent_id']]['name'] for e in effects} == {'variant'}
+        upload = next(r for r in records if r['name'] == 'upload:yandex')
+        assert upload['status'] == 'error' and 'network down' in upload['attrs']['error']
+
+        summary = tracer.summary
+        assert summary['stages']['download']['bytes'] == 1024
+        assert summary['stages']['variant']['count'] == 2
+        assert summary['stages']['upload:yandex']['errors'] == 1
+
+        lines = (run_dir / 'trace.jsonl').read_text(encoding='utf-8').splitlines()
+        assert len(lines) == len(records)
+        chrome = json.loads((run_dir / 'trace.chrome.json').read_text(encoding='utf-8'))
+        assert {e['ph'] for e in chrome['traceEvents']} == {'X'}
+        run_summary = json.loads((run_dir / 'run_summary.json').read_text(encoding='utf-8'))
+        assert run_summary['trace']['job_class'] == 'batch'
+        assert (Path(tmp) / 'trace.jsonl').exists()
+    print("✅ Вложенность, потоки, экспорт")
+
+
+def test_job_decorator_and_report():
+    with tempfile.TemporaryDirectory() as tmp:
+        @job('single')
+        async def process(seconds):
+            tracing.current_tracer().trace_dir = tmp
+            with span('encode'):
+                await asyncio.sleep(seconds)
+            with span('probe'):
+                pass
+
+        asyncio.run(process(0.05))
+        asyncio.run(process(0.01))
+        assert tracing.current_tracer() is None
+
+        report = slowest_by_class(str(Path(tmp) / 'trace.jsonl'))
+        assert report['single']['jobs'] == 2
+        assert report['single']['slowest_stage'] == 'encode'
+        assert report['single']['stages']['encode']['count'] == 2
+    print("✅ Декоратор job и отчет по классам задач")
+
+
+def test_run_summary_is_merged():
+    with tempfile.TemporaryDirectory() as tmp:
+        summary_file = Path(tmp) / 'run_summary.json'
+        summary_file.write_text(json.dumps({'successful': 3}), encoding='utf-8')
+        with Tracer('fanout', run_dir=tmp, trace_dir=None).activate():
+            with span('render:fanout'):
+                pass
+        run_summary = json.loads(summary_file.read_text(encoding='utf-8'))
+        assert run_summary['successful'] == 3
+        assert run_summary['trace']['slowest_stage'] == 'render:fanout'
+        assert chrome_trace([]) == {'traceEvents': []}
+    print("✅ Слияние с run_summary.json")
+
+
+if __name__ == "__main__":
+    print("🧪 ТЕСТ ТРАССИРОВКИ")
+    print("=" * 60)
+    test_span_without_tracer_is_noop()
+    test_nested_spans_and_threads()
+    test_job_decorator_and_report()
+    test_run_summary_is_merged()
+    print("🎉 Все тесты завершены")
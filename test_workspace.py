@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Тест рабочих папок задач: бюджет RAM и перенос на диск, очистка при успехе и
+ошибке, восстановление после падения процесса, uniquize_video без файлов в CWD,
+повтор прохода на диске при ENOSPC в tmpfs
+"""
+
+import os
+import errno
+import asyncio
+import tempfile
+import subprocess
+import sys
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+import workspace
+from workspace import Workspace, RamBudget, recover_stale
+from clip_fixtures import make_clip, requires_ffmpeg
+
+
+def test_ram_budget_and_spill():
+    with tempfile.TemporaryDirectory() as ram, tempfile.TemporaryDirectory() as disk:
+        budget = RamBudget(1000, ram_dir=ram)
+        ws = Workspace('spill', ram_budget=budget, disk_root=disk)
+        small = ws.path('a.mp4', size_hint=600)
+        large = ws.path('b.mp4', size_hint=600)   # не помещается в остаток бюджета
+        unknown = ws.path('c.mp4')                # размер неизвестен - на диск
+        assert ws.in_ram(small) and str(small).startswith(ram)
+        assert not ws.in_ram(large) and str(large).startswith(disk)
+        assert str(unknown).startswith(disk)
+        assert len({small.name, large.name, unknown.name}) == 3
+        assert budget.reserved == 600
+
+        small.write_bytes(b'x' * 600)
+        ws.remove(small)
+        assert not small.exists() and budget.reserved == 0
+        assert ws.in_ram(ws.path('d.mp4', size_hint=900))
+        ws.cleanup()
+        assert budget.reserved == 0
+        assert not ws.disk_dir.exists() and not ws.ram_dir.exists()
+    print("✅ Бюджет RAM и перенос на диск")
+
+
+def test_cleanup_on_success_and_failure():
+    with tempfile.TemporaryDirectory() as disk:
+        @workspace.job('ok')
+        def ok_job():
+            path = workspace.current().path('out.bin')
+            path.write_bytes(b'data')
+            return path
+
+        @workspace.job('fail')
+        async def failing_job():
+            workspace.current().path('out.bin').write_bytes(b'data')
+            raise RuntimeError('render failed')
+
+        original_root = workspace.SCRATCH_DISK_DIR
+        workspace.SCRATCH_DISK_DIR = disk
+        try:
+            path = ok_job()
+            assert not path.exists()
+            try:
+                asyncio.run(failing_job())
+                assert False, "ошибка должна пробрасываться"
+            except RuntimeError:
+                pass
+            assert os.listdir(disk) == []
+            assert workspace.current() is None
+        finally:
+            workspace.SCRATCH_DISK_DIR = original_root
+    print("✅ Очистка при успехе и ошибке")
+
+
+def test_threads_share_job_workspace():
+    with tempfile.TemporaryDirectory() as disk:
+        with Workspace('threads', ram_budget=None, disk_root=disk).activate() as ws:
+            with ThreadPoolExecutor(max_workers=4) as executor:
+                futures = [executor.submit(contextvars.copy_context().run, lambda: workspace.current().path('pass.mp4'))
+                           for _ in range(8)]
+                paths = [future.result() for future in futures]
+            assert len(set(paths)) == 8 and all(p.parent == ws.disk_dir for p in paths)
+            with workspace.scratch('nested') as nested:
+                assert nested is ws
+    print("✅ Потоки пишут в папку своей задачи")
+
+
+def test_recover_stale():
+    with tempfile.TemporaryDirectory() as ram, tempfile.TemporaryDirectory() as disk:
+        # Задача в другом процессе, убитом без очистки
+        code = (f"import sys, os; sys.path.insert(0, {os.getcwd()!r}); from workspace import Workspace, RamBudget;"
+                f"ws = Workspace('crashed', ram_budget=RamBudget(10**6, ram_dir={ram!r}), disk_root={disk!r});"
+                f"ws.path('a', size_hint=10).write_bytes(b'x'); ws.path('b').write_bytes(b'y'); os._exit(1)")
+        subprocess.run([sys.executable, '-c', code], check=False)
+        assert len(os.listdir(ram)) == 1 and len(os.listdir(disk)) == 1
+
+        live = Workspace('live', ram_budget=RamBudget(10**6, ram_dir=ram), disk_root=disk)
+        live.path('c', size_hint=10).write_bytes(b'z')
+        assert recover_stale(ram_root=ram, disk_root=disk) == 2
+        assert sorted(os.listdir(ram)) == sorted(os.listdir(disk)) == [live.name]
+        live.cleanup()
+    print("✅ Восстановление после падения")
+
+
+def test_enospc_in_ram_retries_on_disk():
+    """size_hint занижен: tmpfs переполнился посреди прохода - проход повторяется на диске"""
+    from video_uniquizer import VideoUniquizer
+
+    assert workspace.is_out_of_space(OSError(errno.ENOSPC, 'No space left on device'))
+    assert workspace.is_out_of_space(RuntimeError('ffmpeg temporal failed: ... No space left on device'))
+    assert not workspace.is_out_of_space(RuntimeError('ffmpeg temporal failed: Invalid data'))
+
+    with tempfile.TemporaryDirectory() as tmp, tempfile.TemporaryDirectory() as ram, \
+            tempfile.TemporaryDirectory() as disk:
+        source = os.path.join(tmp, 'source.mp4')
+        with open(source, 'wb') as f:
+            f.write(b'x' * 100)
+        budget = RamBudget(10**6, ram_dir=ram)
+        outputs = []
+
+        def temporal_pass(self, video_path, output_path):
+            outputs.append(output_path)
+            with open(output_path, 'wb') as f:
+                f.write(b'partial')
+                if output_path.startswith(ram):
+                    raise OSError(errno.ENOSPC, 'No space left on device')
+            return output_path
+
+        with mock.patch.object(VideoUniquizer, 'apply_temporal_effects', temporal_pass), \
+                Workspace('enospc', ram_budget=budget, disk_root=disk).activate() as ws:
+            output = os.path.join(tmp, 'out.mp4')
+            assert VideoUniquizer().uniquize_video(source, output, effects=['temporal']) == output
+            assert [os.path.dirname(path) for path in outputs] == [str(ws.ram_dir), str(ws.disk_dir)]
+            assert os.listdir(ws.ram_dir) == [] and budget.reserved == 0
+        assert open(output, 'rb').read() == b'partial'
+    print("✅ ENOSPC в tmpfs: проход повторен на диске")
+
+
+@requires_ffmpeg
+def test_uniquize_leaves_no_files_in_cwd():
+    from video_uniquizer import VideoUniquizer
+
+    with tempfile.TemporaryDirectory() as tmp, tempfile.TemporaryDirectory() as scratch_root:
+        source = os.path.join(tmp, 'source.mkv')
+        make_clip(source, 1, source='testsrc2=size=160x120:rate=25', x264_args=())
+        cwd = os.getcwd()
+        os.chdir(tmp)
+        try:
+            before = set(os.listdir(tmp))
+            output = os.path.join(tmp, 'out.mp4')
+            with Workspace('uniq', disk_root=scratch_root).activate() as ws:
+                VideoUniquizer().uniquize_video(source, output, effects=['temporal'])
+                assert os.listdir(ws.disk_dir) == ['.lock']
+                if ws.ram_dir.exists():
+                    assert os.listdir(ws.ram_dir) == []
+            assert set(os.listdir(tmp)) - before == {'out.mp4'}
+            assert os.path.getsize(output) > 0
+        finally:
+            os.chdir(cwd)
+    print("✅ uniquize_video: промежуточные файлы только в рабочей папке")
+
+
+if __name__ == "__main__":
+    print("🧪 ТЕСТ РАБОЧИХ ПАПОК ЗАДАЧ")
+    print("=" * 60)
+    test_ram_budget_and_spill()
+    test_cleanup_on_success_and_failure()
+    test_threads_share_job_workspace()
+    test_recover_stale()
+    test_enospc_in_ram_retries_on_disk()
+    test_uniquize_leaves_no_files_in_cwd()
+    print("🎉 Все тесты завершены")
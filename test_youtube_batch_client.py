@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Test batchującego klienta YouTube na lokalnym serwerze-atrapie (bez sieci i bez API key)
+"""
+
+import os
+import json
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+from datetime import datetime, timezone
+
+from youtube_batch_client import YouTubeBatchClient, YouTubeQuotaExceeded, _quota_day
+from incremental_poller import IncrementalPoller, PollCursorStore
+
+# Kanał testowy: 3 wideo w playliście uploads
+CHANNELS = {
+    'UCaaaaaaaaaaaaaaaaaaaaaa': {'handle': '@raachel_fb', 'uploads': 'UUaaaaaaaaaaaaaaaaaaaaaa', 'videos': ['v3', 'v2', 'v1']},
+    'UCbbbbbbbbbbbbbbbbbbbbbb': {'handle': '@daniryb_fb', 'uploads': 'UUbbbbbbbbbbbbbbbbbbbbbb', 'videos': ['w2', 'w1']},
+}
+
+
+class StubYouTubeHandler(BaseHTTPRequestHandler):
+    """Minimalna atrapa endpointów YouTube Data API v3"""
+
+    requests_log = []
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        endpoint = url.path.rsplit('/', 1)[-1]
+        self.requests_log.append((endpoint, params))
+
+        if endpoint == 'videos':
+            ids = params['id'].split(',')
+            assert len(ids) <= 50, "videos.list przyjmuje max 50 id"
+            body = {'items': [{
+                'id': video_id,
+                'snippet': {'title': f'Video {video_id}', 'publishedAt': '2030-01-01T00:00:00Z', 'channelTitle': 'Test'},
+                'statistics': {'viewCount': '100', 'likeCount': '5', 'commentCount': '1'}
+            } for video_id in ids]}
+        elif endpoint == 'channels':
+            if 'forHandle' in params:
+                ids = [cid for cid, ch in CHANNELS.items() if ch['handle'] == params['forHandle']]
+            else:
+                ids = [cid for cid in params['id'].split(',') if cid in CHANNELS]
+            body = {'items': [{
+                'id': cid,
+                'snippet': {'title': cid},
+                'statistics': {'subscriberCount': '10', 'viewCount': '1000', 'videoCount': '3'},
+                'contentDetails': {'relatedPlaylists': {'uploads': CHANNELS[cid]['uploads']}}
+            } for cid in ids]}
+        elif endpoint == 'playlistItems':
+            channel = next(ch for ch in CHANNELS.values() if ch['uploads'] == params['playlistId'])
+            body = {'items': [{'contentDetails': {'videoId': video_id}} for video_id in channel['videos']]}
+        else:
+            body = {'items': []}
+
+        payload = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+def start_stub_server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubYouTubeHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/youtube/v3"
+
+
+def make_client(tmp, base_url, **kwargs):
+    return YouTubeBatchClient('test-key', base_url=base_url,
+                              cache_path=os.path.join(tmp, 'channels.json'), **kwargs)
+
+
+def test_videos_are_batched_by_50():
+    """120 id -> 3 wywołania videos.list i 3 jednostki quota"""
+    server, base_url = start_stub_server()
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            client = make_client(tmp, base_url)
+            videos = client.videos([f'id{i}' for i in range(120)])
+            metrics = client.metrics()
+
+            assert len(videos) == 120
+            assert metrics['calls_by_call'] == {'videos.list': 3}
+            assert metrics['units_used'] == 3
+            print(f"✅ 120 wideo -> {metrics['calls_by_call']['videos.list']} wywołania")
+    finally:
+        server.shutdown()
+
+
+def test_uploads_playlist_cache():
+    """Kanały hurtem, playlisty uploads z cache przy kolejnym kliencie"""
+    server, base_url = start_stub_server()
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            client = make_client(tmp, base_url)
+            playlists = client.uploads_playlists(list(CHANNELS))
+            assert playlists == {cid: ch['uploads'] for cid, ch in CHANNELS.items()}
+            assert client.metrics()['calls_by_call'] == {'channels.list': 1}
+
+            # Nowy klient czyta cache z pliku - zero wywołań
+            client = make_client(tmp, base_url)
+            assert client.uploads_playlists(list(CHANNELS)) == playlists
+            assert client.metrics()['units_used'] == 0
+            print("✅ Cache channel_id -> uploads")
+    finally:
+        server.shutdown()
+
+
+def test_quota_limit():
+    """Przekroczenie dziennego limitu -> wyjątek przed wysłaniem zapytania"""
+    server, base_url = start_stub_server()
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            client = make_client(tmp, base_url, daily_quota=0)
+            try:
+                client.playlist_items('UU_raachel')
+                assert False, "playlistItems.list kosztuje 1 jednostkę"
+            except YouTubeQuotaExceeded:
+                pass
+            assert client.metrics()['units_used'] == 0
+            print("✅ Limit quota respektowany")
+    finally:
+        server.shutdown()
+
+
+def test_quota_day_follows_pacific_dst():
+    """Północ czasu pacyficznego: UTC-7 latem, UTC-8 zimą"""
+    assert _quota_day(datetime(2026, 7, 1, 7, 30, tzinfo=timezone.utc)) == '2026-07-01'
+    assert _quota_day(datetime(2026, 7, 1, 6, 30, tzinfo=timezone.utc)) == '2026-06-30'
+    assert _quota_day(datetime(2026, 1, 15, 7, 30, tzinfo=timezone.utc)) == '2026-01-14'
+    assert _quota_day(datetime(2026, 1, 15, 8, 30, tzinfo=timezone.utc)) == '2026-01-15'
+    print("✅ Dzień quota z czasem letnim")
+
+
+def test_poller_shares_videos_calls_between_channels():
+    """Dwa kanały -> jedno wspólne videos.list"""
+    server, base_url = start_stub_server()
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            poller = IncrementalPoller(youtube_api_key='test-key',
+                                       store=PollCursorStore(os.path.join(tmp, 'cursors.json')))
+            poller.youtube = make_client(tmp, base_url)
+            results = poller.poll_youtube_batch(['raachel_fb', 'daniryb_fb'])
+
+            assert results['raachel_fb']['new_videos'] == 3
+            assert results['daniryb_fb']['new_videos'] == 2
+            assert poller.youtube.metrics()['calls_by_call']['videos.list'] == 1
+
+            # Drugie sprawdzenie: kanały z kursora, brak nowych wideo
+            results = poller.poll_youtube_batch(['raachel_fb', 'daniryb_fb'])
+            assert results['raachel_fb']['new_videos'] == 0
+            print(f"✅ Quota: {poller.youtube.metrics()['units_by_call']}")
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    print("🧪 TEST KLIENTA YOUTUBE (serwer-atrapa)")
+    print("=" * 60)
+    test_videos_are_batched_by_50()
+    test_uploads_playlist_cache()
+    test_quota_limit()
+    test_quota_day_follows_pacific_dst()
+    test_poller_shares_videos_calls_between_channels()
+    print("🎉 Wszystkie testy zakończone")
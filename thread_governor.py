@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+Единый бюджет потоков CPU для ffmpeg, OpenCV, NumPy/BLAS и torch.
+
+Число ядер берется из квоты cgroup контейнера (cpu.max / cfs_quota_us) и маски
+affinity, а не из os.cpu_count() хоста. Каждый рендер получает у ThreadGovernor
+аренду (lease): число потоков для ffmpeg -threads/-filter_threads и, при
+PIN_RENDER_THREADS=true, собственные ядра - поток рендера и все запущенные им
+процессы ffmpeg привязываются к ним через os.sched_setaffinity. Аренда хранится в
+contextvar: команды ffmpeg внутри рендера берут ее через ffmpeg_thread_args().
+
+Пулы OpenCV/torch/BLAS общие на процесс, поэтому им задается доля одного рендера
+при максимальной параллельности (configure_libraries / init_thread_env).
+"""
+
+import os
+import sys
+import math
+import logging
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+CGROUP_V2_CPU_MAX = '/sys/fs/cgroup/cpu.max'
+CGROUP_V1_QUOTA = '/sys/fs/cgroup/cpu/cpu.cfs_quota_us'
+CGROUP_V1_PERIOD = '/sys/fs/cgroup/cpu/cpu.cfs_period_us'
+
+# Переменные окружения пулов потоков BLAS/OpenMP (читаются при импорте numpy/torch)
+THREAD_ENV_VARS = ['OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS',
+                   'VECLIB_MAXIMUM_THREADS', 'NUMEXPR_NUM_THREADS']
+
+DEFAULT_MAX_JOBS = 4
+
+
+def _read(path: str) -> Optional[str]:
+    try:
+        with open(path, 'r') as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def cgroup_cpu_quota() -> Optional[float]:
+    """Квота CPU контейнера в ядрах (None - без ограничения)"""
+    cpu_max = _read(CGROUP_V2_CPU_MAX)
+    if cpu_max:
+        quota, _, period = cpu_max.partition(' ')
+        if quota != 'max' and period:
+            return int(quota) / int(period)
+        return None
+    quota, period = _read(CGROUP_V1_QUOTA), _read(CGROUP_V1_PERIOD)
+    if quota and period and int(quota) > 0:
+        return int(quota) / int(period)
+    return None
+
+
+def allowed_cpu_ids() -> List[int]:
+    if hasattr(os, 'sched_getaffinity'):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def available_cpus() -> int:
+    """Ядра, реально доступные процессу: affinity, ограниченная квотой cgroup"""
+    cpus = len(allowed_cpu_ids())
+    quota = cgroup_cpu_quota()
+    if quota:
+        cpus = min(cpus, math.ceil(quota))
+    return max(1, cpus)
+
+
+def max_parallel_jobs(cpus: Optional[int] = None) -> int:
+    """Сколько рендеров идет одновременно (MAX_PARALLEL_RENDERS или min(4, ядра))"""
+    env = os.getenv('MAX_PARALLEL_RENDERS')
+    if env:
+        return max(1, int(env))
+    return max(1, min(DEFAULT_MAX_JOBS, cpus or available_cpus()))
+
+
+def init_thread_env():
+    """
+    Размер пулов BLAS/OpenMP - доля одного рендера. Вызывать до импорта numpy/cv2/torch;
+    значения, заданные явно в окружении, не трогаются.
+    """
+    cpus = available_cpus()
+    per_job = str(max(1, cpus // max_parallel_jobs(cpus)))
+    for name in THREAD_ENV_VARS:
+        os.environ.setdefault(name, per_job)
+
+
+class ThreadBudget:
+    """Аренда потоков для одного рендера"""
+
+    def __init__(self, threads: int, cpu_ids: List[int], jobs: int = 1):
+        self.threads = threads
+        self.cpu_ids = cpu_ids
+        self.jobs = jobs
+
+    @property
+    def filter_threads(self) -> int:
+        return self.threads
+
+    def ffmpeg_args(self) -> List[str]:
+        """-threads (декодер, если перед -i) и потоки графов -vf/-filter_complex"""
+        return ['-threads', str(self.threads), '-filter_threads', str(self.filter_threads),
+                '-filter_complex_threads', str(self.filter_threads)]
+
+    def __repr__(self):
+        return f"ThreadBudget(threads={self.threads}, cpus={self.cpu_ids}, jobs={self.jobs})"
+
+
+_current_budget: ContextVar[Optional[ThreadBudget]] = ContextVar('thread_budget', default=None)
+
+
+def current_budget() -> Optional[ThreadBudget]:
+    """Аренда рендера, в котором идет текущий код (None - вне ThreadGovernor.lease)"""
+    return _current_budget.get()
+
+
+def ffmpeg_thread_args() -> List[str]:
+    """Потоки ffmpeg из текущей аренды; вне аренды - пусто (решает ffmpeg)"""
+    budget = _current_budget.get()
+    return budget.ffmpeg_args() if budget else []
+
+
+class ThreadGovernor:
+    """Раздает потоки и ядра рендерам с учетом квоты контейнера"""
+
+    def __init__(self, cpus: Optional[int] = None, max_jobs: Optional[int] = None,
+                 pin: Optional[bool] = None):
+        self.cpus = cpus or available_cpus()
+        # Для привязки берем столько разрешенных ядер, сколько позволяет квота
+        self.cpu_ids = allowed_cpu_ids()[:self.cpus]
+        self.max_jobs = max_jobs or max_parallel_jobs(self.cpus)
+        self.pin = pin if pin is not None else os.getenv('PIN_RENDER_THREADS', 'false').lower() == 'true'
+        self.active_jobs = 0
+        self._core_load: Dict[int, int] = {cpu: 0 for cpu in self.cpu_ids}
+        self._lock = threading.Lock()
+
+    def threads_per_job(self, active_jobs: Optional[int] = None) -> int:
+        jobs = max(1, self.active_jobs if active_jobs is None else active_jobs)
+        return max(1, self.cpus // jobs)
+
+    @contextmanager
+    def lease(self, jobs: int = 1, reuse: bool = False):
+        """
+        Аренда на время рендера. jobs > 1 - несколько одновременных кодеров
+        (fan-out): потоки в бюджете - на один кодер, ядра - на все.
+        reuse=True - внутри уже идущей аренды (сжатие в рендере) взять ее бюджет,
+        а не считать еще одну работу.
+        """
+        if reuse and _current_budget.get() is not None:
+            yield _current_budget.get()
+            return
+        with self._lock:
+            self.active_jobs += jobs
+            threads = self.threads_per_job()
+            # Наименее загруженные ядра; при переподписке ядра делятся
+            count = min(len(self.cpu_ids), threads * jobs)
+            cpu_ids = sorted(self.cpu_ids, key=lambda cpu: self._core_load[cpu])[:count]
+            for cpu in cpu_ids:
+                self._core_load[cpu] += 1
+        budget = ThreadBudget(threads, sorted(cpu_ids), jobs)
+
+        saved_affinity = None
+        if self.pin and hasattr(os, 'sched_setaffinity'):
+            try:
+                # pid 0 - текущий поток; дочерние ffmpeg наследуют привязку
+                saved_affinity = os.sched_getaffinity(0)
+                os.sched_setaffinity(0, budget.cpu_ids)
+            except OSError as e:
+                logger.warning(f"⚠️ Не удалось привязать поток к ядрам {budget.cpu_ids}: {e}")
+                saved_affinity = None
+        token = _current_budget.set(budget)
+        try:
+            yield budget
+        finally:
+            _current_budget.reset(token)
+            if saved_affinity is not None:
+                os.sched_setaffinity(0, saved_affinity)
+            with self._lock:
+                self.active_jobs -= jobs
+                for cpu in cpu_ids:
+                    self._core_load[cpu] -= 1
+
+    def configure_libraries(self):
+        """Пулы OpenCV и torch общие на процесс: доля одного рендера при max_jobs"""
+        per_job = max(1, self.cpus // self.max_jobs)
+        try:
+            import cv2
+            cv2.setNumThreads(per_job)
+        except ImportError:
+            pass
+        # torch загружается лениво (только для 'neural') и при импорте читает OMP_NUM_THREADS
+        # из init_thread_env; если он уже загружен - задаем явно
+        torch = sys.modules.get('torch')
+        if torch is not None:
+            torch.set_num_threads(per_job)
+            try:
+                torch.set_num_interop_threads(1)
+            except RuntimeError:
+                pass  # уже задано: можно только до первой параллельной операции
+        logger.info(f"🧵 CPU: {self.cpus} (квота cgroup: {cgroup_cpu_quota() or 'нет'}), "
+                    f"рендеров: {self.max_jobs}, потоков OpenCV/torch: {per_job}, привязка: {self.pin}")
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            return {'cpus': self.cpus, 'active_jobs': self.active_jobs, 'max_jobs': self.max_jobs,
+                    'core_load': dict(self._core_load), 'pin': self.pin}
@@ -0,0 +1,379 @@
+#!/usr/bin/env python3
+"""
+Трассировка задач по стадиям (span): скачивание, анализ, обрезка, сжатие,
+проходы эффектов, кодирование, выгрузки, перенос в approved.
+
+Tracer создается на задачу (job) и становится текущим через contextvars; span()
+в любом месте кода вкладывается в текущий span этой задачи. Без активного
+Tracer span() ничего не делает. В отдельные потоки контекст передается явно:
+executor.submit(contextvars.copy_context().run, fn, ...).
+
+Каждый span: длительность, CPU потока и дочерних процессов (ffmpeg), байты и
+другие атрибуты. По завершении задачи spans дописываются в общий JSONL
+(TRACE_DIR/trace.jsonl), а при заданной папке запуска туда же пишутся
+trace.jsonl, trace.chrome.json (chrome://tracing, Perfetto) и сводка в
+run_summary.json (ключ 'trace'). `python tracing.py traces/trace.jsonl` -
+самая медленная стадия по классам задач.
+"""
+
+import os
+import json
+import time
+import uuid
+import inspect
+import logging
+import resource
+import functools
+import threading
+import contextvars
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+TRACE_DIR = os.getenv('TRACE_DIR', 'traces')
+TRACING_ENABLED = os.getenv('TRACING_ENABLED', 'true').lower() == 'true'
+
+_current_tracer: contextvars.ContextVar = contextvars.ContextVar('tracer', default=None)
+_current_span: contextvars.ContextVar = contextvars.ContextVar('span', default=None)
+
+# Выполняющиеся задачи (для профилировщика: куда класть результаты)
+_active_tracers: set = set()
+_active_lock = threading.Lock()
+
+
+def _children_cpu() -> float:
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+class Span:
+    """Один интервал задачи; атрибуты добавляются через set()"""
+
+    def __init__(self, tracer: 'Tracer', name: str, parent_id: Optional[str], attrs: Dict[str, Any]):
+        self.tracer = tracer
+        self.name = name
+        self.span_id = uuid.uuid4().hex[:12]
+        self.parent_id = parent_id
+        self.attrs = attrs
+        self.thread = threading.get_ident()
+        self.start = time.time()
+        self._perf_start = time.perf_counter()
+        self._cpu_start = time.thread_time()
+        self._children_cpu_start = _children_cpu()
+        self.duration = 0.0
+        self.cpu_time = 0.0
+        self.child_cpu_time = 0.0
+        self.status = 'ok'
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def end(self, error: Optional[BaseException] = None):
+        self.duration = time.perf_counter() - self._perf_start
+        self.cpu_time = time.thread_time() - self._cpu_start
+        # RUSAGE_CHILDREN общий на процесс: при параллельных задачах это верхняя оценка
+        self.child_cpu_time = _children_cpu() - self._children_cpu_start
+        if error is not None:
+            self.status = 'error'
+            self.attrs['error'] = str(error)[:300]
+        self.tracer._record(self)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'job_id': self.tracer.job_id,
+            'job_class': self.tracer.job_class,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'name': self.name,
+            'start': round(self.start, 6),
+            'duration': round(self.duration, 6),
+            'cpu_time': round(self.cpu_time, 6),
+            'child_cpu_time': round(self.child_cpu_time, 6),
+            'thread': self.thread,
+            'status': self.status,
+            'attrs': self.attrs,
+        }
+
+
+class _NoopSpan:
+    def set(self, **attrs):
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+@contextmanager
+def span(name: str, **attrs):
+    """Span в текущей задаче; без активного Tracer - no-op"""
+    tracer = _current_tracer.get()
+    if tracer is None:
+        yield _NOOP_SPAN
+        return
+    current = Span(tracer, name, _current_span.get(), attrs)
+    token = _current_span.set(current.span_id)
+    try:
+        yield current
+    except BaseException as e:
+        current.end(e)
+        raise
+    else:
+        current.end()
+    finally:
+        _current_span.reset(token)
+
+
+def current_tracer() -> Optional['Tracer']:
+    return _current_tracer.get()
+
+
+def active_run_dirs() -> List[Path]:
+    """Папки запусков задач, выполняющихся сейчас"""
+    with _active_lock:
+        return sorted({tracer.run_dir for tracer in _active_tracers if tracer.run_dir})
+
+
+def set_run_dir(run_dir):
+    """Папка запуска текущей задачи: туда пишутся trace-файлы и run_summary.json"""
+    tracer = _current_tracer.get()
+    if tracer is not None:
+        tracer.run_dir = Path(run_dir)
+
+
+class Tracer:
+    """Spans одной задачи"""
+
+    def __init__(self, job_class: str, job_id: Optional[str] = None, run_dir=None,
+                 trace_dir: str = TRACE_DIR, summary_name: str = 'run_summary.json', **attrs):
+        self.job_class = job_class
+        self.job_id = job_id or f"{job_class}_{uuid.uuid4().hex[:8]}"
+        self.run_dir = Path(run_dir) if run_dir else None
+        self.summary_name = summary_name
+        self.trace_dir = trace_dir
+        self.attrs = attrs
+        self.spans: List[Span] = []
+        self.summary: Optional[Dict[str, Any]] = None
+        self._lock = threading.Lock()
+
+    def _record(self, finished: Span):
+        with self._lock:
+            self.spans.append(finished)
+
+    @contextmanager
+    def activate(self):
+        """Задача целиком - корневой span; по выходе трасса экспортируется"""
+        tracer_token = _current_tracer.set(self)
+        span_token = _current_span.set(None)
+        with _active_lock:
+            _active_tracers.add(self)
+        try:
+            with span('job', job_class=self.job_class, **self.attrs) as root:
+                yield root
+        finally:
+            with _active_lock:
+                _active_tracers.discard(self)
+            _current_span.reset(span_token)
+            _current_tracer.reset(tracer_token)
+            try:
+                self.export()
+            except Exception as e:
+                logger.error(f"❌ Не удалось записать трассу {self.job_id}: {e}")
+
+    # ------------------------------------------------------------ экспорт
+
+    def records(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [s.to_dict() for s in sorted(self.spans, key=lambda s: s.start)]
+
+    def export(self) -> Dict[str, Any]:
+        records = self.records()
+        self.summary = summarize(records)
+        if self.trace_dir:
+            os.makedirs(self.trace_dir, exist_ok=True)
+            _append_jsonl(os.path.join(self.trace_dir, 'trace.jsonl'), records)
+        if self.run_dir:
+            self.run_dir.mkdir(parents=True, exist_ok=True)
+            _append_jsonl(self.run_dir / 'trace.jsonl', records)
+            with open(self.run_dir / 'trace.chrome.json', 'w', encoding='utf-8') as f:
+                json.dump(chrome_trace(records), f, ensure_ascii=False)
+            update_run_summary(self.run_dir / self.summary_name, trace=self.summary)
+        return self.summary
+
+
+def update_run_summary(path, **keys):
+    """
+    Дописывает ключи в JSON метаданных запуска (файл создается, если его нет):
+    сводка трассы - ключ 'trace', выбор параметров кодера - 'encoding'
+    """
+    path = Path(path)
+    run_summary: Dict[str, Any] = {}
+    if path.exists():
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                run_summary = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"⚠️ {path.name} не прочитан, будет перезаписан: {e}")
+    run_summary.update(keys)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(run_summary, f, indent=2, ensure_ascii=False)
+
+
+def _append_jsonl(path, records: List[Dict[str, Any]]):
+    with open(path, 'a', encoding='utf-8') as f:
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+
+def chrome_trace(records: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Формат Trace Event (события 'X' с длительностью, время в мкс)"""
+    if not records:
+        return {'traceEvents': []}
+    origin = min(r['start'] for r in records)
+    events = []
+    for record in records:
+        events.append({
+            'name': record['name'],
+            'cat': record['job_class'],
+            'ph': 'X',
+            'ts': round((record['start'] - origin) * 1e6),
+            'dur': round(record['duration'] * 1e6),
+            'pid': record['job_id'],
+            'tid': record['thread'],
+            'args': dict(record['attrs'], cpu_time=record['cpu_time'], child_cpu_time=record['child_cpu_time'],
+                         status=record['status']),
+        })
+    return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+
+def summarize(records: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Сводка задачи по стадиям: количество, полное и собственное время (без вложенных
+    spans), CPU, байты; slowest_stage - стадия с наибольшим собственным временем
+    """
+    if not records:
+        return {'stages': {}, 'slowest_stage': None}
+    children_time: Dict[str, float] = {}
+    for record in records:
+        if record['parent_id']:
+            children_time[record['parent_id']] = children_time.get(record['parent_id'], 0.0) + record['duration']
+
+    stages: Dict[str, Dict[str, Any]] = {}
+    for record in records:
+        stage = stages.setdefault(record['name'], {'count': 0, 'total_time': 0.0, 'self_time': 0.0,
+                                                   'cpu_time': 0.0, 'child_cpu_time': 0.0, 'bytes': 0,
+                                                   'errors': 0})
+        stage['count'] += 1
+        stage['total_time'] += record['duration']
+        # Параллельные дочерние spans могут суммарно длиться дольше родителя
+        stage['self_time'] += max(0.0, record['duration'] - children_time.get(record['span_id'], 0.0))
+        stage['cpu_time'] += record['cpu_time']
+        stage['child_cpu_time'] += record['child_cpu_time']
+        stage['bytes'] += int(record['attrs'].get('bytes') or 0)
+        stage['errors'] += record['status'] == 'error'
+    for stage in stages.values():
+        for key in ('total_time', 'self_time', 'cpu_time', 'child_cpu_time'):
+            stage[key] = round(stage[key], 3)
+
+    root = next((r for r in records if r['name'] == 'job'), None)
+    candidates = {name: stage for name, stage in stages.items() if name != 'job'}
+    return {
+        'job_id': records[0]['job_id'],
+        'job_class': records[0]['job_class'],
+        'wall_time': round(root['duration'], 3) if root else None,
+        'spans': len(records),
+        'stages': stages,
+        'slowest_stage': max(candidates, key=lambda n: candidates[n]['self_time']) if candidates else None,
+    }
+
+
+def merge_summaries(summaries: Iterable[Optional[Dict[str, Any]]]) -> Dict[str, Any]:
+    """Сводка нескольких задач (например, версий одного запуска) по стадиям"""
+    stages: Dict[str, Dict[str, Any]] = {}
+    jobs = 0
+    for summary in summaries:
+        if not summary:
+            continue
+        jobs += 1
+        for name, stage in summary.get('stages', {}).items():
+            merged = stages.setdefault(name, {key: 0 for key in stage})
+            for key, value in stage.items():
+                merged[key] = round(merged.get(key, 0) + value, 3)
+    candidates = {name: stage for name, stage in stages.items() if name != 'job'}
+    return {
+        'jobs': jobs,
+        'stages': stages,
+        'slowest_stage': max(candidates, key=lambda n: candidates[n]['self_time']) if candidates else None,
+    }
+
+
+def traced(name: str):
+    """Декоратор: каждый вызов функции - span текущей задачи"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def job(job_class: str):
+    """Декоратор: каждый вызов - отдельная трассируемая задача (sync и async)"""
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                if not TRACING_ENABLED:
+                    return await func(*args, **kwargs)
+                with Tracer(job_class).activate():
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not TRACING_ENABLED:
+                return func(*args, **kwargs)
+            with Tracer(job_class).activate():
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def slowest_by_class(path: str) -> Dict[str, Dict[str, Any]]:
+    """Читает JSONL и сводит стадии по классам задач: средние времена, самая медленная стадия"""
+    by_job: Dict[str, List[Dict[str, Any]]] = {}
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                by_job.setdefault(record['job_id'], []).append(record)
+
+    by_class: Dict[str, List[Dict[str, Any]]] = {}
+    for records in by_job.values():
+        summary = summarize(records)
+        by_class.setdefault(summary['job_class'], []).append(summary)
+
+    report = {}
+    for job_class, summaries in by_class.items():
+        merged = merge_summaries(summaries)
+        for stage in merged['stages'].values():
+            stage['mean_self_time'] = round(stage['self_time'] / len(summaries), 3)
+        report[job_class] = merged
+    return report
+
+
+def main():
+    import sys
+    path = sys.argv[1] if len(sys.argv) > 1 else os.path.join(TRACE_DIR, 'trace.jsonl')
+    for job_class, report in slowest_by_class(path).items():
+        print(f"📊 {job_class}: {report['jobs']} задач, самая медленная стадия: {report['slowest_stage']}")
+        ordered = sorted(report['stages'].items(), key=lambda item: -item[1]['self_time'])
+        for name, stage in ordered:
+            print(f"   {name:<24} x{stage['count']:<4} self {stage['mean_self_time']:>8.3f}s/задача  "
+                  f"CPU {stage['cpu_time']:.1f}s + ffmpeg {stage['child_cpu_time']:.1f}s  {stage['bytes']} B")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,24 +1,87 @@
 import cv2
 import numpy as np
-import torch
-import torch.nn as nn
-import torch.nn.functional as F
-from moviepy.editor import VideoFileClip, CompositeVideoClip
 import random
 import os
 import time
+import shutil
+import importlib
+import importlib.util
+import threading
+from functools import lru_cache
 from typing import Tuple, List, Optional
 import json
 from tqdm import tqdm
 import logging
 
-# VidGear fallback
-try:
-    from vidgear.gears import WriteGear
-    VIDGEAR_AVAILABLE = True
-except ImportError:
-    VIDGEAR_AVAILABLE = False
-    print("⚠️ VidGear not available, using MoviePy only")
+from ffmpeg_utils import run_ffmpeg, probe_video, mux_audio, audio_codec_args, keyframe_times, retime_copy
+from smart_cut import smart_cut
+from encoder_profiles import RATE_ARGS
+import metrics
+import tracing
+from thread_governor import ffmpeg_thread_args
+import workspace
+
+
+class LazyBackend:
+    """
+    Тяжелый модуль (torch, MoviePy, VidGear), импортируемый при первом обращении
+    к атрибуту: бот и CLI стартуют без них, а torch нужен только эффекту 'neural'
+    """
+    
+    def __init__(self, module_name: str):
+        self.module_name = module_name
+        self._module = None
+        self._lock = threading.Lock()
+    
+    def load(self):
+        with self._lock:
+            if self._module is None:
+                start_time = time.time()
+                self._module = importlib.import_module(self.module_name)
+                logging.info(f"📦 {self.module_name} загружен за {time.time() - start_time:.2f}s")
+        return self._module
+    
+    @property
+    def loaded(self) -> bool:
+        return self._module is not None
+    
+    def available(self) -> bool:
+        """Установлен ли пакет (без импорта самого модуля)"""
+        return importlib.util.find_spec(self.module_name.split('.')[0]) is not None
+    
+    def __getattr__(self, name):
+        return getattr(self.load(), name)
+
+
+torch = LazyBackend('torch')
+F = LazyBackend('torch.nn.functional')
+moviepy_editor = LazyBackend('moviepy.editor')
+vidgear_gears = LazyBackend('vidgear.gears')
+
+
+@lru_cache(maxsize=None)
+def probe_device(device: str = 'auto') -> str:
+    """Устройство для torch; проверка CUDA выполняется один раз на процесс"""
+    if device != 'auto':
+        return device
+    return 'cuda' if torch.cuda.is_available() else 'cpu'
+
+
+# Эффект -> (метод VideoUniquizer, сообщение о прогрессе). Бэкенд эффекта импортируется
+# при первом вызове: temporal - только ffmpeg, social - VidGear (или MoviePy),
+# visual - MoviePy, neural - torch
+EFFECTS = {
+    'temporal': ('apply_temporal_effects', "⏱️ Applying temporal effects..."),
+    'visual': ('apply_visual_effects', "👁️ Applying visual effects..."),
+    'neural': ('apply_neural_effects', "🧠 Applying neural effects..."),
+    'social': ('apply_social_effects', "📱 Applying social effects..."),
+}
+
+
+def _video_only_path(output_path: str) -> str:
+    """Временный файл для видео без звука рядом с результатом (уникален для каждого рендера)"""
+    base, ext = os.path.splitext(output_path)
+    return f"{base}_noaudio{ext or '.mp4'}"
 
 
 class VideoUniquizer:
@@ -26,21 +89,29 @@ class VideoUniquizer:
     Нейронная сеть для уникализации видео через незаметные изменения
     """
     
-    def __init__(self, device: str = 'auto', progress_callback=None):
+    def __init__(self, device: str = 'auto', progress_callback=None, frame_callback=None,
+                 temporal_mode: Optional[str] = None, x264_args: Optional[List[str]] = None,
+                 rate_args: Optional[List[str]] = None):
         """
         Инициализация уникализатора видео
         
         Args:
             device: Устройство для обработки ('cpu', 'cuda', 'auto')
             progress_callback: Callback function for progress updates (message, progress_pct)
+            frame_callback: Callback (frames_done, total_frames) на каждый записанный кадр
+            temporal_mode: 'fast' (пересчет временных меток без перекодирования) или 'encode'
+            x264_args: -preset/-threads/-x264-params (см. EncoderTuner); по умолчанию fast, 2 потока
+            rate_args: -crf/-maxrate/-bufsize по сложности ролика (complexity.choose_rate); по умолчанию RATE_ARGS
         """
-        if device == 'auto':
-            self.device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
-        else:
-            self.device = torch.device(device)
+        # Устройство определяется при первом нейросетевом эффекте (см. probe_device)
+        self.device_name = device
+        self._device = None
         
         self.progress_callback = progress_callback
-        print(f"Используется устройство: {self.device}")
+        self.frame_callback = frame_callback
+        self.temporal_mode = temporal_mode or os.getenv('TEMPORAL_MODE', 'fast')
+        self.x264_args = list(x264_args or ['-preset', 'fast', '-threads', '2'])
+        self.rate_args = list(rate_args or RATE_ARGS)
         
         # Параметры для заметной уникализации
         self.speed_range = (0.95, 1.05)  # Заметное изменение скорости
@@ -64,35 +135,60 @@ class VideoUniquizer:
             'vibrant': {'saturation': 1.2, 'vibrance': 1.15, 'clarity': 1.1}
         }
         
+    @property
+    def device(self):
+        if self._device is None:
+            self._device = torch.device(probe_device(self.device_name))
+            print(f"Используется устройство: {self._device}")
+        return self._device
+    
     def apply_temporal_effects(self, video_path: str, output_path: str) -> str:
         """
-        Применяет временные эффекты (скорость, обрезка)
+        Применяет временные эффекты (скорость, обрезка).
+        В режиме 'fast' видео не перекодируется: меняются временные метки, начало
+        режется по ключевому кадру; иначе - один проход ffmpeg (setpts + atempo)
         """
-        clip = VideoFileClip(video_path)
+        info = probe_video(video_path)
+        if not info:
+            raise ValueError(f"Cannot probe video: {video_path}")
         
         # Случайное изменение скорости
         speed_factor = random.uniform(*self.speed_range)
-        new_duration = clip.duration / speed_factor
         
         # Случайная обрезка (убираем 1-5% от начала и конца)
-        trim_start = random.uniform(0, clip.duration * 0.05)
-        trim_end = random.uniform(0, clip.duration * 0.05)
+        trim_start = random.uniform(0, info['duration'] * 0.05)
+        trim_end = random.uniform(0, info['duration'] * 0.05)
         
-        # Применяем изменения
-        processed_clip = clip.subclip(trim_start, clip.duration - trim_end)
-        processed_clip = processed_clip.fx(lambda clip: clip.speedx(speed_factor))
-        
-        # Сохраняем
-        processed_clip.write_videofile(
-            output_path, 
-            codec='libx264', 
-            audio_codec='aac',
-            ffmpeg_params=['-preset', 'fast', '-crf', '23', '-threads', '2'],
-            verbose=False,
-            logger=None
-        )
-        processed_clip.close()
-        clip.close()
+        if self.temporal_mode == 'fast':
+            # Точная обрезка smart cut (перекодируются только края), затем ретайминг копированием
+            base, ext = os.path.splitext(output_path)
+            cut_path = f"{base}_cut{ext or '.mp4'}"
+            try:
+                if (smart_cut(video_path, cut_path, trim_start, info['duration'] - trim_end)
+                        and retime_copy(cut_path, output_path, speed_factor)):
+                    return output_path
+            finally:
+                if os.path.exists(cut_path):
+                    os.remove(cut_path)
+            
+            # Smart cut или ретайминг не удались: начало режется по ближайшему ключевому кадру в пределах тех же 5%
+            keyframes = [k for k in keyframe_times(video_path) if k <= info['duration'] * 0.05]
+            start = min(keyframes, key=lambda k: abs(k - trim_start), default=0.0)
+            if retime_copy(video_path, output_path, speed_factor, start, info['duration'] - trim_end):
+                return output_path
+            self._update_progress("⚠️ Fast temporal mode unavailable, re-encoding...")
+        
+        args = ['-ss', f"{trim_start:.3f}", '-t', f"{info['duration'] - trim_start - trim_end:.3f}",
+                '-i', video_path, '-map', '0:v:0', '-map', '0:a:0?',
+                '-filter:v', f"setpts=PTS/{speed_factor:.6f}"]
+        if info['fps']:
+            args += ['-r', f"{info['fps']:.3f}"]
+        args += ['-c:v', 'libx264'] + self.x264_args + self.rate_args
+        args += audio_codec_args(info, speed_factor) + ['-movflags', '+faststart', output_path]
+        
+        result = run_ffmpeg(ffmpeg_thread_args() + args)
+        if result.returncode != 0:
+            raise RuntimeError(f"ffmpeg temporal failed: {result.stderr[-500:]}")
         
         return output_path
     
@@ -101,7 +197,7 @@ class VideoUniquizer:
         Применяет визуальные эффекты (яркость, контраст, насыщенность) с сохранением аудио
         """
         # Загружаем видео с аудио
-        clip = VideoFileClip(video_path)
+        clip = moviepy_editor.VideoFileClip(video_path)
         
         # Случайные параметры для эффектов
         brightness_delta = random.randint(*self.brightness_range)
@@ -118,19 +214,14 @@ class VideoUniquizer:
         # Создаем новый клип с эффектами
         processed_clip = clip.fl(apply_effect)
         
-        # Сохраняем с аудио
+        # Кодируем только видео; аудио переносится из исходника без перекодирования
+        video_only_path = _video_only_path(output_path)
         processed_clip.write_videofile(
-            output_path, 
+            video_only_path, 
             codec='libx264', 
-            audio_codec='aac',
-            temp_audiofile='temp-audio.m4a',
-            remove_temp=True,
-            ffmpeg_params=[
-                '-preset', 'fast',  # Быстрая кодировка
-                '-crf', '23',       # Качество
-                '-maxrate', '2M',   # Максимальный битрейт
-                '-bufsize', '4M',   # Размер буфера
-                '-threads', '2',    # Количество потоков
+            audio=False,
+            # preset и потоки - по профилю кодера, CRF/maxrate - по сложности ролика
+            ffmpeg_params=self.x264_args + self.rate_args + [
                 '-movflags', '+faststart'  # Оптимизация для стриминга
             ],
             verbose=False,
@@ -141,7 +232,7 @@ class VideoUniquizer:
         processed_clip.close()
         clip.close()
         
-        return output_path
+        return mux_audio(video_only_path, video_path, output_path)
     
     def _apply_frame_effects(self, frame: np.ndarray, brightness: int, 
                            contrast: float, saturation: float) -> np.ndarray:
@@ -179,7 +270,8 @@ class VideoUniquizer:
         
         # Создаем writer для выходного видео
         fourcc = cv2.VideoWriter_fourcc(*'H264')
-        out = cv2.VideoWriter(output_path, fourcc, fps, (width, height))
+        video_only_path = _video_only_path(output_path)
+        out = cv2.VideoWriter(video_only_path, fourcc, fps, (width, height))
         
         print("Применяем нейросетевые эффекты...")
         
@@ -196,11 +288,13 @@ class VideoUniquizer:
                 out.write(processed_frame)
                 frame_count += 1
                 pbar.update(1)
+                if self.frame_callback:
+                    self.frame_callback(frame_count, total_frames)
         
         cap.release()
         out.release()
         
-        return output_path
+        return mux_audio(video_only_path, video_path, output_path)
     
     def _apply_neural_frame_effects(self, frame: np.ndarray) -> np.ndarray:
         """
@@ -248,7 +342,7 @@ class VideoUniquizer:
         Применяет естественные эффекты в стиле социальных сетей (с сохранением аудио)
         VidGear first (faster), MoviePy as fallback
         """
-        if VIDGEAR_AVAILABLE:
+        if vidgear_gears.available():
             try:
                 print("🚀 Using VidGear (faster) for video processing...")
                 return self._apply_social_effects_vidgear(video_path, output_path)
@@ -268,7 +362,7 @@ class VideoUniquizer:
         logging.info("🎬 Starting MoviePy video processing...")
         
         # Загружаем видео с аудио
-        clip = VideoFileClip(video_path)
+        clip = moviepy_editor.VideoFileClip(video_path)
         
         # Получаем информацию о видео
         duration = clip.duration
@@ -288,6 +382,8 @@ class VideoUniquizer:
         # Применяем эффекты к каждому кадру
         def apply_effect(get_frame, t):
             frame = get_frame(t)
+            if self.frame_callback and fps:
+                self.frame_callback(min(total_frames, int(t * fps) + 1), total_frames)
             return self._apply_social_frame_effects(frame, effect_style, effect_params)
         
         # Создаем новый клип с эффектами
@@ -304,19 +400,14 @@ class VideoUniquizer:
         print("🎬 Starting MoviePy encoding...")
         logging.info("🎬 Starting MoviePy encoding...")
         
-        # Сохраняем с аудио
+        # Кодируем только видео; аудио переносится из исходника без перекодирования
+        video_only_path = _video_only_path(output_path)
         processed_clip.write_videofile(
-            output_path, 
+            video_only_path, 
             codec='libx264', 
-            audio_codec='aac',
-            temp_audiofile='temp-audio.m4a',
-            remove_temp=True,
-            ffmpeg_params=[
-                '-preset', 'fast',  # Быстрая кодировка
-                '-crf', '23',       # Качество
-                '-maxrate', '2M',   # Максимальный битрейт
-                '-bufsize', '4M',   # Размер буфера
-                '-threads', '2',    # Количество потоков
+            audio=False,
+            # preset и потоки - по профилю кодера, CRF/maxrate - по сложности ролика
+            ffmpeg_params=self.x264_args + self.rate_args + [
                 '-movflags', '+faststart'  # Оптимизация для стриминга
             ],
             verbose=False,
@@ -331,7 +422,28 @@ class VideoUniquizer:
         processed_clip.close()
         clip.close()
         
-        return output_path
+        return mux_audio(video_only_path, video_path, output_path)
+    
+    @staticmethod
+    def _source_fps(video_path: str, cap) -> float:
+        """Частота кадров исходника без округления (29.97, а не 29); OpenCV - запасной вариант"""
+        info = probe_video(video_path)
+        return (info and info['fps']) or cap.get(cv2.CAP_PROP_FPS) or 25.0
+    
+    def _vidgear_output_params(self, fps: float) -> dict:
+        """
+        Параметры WriteGear: частота кадров исходника (иначе WriteGear пишет 25 fps, и
+        mux_audio с -shortest обрезает растянутое видео по аудио) и yuv420p (из bgr24
+        libx264 иначе выберет yuv444p)
+        """
+        return {
+            "-input_framerate": fps,
+            "-vcodec": "libx264",
+            "-pix_fmt": "yuv420p",
+            "-movflags": "+faststart",
+            **dict(zip(self.rate_args[::2], self.rate_args[1::2])),  # CRF/maxrate по сложности
+            **dict(zip(self.x264_args[::2], self.x264_args[1::2]))  # preset и потоки
+        }
     
     def _apply_social_effects_vidgear(self, video_path: str, output_path: str) -> str:
         """
@@ -345,24 +457,16 @@ class VideoUniquizer:
             raise ValueError(f"Cannot open video: {video_path}")
         
         # Получаем параметры видео
-        fps = int(cap.get(cv2.CAP_PROP_FPS))
+        fps = self._source_fps(video_path, cap)
         width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
         height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
         total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
         duration = total_frames / fps if fps > 0 else 0
         
-        self._update_progress(f"📹 Video info: {width}x{height} @ {fps}fps, {total_frames} frames ({duration:.1f}s)")
+        self._update_progress(f"📹 Video info: {width}x{height} @ {fps:.3f}fps, {total_frames} frames ({duration:.1f}s)")
         
         # Настройки VidGear
-        output_params = {
-            "-vcodec": "libx264",
-            "-preset": "fast",
-            "-crf": "23",
-            "-maxrate": "2M",
-            "-bufsize": "4M",
-            "-threads": "2",
-            "-movflags": "+faststart"
-        }
+        output_params = self._vidgear_output_params(fps)
         
         # Случайно выбираем стиль эффекта
         effect_style = random.choice(list(self.social_effects.keys()))
@@ -371,7 +475,8 @@ class VideoUniquizer:
         self._update_progress(f"🎨 Applying effect '{effect_style}': {effect_params}")
         
         # Инициализируем VidGear writer
-        writer = WriteGear(output=output_path, logging=False, **output_params)
+        video_only_path = _video_only_path(output_path)
+        writer = vidgear_gears.WriteGear(output=video_only_path, logging=False, **output_params)
         
         frame_count = 0
         start_time = time.time()
@@ -388,6 +493,8 @@ class VideoUniquizer:
                 writer.write(processed_frame)
                 
                 frame_count += 1
+                if self.frame_callback:
+                    self.frame_callback(frame_count, total_frames)
                 
                 # Progress reporting every 30 frames or every 5%
                 progress_interval = max(30, total_frames // 20)  # At least every 5%
@@ -414,10 +521,11 @@ class VideoUniquizer:
         self._update_progress(f"✅ VidGear processing completed: {frame_count} frames in {total_time:.1f}s (avg: {avg_fps:.1f} fps)")
         
         # Проверяем что файл создан и не пустой
-        if not os.path.exists(output_path) or os.path.getsize(output_path) == 0:
+        if not os.path.exists(video_only_path) or os.path.getsize(video_only_path) == 0:
             raise ValueError("VidGear output file is empty or doesn't exist")
         
-        return output_path
+        # VidGear пишет только видео - переносим аудио исходника (stream copy)
+        return mux_audio(video_only_path, video_path, output_path)
     
     def _apply_social_frame_effects(self, frame: np.ndarray, style: str, params: dict) -> np.ndarray:
         """
@@ -554,75 +662,82 @@ class VideoUniquizer:
         self._update_progress(f"🎬 Starting video uniquization: {input_path}")
         self._update_progress(f"🎨 Effects to apply: {effects}")
         
-        # Получаем информацию о входном видео
-        try:
-            input_clip = VideoFileClip(input_path)
-            input_duration = input_clip.duration
-            input_fps = input_clip.fps
-            input_frames = int(input_duration * input_fps) if input_fps else 0
-            input_clip.close()
-            
-            self._update_progress(f"📹 Input video: {input_duration:.1f}s @ {input_fps}fps ({input_frames} frames)")
-        except Exception as e:
-            self._update_progress(f"⚠️ Could not get input video info: {e}")
+        # Получаем информацию о входном видео (ffprobe - без загрузки MoviePy)
+        info = probe_video(input_path)
+        if info:
+            input_frames = int(info['duration'] * info['fps']) if info['fps'] else 0
+            self._update_progress(f"📹 Input video: {info['duration']:.1f}s @ {info['fps']}fps ({input_frames} frames)")
+        else:
+            self._update_progress(f"⚠️ Could not get input video info: {input_path}")
         
-        temp_path = f"temp_{random.randint(1000, 9999)}.mp4"
-        current_path = input_path
+        # Проход эффекта и его видеодорожка без звука лежат рядом - около двух исходников
+        # (оценка: если tmpfs все же кончится, проход повторяется на диске)
+        pass_size = 2 * os.path.getsize(input_path) if os.path.exists(input_path) else 0
         start_time = time.time()
         
-        try:
-            # Применяем эффекты последовательно
-            for i, effect in enumerate(effects):
-                effect_start = time.time()
-                progress_pct = (i / len(effects)) * 100
-                self._update_progress(f"🔄 Step {i+1}/{len(effects)}: Applying {effect} effects...", progress_pct)
+        with workspace.scratch('uniquize') as scratch:
+            temp_path = str(scratch.path('pass.mp4', size_hint=pass_size))
+            current_path = input_path
                 
-                if effect == 'temporal':
-                    self._update_progress("⏱️ Applying temporal effects...")
-                    self.apply_temporal_effects(current_path, temp_path)
-                elif effect == 'visual':
-                    self._update_progress("👁️ Applying visual effects...")
-                    self.apply_visual_effects(current_path, temp_path)
-                elif effect == 'neural':
-                    self._update_progress("🧠 Applying neural effects...")
-                    self.apply_neural_effects(current_path, temp_path)
-                elif effect == 'social':
-                    self._update_progress("📱 Applying social effects...")
-                    self.apply_social_effects(current_path, temp_path)
+            try:
+                # Применяем эффекты последовательно
+                for i, effect in enumerate(effects):
+                    effect_start = time.time()
+                    progress_pct = (i / len(effects)) * 100
+                    self._update_progress(f"🔄 Step {i+1}/{len(effects)}: Applying {effect} effects...", progress_pct)
+                    
+                    if effect in EFFECTS:
+                        method_name, message = EFFECTS[effect]
+                        self._update_progress(message)
+                        with tracing.span(f"effect:{effect}"):
+                            try:
+                                getattr(self, method_name)(current_path, temp_path)
+                            except Exception as e:
+                                if not (scratch.in_ram(temp_path) and workspace.is_out_of_space(e)):
+                                    raise
+                                # size_hint - лишь оценка: tmpfs кончился, проход повторяется на диске
+                                self._update_progress(f"⚠️ tmpfs full during {effect}, retrying the pass on disk...")
+                                if os.path.exists(_video_only_path(temp_path)):
+                                    os.remove(_video_only_path(temp_path))
+                                temp_path = str(scratch.to_disk(temp_path))
+                                getattr(self, method_name)(current_path, temp_path)
+                    
+                    effect_time = time.time() - effect_start
+                    self._update_progress(f"✅ {effect} effects completed in {effect_time:.1f}s")
+                    if info and info['fps'] and effect_time > 0:
+                        metrics.RENDER_FPS.observe(info['duration'] * info['fps'] / effect_time,
+                                                   backend='python', effect=effect)
+                    
+                    # Обновляем путь для следующего эффекта
+                    if i > 0:  # Удаляем предыдущий временный файл
+                        scratch.remove(current_path)
+                    current_path = temp_path
+                    
+                    if i < len(effects) - 1:  # Создаем новый временный файл
+                        temp_path = str(scratch.path('pass.mp4', size_hint=pass_size))
                 
-                effect_time = time.time() - effect_start
-                self._update_progress(f"✅ {effect} effects completed in {effect_time:.1f}s")
+                # Переносим финальный файл (рабочая папка может быть в tmpfs - другой файловой системе)
+                shutil.move(current_path, output_path)
+                scratch.remove(current_path)
+                total_time = time.time() - start_time
                 
-                # Обновляем путь для следующего эффекта
-                if i > 0:  # Удаляем предыдущий временный файл
-                    os.remove(current_path)
-                current_path = temp_path
+                self._update_progress(f"🎉 Video successfully uniquized: {output_path}")
+                self._update_progress(f"⏱️ Total processing time: {total_time:.1f}s", 100.0)
                 
-                if i < len(effects) - 1:  # Создаем новый временный файл
-                    temp_path = f"temp_{random.randint(1000, 9999)}.mp4"
-            
-            # Переименовываем финальный файл
-            os.rename(current_path, output_path)
-            total_time = time.time() - start_time
-            
-            self._update_progress(f"🎉 Video successfully uniquized: {output_path}")
-            self._update_progress(f"⏱️ Total processing time: {total_time:.1f}s", 100.0)
-            
-        except Exception as e:
-            print(f"⚠️ MoviePy processing failed: {e}")
-            logging.error(f"⚠️ MoviePy processing failed: {e}")
-            if VIDGEAR_AVAILABLE:
-                print("🔄 Trying VidGear fallback for full video processing...")
-                logging.info("🔄 Trying VidGear fallback for full video processing...")
-                return self._uniquize_video_vidgear(input_path, output_path, effects)
-            else:
-                print("❌ No fallback available, re-raising error")
-                logging.error("❌ No fallback available, re-raising error")
-                # Очищаем временные файлы
-                for temp_file in [temp_path, current_path]:
-                    if os.path.exists(temp_file):
-                        os.remove(temp_file)
-                raise
+            except Exception as e:
+                print(f"⚠️ MoviePy processing failed: {e}")
+                logging.error(f"⚠️ MoviePy processing failed: {e}")
+                if vidgear_gears.available():
+                    print("🔄 Trying VidGear fallback for full video processing...")
+                    logging.info("🔄 Trying VidGear fallback for full video processing...")
+                    return self._uniquize_video_vidgear(input_path, output_path, effects)
+                else:
+                    print("❌ No fallback available, re-raising error")
+                    logging.error("❌ No fallback available, re-raising error")
+                    # Очищаем временные файлы (исходник не трогаем)
+                    for temp_file in {temp_path, current_path} - {input_path}:
+                        scratch.remove(temp_file)
+                    raise
         
         return output_path
     
@@ -638,23 +753,15 @@ class VideoUniquizer:
             raise ValueError(f"Cannot open video: {input_path}")
         
         # Получаем параметры видео
-        fps = int(cap.get(cv2.CAP_PROP_FPS))
+        fps = self._source_fps(input_path, cap)
         width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
         height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
         total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
         
-        print(f"📹 Video info: {width}x{height} @ {fps}fps, {total_frames} frames")
+        print(f"📹 Video info: {width}x{height} @ {fps:.3f}fps, {total_frames} frames")
         
         # Настройки VidGear
-        output_params = {
-            "-vcodec": "libx264",
-            "-preset": "fast",
-            "-crf": "23",
-            "-maxrate": "2M",
-            "-bufsize": "4M",
-            "-threads": "2",
-            "-movflags": "+faststart"
-        }
+        output_params = self._vidgear_output_params(fps)
         
         # Случайно выбираем стиль эффекта
         effect_style = random.choice(list(self.social_effects.keys()))
@@ -663,7 +770,8 @@ class VideoUniquizer:
         print(f"Применяем эффект '{effect_style}': {effect_params}")
         
         # Инициализируем VidGear writer
-        writer = WriteGear(output=output_path, logging=False, **output_params)
+        video_only_path = _video_only_path(output_path)
+        writer = vidgear_gears.WriteGear(output=video_only_path, logging=False, **output_params)
         
         frame_count = 0
         try:
@@ -679,6 +787,8 @@ class VideoUniquizer:
                 writer.write(processed_frame)
                 
                 frame_count += 1
+                if self.frame_callback:
+                    self.frame_callback(frame_count, total_frames)
                 if frame_count % 30 == 0:  # Progress every 30 frames
                     print(f"📊 Processed {frame_count}/{total_frames} frames ({frame_count/total_frames*100:.1f}%)")
         
@@ -690,10 +800,11 @@ class VideoUniquizer:
         print(f"✅ VidGear uniquization completed: {frame_count} frames")
         
         # Проверяем что файл создан и не пустой
-        if not os.path.exists(output_path) or os.path.getsize(output_path) == 0:
+        if not os.path.exists(video_only_path) or os.path.getsize(video_only_path) == 0:
             raise ValueError("VidGear output file is empty or doesn't exist")
         
-        return output_path
+        # VidGear пишет только видео - переносим аудио исходника (stream copy)
+        return mux_audio(video_only_path, input_path, output_path)
 
 
 def main():
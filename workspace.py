@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+Рабочая папка задачи (scratch) для промежуточных файлов: скачанный исходник,
+проходы эффектов, части при разделении, временные файлы выгрузки.
+
+У каждой задачи своя папка (имя с job_id и pid процесса), поэтому файлы
+параллельных задач не пересекаются. Небольшие файлы кладутся в RAM
+(SCRATCH_RAM_DIR, по умолчанию /dev/shm), пока хватает общего бюджета
+SCRATCH_RAM_BUDGET_MB и свободного места в tmpfs; остальные - на диск
+(SCRATCH_DISK_DIR). Размер прохода заранее известен лишь приблизительно
+(size_hint - оценка), поэтому ENOSPC в tmpfs не фатален: вызывающий переносит
+путь на диск (to_disk) и повторяет проход. По выходе из задачи папки удаляются и при успехе, и при
+ошибке. Живая задача держит flock на .lock в своей папке; папки, чей замок
+никто не держит (процесс упал), удаляет recover_stale() при старте.
+
+Текущая рабочая папка передается через contextvars (как и трасса), так что
+вложенный код и потоки рендера (copy_context) пишут в папку своей задачи.
+"""
+
+import os
+import errno
+import fcntl
+import shutil
+import inspect
+import logging
+import functools
+import threading
+import contextvars
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+SCRATCH_RAM_DIR = os.getenv('SCRATCH_RAM_DIR', '/dev/shm')
+SCRATCH_DISK_DIR = os.getenv('SCRATCH_DISK_DIR', 'temp_videos/scratch')
+SCRATCH_RAM_BUDGET_MB = int(os.getenv('SCRATCH_RAM_BUDGET_MB', '512'))
+
+PREFIX = 'uniq_job_'
+# Свободное место tmpfs, которое не занимаем (его делят с другими процессами)
+RAM_FREE_RESERVE = 0.1
+
+_current_workspace: contextvars.ContextVar = contextvars.ContextVar('workspace', default=None)
+
+
+class RamBudget:
+    """Общий на процесс бюджет RAM для промежуточных файлов всех задач"""
+
+    def __init__(self, limit_bytes: int, ram_dir: str = SCRATCH_RAM_DIR):
+        self.limit_bytes = limit_bytes
+        self.ram_dir = ram_dir
+        self.reserved = 0
+        self._lock = threading.Lock()
+
+    def reserve(self, size: int) -> bool:
+        if size <= 0 or not os.path.isdir(self.ram_dir):
+            return False
+        try:
+            free = shutil.disk_usage(self.ram_dir).free
+        except OSError:
+            return False
+        with self._lock:
+            if self.reserved + size > self.limit_bytes or size > free * (1 - RAM_FREE_RESERVE):
+                return False
+            self.reserved += size
+            return True
+
+    def release(self, size: int):
+        with self._lock:
+            self.reserved = max(0, self.reserved - size)
+
+
+RAM_BUDGET = RamBudget(SCRATCH_RAM_BUDGET_MB * 1024 * 1024)
+
+
+class Workspace:
+    """Приватная папка одной задачи: path() выдает уникальные пути в RAM или на диске"""
+
+    def __init__(self, job_id: str, ram_budget: Optional[RamBudget] = RAM_BUDGET,
+                 disk_root: Optional[str] = None):
+        self.name = f"{PREFIX}{job_id}_{os.getpid()}"
+        self.ram_budget = ram_budget
+        self.disk_dir = Path(disk_root or SCRATCH_DISK_DIR) / self.name
+        self.ram_dir = Path(ram_budget.ram_dir) / self.name if ram_budget else None
+        self._reservations: Dict[Path, int] = {}
+        self._counter = 0
+        self._lock = threading.Lock()
+        self.disk_dir.mkdir(parents=True, exist_ok=True)
+        # Замок снимается ядром при завершении процесса - так recover_stale отличает брошенные папки
+        self._lock_file = open(self.disk_dir / '.lock', 'w')
+        fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+    def path(self, name: str, size_hint: int = 0) -> Path:
+        """
+        Уникальный путь для промежуточного файла. size_hint - ожидаемый размер:
+        если он известен и помещается в бюджет RAM, файл будет в tmpfs
+        """
+        with self._lock:
+            self._counter += 1
+            filename = f"{self._counter:03d}_{name}"
+        if size_hint and self.ram_budget and self.ram_budget.reserve(size_hint):
+            self.ram_dir.mkdir(parents=True, exist_ok=True)
+            path = self.ram_dir / filename
+            with self._lock:
+                self._reservations[path] = size_hint
+            return path
+        return self.disk_dir / filename
+
+    def in_ram(self, path) -> bool:
+        return Path(path) in self._reservations
+
+    def to_disk(self, path) -> Path:
+        """Путь в RAM, где не хватило места: недописанный файл удаляется, взамен - путь на диске"""
+        path = Path(path)
+        self.remove(path)
+        return self.disk_dir / path.name
+
+    def remove(self, path):
+        """Удаляет промежуточный файл и возвращает его долю бюджета RAM"""
+        path = Path(path)
+        path.unlink(missing_ok=True)
+        with self._lock:
+            size = self._reservations.pop(path, 0)
+        if size:
+            self.ram_budget.release(size)
+
+    def cleanup(self):
+        if not self._lock_file.closed:
+            self._lock_file.close()
+        for directory in (self.ram_dir, self.disk_dir):
+            if directory is not None:
+                shutil.rmtree(directory, ignore_errors=True)
+        with self._lock:
+            reserved = sum(self._reservations.values())
+            self._reservations.clear()
+        if reserved:
+            self.ram_budget.release(reserved)
+
+    @contextmanager
+    def activate(self):
+        token = _current_workspace.set(self)
+        try:
+            yield self
+        finally:
+            _current_workspace.reset(token)
+            self.cleanup()
+
+
+def current() -> Optional[Workspace]:
+    return _current_workspace.get()
+
+
+def is_out_of_space(error: BaseException) -> bool:
+    """Ошибка из-за нехватки места: ENOSPC напрямую или в выводе ffmpeg"""
+    if isinstance(error, OSError) and error.errno == errno.ENOSPC:
+        return True
+    return 'No space left on device' in str(error)
+
+
+@contextmanager
+def scratch(job_id: str):
+    """Рабочая папка текущей задачи; если ее нет - новая, удаляемая по выходе"""
+    workspace = current()
+    if workspace is not None:
+        yield workspace
+        return
+    with Workspace(job_id).activate() as workspace:
+        yield workspace
+
+
+def job(job_class: str):
+    """Декоратор: вызов получает свою рабочую папку (sync и async)"""
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with Workspace(f"{job_class}_{os.urandom(4).hex()}").activate():
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with Workspace(f"{job_class}_{os.urandom(4).hex()}").activate():
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _is_stale(name: str, disk_root: str) -> bool:
+    lock_path = Path(disk_root) / name / '.lock'
+    try:
+        with open(lock_path, 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        return False  # Задача жива
+    except OSError:
+        pass  # Папки на диске нет - папка в RAM осталась от упавшего процесса
+    return True
+
+
+def recover_stale(ram_root: Optional[str] = None, disk_root: Optional[str] = None) -> int:
+    """Удаляет рабочие папки задач, чей процесс завершился (после падения/перезапуска)"""
+    ram_root = ram_root or RAM_BUDGET.ram_dir
+    disk_root = disk_root or SCRATCH_DISK_DIR
+    removed = 0
+    for root in (ram_root, disk_root):
+        try:
+            entries = list(Path(root).iterdir())
+        except OSError:
+            continue
+        for entry in entries:
+            if entry.is_dir() and entry.name.startswith(PREFIX) and _is_stale(entry.name, disk_root):
+                shutil.rmtree(entry, ignore_errors=True)
+                removed += 1
+    if removed:
+        logger.info(f"🧹 Удалено рабочих папок после сбоя: {removed}")
+    return removed
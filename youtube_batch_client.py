@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+Klient YouTube Data API z batchowaniem i liczeniem quota.
+
+- videos.list / channels.list: do 50 id na jedno wywołanie
+- cache channel_id -> playlista uploads (plik JSON, nie zmienia się)
+- liczenie dziennych jednostek quota per typ wywołania (metrics())
+"""
+
+import os
+import json
+import logging
+import threading
+from datetime import datetime
+from zoneinfo import ZoneInfo
+from typing import Dict, Any, List, Optional, Iterable
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+YOUTUBE_API_URL = "https://www.googleapis.com/youtube/v3"
+
+# Koszt wywołań w jednostkach quota (https://developers.google.com/youtube/v3/determine_quota_cost)
+QUOTA_COSTS = {
+    'videos.list': 1,
+    'channels.list': 1,
+    'playlistItems.list': 1,
+    'search.list': 100,
+}
+
+# Domyślny dzienny limit projektu
+DAILY_QUOTA = 10000
+
+# Maksymalna liczba id w jednym wywołaniu *.list
+MAX_IDS_PER_CALL = 50
+
+# Quota resetuje się o północy czasu pacyficznego (z czasem letnim)
+QUOTA_TIMEZONE = ZoneInfo('America/Los_Angeles')
+
+
+def _quota_day(now: Optional[datetime] = None) -> str:
+    """Dzień quota dla chwili now (domyślnie teraz)"""
+    return (now or datetime.now(QUOTA_TIMEZONE)).astimezone(QUOTA_TIMEZONE).strftime('%Y-%m-%d')
+
+
+def _chunks(items: List[str], size: int) -> Iterable[List[str]]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class YouTubeQuotaExceeded(Exception):
+    """Dzienny limit quota wyczerpany"""
+
+
+class YouTubeBatchClient:
+    """Batchujący klient YouTube Data API z liczeniem quota"""
+
+    def __init__(self, api_key: Optional[str], session: Optional[requests.Session] = None,
+                 base_url: str = YOUTUBE_API_URL, cache_path: str = "youtube_channels_cache.json",
+                 daily_quota: int = DAILY_QUOTA):
+        self.api_key = api_key
+        self.session = session or requests.Session()
+        self.base_url = base_url.rstrip('/')
+        self.cache_path = cache_path
+        self.daily_quota = daily_quota
+
+        self._lock = threading.Lock()
+        self._quota_day = _quota_day()
+        self._units: Dict[str, int] = {}
+        self._calls: Dict[str, int] = {}
+
+        # channel_id -> uploads playlist, handle -> channel_id
+        self._uploads: Dict[str, str] = {}
+        self._handles: Dict[str, str] = {}
+        self._load_cache()
+
+    # ----------------------------------------------------------------- cache
+
+    def _load_cache(self):
+        try:
+            if self.cache_path and os.path.exists(self.cache_path):
+                with open(self.cache_path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                self._uploads = data.get('uploads', {})
+                self._handles = data.get('handles', {})
+        except Exception as e:
+            logger.warning(f"Nie udało się wczytać cache kanałów {self.cache_path}: {e}")
+
+    def _save_cache(self):
+        if not self.cache_path:
+            return
+        try:
+            # Pod zamkiem: równoległy batch może w tym czasie dopisywać kanały
+            with self._lock:
+                tmp_path = f"{self.cache_path}.tmp"
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump({'uploads': self._uploads, 'handles': self._handles}, f, ensure_ascii=False, indent=2)
+                os.replace(tmp_path, self.cache_path)
+        except Exception as e:
+            logger.warning(f"Nie udało się zapisać cache kanałów: {e}")
+
+    # ----------------------------------------------------------------- quota
+
+    def _charge(self, call_type: str):
+        """Dolicza koszt wywołania (reset po zmianie dnia quota)"""
+        with self._lock:
+            day = _quota_day()
+            if day != self._quota_day:
+                self._quota_day = day
+                self._units.clear()
+                self._calls.clear()
+            cost = QUOTA_COSTS.get(call_type, 1)
+            if sum(self._units.values()) + cost > self.daily_quota:
+                raise YouTubeQuotaExceeded(f"Brak quota na {call_type} ({self.daily_quota} jednostek/dzień)")
+            self._units[call_type] = self._units.get(call_type, 0) + cost
+            self._calls[call_type] = self._calls.get(call_type, 0) + 1
+
+    def metrics(self) -> Dict[str, Any]:
+        """Zużycie quota w bieżącym dniu"""
+        with self._lock:
+            used = sum(self._units.values())
+            return {
+                'quota_day': self._quota_day,
+                'units_used': used,
+                'units_remaining': max(0, self.daily_quota - used),
+                'units_by_call': dict(self._units),
+                'calls_by_call': dict(self._calls),
+                'cached_channels': len(self._uploads)
+            }
+
+    def _get(self, call_type: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        """GET na endpoint ('videos.list' -> /videos) z liczeniem quota"""
+        self._charge(call_type)
+        endpoint = call_type.split('.')[0]
+        response = self.session.get(f"{self.base_url}/{endpoint}",
+                                    params=dict(params, key=self.api_key), timeout=10)
+        response.raise_for_status()
+        return response.json()
+
+    # ------------------------------------------------------------------- API
+
+    def videos(self, video_ids: List[str], part: str = 'statistics,snippet') -> Dict[str, Dict[str, Any]]:
+        """Statystyki wideo: do 50 id na jedno wywołanie videos.list"""
+        result = {}
+        unique_ids = list(dict.fromkeys(video_ids))
+        for chunk in _chunks(unique_ids, MAX_IDS_PER_CALL):
+            data = self._get('videos.list', {'part': part, 'id': ','.join(chunk), 'maxResults': MAX_IDS_PER_CALL})
+            for item in data.get('items', []):
+                result[item['id']] = item
+        return result
+
+    def channels(self, channel_ids: List[str],
+                 part: str = 'statistics,snippet,contentDetails') -> Dict[str, Dict[str, Any]]:
+        """Kanały hurtem: do 50 id na jedno wywołanie channels.list"""
+        result = {}
+        unique_ids = list(dict.fromkeys(channel_ids))
+        for chunk in _chunks(unique_ids, MAX_IDS_PER_CALL):
+            data = self._get('channels.list', {'part': part, 'id': ','.join(chunk), 'maxResults': MAX_IDS_PER_CALL})
+            for item in data.get('items', []):
+                result[item['id']] = item
+                self._remember_uploads(item)
+        self._save_cache()
+        return result
+
+    def _remember_uploads(self, channel: Dict[str, Any]):
+        uploads = channel.get('contentDetails', {}).get('relatedPlaylists', {}).get('uploads')
+        if uploads:
+            with self._lock:
+                self._uploads[channel['id']] = uploads
+
+    def resolve_handles(self, handles: List[str]) -> Dict[str, str]:
+        """@handle -> channel_id (forHandle przyjmuje jeden handle, wynik w cache)"""
+        result = {}
+        changed = False
+        for handle in dict.fromkeys(h.lstrip('@') for h in handles):
+            if handle in self._handles:
+                result[handle] = self._handles[handle]
+                continue
+            data = self._get('channels.list', {'part': 'contentDetails,snippet', 'forHandle': f"@{handle}"})
+            if not data.get('items'):
+                # Fallback: wyszukiwanie kanału (drogie - 100 jednostek)
+                search = self._get('search.list', {'part': 'snippet', 'q': handle, 'type': 'channel', 'maxResults': 1})
+                if not search.get('items'):
+                    continue
+                channel_id = search['items'][0]['snippet']['channelId']
+            else:
+                channel_id = data['items'][0]['id']
+                self._remember_uploads(data['items'][0])
+            with self._lock:
+                self._handles[handle] = channel_id
+            result[handle] = channel_id
+            changed = True
+        if changed:
+            self._save_cache()
+        return result
+
+    def uploads_playlists(self, channel_ids: List[str]) -> Dict[str, str]:
+        """channel_id -> playlista uploads; brakujące pobierane jednym channels.list"""
+        missing = [channel_id for channel_id in channel_ids if channel_id not in self._uploads]
+        if missing:
+            self.channels(missing, part='contentDetails')
+        with self._lock:
+            return {channel_id: self._uploads[channel_id] for channel_id in channel_ids if channel_id in self._uploads}
+
+    def playlist_items(self, playlist_id: str, max_results: int = 50,
+                       page_token: Optional[str] = None) -> Dict[str, Any]:
+        """Jedna strona playlistItems.list"""
+        params = {'part': 'contentDetails', 'playlistId': playlist_id, 'maxResults': min(MAX_IDS_PER_CALL, max_results)}
+        if page_token:
+            params['pageToken'] = page_token
+        return self._get('playlistItems.list', params)